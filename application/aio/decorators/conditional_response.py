@@ -0,0 +1,62 @@
+from functools import wraps
+from typing import Optional
+
+from starlette.requests import Request
+from starlette.responses import Response
+from werkzeug.http import parse_etags, quote_etag
+
+from application.aio.handlers import shared
+from application.decorators.conditional_response import make_etag
+
+
+async def get_request_import_version(request: Request, import_id: int, db) -> Optional[int]:
+    """
+    Возвращает версию поставки, прочитанную для запроса декоратором conditional_response.
+
+    Если версия для запроса еще не прочитана, она читается из базы данных.
+    :param Request request: запрос
+    :param int import_id: уникальный идентификатор поставки
+    :param AsyncIOMotorDatabase db: объект базы данных, в которую записываются наборы данных о жителях
+
+    :return: Версия поставки или None, если поставка не найдена
+    :rtype: Optional[int]
+    """
+    import_version = getattr(request.state, 'import_version', (None, None))
+    if import_version[0] == import_id:
+        return import_version[1]
+    return await shared.get_import_version(import_id, db)
+
+
+def conditional_response(db, date_param: str = None):
+    """
+    Декоратор асинхронного обработчика, добавляющий к ответу ETag по версии поставки и отвечающий
+    304 Not Modified, если ETag из заголовка If-None-Match запроса совпадает с текущим.
+
+    Работает так же, как синхронный декоратор conditional_response. Прочитанная версия сохраняется в request.state.
+    :param AsyncIOMotorDatabase db: объект базы данных, в которую записываются наборы данных о жителях
+    :param str date_param: имя параметра запроса с датой, без которого ответ вычисляется на текущую дату
+    """
+
+    def decorator(f):
+        @wraps(f)
+        async def wrap(request: Request):
+            import_id = request.path_params['import_id']
+            version = await shared.get_import_version(import_id, db)
+            request.state.import_version = (import_id, version)
+            if version is None:
+                return await f(request)
+
+            etag = make_etag(import_id, version, date_param,
+                             request.query_params.get(date_param) if date_param else None)
+            if parse_etags(request.headers.get('If-None-Match')).contains_weak(etag):
+                response = Response(status_code=304)
+            else:
+                response = await f(request)
+                if response.status_code >= 300:
+                    return response
+            response.headers['ETag'] = quote_etag(etag, weak=True)
+            return response
+
+        return wrap
+
+    return decorator
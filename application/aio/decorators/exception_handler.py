@@ -0,0 +1,42 @@
+import logging
+from functools import wraps
+from json import JSONDecodeError
+
+from jsonschema import ValidationError
+from pymongo.errors import PyMongoError
+from starlette.responses import JSONResponse
+from werkzeug.exceptions import BadRequest
+
+from application.decorators.exception_handler import _make_error_response
+
+
+def handle_exceptions(logger: logging.Logger):
+    """
+    Декоратор, обворачивающий указанную асинхронную функцию в блок обработки ошибок.
+
+    Логирует все появивишиеся ошибки с помощью логгера, переданного на вход, и возвращает те же ответы об ошибках,
+    что и синхронный обработчик.
+    :param logging.Logger logger: логгер, которым логируется возникающие ошибки
+    """
+
+    def decorator(f):
+        @wraps(f)
+        async def wrap(*args, **kwargs):
+            try:
+                return await f(*args, **kwargs)
+            except ValidationError as e:
+                return JSONResponse(*_make_error_response(logger, 'Input data is not valid: ' + str(e), 400))
+            except BadRequest as e:
+                return JSONResponse(*_make_error_response(logger, 'Error when parsing JSON: ' + str(e), 400))
+            except JSONDecodeError as e:
+                return JSONResponse(*_make_error_response(logger, 'Error when parsing JSON: ' + str(e), 400))
+            except PyMongoError as e:
+                return JSONResponse(*_make_error_response(logger, 'Database error: ' + str(e), 400))
+            except ValueError as e:
+                return JSONResponse(*_make_error_response(logger, 'Value error: ' + str(e), 400))
+            except Exception as e:
+                return JSONResponse(*_make_error_response(logger, str(e), 400))
+
+        return wrap
+
+    return decorator
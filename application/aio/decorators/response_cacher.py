@@ -0,0 +1,153 @@
+import os
+from datetime import datetime
+from functools import wraps
+from typing import Iterable, Optional, Tuple
+
+from starlette.requests import Request
+from starlette.responses import Response
+from werkzeug.http import http_date, parse_accept_header
+
+from application import metrics, response_body
+from application.aio.decorators.conditional_response import get_request_import_version
+from application.aio.read_write_lock import AsyncReadWriteMongoLock
+from application.decorators.response_cacher import _get_expires
+from application.handlers.shared import ImportNotFoundError
+from application.memory_cache import MemoryCache
+
+
+async def _get_cached_data(import_id: int, collection_name: str, db,
+                           key_params: dict = None) -> Tuple[Optional[dict], Optional[datetime]]:
+    """
+    Возвращает закешированное ранее тело ответа для указанной поставки.
+
+    Если тело удалено при модификации жителей или документ сохранен до появления тел ответов, оно собирается
+    из структурированных данных и записывается в документ, если ревизия документа не изменилась.
+    Если закешированные данные отсутствуют или срок их действия истек, возвращается None.
+    :param int import_id: уникальный идентификатор поставки
+    :param str collection_name: имя коллекции, в которой находятся кешированные данные
+    :param AsyncIOMotorDatabase db: объект базы данных, в которую записываются наборы данных о жителях
+    :param dict key_params: параметры запроса, входящие в ключ кеша вместе с import_id
+
+    :return: Поля body и gzip_body закешированного ответа и время по UTC, начиная с которого он устаревает
+    :rtype: Tuple[Optional[dict], Optional[datetime]]
+    """
+    key_params = key_params or {}
+    projection = {'import_id': 0, **{param: 0 for param in key_params}}
+    cached_data = await db[collection_name].find_one({'import_id': import_id, **key_params}, projection)
+    if cached_data is None:
+        return None, None
+    expires = cached_data.get('expires')
+    if expires is not None and expires <= datetime.utcnow():
+        return None, None
+    if 'body' not in cached_data:
+        body_fields = response_body.make_body_fields(
+            response_body.encode_body(response_body.read_cached_data(cached_data)))
+        await db[collection_name].update_one(
+            {'_id': cached_data['_id'], 'revision': cached_data.get('revision'), 'body': {'$exists': False}},
+            {'$set': body_fields})
+        return body_fields, expires
+    return {'body': cached_data['body'], 'gzip_body': cached_data.get('gzip_body')}, expires
+
+
+async def _cache_data(import_id: int, collection_name: str, body: bytes, data: dict, db,
+                      key_params: dict = None, expires: datetime = None) -> dict:
+    """
+    Сохраняет тело ответа для указанной поставки в базу данных, заменяя устаревшие данные с тем же ключом.
+
+    Вместе с телом сохраняются структурированные данные ответа, которые изменяются при модификации жителей.
+    :param int import_id: уникальный идентификатор поставки
+    :param str collection_name: имя коллекции, в которую производится запись
+    :param bytes body: сериализованное тело ответа
+    :param dict data: данные ответа, из которых сериализовано тело
+    :param AsyncIOMotorDatabase db: объект базы данных, в которую записываются наборы данных о жителях
+    :param dict key_params: параметры запроса, входящие в ключ кеша вместе с import_id
+    :param datetime expires: время по UTC, начиная с которого данные устаревают. Если не указано, данные не устаревают
+
+    :return: Сохраненные поля body и gzip_body
+    :rtype: dict
+    """
+    key = {'import_id': import_id, **(key_params or {})}
+    cache_fields = response_body.make_cache_fields(body, data)
+    data = {**key, **cache_fields}
+    if expires is not None:
+        data['expires'] = expires
+    await db[collection_name].replace_one(key, data, upsert=True)
+    return {'body': cache_fields['body'], 'gzip_body': cache_fields['gzip_body']}
+
+
+def _make_response(request: Request, body: bytes, gzip_body: Optional[bytes], expires: Optional[datetime]) -> Response:
+    """
+    Создает ответ из закешированного тела.
+
+    Если у тела есть сжатый вариант и клиент принимает gzip, отправляется сжатый вариант.
+    :param Request request: запрос, на который отправляется ответ
+    :param bytes body: сериализованное тело ответа
+    :param Optional[bytes] gzip_body: сжатое gzip тело ответа
+    :param Optional[datetime] expires: время по UTC, начиная с которого ответ устаревает
+
+    :return: Ответ с заголовком Expires, если время устаревания указано
+    :rtype: Response
+    """
+    accepts_gzip = 'gzip' in parse_accept_header(request.headers.get('Accept-Encoding'))
+    response = Response(gzip_body if gzip_body is not None and accepts_gzip else body, 201,
+                        media_type='application/json; charset=utf-8')
+    if gzip_body is not None:
+        response.headers['Vary'] = 'Accept-Encoding'
+        if accepts_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+    if expires is not None:
+        response.headers['Expires'] = http_date(expires)
+    return response
+
+
+def cache_response(collection_name: str, db, lock: AsyncReadWriteMongoLock, key_params: Iterable[str] = (),
+                   memory_cache: MemoryCache = None):
+    """
+    Декоратор асинхронного обработчика, проверяющий наличие закешированных данных в указанной коллекции перед
+    выполнением обработчика.
+
+    Работает так же, как синхронный декоратор cache_response: данные отдаются только для завершенной поставки,
+    читаются без блокировки, блокировка берется только при их отсутствии, ответы хранятся готовыми телами и, если
+    указан кеш в памяти процесса, отдаются из него, пока не изменилась версия поставки. Обработчик должен сохранить
+    в ответе данные, из которых сериализовано тело, функцией response_body.with_response_data.
+    :param str collection_name: имя коллекции, в которой находятся кешированные данные
+    :param AsyncIOMotorDatabase db: объект базы данных, в которую записываются наборы данных о жителях
+    :param AsyncReadWriteMongoLock lock: объект для ограничения одновременного доступа к ресурсам из разных процессов
+    :param Iterable[str] key_params: имена параметров запроса, значения которых входят в ключ кеша
+    :param MemoryCache memory_cache: кеш сериализованных ответов в памяти процесса
+    """
+
+    def decorator(f):
+        @wraps(f)
+        async def wrap(request: Request):
+            import_id = request.path_params['import_id']
+            request_params = {param: request.query_params.get(param) for param in key_params}
+            memory_key = (collection_name, import_id, *request_params.values())
+            version = await get_request_import_version(request, import_id, db)
+            if version is None:
+                raise ImportNotFoundError()
+            if memory_cache is not None:
+                entry = memory_cache.get(memory_key, version)
+                if entry is not None:
+                    metrics.CACHE_REQUESTS.inc(cache=collection_name, result='memory_hit')
+                    return _make_response(request, entry.body, entry.gzip_body, entry.expires)
+
+            body_fields, expires = await _get_cached_data(import_id, collection_name, db, request_params)
+            result = 'hit'
+            if body_fields is None:
+                async with lock(f'{collection_name}_{import_id}', str(os.getpid()), expire=60, timeout=10):
+                    body_fields, expires = await _get_cached_data(import_id, collection_name, db, request_params)
+                    if body_fields is None:
+                        result = 'miss'
+                        response: Response = await f(request)
+                        expires = _get_expires(response)
+                        body_fields = await _cache_data(import_id, collection_name, response.body,
+                                                        response.response_data, db, request_params, expires)
+            metrics.CACHE_REQUESTS.inc(cache=collection_name, result=result)
+            if memory_cache is not None:
+                memory_cache.put(memory_key, version, body_fields['body'], expires, body_fields['gzip_body'])
+            return _make_response(request, body_fields['body'], body_fields['gzip_body'], expires)
+
+        return wrap
+
+    return decorator
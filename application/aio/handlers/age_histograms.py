@@ -0,0 +1,94 @@
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from application.handlers.age_histograms import _date_key, _get_histograms_difference, load_histograms
+
+
+async def write_histograms(import_id: int, histograms: Dict[str, Counter], db):
+    """
+    Записывает гистограммы дат рождения в базу данных, каждый город отдельным документом.
+
+    :param int import_id: уникальный идентификатор поставки
+    :param Dict[str, Counter] histograms: гистограммы дат рождения жителей по городам
+    :param AsyncIOMotorDatabase db: объект базы данных, в которую записываются наборы данных о жителях
+    :raises: :class:`PyMongoError`: Операция записи в базу данных не была разрешена
+    """
+    if not histograms:
+        return
+    db_response = await db['age_histograms'].insert_many(
+        [{'import_id': import_id, 'town': town, 'birth_dates': dict(birth_dates)}
+         for town, birth_dates in histograms.items()])
+    if not db_response.acknowledged:
+        raise PyMongoError('Operation was not acknowledged')
+
+
+async def read_histograms(import_id: int, db,
+                          session=None) -> Tuple[Optional[List[str]], np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Загружает гистограммы дат рождения указанной поставки в массивы numpy.
+
+    Количество документов равно количеству городов поставки, поэтому они читаются одним списком.
+    :param int import_id: уникальный идентификатор поставки
+    :param AsyncIOMotorDatabase db: объект базы данных, в которую записываются наборы данных о жителях
+    :param AsyncIOMotorClientSession session: сессия соединения с базой данных, через которую производятся все запросы
+
+    :return: Названия городов по их кодам, а также коды городов, даты рождения и количество жителей
+        для каждого столбца гистограмм. Если гистограммы поставки не найдены, список городов равен None.
+    :rtype: Tuple[Optional[List[str]], np.ndarray, np.ndarray, np.ndarray]
+    """
+    documents = await db['age_histograms'].find({'import_id': import_id}, {'_id': 0, 'town': 1, 'birth_dates': 1},
+                                                session=session).sort('town', 1).to_list(None)
+    return load_histograms(documents)
+
+
+async def move_citizen(import_id: int, old_citizen: dict, new_citizen: dict, db, session) -> bool:
+    """
+    Переносит жителя из столбца его старых города и даты рождения в столбец новых.
+
+    :param int import_id: уникальный идентификатор поставки
+    :param dict old_citizen: информация о жителе до модификации
+    :param dict new_citizen: информация о жителе после модификации
+    :param AsyncIOMotorDatabase db: объект базы данных, в которую записываются наборы данных о жителях
+    :param AsyncIOMotorClientSession session: сессия соединения с базой данных, через которую производятся все запросы
+
+    :return: Были ли найдены гистограммы поставки. Поставки, загруженные до появления гистограмм, их не имеют.
+    :rtype: bool
+    """
+    old_key, new_key = _date_key(old_citizen['birth_date']), _date_key(new_citizen['birth_date'])
+    db_response = await db['age_histograms'].update_one({'import_id': import_id, 'town': old_citizen['town']},
+                                                        {'$inc': {f'birth_dates.{old_key}': -1}}, session=session)
+    if not db_response.matched_count:
+        return False
+    await db['age_histograms'].update_one({'import_id': import_id, 'town': new_citizen['town']},
+                                          {'$inc': {f'birth_dates.{new_key}': 1}}, upsert=True, session=session)
+    return True
+
+
+async def move_citizens(import_id: int, old_citizens: List[dict], new_citizens: List[dict], db, session) -> bool:
+    """
+    Переносит нескольких жителей из столбцов их старых городов и дат рождения в столбцы новых.
+
+    Изменения суммируются по городам и отправляются одной пакетной записью.
+    :param int import_id: уникальный идентификатор поставки
+    :param List[dict] old_citizens: информация о жителях до модификации
+    :param List[dict] new_citizens: информация о тех же жителях после модификации
+    :param AsyncIOMotorDatabase db: объект базы данных, в которую записываются наборы данных о жителях
+    :param AsyncIOMotorClientSession session: сессия соединения с базой данных, через которую производятся все запросы
+
+    :return: Были ли найдены гистограммы поставки. Поставки, загруженные до появления гистограмм, их не имеют.
+    :rtype: bool
+    """
+    if not await db['age_histograms'].count_documents({'import_id': import_id}, limit=1, session=session):
+        return False
+    difference = _get_histograms_difference(old_citizens, new_citizens)
+    if difference:
+        await db['age_histograms'].bulk_write(
+            [UpdateOne({'import_id': import_id, 'town': town},
+                       {'$inc': {f'birth_dates.{date_key}': count for date_key, count in birth_dates.items()}},
+                       upsert=True)
+             for town, birth_dates in difference.items()], session=session)
+    return True
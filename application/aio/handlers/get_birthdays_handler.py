@@ -0,0 +1,55 @@
+import os
+from collections import defaultdict
+from typing import Tuple
+
+from pymongo.errors import OperationFailure
+
+from application.aio.handlers import shared
+from application.aio.read_write_lock import AsyncReadWriteMongoLock
+from application.handlers.get_birthdays_handler import _get_birthdays_data, _get_birthdays_pipeline, \
+    _get_birthdays_representation
+
+
+async def _aggregate_birthdays_data(import_id: int, db) -> dict:
+    """
+    Возвращает жителей и количество подарков по месяцам, посчитанные агрегацией в базе данных.
+
+    :param int import_id: уникальный идентификатор поставки
+    :param AsyncIOMotorDatabase db: объект базы данных, в которую записываются наборы данных о жителях
+    :raises: :class:`OperationFailure`: База данных не смогла выполнить агрегацию
+
+    :return: Словарь количества подарков для каждого жителя по месяцам
+    :rtype: dict
+    """
+    birthdays_data = defaultdict(dict)
+    async for group in db['citizens'].aggregate(_get_birthdays_pipeline(import_id)):
+        birthdays_data[group['_id']['month']][group['_id']['citizen_id']] = group['presents']
+    return birthdays_data
+
+
+async def get_birthdays(import_id: int, db, lock: AsyncReadWriteMongoLock) -> Tuple[dict, int]:
+    """
+    Возвращает жителей и количество подарков, которые они будут покупать своим ближайшим родственникам
+    (1-го порядка), сгруппированных по месяцам из указанного набора данных.
+
+    Подарки считаются агрегацией в базе данных. Если база данных не может выполнить агрегацию,
+    жители загружаются и подарки считаются в python. Жители читаются только после проверки, что поставка завершена.
+    :param int import_id: уникальный идентификатор поставки
+    :param AsyncIOMotorDatabase db: объект базы данных, в которую записываются наборы данных о жителях
+    :param AsyncReadWriteMongoLock lock: объект для ограничения одновременного доступа к ресурсам из разных процессов
+    :raises: :class:`ImportNotFoundError`: Завершенная поставка с указанным уникальным идентификатором
+        остутствует в базе данных
+
+    :return: Данные о подарках и http статус
+    :rtype: dict
+    """
+    async with lock.shared(str(import_id), str(os.getpid()), expire=60, timeout=10):
+        await shared.check_import_exists(import_id, db)
+        try:
+            birthdays_data = await _aggregate_birthdays_data(import_id, db)
+        except OperationFailure:
+            projection = {'_id': 0, 'birth_date': 1, 'relatives': 1}
+            citizens = await shared.find_citizens(import_id, db, projection).to_list(None)
+            birthdays_data = _get_birthdays_data(citizens)
+        birthdays_data = _get_birthdays_representation(birthdays_data)
+        return birthdays_data, 201
@@ -0,0 +1,84 @@
+import os
+from typing import AsyncIterator, Tuple
+
+from application.aio.handlers import shared
+from application.aio.read_write_lock import AsyncReadWriteMongoLock
+from application.handlers.get_citizens_handler import CHUNK_SIZE, _get_chunk_representation
+
+
+async def _generate_citizens_chunks(import_id: int, db, lock: AsyncReadWriteMongoLock, filters: dict = None,
+                                    after_citizen_id: int = None, limit: int = 0, projection: dict = None,
+                                    chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """
+    Генерирует ответ со списком жителей частями по мере чтения курсора из базы данных.
+
+    Жители читаются только после проверки, что поставка завершена, поэтому первая часть генерируется только
+    для завершенной поставки. Блокировка поставки удерживается,
+    пока не будет сгенерирована последняя часть или генератор не будет закрыт.
+    :param int import_id: уникальный идентификатор поставки
+    :param AsyncIOMotorDatabase db: объект базы данных, в которую записываются наборы данных о жителях
+    :param AsyncReadWriteMongoLock lock: объект для ограничения одновременного доступа к ресурсам из разных процессов
+    :param dict filters: значения полей town, gender и birth_month, которым должны соответствовать жители
+    :param int after_citizen_id: уникальный идентификатор жителя, после которого начинается страница
+    :param int limit: максимальное количество жителей на странице, 0 - без ограничения
+    :param dict projection: словарь проекции выборки, по умолчанию все поля жителя
+    :param int chunk_size: количество жителей в одной части ответа
+    :raises: :class:`ImportNotFoundError`: Завершенная поставка с указанным уникальным идентификатором
+        остутствует в базе данных
+    """
+    async with lock.shared(str(import_id), str(os.getpid()), expire=60, timeout=10):
+        await shared.check_import_exists(import_id, db)
+        cursor = shared.find_citizens(import_id, db, projection or shared.CITIZEN_PROJECTION, filters,
+                                      after_citizen_id, limit)
+        cursor = cursor.batch_size(chunk_size)
+        try:
+            chunk = None
+            async for citizen in cursor:
+                if chunk is None:
+                    chunk = []
+                    yield b'{"data": ['
+                elif len(chunk) >= chunk_size:
+                    yield _get_chunk_representation(chunk) + b', '
+                    chunk = []
+                chunk.append(citizen)
+            if chunk is None:
+                yield b'{"data": []}'
+                return
+            yield _get_chunk_representation(chunk) + b']}'
+        finally:
+            await cursor.close()
+
+
+async def get_citizens(import_id: int, db, lock: AsyncReadWriteMongoLock, filters: dict = None,
+                       after_citizen_id: int = None, limit: int = 0,
+                       projection: dict = None) -> Tuple[AsyncIterator[bytes], int]:
+    """
+    Возвращает список жителей для указанного набора данных в виде асинхронного генератора частей ответа.
+
+    Ответ формируется из курсора по частям, поэтому время до первого байта и потребление памяти
+    не зависят от размера поставки. Ошибка отсутствия завершенной поставки возникает до возврата генератора.
+    :param int import_id: уникальный идентификатор поставки
+    :param AsyncIOMotorDatabase db: объект базы данных, в которую записываются наборы данных о жителях
+    :param AsyncReadWriteMongoLock lock: объект для ограничения одновременного доступа к ресурсам из разных процессов
+    :param dict filters: значения полей town, gender и birth_month, которым должны соответствовать жители
+    :param int after_citizen_id: уникальный идентификатор жителя, после которого начинается страница
+    :param int limit: максимальное количество жителей на странице, 0 - без ограничения
+    :param dict projection: словарь проекции выборки, по умолчанию все поля жителя
+    :raises: :class:`ImportNotFoundError`: Завершенная поставка с указанным уникальным идентификатором
+        остутствует в базе данных
+
+    :return: Асинхронный генератор частей ответа со списком жителей и http статус
+    :rtype: Tuple[AsyncIterator[bytes], int]
+    """
+    chunks = _generate_citizens_chunks(import_id, db, lock, filters, after_citizen_id, limit, projection)
+    first_chunk = await chunks.__anext__()
+
+    async def generate():
+        try:
+            yield first_chunk
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await chunks.aclose()
+
+    return generate(), 201
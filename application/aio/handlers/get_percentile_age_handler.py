@@ -0,0 +1,41 @@
+import os
+from datetime import date, datetime
+from typing import Optional, Tuple
+
+import numpy as np
+
+from application.aio.handlers import age_histograms, shared
+from application.aio.read_write_lock import AsyncReadWriteMongoLock
+from application.handlers.get_percentile_age_handler import _load_citizens, calculate_percentile_age, get_expires
+
+
+async def get_percentile_age(import_id: int, db, lock: AsyncReadWriteMongoLock,
+                             as_of: date = None) -> Tuple[dict, int, Optional[datetime]]:
+    """
+    Возвращает статистику по городам для указанного набора данных в разрезе возраста (полных лет) жителей:
+    p50, p75, p99, где число - это значение перцентиля.
+
+    Статистика вычисляется по гистограммам дат рождения, сохраненным при загрузке поставки. Для поставок без
+    гистограмм загружаются сами жители.
+
+    :param int import_id: уникальный идентификатор поставки
+    :param AsyncIOMotorDatabase db: объект базы данных, в которую записываются наборы данных о жителях
+    :param AsyncReadWriteMongoLock lock: объект для ограничения одновременного доступа к ресурсам из разных процессов
+    :param date as_of: дата, на которую вычисляется возраст. Если не указана, используется текущая дата по UTC
+    :raises: :class:`ImportNotFoundError`: Завершенная поставка с указанным уникальным идентификатором
+        остутствует в базе данных
+
+    :return: статистика по городам в разрезе возраста, http статус и время по UTC, до которого статистика
+        остается актуальной (None, если статистика не устаревает)
+    :rtype: Tuple[dict, int, Optional[datetime]]
+    """
+    async with lock.shared(str(import_id), str(os.getpid()), expire=60, timeout=10):
+        await shared.check_import_exists(import_id, db)
+        towns, codes, birth_dates, counts = await age_histograms.read_histograms(import_id, db)
+        if towns is None:
+            citizens = await shared.find_citizens(import_id, db, {'_id': 0, 'birth_date': 1, 'town': 1}).to_list(None)
+            towns, codes, birth_dates = _load_citizens(citizens)
+            counts = np.ones(len(codes), dtype=np.int64)
+        reference_date = as_of or datetime.utcnow().date()
+        percentile_age_data = calculate_percentile_age(towns, codes, birth_dates, counts, reference_date)
+        return percentile_age_data, 201, get_expires(birth_dates, as_of)
@@ -0,0 +1,71 @@
+import os
+from typing import Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+
+from application.aio.handlers import shared
+from application.aio.handlers.patch_citizen.update_birthdays import update_birthdays
+from application.aio.handlers.patch_citizen.update_percentile_age import update_percentile_age
+from application.aio.handlers.patch_citizen.update_relatives import update_relatives
+from application.aio.read_write_lock import AsyncReadWriteMongoLock
+from application.handlers.patch_citizen.patch_citizen_handler import _parse_birth_date
+
+
+async def _write_citizen_update(citizen_id: int, import_id: int, patch_data: dict, db,
+                                session) -> Tuple[dict, dict]:
+    """
+    Записывает обновление информации о жителе в базу данных.
+
+    Информация до обновления возвращается тем же запросом, что и запись, а информация после обновления
+    получается наложением новых данных на нее.
+
+    :param int citizen_id: Уникальный идентификатор модифицируемого жителя
+    :param int import_id: Уникальный идентификатор поставки
+    :param dict patch_data: Новая информация о жителе
+    :param AsyncIOMotorDatabase db: объект базы данных, в которую записываются наборы данных о жителях
+    :param AsyncIOMotorClientSession session: сессия соединения с базой данных, через которую производятся все запросы
+    :raises: :class:`PyMongoError`: Объект с указанным уникальным идентификатором не был найден в базе данных
+
+    :return: Пара из информации о жителе до и после обновления
+    :rtype: Tuple[dict, dict]
+    """
+    db_response = await db['citizens'].find_one_and_update(
+        filter={'import_id': import_id, 'citizen_id': citizen_id},
+        update={'$set': shared.with_birth_month(patch_data)},
+        projection=shared.CITIZEN_PROJECTION, return_document=ReturnDocument.BEFORE, session=session)
+
+    if db_response is None:
+        raise PyMongoError(shared.CITIZEN_NOT_FOUND_MESSAGE)
+    return db_response, {**db_response, **patch_data}
+
+
+async def patch_citizen(import_id: int, citizen_id: int, patch_data: dict, lock: AsyncReadWriteMongoLock,
+                        db) -> Tuple[dict, int]:
+    """
+    Изменяет информацию о жителе в указанном наборе данных.
+    На вход подается JSON в котором можно указать любые данные о жителе.
+
+    :param int import_id: Уникальный идентификатор поставки, в которой изменяется информация о жителе
+    :param int citizen_id: Уникальный индентификатор жителя в поставке
+    :param dict patch_data: Новая информация о жителе
+    :param AsyncReadWriteMongoLock lock: объект для ограничения одновременного доступа к ресурсам из разных процессов
+    :param AsyncIOMotorDatabase db: объект базы данных, в которую записываются наборы данных о жителях
+    :raises: :class:`ImportNotFoundError`: Завершенная поставка с указанным уникальным идентификатором
+        остутствует в базе данных
+
+    :return: Пара из актуальной информации о жителе и http статуса
+    :rtype: Tuple[dict, int]
+    """
+    _parse_birth_date(patch_data)
+
+    async with await db.client.start_session() as session, \
+            session.start_transaction(), \
+            lock.exclusive(str(import_id), str(os.getpid()), expire=60, timeout=10):
+        await shared.check_import_exists(import_id, db, session, shared.CITIZEN_NOT_FOUND_MESSAGE)
+        old_citizen, new_citizen = await _write_citizen_update(citizen_id, import_id, patch_data, db, session)
+        to_push, to_pull = await update_relatives(citizen_id, import_id, old_citizen, patch_data, db, session)
+        await update_birthdays(import_id, old_citizen, new_citizen, to_push, to_pull, lock, db, session)
+        await update_percentile_age(import_id, old_citizen, new_citizen, lock, db, session)
+        await shared.increment_import_version(import_id, db, session)
+        return {'data': new_citizen}, 201
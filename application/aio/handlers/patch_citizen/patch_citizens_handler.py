@@ -0,0 +1,96 @@
+import os
+from typing import Dict, List, Tuple
+
+from pymongo.errors import PyMongoError
+
+from application.aio.handlers import shared
+from application.aio.handlers.patch_citizen.update_birthdays import update_birthdays_batch
+from application.aio.handlers.patch_citizen.update_percentile_age import update_percentile_age_batch
+from application.aio.handlers.patch_citizen.update_relatives import prepare_relatives_update_batch
+from application.aio.read_write_lock import AsyncReadWriteMongoLock
+from application.handlers.patch_citizen.patch_citizen_handler import _parse_birth_date
+from application.handlers.patch_citizen.patch_citizens_handler import _make_citizens_requests
+
+
+async def _get_citizens(citizens_ids: List[int], import_id: int, db, session) -> Dict[int, dict]:
+    """
+    Возвращает информацию об указанных жителях одним запросом.
+
+    :param List[int] citizens_ids: Уникальные идентификаторы жителей
+    :param int import_id: Уникальный идентификатор поставки
+    :param AsyncIOMotorDatabase db: объект базы данных, в которую записываются наборы данных о жителях
+    :param AsyncIOMotorClientSession session: сессия соединения с базой данных, через которую производятся все запросы
+    :raises: :class:`PyMongoError`: Объект с указанным уникальным идентификатором не был найден в базе данных
+
+    :return: Словарь информации о жителях по их идентификаторам
+    :rtype: Dict[int, dict]
+    """
+    citizens = db['citizens'].find({'import_id': import_id, 'citizen_id': {'$in': citizens_ids}},
+                                   shared.CITIZEN_PROJECTION, session=session)
+    citizens = {citizen['citizen_id']: citizen async for citizen in citizens}
+    if len(citizens) != len(citizens_ids):
+        raise PyMongoError(shared.CITIZEN_NOT_FOUND_MESSAGE)
+    return citizens
+
+
+async def _write_citizens_update(db_requests: list, expected_count: int, db, session):
+    """
+    При наличии запросов производит их запись в базу данных одной пакетной записью.
+
+    :param list db_requests: Список запросов к базе данных на обновление жителей и их родственников
+    :param int expected_count: Количество документов жителей, которые должны быть найдены запросами
+    :param AsyncIOMotorDatabase db: объект базы данных, в которую записываются наборы данных о жителях
+    :param AsyncIOMotorClientSession session: сессия соединения с базой данных, через которую производятся все запросы
+    :raises: :class:`PyMongoError`: Объект с указанным уникальным идентификатором не был найден в базе данных
+    """
+    if db_requests:
+        bulk_response = await db['citizens'].bulk_write(db_requests, ordered=False, session=session)
+        if bulk_response.matched_count != expected_count:
+            raise PyMongoError(shared.CITIZEN_NOT_FOUND_MESSAGE)
+
+
+async def patch_citizens(import_id: int, patches: List[dict], lock: AsyncReadWriteMongoLock,
+                         db) -> Tuple[dict, int]:
+    """
+    Изменяет информацию о нескольких жителях в указанном наборе данных.
+
+    Работает так же, как синхронный обработчик patch_citizens: все изменения записываются одной пакетной записью
+    в одной транзакции под одной блокировкой поставки.
+    :param int import_id: Уникальный идентификатор поставки, в которой изменяется информация о жителях
+    :param List[dict] patches: Новая информация о жителях с уникальным идентификатором жителя в поле citizen_id
+    :param AsyncReadWriteMongoLock lock: объект для ограничения одновременного доступа к ресурсам из разных процессов
+    :param AsyncIOMotorDatabase db: объект базы данных, в которую записываются наборы данных о жителях
+    :raises: :class:`ImportNotFoundError`: Завершенная поставка с указанным уникальным идентификатором
+        остутствует в базе данных
+    :raises: :class:`PyMongoError`: Объект с указанным уникальным идентификатором не был найден в базе данных
+
+    :return: Пара из актуальной информации о жителях в порядке модификаций и http статуса
+    :rtype: Tuple[dict, int]
+    """
+    for patch_data in patches:
+        _parse_birth_date(patch_data)
+    citizens_ids = [patch_data['citizen_id'] for patch_data in patches]
+
+    async with await db.client.start_session() as session, \
+            session.start_transaction(), \
+            lock.exclusive(str(import_id), str(os.getpid()), expire=60, timeout=10):
+        await shared.check_import_exists(import_id, db, session, shared.CITIZEN_NOT_FOUND_MESSAGE)
+        old_citizens = await _get_citizens(citizens_ids, import_id, db, session)
+        relatives = {citizen_id: list(citizen['relatives']) for citizen_id, citizen in old_citizens.items()}
+        relatives_changes, relatives_requests = await prepare_relatives_update_batch(relatives, patches, import_id,
+                                                                                     db, session)
+        new_citizens = {patch_data['citizen_id']: {**old_citizens[patch_data['citizen_id']], **patch_data}
+                        for patch_data in patches}
+        for citizen_id, citizen_relatives in relatives.items():
+            new_citizens[citizen_id]['relatives'] = citizen_relatives
+
+        citizens_requests = _make_citizens_requests(old_citizens, new_citizens, import_id)
+        await _write_citizens_update(citizens_requests + relatives_requests,
+                                     len(citizens_requests) + len(relatives_changes), db, session)
+
+        old_citizens = [old_citizens[citizen_id] for citizen_id in citizens_ids]
+        new_citizens = [new_citizens[citizen_id] for citizen_id in citizens_ids]
+        await update_birthdays_batch(import_id, old_citizens, new_citizens, relatives_changes, lock, db, session)
+        await update_percentile_age_batch(import_id, old_citizens, new_citizens, lock, db, session)
+        await shared.increment_import_version(import_id, db, session)
+        return {'data': new_citizens}, 201
@@ -0,0 +1,108 @@
+import os
+from typing import Dict, List, Set, Tuple
+
+from application import response_body
+from application.aio.read_write_lock import AsyncReadWriteMongoLock
+from application.handlers.patch_citizen.update_birthdays import _apply_birthdays_difference, \
+    _get_batch_birthdays_difference, _get_birthdays_difference
+
+
+async def _get_relatives_months(relatives_ids: Set[int], import_id: int, db, session) -> Dict[int, int]:
+    """
+    Возвращает месяцы рождения указанных жителей.
+
+    :param Set[int] relatives_ids: уникальные идентификаторы жителей
+    :param int import_id: уникальный идентификатор поставки
+    :param AsyncIOMotorDatabase db: объект базы данных, в которую записываются наборы данных о жителях
+    :param AsyncIOMotorClientSession session: сессия соединения с базой данных, через которую производятся все запросы
+
+    :return: Словарь месяцев рождения по идентификаторам жителей
+    :rtype: Dict[int, int]
+    """
+    if not relatives_ids:
+        return {}
+    relatives = db['citizens'].find({'import_id': import_id, 'citizen_id': {'$in': list(relatives_ids)}},
+                                    {'_id': 0, 'citizen_id': 1, 'birth_date': 1}, session=session)
+    return {relative['citizen_id']: relative['birth_date'].month async for relative in relatives}
+
+
+async def update_birthdays(import_id: int, old_citizen: dict, new_citizen: dict, to_push: Set[int],
+                           to_pull: Set[int], lock: AsyncReadWriteMongoLock, db, session):
+    """
+    Обновляет сохраненные данные о подарках для указанной поставки после модификации жителя.
+
+    Изменяются только затронутые месяцы. Если данные о подарках еще не сохранены, ничего не происходит.
+    :param int import_id: уникальный идентификатор поставки
+    :param dict old_citizen: информация о жителе до модификации
+    :param dict new_citizen: информация о жителе после модификации
+    :param Set[int] to_push: родственники, добавленные жителю
+    :param Set[int] to_pull: родственники, удаленные у жителя
+    :param AsyncReadWriteMongoLock lock: объект для ограничения одновременного доступа к ресурсам из разных процессов
+    :param AsyncIOMotorDatabase db: объект базы данных, в которую записываются наборы данных о жителях
+    :param AsyncIOMotorClientSession session: сессия соединения с базой данных, через которую производятся все запросы
+    """
+    if old_citizen['birth_date'].month == new_citizen['birth_date'].month and not to_push and not to_pull:
+        return
+    async with lock(f'birthdays_{import_id}', str(os.getpid()), timeout=60, expire=10):
+        if not await db['birthdays'].count_documents({'import_id': import_id}, limit=1, session=session):
+            return
+        relatives_months = await _get_relatives_months(to_push | to_pull, import_id, db, session)
+        difference = _get_birthdays_difference(old_citizen, new_citizen, to_push, to_pull, relatives_months)
+        await _write_birthdays_difference(import_id, difference, db, session)
+
+
+async def update_birthdays_batch(import_id: int, old_citizens: List[dict], new_citizens: List[dict],
+                                 relatives_changes: Dict[Tuple[int, int], int], lock: AsyncReadWriteMongoLock, db,
+                                 session):
+    """
+    Обновляет сохраненные данные о подарках для указанной поставки после модификации нескольких жителей.
+
+    Изменения всех жителей суммируются, поэтому сохраненные данные изменяются одной записью.
+    Если данные о подарках еще не сохранены, ничего не происходит.
+    :param int import_id: уникальный идентификатор поставки
+    :param List[dict] old_citizens: информация о модифицированных жителях до модификации
+    :param List[dict] new_citizens: информация о тех же жителях после модификации
+    :param Dict[Tuple[int, int], int] relatives_changes: изменения по парам (идентификатор немодифицированного
+        жителя, идентификатор родственника): 1, если родственник добавлен, и -1, если удален
+    :param AsyncReadWriteMongoLock lock: объект для ограничения одновременного доступа к ресурсам из разных процессов
+    :param AsyncIOMotorDatabase db: объект базы данных, в которую записываются наборы данных о жителях
+    :param AsyncIOMotorClientSession session: сессия соединения с базой данных, через которую производятся все запросы
+    """
+    if not relatives_changes and all(
+            old_citizen['birth_date'].month == new_citizen['birth_date'].month
+            and old_citizen['relatives'] == new_citizen['relatives']
+            for old_citizen, new_citizen in zip(old_citizens, new_citizens)):
+        return
+    async with lock(f'birthdays_{import_id}', str(os.getpid()), timeout=60, expire=10):
+        if not await db['birthdays'].count_documents({'import_id': import_id}, limit=1, session=session):
+            return
+        relatives_months = await _get_relatives_months({citizen_id for citizen_id, _ in relatives_changes},
+                                                       import_id, db, session)
+        difference = _get_batch_birthdays_difference(old_citizens, new_citizens, relatives_changes, relatives_months)
+        await _write_birthdays_difference(import_id, difference, db, session)
+
+
+async def _write_birthdays_difference(import_id: int, difference: Dict[Tuple[int, int], int], db, session):
+    """
+    Применяет изменение количества подарков к затронутым месяцам сохраненных данных о подарках.
+
+    Тело ответа не сериализуется и не сжимается под блокировкой, а удаляется и собирается при следующем запросе
+    подарков. Документы, сохраненные только с телом ответа, удаляются.
+    Должна вызываться под блокировкой данных о подарках указанной поставки.
+    :param int import_id: уникальный идентификатор поставки
+    :param Dict[Tuple[int, int], int] difference: изменения количества подарков по парам (месяц, идентификатор жителя)
+    :param AsyncIOMotorDatabase db: объект базы данных, в которую записываются наборы данных о жителях
+    :param AsyncIOMotorClientSession session: сессия соединения с базой данных, через которую производятся все запросы
+    """
+    if not difference:
+        return
+
+    projection = {'_id': 0, **{f'data.{month}': 1 for month, _ in difference}}
+    cached_data = await db['birthdays'].find_one({'import_id': import_id}, projection, session=session)
+    if 'data' not in cached_data:
+        await db['birthdays'].delete_one({'import_id': import_id}, session=session)
+        return
+    months = _apply_birthdays_difference(cached_data['data'], difference)
+    update = {'$set': {f'data.{month}': value for month, value in months.items()}}
+    await db['birthdays'].update_one({'import_id': import_id}, response_body.make_invalidating_update(update),
+                                     session=session)
@@ -0,0 +1,94 @@
+from typing import Dict, List, Set, Tuple
+
+from pymongo import UpdateMany
+from pymongo.errors import PyMongoError
+
+from application.handlers.patch_citizen.update_relatives import _get_batch_relatives_changes, \
+    _get_relatives_difference, _make_batch_db_requests, _make_db_requests
+
+
+async def _check_all_citizens_exist(citizens_ids: Set[int], import_id: int, db, session):
+    """
+    Проверяет наличие всех жителей, указанных в relatives_ids в поставке с идентификатором import_id.
+
+    :param Set[int] citizens_ids: Уникальные идентификаторы жителей
+    :param int import_id: Уникальный идентификатор поставки
+    :param AsyncIOMotorDatabase db: объект базы данных, в которую записываются наборы данных о жителях
+    :param AsyncIOMotorClientSession session: сессия соединения с базой данных, через которую производятся все запросы
+    :raises: :class:`PyMongoError`: Объект с указанным уникальным идентификатором не был найден в базе данных
+    """
+    if not citizens_ids:
+        return
+
+    count = await db['citizens'].count_documents(
+        {'import_id': import_id, 'citizen_id': {'$in': list(citizens_ids)}}, session=session)
+    if count != len(citizens_ids):
+        raise PyMongoError('Citizens with specified id not found')
+
+
+async def _write_relatives_update(db_requests: List[UpdateMany], expected_count: int, db, session):
+    """
+    При наличии запросов в db_request производит их запись в базу данных.
+
+    :param List[UpdateMany] db_requests: Список запросов к базе данных на обновление множества документов
+    :param int expected_count: Количество документов жителей, которые должны быть изменены запросами
+    :param AsyncIOMotorDatabase db: объект базы данных, в которую записываются наборы данных о жителях
+    :param AsyncIOMotorClientSession session: сессия соединения с базой данных, через которую производятся все запросы
+    :raises: :class:`PyMongoError`: Объект с указанным уникальным идентификатором не был найден в базе данных
+    """
+    if db_requests:
+        bulk_response = await db['citizens'].bulk_write(db_requests, ordered=False, session=session)
+        if bulk_response.modified_count != expected_count:
+            raise PyMongoError('Citizens with specified id not found')
+
+
+async def update_relatives(citizen_id: int, import_id: int, old_citizen: dict, patch_data: dict, db,
+                           session) -> Tuple[Set[int], Set[int]]:
+    """
+    При наличии поля relatives в patch_data производит обновление поля relatives
+    у всех родственников обновляемого жителя.
+
+    Старые родственники берутся из информации о жителе, полученной при записи его обновления, а наличие
+    добавленных родственников проверяется по количеству измененных документов, поэтому обновление выполняется
+    одной пакетной записью без дополнительных запросов.
+    :param int citizen_id: Уникальный индентификатор обновляемого жителя
+    :param int import_id: Уникальный идентификатор поставки, в которой обновляется житель
+    :param dict old_citizen: Информация о жителе до обновления
+    :param dict patch_data: Новые данные жителя
+    :param AsyncIOMotorDatabase db: объект базы данных, в которую записываются наборы данных о жителях
+    :param AsyncIOMotorClientSession session: сессия соединения с базой данных, через которую производятся все запросы
+    :raises: :class:`PyMongoError`: Добавленный родственник не был найден в базе данных
+
+    :return: Пара сетов добавленных и удаленных родственников жителя
+    :rtype: Tuple[Set[int], Set[int]]
+    """
+    if 'relatives' not in patch_data:
+        return set(), set()
+
+    to_push, to_pull = _get_relatives_difference(set(old_citizen['relatives']), patch_data)
+    db_requests = _make_db_requests(to_push, to_pull, import_id, citizen_id)
+    await _write_relatives_update(db_requests, len(to_push) + len(to_pull), db, session)
+    return to_push, to_pull
+
+
+async def prepare_relatives_update_batch(relatives: Dict[int, List[int]], patches: List[dict], import_id: int, db,
+                                         session) -> Tuple[Dict[Tuple[int, int], int], List[UpdateMany]]:
+    """
+    Вычисляет общее изменение родственников для модификаций нескольких жителей и создает запросы для его записи.
+
+    Запросы не выполняются, чтобы их можно было отправить одной пакетной записью вместе с обновлениями
+    самих жителей.
+    :param Dict[int, List[int]] relatives: списки родственников модифицируемых жителей по их идентификаторам,
+        которые изменяются на месте
+    :param List[dict] patches: модификации жителей с идентификатором жителя в поле citizen_id
+    :param int import_id: уникальный идентификатор поставки
+    :param AsyncIOMotorDatabase db: объект базы данных, в которую записываются наборы данных о жителях
+    :param AsyncIOMotorClientSession session: сессия соединения с базой данных, через которую производятся все запросы
+    :raises: :class:`PyMongoError`: Объект с указанным уникальным идентификатором не был найден в базе данных
+
+    :return: Изменения родственников немодифицируемых жителей и запросы для их записи
+    :rtype: Tuple[Dict[Tuple[int, int], int], List[UpdateMany]]
+    """
+    relatives_changes, pushed_ids = _get_batch_relatives_changes(relatives, patches)
+    await _check_all_citizens_exist(pushed_ids, import_id, db, session)
+    return relatives_changes, _make_batch_db_requests(relatives_changes, import_id)
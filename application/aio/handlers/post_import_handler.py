@@ -0,0 +1,152 @@
+import asyncio
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from application.aio.handlers import age_histograms as aio_age_histograms
+from application.handlers import age_histograms
+from application.handlers.post_import_handler import BATCH_SIZE, IMPORT_ID_COUNTER, _parse_birth_date
+
+
+async def _init_import_id_counter(db):
+    """
+    Создает счетчик идентификаторов поставок, если его еще нет.
+
+    Счетчик начинается с количества уже записанных поставок. Если счетчик одновременно создан другим процессом,
+    ничего не происходит.
+    :param AsyncIOMotorDatabase db: объект базы данных, в которую записываются наборы данных о жителях
+    """
+    try:
+        await db['counters'].insert_one({'_id': IMPORT_ID_COUNTER, 'value': await db['imports'].count_documents({})})
+    except DuplicateKeyError:
+        pass
+
+
+async def _add_import_id(import_data: dict, db):
+    """
+    Добавляет в данные о поставке поле с уникальным идентификатором набора import_id.
+
+    Идентификатор выделяется атомарным увеличением счетчика.
+    :param dict import_data: заголовок поставки
+    :param AsyncIOMotorDatabase db: объект базы данных, в которую записываются наборы данных о жителях
+    """
+    counter = await db['counters'].find_one_and_update({'_id': IMPORT_ID_COUNTER}, {'$inc': {'value': 1}},
+                                                       return_document=ReturnDocument.AFTER)
+    if counter is None:
+        await _init_import_id_counter(db)
+        counter = await db['counters'].find_one_and_update({'_id': IMPORT_ID_COUNTER}, {'$inc': {'value': 1}},
+                                                           return_document=ReturnDocument.AFTER)
+    import_data['import_id'] = counter['value'] - 1
+
+
+async def _write_import_header(import_data: dict, db):
+    """
+    Записывает незавершенный заголовок поставки, резервируя за ней уникальный идентификатор.
+
+    :param dict import_data: заголовок поставки с идентификатором import_id
+    :param AsyncIOMotorDatabase db: объект базы данных, в которую записываются наборы данных о жителях
+    :raises: :class:`PyMongoError`: Операция записи в базу данных не была разрешена
+    """
+    db_response = await db['imports'].insert_one({**import_data, 'complete': False})
+    if not db_response.acknowledged:
+        raise PyMongoError('Operation was not acknowledged')
+
+
+def _read_citizens_batch(citizens: Iterator[dict], histograms: Dict[str, Counter], batch_size: int) -> List[dict]:
+    """
+    Читает следующую пачку жителей, парсит их даты рождения и учитывает их в гистограммах.
+
+    Вызывается в пуле потоков, так как разбор и валидация тела запроса не ожидают базу данных.
+    :param Iterator[dict] citizens: валидируемые по мере поступления жители поставки
+    :param Dict[str, Counter] histograms: гистограммы дат рождения жителей по городам
+    :param int batch_size: максимальное количество жителей в пачке
+
+    :return: Пачка жителей, пустая, если жители закончились
+    :rtype: List[dict]
+    """
+    batch = []
+    for citizen in citizens:
+        _parse_birth_date(citizen)
+        age_histograms.add_citizen(histograms, citizen)
+        batch.append(citizen)
+        if len(batch) >= batch_size:
+            break
+    return batch
+
+
+async def _write_citizens(import_id: int, citizens: Iterable[dict], db, batch_size: int = BATCH_SIZE):
+    """
+    Читает жителей пачками и записывает каждую пачку в базу данных, пока читается следующая.
+
+    Чтение пачки выполняется в пуле потоков, поэтому разбор большого тела запроса не блокирует цикл событий.
+    В памяти одновременно находится не больше двух пачек жителей.
+    :param int import_id: уникальный идентификатор поставки
+    :param Iterable[dict] citizens: валидируемые по мере поступления жители поставки
+    :param AsyncIOMotorDatabase db: объект базы данных, в которую записываются наборы данных о жителях
+    :param int batch_size: максимальное количество жителей в одной пачке
+    :raises: :class:`PyMongoError`: Операция записи в базу данных не была разрешена
+    """
+    loop = asyncio.get_event_loop()
+    citizens = iter(citizens)
+    histograms = age_histograms.create_histograms()
+    batch = await loop.run_in_executor(None, _read_citizens_batch, citizens, histograms, batch_size)
+    while batch:
+        for citizen in batch:
+            citizen['import_id'] = import_id
+        write = asyncio.ensure_future(db['citizens'].insert_many(batch))
+        try:
+            next_batch = await loop.run_in_executor(None, _read_citizens_batch, citizens, histograms, batch_size)
+        finally:
+            db_response = await write
+        if not db_response.acknowledged:
+            raise PyMongoError('Operation was not acknowledged')
+        batch = next_batch
+    await aio_age_histograms.write_histograms(import_id, histograms, db)
+
+
+async def _complete_import(import_id: int, db) -> Tuple[dict, int]:
+    """
+    Помечает поставку завершенной, после чего она становится видна обработчикам чтения.
+
+    :param int import_id: уникальный идентификатор поставки
+    :param AsyncIOMotorDatabase db: объект базы данных, в которую записываются наборы данных о жителях
+    :raises: :class:`PyMongoError`: Операция записи в базу данных не была разрешена
+
+    :returns: В случае успеха возвращается пару из ответа с идентификатором импорта и http кода 201
+    :rtype: Tuple[dict, int]
+    """
+    db_response = await db['imports'].update_one({'import_id': import_id}, {'$set': {'complete': True}})
+    if db_response.acknowledged:
+        return {'data': {'import_id': import_id}}, 201
+    else:
+        raise PyMongoError('Operation was not acknowledged')
+
+
+async def post_import(citizens: Iterable[dict], db) -> Tuple[dict, int]:
+    """
+    Принимает на вход жителей поставки по одному и сохраняет их с уникальным идентификатором import_id.
+
+    Идентификатор резервируется до чтения жителей, после чего жители записываются пачками по мере поступления.
+    При любой ошибке уже записанные жители поставки удаляются вместе с ее заголовком.
+    :param Iterable[dict] citizens: валидируемые по мере поступления жители поставки
+    :param AsyncIOMotorDatabase db: объект базы данных, в которую записываются наборы данных о жителях
+    :raises: :class:`PyMongoError`: Операция записи в базу данных не была разрешена
+
+    :returns: В случае успеха возвращается пару из ответа с идентификатором импорта и http кода 201
+    :rtype: Tuple[dict, int]
+    """
+    import_data = {}
+    await _add_import_id(import_data, db)
+    await _write_import_header(import_data, db)
+
+    import_id = import_data['import_id']
+    try:
+        await _write_citizens(import_id, citizens, db)
+    except Exception:
+        await db['citizens'].delete_many({'import_id': import_id})
+        await db['age_histograms'].delete_many({'import_id': import_id})
+        await db['imports'].delete_one({'import_id': import_id})
+        raise
+    return await _complete_import(import_id, db)
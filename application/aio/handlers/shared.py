@@ -0,0 +1,88 @@
+from typing import List, Optional
+
+from application.handlers.shared import CITIZEN_NOT_FOUND_MESSAGE, CITIZEN_PROJECTION, ImportNotFoundError, \
+    make_citizens_query, with_birth_month
+
+
+async def check_import_exists(import_id: int, db, session=None,
+                              message: str = 'Import with specified id not found'):
+    """
+    Проверяет наличие заголовка завершенной поставки с указанным уникальным идентификатором.
+
+    Жители незавершенной поставки уже могут быть записаны, поэтому проверка выполняется до любого чтения жителей.
+    :param int import_id: уникальный идентификатор поставки
+    :param AsyncIOMotorDatabase db: объект базы данных, в которую записываются наборы данных о жителях
+    :param AsyncIOMotorClientSession session: сессия соединения с базой данных, через которую производятся все запросы
+    :param str message: сообщение ошибки об отсутствии поставки
+    :raises :class:`ImportNotFoundError`: Завершенная поставка с указанным уникальным идентификатором
+        остутствует в базе данных
+    """
+    if await db['imports'].count_documents({'import_id': import_id, 'complete': True}, limit=1,
+                                           session=session) == 0:
+        raise ImportNotFoundError(message)
+
+
+async def get_import_version(import_id: int, db) -> Optional[int]:
+    """
+    Возвращает версию завершенной поставки, которая увеличивается при каждом изменении жителей поставки.
+
+    :param int import_id: уникальный идентификатор поставки
+    :param AsyncIOMotorDatabase db: объект базы данных, в которую записываются наборы данных о жителях
+
+    :return: Версия поставки или None, если поставка не найдена. Поставки без сохраненной версии имеют версию 0
+    :rtype: Optional[int]
+    """
+    import_header = await db['imports'].find_one({'import_id': import_id, 'complete': True},
+                                                 {'_id': 0, 'version': 1})
+    if import_header is None:
+        return None
+    return import_header.get('version', 0)
+
+
+async def increment_import_version(import_id: int, db, session=None):
+    """
+    Увеличивает версию поставки, делая недействительными ответы, закешированные для предыдущей версии.
+
+    :param int import_id: уникальный идентификатор поставки
+    :param AsyncIOMotorDatabase db: объект базы данных, в которую записываются наборы данных о жителях
+    :param AsyncIOMotorClientSession session: сессия соединения с базой данных, через которую производятся все запросы
+    """
+    await db['imports'].update_one({'import_id': import_id}, {'$inc': {'version': 1}}, session=session)
+
+
+def find_citizens(import_id: int, db, projection: dict = None, filters: dict = None, after_citizen_id: int = None,
+                  limit: int = 0):
+    """
+    Возвращает асинхронный курсор по жителям в указанной поставке в порядке citizen_id.
+
+    Наличие поставки не проверяется, поэтому перед выборкой вызывается check_import_exists.
+    :param int import_id: уникальный идентификатор поставки
+    :param AsyncIOMotorDatabase db: объект базы данных, в которую записываются наборы данных о жителях
+    :param dict projection: словарь проекции выборки
+    :param dict filters: значения полей town, gender и birth_month, которым должны соответствовать жители
+    :param int after_citizen_id: уникальный идентификатор жителя, после которого начинается выборка
+    :param int limit: максимальное количество жителей в выборке, 0 - без ограничения
+
+    :return: Асинхронный курсор по жителям
+    :rtype: AsyncIOMotorCursor
+    """
+    query = make_citizens_query(import_id, filters, after_citizen_id)
+    return db['citizens'].find(query, projection).sort('citizen_id', 1).limit(limit)
+
+
+async def get_citizens(import_id: int, db, projection: dict = None) -> List[dict]:
+    """
+    Возвращает список жителей в указанной поставке, выбранный с указанной проекцией.
+
+    Жители читаются только после проверки, что поставка завершена.
+    :param int import_id: уникальный идентификатор поставки
+    :param AsyncIOMotorDatabase db: объект базы данных, в которую записываются наборы данных о жителях
+    :param dict projection: словарь проекции выборки
+    :raises :class:`ImportNotFoundError`: Завершенная поставка с указанным уникальным идентификатором
+        остутствует в базе данных
+
+    :return: Список жителей
+    :rtype: List[dict]
+    """
+    await check_import_exists(import_id, db)
+    return await find_citizens(import_id, db, projection).to_list(None)
@@ -0,0 +1,62 @@
+import time
+from typing import Sequence
+
+from starlette.routing import BaseRoute, Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from application import metrics
+
+
+class MetricsMiddleware(object):
+    """
+    ASGI middleware, записывающий количество, длительность и размер ответов по шаблону пути обработчика так же,
+    как синхронное приложение.
+
+    Размер тела подсчитывается по отправляемым сообщениям, поэтому метрики потоковых ответов записываются после
+    отправки последней части.
+    :ivar: ASGIApp app: приложение, запросы к которому измеряются
+    :ivar: Sequence[BaseRoute] routes: маршруты приложения, по которым определяется шаблон пути запроса
+    """
+
+    def __init__(self, app: ASGIApp, routes: Sequence[BaseRoute]):
+        self.app = app
+        self.routes = routes
+
+    def _get_route(self, scope: Scope) -> str:
+        """
+        Находит шаблон пути обработчика запроса.
+
+        :param Scope scope: параметры запроса
+
+        :return: Шаблон пути маршрута, полностью или частично (без учета метода) совпавшего с запросом,
+            или unmatched, если такого маршрута нет
+        :rtype: str
+        """
+        partial = 'unmatched'
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+            if match == Match.PARTIAL and partial == 'unmatched':
+                partial = route.path
+        return partial
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        route, method, start = self._get_route(scope), scope['method'], time.perf_counter()
+        status, size = None, 0
+
+        async def send_with_metrics(message: Message):
+            nonlocal status, size
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            elif message['type'] == 'http.response.body':
+                size += len(message.get('body', b''))
+                if not message.get('more_body', False):
+                    metrics.observe_request(route, method, status, time.perf_counter() - start, size)
+            await send(message)
+
+        await self.app(scope, receive, send_with_metrics)
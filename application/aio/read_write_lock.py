@@ -0,0 +1,210 @@
+import asyncio
+import contextlib
+import time
+import uuid
+from datetime import datetime
+from typing import AsyncIterator, Optional
+
+from mongolock import MongoLockLocked
+from pymongo.errors import DuplicateKeyError
+
+from application import metrics
+from application.read_write_lock import ReadWriteMongoLock
+
+
+class AsyncReadWriteMongoLock(object):
+    """
+    Асинхронный вариант блокировки ReadWriteMongoLock для асинхронного клиента монго (motor).
+
+    Хранит блокировки в тех же коллекциях и в том же формате документов, что MongoLock и ReadWriteMongoLock,
+    поэтому синхронные и асинхронные процессы сервиса могут работать с одной базой данных одновременно.
+    Ожидание блокировки не блокирует цикл событий, пока блокировка занята, выполняются другие запросы.
+    Обычная исключительная блокировка доступна через вызов объекта.
+    :ivar: float acquire_retry_step: сколько секунд ждать между попытками получить блокировку
+    """
+
+    def __init__(self, client, db: str = 'mongolock', collection: str = 'lock', acquire_retry_step: float = 0.1):
+        self.acquire_retry_step = acquire_retry_step
+        self.collection = client[db][collection]
+        self.rw_collection = client[db][f'{collection}_rw']
+
+    @contextlib.asynccontextmanager
+    async def __call__(self, key: str, owner: str, timeout: float = None, expire: float = None) -> AsyncIterator[None]:
+        """
+        Удерживает обычную исключительную блокировку так же, как MongoLock.
+
+        Все сопрограммы процесса передают одного и того же владельца, поэтому к владельцу добавляется уникальный
+        идентификатор этого получения блокировки. Блокировка отпускается только по нему, и запоздавшее освобождение
+        истекшей блокировки не освобождает блокировку, которую уже получила другая сопрограмма того же процесса.
+        :param str key: имя блокировки
+        :param str owner: владелец блокировки
+        :param float timeout: сколько секунд ждать, пока блокировка занята
+        :param float expire: через сколько секунд блокировка считается освобожденной, если не была отпущена
+        :raises: :class:`MongoLockLocked`: Блокировка не получена за указанное время
+        """
+        owner = f'{owner}:{uuid.uuid4().hex}'
+        deadline = ReadWriteMongoLock._get_deadline(timeout)
+        start = time.perf_counter()
+        while not await self._try_lock(key, owner, expire):
+            if deadline is None or datetime.utcnow() >= deadline:
+                status = await self.collection.find_one({'_id': key})
+                raise MongoLockLocked(f'Timeout, lock {key} is held: {status}')
+            await asyncio.sleep(self.acquire_retry_step)
+        metrics.observe_lock_wait(key, 'lock', start)
+        try:
+            yield
+        finally:
+            await self.collection.update_one({'_id': key, 'owner': owner},
+                                             {'$set': {'locked': False, 'owner': None, 'created': None,
+                                                       'expire': None}})
+
+    @contextlib.asynccontextmanager
+    async def shared(self, key: str, owner: str, timeout: float = None, expire: float = None) -> AsyncIterator[None]:
+        """
+        Удерживает блокировку в разделяемом режиме.
+
+        :param str key: имя блокировки
+        :param str owner: владелец блокировки, сохраняется для диагностики
+        :param float timeout: сколько секунд ждать, пока блокировку удерживает писатель
+        :param float expire: через сколько секунд блокировка считается освобожденной, если не была отпущена
+        :raises: :class:`MongoLockLocked`: Блокировка не получена за указанное время
+        """
+        token = uuid.uuid4().hex
+        deadline = ReadWriteMongoLock._get_deadline(timeout)
+        start = time.perf_counter()
+        while not await self._try_lock_shared(key, owner, token, expire):
+            await self._wait(key, deadline)
+        metrics.observe_lock_wait(key, 'shared', start)
+        try:
+            yield
+        finally:
+            await self.rw_collection.update_one({'_id': key}, {'$pull': {'readers': {'token': token}}})
+
+    @contextlib.asynccontextmanager
+    async def exclusive(self, key: str, owner: str, timeout: float = None,
+                        expire: float = None) -> AsyncIterator[None]:
+        """
+        Удерживает блокировку в исключительном режиме.
+
+        :param str key: имя блокировки
+        :param str owner: владелец блокировки, сохраняется для диагностики
+        :param float timeout: сколько секунд ждать, пока блокировку удерживают другой писатель или читатели
+        :param float expire: через сколько секунд блокировка считается освобожденной, если не была отпущена
+        :raises: :class:`MongoLockLocked`: Блокировка не получена за указанное время
+        """
+        token = uuid.uuid4().hex
+        deadline = ReadWriteMongoLock._get_deadline(timeout)
+        start = time.perf_counter()
+        while not await self._try_lock_exclusive(key, owner, token, expire):
+            await self._wait(key, deadline)
+        try:
+            while await self._has_readers(key):
+                await self._wait(key, deadline)
+            metrics.observe_lock_wait(key, 'exclusive', start)
+            yield
+        finally:
+            await self.rw_collection.update_one({'_id': key, 'writer': token}, {'$set': {'writer': None}})
+
+    async def is_locked(self, key: str) -> bool:
+        """
+        Проверяет, удерживается ли блокировка в любом режиме.
+
+        :param str key: имя блокировки
+
+        :return: Удерживают ли блокировку писатель, читатели или обычная исключительная блокировка
+        :rtype: bool
+        """
+        now = datetime.utcnow()
+        if await self.collection.count_documents(
+                {'_id': key, 'locked': True, '$or': [{'expire': None}, {'expire': {'$gte': now}}]}, limit=1):
+            return True
+        return await self.rw_collection.count_documents(
+            {'_id': key, '$or': [{'writer': {'$ne': None}, 'writer_expire': {'$gte': now}},
+                                 {'readers': {'$elemMatch': {'expire': {'$gte': now}}}}]}, limit=1) > 0
+
+    async def _try_lock(self, key: str, owner: str, expire: Optional[float]) -> bool:
+        """
+        Пытается занять обычную исключительную блокировку, если она свободна или ее срок истек.
+
+        :param str key: имя блокировки
+        :param str owner: владелец блокировки
+        :param Optional[float] expire: через сколько секунд блокировка считается освобожденной
+
+        :return: Получена ли блокировка
+        :rtype: bool
+        """
+        now = datetime.utcnow()
+        lock = {'locked': True, 'owner': owner, 'created': now,
+                'expire': ReadWriteMongoLock._get_expire(expire) if expire else None}
+        try:
+            await self.collection.update_one({'_id': key, '$or': [{'locked': False}, {'expire': {'$lt': now}}]},
+                                             {'$set': lock}, upsert=True)
+        except DuplicateKeyError:
+            return False
+        return True
+
+    async def _try_lock_shared(self, key: str, owner: str, token: str, expire: Optional[float]) -> bool:
+        """
+        Пытается добавить читателя, если блокировку не удерживает писатель.
+
+        :param str key: имя блокировки
+        :param str owner: владелец блокировки
+        :param str token: уникальный идентификатор этого получения блокировки
+        :param Optional[float] expire: через сколько секунд блокировка считается освобожденной
+
+        :return: Получена ли блокировка
+        :rtype: bool
+        """
+        reader = {'token': token, 'owner': owner, 'expire': ReadWriteMongoLock._get_expire(expire)}
+        try:
+            await self.rw_collection.update_one(ReadWriteMongoLock._free_writer_filter(key),
+                                                {'$set': {'writer': None}, '$push': {'readers': reader}}, upsert=True)
+        except DuplicateKeyError:
+            return False
+        return True
+
+    async def _try_lock_exclusive(self, key: str, owner: str, token: str, expire: Optional[float]) -> bool:
+        """
+        Пытается занять место писателя, если его не удерживает другой писатель.
+
+        :param str key: имя блокировки
+        :param str owner: владелец блокировки
+        :param str token: уникальный идентификатор этого получения блокировки
+        :param Optional[float] expire: через сколько секунд блокировка считается освобожденной
+
+        :return: Получено ли место писателя. Читатели при этом еще могут удерживать блокировку
+        :rtype: bool
+        """
+        writer = {'writer': token, 'writer_owner': owner, 'writer_expire': ReadWriteMongoLock._get_expire(expire)}
+        try:
+            await self.rw_collection.update_one(ReadWriteMongoLock._free_writer_filter(key), {'$set': writer},
+                                                upsert=True)
+        except DuplicateKeyError:
+            return False
+        return True
+
+    async def _has_readers(self, key: str) -> bool:
+        """
+        Удаляет читателей с истекшим сроком и проверяет, остались ли читатели.
+
+        :param str key: имя блокировки
+
+        :return: Удерживают ли блокировку читатели
+        :rtype: bool
+        """
+        await self.rw_collection.update_one({'_id': key},
+                                            {'$pull': {'readers': {'expire': {'$lt': datetime.utcnow()}}}})
+        return await self.rw_collection.count_documents({'_id': key, 'readers.0': {'$exists': True}}, limit=1) > 0
+
+    async def _wait(self, key: str, deadline: Optional[datetime]):
+        """
+        Ждет перед следующей попыткой получить блокировку, не блокируя цикл событий.
+
+        :param str key: имя блокировки
+        :param Optional[datetime] deadline: время, после которого ожидание прекращается
+        :raises: :class:`MongoLockLocked`: Время ожидания истекло
+        """
+        if deadline is None or datetime.utcnow() >= deadline:
+            status = await self.rw_collection.find_one({'_id': key})
+            raise MongoLockLocked(f'Timeout, read-write lock {key} is held: {status}')
+        await asyncio.sleep(self.acquire_retry_step)
@@ -0,0 +1,247 @@
+import asyncio
+import logging
+import tempfile
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+from werkzeug.exceptions import BadRequest
+from werkzeug.http import http_date
+
+from application.aio.decorators.conditional_response import conditional_response
+from application.aio.decorators.exception_handler import handle_exceptions
+from application.aio.decorators.response_cacher import cache_response
+from application.aio.handlers.get_birthdays_handler import get_birthdays
+from application.aio.handlers.get_citizens_handler import get_citizens
+from application.aio.handlers.get_percentile_age_handler import get_percentile_age
+from application.aio.handlers.patch_citizen.patch_citizen_handler import patch_citizen
+from application.aio.handlers.patch_citizen.patch_citizens_handler import patch_citizens
+from application.aio.handlers.post_import_handler import post_import
+from application.aio.metrics_middleware import MetricsMiddleware
+from application.aio.read_write_lock import AsyncReadWriteMongoLock
+from application import metrics, response_body
+from application.citizens_stream import iter_citizens
+from application.data_validator import DataValidator
+from application.handlers.get_citizens_handler import parse_citizens_query
+from application.handlers.get_percentile_age_handler import parse_as_of
+from application.memory_cache import MemoryCache
+
+logger = logging.getLogger(__name__)
+
+SPOOL_MAX_SIZE = 1024 * 1024
+
+
+def _is_json(request: Request) -> bool:
+    """
+    Проверяет, что тело запроса передано в формате json, так же, как flask.Request.is_json.
+
+    :param Request request: запрос
+
+    :return: Равен ли Content-Type запроса application/json или application/*+json
+    :rtype: bool
+    """
+    mimetype = request.headers.get('Content-Type', '').split(';')[0].strip().lower()
+    return mimetype == 'application/json' or (mimetype.startswith('application/') and mimetype.endswith('+json'))
+
+
+async def _spool_body(request: Request) -> tempfile.SpooledTemporaryFile:
+    """
+    Сохраняет тело запроса по мере поступления во временный файл, который хранится в памяти до SPOOL_MAX_SIZE байт.
+
+    Пока тело помещается в память, куски дописываются в цикле событий. Запись, после которой файл переносится
+    на диск, и все последующие записи выполняются в пуле потоков, чтобы запись на диск не блокировала цикл событий.
+    :param Request request: запрос
+
+    :return: Временный файл с телом запроса, открытый на чтение с начала
+    :rtype: tempfile.SpooledTemporaryFile
+    """
+    loop = asyncio.get_running_loop()
+    body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size <= SPOOL_MAX_SIZE:
+            body.write(chunk)
+        else:
+            await loop.run_in_executor(None, body.write, chunk)
+    body.seek(0)
+    return body
+
+
+def _make_json_response(data: dict, status: int) -> Response:
+    """
+    Создает ответ с данными в формате json.
+
+    :param dict data: данные ответа
+    :param int status: http статус
+
+    :return: Ответ
+    :rtype: Response
+    """
+    return Response(response_body.encode_body(data), status, media_type='application/json; charset=utf-8')
+
+
+def make_app(db, data_validator: DataValidator, lock: AsyncReadWriteMongoLock,
+             memory_cache: MemoryCache = None) -> Starlette:
+    """
+    Создает асинхронное ASGI приложение с теми же обработчиками, что и синхронное приложение flask.
+
+    Пока запрос ожидает базу данных или блокировку, процесс обрабатывает другие запросы, поэтому небольшое
+    количество процессов обслуживает множество одновременных медленных запросов.
+    :param AsyncIOMotorDatabase db: объект базы данных (motor), в которую записываются наборы данных о жителях
+    :param DataValidator data_validator: объект для валидации входных данных
+    :param AsyncReadWriteMongoLock lock: объект для ограничения одновременного доступа к ресурсам из разных процессов
+    :param MemoryCache memory_cache: кеш сериализованных ответов в памяти процесса
+
+    :return: ASGI приложение
+    :rtype: Starlette
+    """
+    memory_cache = memory_cache if memory_cache is not None else MemoryCache()
+
+    @handle_exceptions(logger)
+    async def imports(request: Request) -> Response:
+        """
+        Принимает на вход набор с данными о жителях в формате json
+        и сохраняет его с уникальным идентификатором import_id.
+
+        Тело запроса сохраняется во временный файл по мере поступления, после чего разбирается по одному жителю
+        в пуле потоков, поэтому разбор не блокирует цикл событий.
+        :param Request request: запрос
+        :raises: :class:`BadRequest`: Content-Type в заголовке запроса не равен application/json
+        :raises: :class:`JSONDecodeError`: Тело запроса не является корректным JSON
+        :raises: :class:`PyMongoError`: Операция записи в базу данных не была разрешена
+
+        :returns: В случае успеха возвращается ответ с идентификатором импорта
+        :rtype: Response
+        """
+        if not _is_json(request):
+            raise BadRequest('Content-Type must be application/json')
+
+        with await _spool_body(request) as body:
+            citizens = data_validator.validate_import_stream(iter_citizens(body))
+            data, status = await post_import(citizens, db)
+        return _make_json_response(data, status)
+
+    @handle_exceptions(logger)
+    async def citizen(request: Request) -> Response:
+        """
+        Изменяет информацию о жителе в указанном наборе данных.
+        На вход подается JSON в котором можно указать любые данные о жителе.
+
+        :param Request request: запрос с параметрами пути import_id и citizen_id
+        :raises: :class:`BadRequest`: Content-Type в заголовке запроса не равен application/json
+        :raises: :class:`PyMongoError`: Объект с указанным уникальным идентификатором не был найден в базе данных
+
+        :return: Актуальная информация об указанном жителе
+        :rtype: Response
+        """
+        if not _is_json(request):
+            raise BadRequest('Content-Type must be application/json')
+
+        import_id, citizen_id = request.path_params['import_id'], request.path_params['citizen_id']
+        patch_data = response_body.decode_body(await request.body())
+        data_validator.validate_citizen_patch(citizen_id, patch_data)
+        data, status = await patch_citizen(import_id, citizen_id, patch_data, lock, db)
+        return _make_json_response(data, status)
+
+    @handle_exceptions(logger)
+    async def citizens_batch(request: Request) -> Response:
+        """
+        Изменяет информацию о нескольких жителях в указанном наборе данных.
+        На вход подается JSON, в поле citizens которого перечислены изменения жителей с полем citizen_id.
+
+        :param Request request: запрос с параметром пути import_id
+        :raises: :class:`BadRequest`: Content-Type в заголовке запроса не равен application/json
+        :raises: :class:`PyMongoError`: Объект с указанным уникальным идентификатором не был найден в базе данных
+
+        :return: Актуальная информация об указанных жителях
+        :rtype: Response
+        """
+        if not _is_json(request):
+            raise BadRequest('Content-Type must be application/json')
+
+        patches_data = response_body.decode_body(await request.body())
+        data_validator.validate_citizens_patch(patches_data)
+        data, status = await patch_citizens(request.path_params['import_id'], patches_data['citizens'], lock, db)
+        return _make_json_response(data, status)
+
+    @handle_exceptions(logger)
+    @conditional_response(db)
+    async def citizens(request: Request) -> Response:
+        """
+        Возвращает список всех жителей для указанного набора данных.
+
+        Ответ отправляется частями (chunked) по мере чтения жителей из базы данных. Необязательные параметры
+        запроса town, gender и birth_month фильтруют жителей, limit и after_citizen_id задают страницу,
+        fields - список возвращаемых полей через запятую.
+        :param Request request: запрос с параметром пути import_id
+        :raises: :class:`ValueError`: Параметр запроса указан в неверном формате
+
+        :return: Список жителей в указанной поставке
+        :rtype: Response
+        """
+        chunks, status = await get_citizens(request.path_params['import_id'], db, lock,
+                                            **parse_citizens_query(request.query_params))
+        return StreamingResponse(chunks, status, media_type='application/json; charset=utf-8')
+
+    @handle_exceptions(logger)
+    @conditional_response(db)
+    @cache_response('birthdays', db, lock, memory_cache=memory_cache)
+    async def birthdays(request: Request) -> Response:
+        """
+        Возвращает жителей и количество подарков, которые они будут покупать своим ближайшим родственникам
+        (1-го порядка), сгруппированных по месяцам из указанного набора данных.
+
+        :param Request request: запрос с параметром пути import_id
+        :return: Жители и количество подарков по месяцам
+        :rtype: Response
+        """
+        birthdays_data, status = await get_birthdays(request.path_params['import_id'], db, lock)
+        return response_body.with_response_data(_make_json_response(birthdays_data, status), birthdays_data)
+
+    @handle_exceptions(logger)
+    @conditional_response(db, date_param='as_of')
+    @cache_response('percentile_age', db, lock, key_params=['as_of'], memory_cache=memory_cache)
+    async def percentile_age(request: Request) -> Response:
+        """
+        Возвращает статистику по городам для указанного набора данных в разрезе возраста (полных лет) жителей:
+        p50, p75, p99, где число - это значение перцентиля.
+
+        Необязательный параметр запроса as_of (ДД.ММ.ГГГГ) задает дату, на которую вычисляется возраст. Без него
+        заголовок Expires указывает ближайший день рождения, после которого статистика пересчитывается.
+        :param Request request: запрос с параметром пути import_id
+        :raises: :class:`ValueError`: Параметр as_of указан в неверном формате
+
+        :return: статистика по городам в разрезе возраста
+        :rtype: Response
+        """
+        as_of = parse_as_of(request.query_params.get('as_of'))
+        percentile_data, status, expires = await get_percentile_age(request.path_params['import_id'], db, lock,
+                                                                    as_of)
+        response = _make_json_response(percentile_data, status)
+        if expires is not None:
+            response.headers['Expires'] = http_date(expires)
+        return response_body.with_response_data(response, percentile_data)
+
+    async def metrics_endpoint(request: Request) -> Response:
+        """
+        Возвращает метрики процесса в текстовом формате Prometheus.
+
+        :param Request request: запрос
+        :return: Метрики запросов, кеша ответов, ожидания блокировок и команд к базе данных
+        :rtype: Response
+        """
+        return Response(metrics.REGISTRY.render(), 200, headers={'Content-Type': metrics.CONTENT_TYPE})
+
+    routes = [
+        Route('/metrics', metrics_endpoint, methods=['GET']),
+        Route('/imports', imports, methods=['POST']),
+        Route('/imports/{import_id:int}/citizens/{citizen_id:int}', citizen, methods=['PATCH']),
+        Route('/imports/{import_id:int}/citizens', citizens, methods=['GET']),
+        Route('/imports/{import_id:int}/citizens', citizens_batch, methods=['PATCH']),
+        Route('/imports/{import_id:int}/citizens/birthdays', birthdays, methods=['GET']),
+        Route('/imports/{import_id:int}/towns/stat/percentile/age', percentile_age, methods=['GET'])
+    ]
+    return Starlette(routes=routes, middleware=[Middleware(MetricsMiddleware, routes=routes)])
@@ -0,0 +1,164 @@
+import codecs
+import json
+from typing import BinaryIO, Iterator
+
+from jsonschema import ValidationError
+
+_WHITESPACE = ' \t\n\r'
+
+
+class _StreamReader(object):
+    """
+    Класс для последовательного чтения JSON значений из байтового потока.
+
+    В памяти хранится только непрочитанная часть буфера, поэтому потребление памяти
+    не зависит от размера всего документа, а только от размера отдельного значения.
+    :ivar: BinaryIO stream: поток, из которого читаются данные
+    :ivar: int chunk_size: количество байт, считываемых из потока за один раз
+    """
+
+    def __init__(self, stream: BinaryIO, chunk_size: int):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json_decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _read_chunk(self) -> bool:
+        """
+        Дочитывает следующий кусок потока в буфер, отбрасывая уже прочитанную часть буфера.
+
+        :return: Были ли дочитаны новые данные
+        :rtype: bool
+        """
+        if self._eof:
+            return False
+        chunk = self.stream.read(self.chunk_size)
+        self._eof = not chunk
+        self._buffer = self._buffer[self._pos:] + self._decoder.decode(chunk, final=self._eof)
+        self._pos = 0
+        return not self._eof
+
+    def error(self, message: str) -> json.JSONDecodeError:
+        """
+        Создает ошибку разбора JSON в текущей позиции потока.
+
+        :param str message: сообщение, поясняющее ошибку
+
+        :return: Ошибка разбора JSON
+        :rtype: json.JSONDecodeError
+        """
+        return json.JSONDecodeError(message, self._buffer, self._pos)
+
+    def peek(self) -> str:
+        """
+        Пропускает пробельные символы и возвращает следующий символ без его чтения.
+
+        :return: Следующий непробельный символ или пустая строка в конце потока
+        :rtype: str
+        """
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer) or not self._read_chunk():
+                return self._buffer[self._pos:self._pos + 1]
+
+    def expect(self, chars: str) -> str:
+        """
+        Читает следующий непробельный символ, который должен быть одним из указанных.
+
+        :param str chars: допустимые символы
+        :raises: :class:`json.JSONDecodeError`: Следующий символ не является допустимым
+
+        :return: Прочитанный символ
+        :rtype: str
+        """
+        char = self.peek()
+        if not char or char not in chars:
+            raise self.error(f'Expecting one of {list(chars)}')
+        self._pos += 1
+        return char
+
+    def decode_value(self):
+        """
+        Читает следующее JSON значение целиком.
+
+        Значение считается прочитанным, только если за ним в буфере есть еще хотя бы один символ
+        или поток закончился, иначе число на границе куска могло бы быть прочитано не полностью.
+        :raises: :class:`json.JSONDecodeError`: Значение не является корректным JSON
+
+        :return: Прочитанное значение
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self._json_decoder.raw_decode(self._buffer, self._pos)
+                if end < len(self._buffer) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._read_chunk()
+
+
+def _iter_array(reader: _StreamReader) -> Iterator:
+    """
+    Возвращает элементы JSON массива по одному по мере их чтения из потока.
+
+    :param _StreamReader reader: объект чтения потока, остановившийся перед открывающей скобкой массива
+    :raises: :class:`json.JSONDecodeError`: Массив не является корректным JSON
+    """
+    reader.expect('[')
+    if reader.peek() == ']':
+        reader.expect(']')
+        return
+    while True:
+        yield reader.decode_value()
+        if reader.expect(',]') == ']':
+            return
+
+
+def iter_citizens(stream: BinaryIO, chunk_size: int = 64 * 1024) -> Iterator[dict]:
+    """
+    Разбирает тело запроса с поставкой и возвращает жителей из массива citizens по одному.
+
+    В отличие от json.loads не держит в памяти ни весь документ, ни весь список жителей.
+    :param BinaryIO stream: поток с телом запроса
+    :param int chunk_size: количество байт, считываемых из потока за один раз
+    :raises: :class:`json.JSONDecodeError`: Тело запроса не является корректным JSON
+    :raises: :class:`ValidationError`: Тело запроса не соответствует схеме поставки на верхнем уровне
+    """
+    reader = _StreamReader(stream, chunk_size)
+    citizens_found = False
+
+    reader.expect('{')
+    if reader.peek() == '}':
+        reader.expect('}')
+    else:
+        while True:
+            key = reader.decode_value()
+            if not isinstance(key, str):
+                raise reader.error('Expecting property name enclosed in double quotes')
+            reader.expect(':')
+
+            if key != 'citizens':
+                reader.decode_value()
+                raise ValidationError(f'Additional properties are not allowed (\'{key}\' was unexpected)')
+            if citizens_found:
+                raise reader.error('Duplicate key "citizens"')
+            citizens_found = True
+
+            if reader.peek() != '[':
+                raise ValidationError(f'{reader.decode_value()!r} is not of type \'array\'')
+            yield from _iter_array(reader)
+
+            if reader.expect(',}') == '}':
+                break
+
+    if reader.peek():
+        raise reader.error('Extra data')
+    if not citizens_found:
+        raise ValidationError('\'citizens\' is a required property')
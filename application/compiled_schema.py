@@ -0,0 +1,129 @@
+from typing import Any, Callable, Optional
+
+import jsonschema
+from jsonschema.exceptions import best_match
+
+_SUPPORTED_KEYWORDS = {'title', 'type', 'properties', 'required', 'additionalProperties', 'minProperties',
+                       'minLength', 'minimum', 'enum', 'items', 'minItems'}
+_TYPE_CHECKERS = {
+    'object': lambda instance: type(instance) is dict,
+    'array': lambda instance: type(instance) is list,
+    'string': lambda instance: type(instance) is str,
+    'integer': lambda instance: type(instance) is int,
+}
+
+
+def _compile_checker(schema: dict) -> Optional[Callable[[Any], bool]]:
+    """
+    Компилирует JSON схему в функцию быстрой проверки.
+
+    Функция возвращает True, только если данные точно соответствуют схеме. Если функция возвращает False,
+    данные могут быть как некорректными, так и корректными в редком случае (например, целое число 1.0),
+    поэтому окончательное решение принимает jsonschema.
+    :param dict schema: JSON схема
+
+    :return: Функция быстрой проверки или None, если схема содержит неподдерживаемые ключевые слова
+    :rtype: Optional[Callable[[Any], bool]]
+    """
+    if not set(schema).issubset(_SUPPORTED_KEYWORDS) or schema.get('type') not in _TYPE_CHECKERS:
+        return None
+    checks = [_TYPE_CHECKERS[schema['type']]]
+
+    if 'minLength' in schema:
+        min_length = schema['minLength']
+        checks.append(lambda instance: len(instance) >= min_length)
+    if 'minimum' in schema:
+        minimum = schema['minimum']
+        checks.append(lambda instance: instance >= minimum)
+    if 'enum' in schema:
+        if not all(type(value) is str for value in schema['enum']):
+            return None
+        values = frozenset(schema['enum'])
+        checks.append(lambda instance: type(instance) is str and instance in values)
+    if 'minItems' in schema:
+        min_items = schema['minItems']
+        checks.append(lambda instance: len(instance) >= min_items)
+    if 'items' in schema:
+        item_checker = _compile_checker(schema['items'])
+        if item_checker is None:
+            return None
+        checks.append(lambda instance: all(item_checker(item) for item in instance))
+    if 'properties' in schema or 'required' in schema or 'minProperties' in schema:
+        object_checker = _compile_object_checker(schema)
+        if object_checker is None:
+            return None
+        checks.append(object_checker)
+
+    if len(checks) == 1:
+        return checks[0]
+    return lambda instance: all(check(instance) for check in checks)
+
+
+def _compile_object_checker(schema: dict) -> Optional[Callable[[dict], bool]]:
+    """
+    Компилирует проверку полей объекта: properties, required, additionalProperties и minProperties.
+
+    :param dict schema: JSON схема объекта
+
+    :return: Функция быстрой проверки полей или None, если схема свойства не поддерживается
+    :rtype: Optional[Callable[[dict], bool]]
+    """
+    property_checkers = {}
+    for name, property_schema in schema.get('properties', {}).items():
+        property_checkers[name] = _compile_checker(property_schema)
+        if property_checkers[name] is None:
+            return None
+    required = frozenset(schema.get('required', []))
+    additional_properties = schema.get('additionalProperties', True)
+    if additional_properties not in (True, False):
+        return None
+    min_properties = schema.get('minProperties', 0)
+
+    def check_object(instance: dict) -> bool:
+        if len(instance) < min_properties or not required.issubset(instance):
+            return False
+        for key, value in instance.items():
+            checker = property_checkers.get(key)
+            if checker is None:
+                if not additional_properties:
+                    return False
+            elif not checker(value):
+                return False
+        return True
+
+    return check_object
+
+
+class CompiledSchema(object):
+    """
+    Класс для многократной проверки данных одной и той же JSON схемой.
+
+    Схема проверяется и компилируется один раз при создании экземпляра. Корректные данные проверяются
+    скомпилированной функцией, а для поиска ошибки используется заранее созданный валидатор jsonschema,
+    поэтому сообщения об ошибках совпадают с jsonschema.validate.
+    :ivar: dict schema: JSON схема
+    """
+
+    def __init__(self, schema: dict, root_schema: dict = None):
+        """
+        :param dict schema: JSON схема
+        :param dict root_schema: корневая схема, по которой определяется версия JSON схемы, если schema - ее часть
+        """
+        self.schema = schema
+        validator_class = jsonschema.validators.validator_for(root_schema or schema)
+        validator_class.check_schema(schema)
+        self._validator = validator_class(schema)
+        self._checker = _compile_checker(schema)
+
+    def validate(self, instance):
+        """
+        Проверяет данные на соответствие схеме.
+
+        :param instance: проверяемые данные
+        :raises: :class:`ValidationError`: Данные не соответствуют схеме
+        """
+        if self._checker is not None and self._checker(instance):
+            return
+        error = best_match(self._validator.iter_errors(instance))
+        if error is not None:
+            raise error
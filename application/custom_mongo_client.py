@@ -1,6 +1,6 @@
 import logging
 
-from pymongo import MongoClient, IndexModel
+from pymongo import MongoClient, IndexModel, UpdateOne
 from pymongo.errors import PyMongoError, OperationFailure
 
 logger = logging.getLogger(__name__)
@@ -32,13 +32,49 @@ class CustomMongoClient(MongoClient):
         """
         Создает необходимые индексы в базе данных.
 
+        Индексы жителей по полям town, gender и birth_month заканчиваются полем citizen_id, чтобы выборка страницы
+        с фильтром после указанного жителя читала только подходящие документы в нужном порядке.
         :param str db_name: имя базы данных, в которой необходимо создать индексы
         """
         self._create_index(db_name, 'imports', IndexModel([('import_id', 1)], unique=True))
-        self._create_index(db_name, 'imports', IndexModel([('citizens.citizen_id', 1)]))
-        self._create_index(db_name, 'imports', IndexModel([('import_id', 1), ('citizens.citizen_id', 1)], unique=True))
+        self._create_index(db_name, 'citizens', IndexModel([('import_id', 1), ('citizen_id', 1)], unique=True))
+        self._fill_birth_months(db_name)
+        for field in ('town', 'gender', 'birth_month'):
+            self._create_index(db_name, 'citizens', IndexModel([('import_id', 1), (field, 1), ('citizen_id', 1)]))
+        self._create_index(db_name, 'age_histograms', IndexModel([('import_id', 1), ('town', 1)], unique=True))
         self._create_index(db_name, 'birthdays', IndexModel([('import_id', 1)], unique=True))
-        self._create_index(db_name, 'percentile_age', IndexModel([('import_id', 1)], unique=True))
+        self._drop_index(db_name, 'percentile_age', 'import_id_1')
+        self._create_index(db_name, 'percentile_age', IndexModel([('import_id', 1), ('as_of', 1)], unique=True))
+
+    def _fill_birth_months(self, db_name: str, batch_size: int = 1000):
+        """
+        Записывает поле birth_month жителям, сохраненным до его появления.
+
+        :param str db_name: имя базы данных
+        :param int batch_size: количество обновлений в одной пакетной записи
+        """
+        citizens = self[db_name]['citizens']
+        requests = []
+        for citizen in citizens.find({'birth_month': {'$exists': False}}, {'birth_date': 1}):
+            requests.append(UpdateOne({'_id': citizen['_id']}, {'$set': {'birth_month': citizen['birth_date'].month}}))
+            if len(requests) >= batch_size:
+                citizens.bulk_write(requests, ordered=False)
+                requests = []
+        if requests:
+            citizens.bulk_write(requests, ordered=False)
+
+    def _drop_index(self, db_name: str, collection_name: str, index_name: str):
+        """
+        Удаляет устаревший индекс из указанной коллекции указанной базы данных, если он существует.
+
+        :param str db_name: имя базы данных
+        :param str collection_name: имя коллекции
+        :param str index_name: имя удаляемого индекса
+        """
+        try:
+            self[db_name][collection_name].drop_index(index_name)
+        except OperationFailure:
+            logger.info(f'Index {index_name} already dropped')
 
     def _create_index(self, db_name: str, collection_name: str, index: IndexModel):
         """
@@ -1,22 +1,37 @@
+import copy
 import os
+from typing import Iterable, Iterator
 
-import jsonschema
 from bson import json_util
 from jsonschema import ValidationError
 
+from application.compiled_schema import CompiledSchema
+from application.relatives_graph import RelativesGraph
+
 
 class DataValidator(object):
     """
     Класс для валидации данных, приходящих в запросе.
 
-    При создании экземпляра загружаются JSON схемы.
+    При создании экземпляра загружаются и компилируются JSON схемы, поэтому они не проверяются заново при
+    каждом запросе.
     :ivar: dict import_schema: JSON схема для данных поставки
     :ivar: dict citizen_patch_schema: JSON схемя для данных модификации жителя
+    :ivar: dict citizens_patch_schema: JSON схема для данных модификации нескольких жителей
     """
 
     def __init__(self):
         self.import_schema = _load_schema('import_schema.json')
         self.citizen_patch_schema = _load_schema('citizen_patch_schema.json')
+        self.citizens_patch_schema = _load_schema('citizens_patch_schema.json')
+
+        import_envelope_schema = copy.deepcopy(self.import_schema)
+        del import_envelope_schema['properties']['citizens']['items']
+        self._import_envelope_schema = CompiledSchema(import_envelope_schema)
+        self._citizen_schema = CompiledSchema(self.import_schema['properties']['citizens']['items'],
+                                              self.import_schema)
+        self._citizen_patch_schema = CompiledSchema(self.citizen_patch_schema)
+        self._citizens_patch_schema = CompiledSchema(self.citizens_patch_schema)
 
     def validate_import(self, import_data: dict):
         """
@@ -30,29 +45,47 @@ class DataValidator(object):
         5. Существование родственника с указанным индексом
         6. Наличие обратной родственной связи
 
+        Все пункты проверяются за один проход по жителям, проверка останавливается на первой ошибке.
         :param dict import_data: Данные поставки
         :raises: :class:`ValidationError`: Нарушение любого из указанных пунктов
         """
-        jsonschema.validate(import_data, self.import_schema)
+        self._import_envelope_schema.validate(import_data)
+        for _ in self.validate_import_stream(import_data['citizens']):
+            pass
 
-        citizen_ids = {citizen['citizen_id'] for citizen in import_data['citizens']}
-        if len(citizen_ids) != len(import_data['citizens']):
-            raise ValidationError('Citizens ids are not unique')
+    def validate_import_stream(self, citizens: Iterable[dict]) -> Iterator[dict]:
+        """
+        Проводит валидацию жителей поставки по мере их поступления и возвращает их дальше по одному.
+
+        Проверяется то же, что и в validate_import. Схема, уникальность идентификаторов и родственность жителя
+        к самому себе проверяются сразу при получении жителя, поэтому такие ошибки обнаруживаются без чтения
+        оставшихся данных. Связи с родственниками накапливаются в графе, и существование родственников и наличие
+        обратных связей проверяются после получения всех жителей.
+
+        :param Iterable[dict] citizens: Жители поставки
+        :raises: :class:`ValidationError`: Нарушение любого из указанных пунктов
+        """
+        citizen_ids = set()
+        relatives_graph = RelativesGraph()
+
+        for citizen in citizens:
+            self._citizen_schema.validate(citizen)
 
-        citizen_relatives = {citizen['citizen_id']: set(citizen['relatives']) for citizen in import_data['citizens']}
-        for citizen in import_data['citizens']:
             citizen_id = citizen['citizen_id']
-            relatives = citizen_relatives[citizen_id]
+            if citizen_id in citizen_ids:
+                raise ValidationError('Citizens ids are not unique')
+            citizen_ids.add(citizen_id)
 
+            relatives = set(citizen['relatives'])
             if len(relatives) != len(citizen['relatives']):
                 raise ValidationError('Relatives ids should be unique')
             if citizen_id in relatives:
                 raise ValidationError('Citizen can not be relative to himself')
-            for relative_id in relatives:
-                if relative_id not in citizen_ids:
-                    raise ValidationError('Citizen relative does not exists')
-                if citizen_id not in citizen_relatives[relative_id]:
-                    raise ValidationError('Citizen relatives are not duplex')
+            relatives_graph.add_citizen(citizen_id, citizen['relatives'])
+
+            yield citizen
+
+        relatives_graph.validate()
 
     def validate_citizen_patch(self, citizen_id: int, patch_data: dict):
         """
@@ -67,7 +100,7 @@ class DataValidator(object):
         :param patch_data: Данные модификации
         :raises: :class:`ValidationError`: Нарушение любого из указанных пунктов
         """
-        jsonschema.validate(patch_data, self.citizen_patch_schema)
+        self._citizen_patch_schema.validate(patch_data)
         if 'relatives' in patch_data:
             relatives = set(patch_data['relatives'])
             if len(relatives) != len(patch_data['relatives']):
@@ -75,6 +108,28 @@ class DataValidator(object):
             if citizen_id in relatives:
                 raise ValidationError('Citizen can not be relative to himself')
 
+    def validate_citizens_patch(self, patches_data: dict):
+        """
+        Проводит валидацию данных модификации нескольких жителей.
+
+        Проверяется:
+        1. JSON схема
+        2. Уникальность идентификаторов модифицируемых жителей
+        3. Данные модификации каждого жителя, так же как в validate_citizen_patch
+
+        :param dict patches_data: Данные модификации с модификациями жителей в поле citizens
+        :raises: :class:`ValidationError`: Нарушение любого из указанных пунктов
+        """
+        self._citizens_patch_schema.validate(patches_data)
+        citizen_ids = set()
+        for patch_data in patches_data['citizens']:
+            citizen_id = patch_data['citizen_id']
+            if citizen_id in citizen_ids:
+                raise ValidationError('Citizens ids are not unique')
+            citizen_ids.add(citizen_id)
+            self.validate_citizen_patch(citizen_id, {key: value for key, value in patch_data.items()
+                                                     if key != 'citizen_id'})
+
 
 def _load_schema(schema_name: str) -> dict:
     """
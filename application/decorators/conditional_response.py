@@ -0,0 +1,81 @@
+from datetime import datetime
+from functools import wraps
+from typing import Optional
+
+from flask import Response, g, has_app_context, request
+from pymongo.database import Database
+
+from application.handlers import shared
+
+
+def make_etag(import_id: int, version: int, date_param: str = None, date_value: Optional[str] = None) -> str:
+    """
+    Создает значение ETag ответа по версии поставки.
+
+    Версия поставки увеличивается в той же транзакции, что и изменение жителей, поэтому ответ на тот же запрос
+    меняется только вместе с ней. Ответы, которые без параметра даты вычисляются на текущую дату, меняются еще и
+    каждый день, поэтому для них в ETag входит текущая дата по UTC.
+    :param int import_id: уникальный идентификатор поставки
+    :param int version: версия поставки
+    :param str date_param: имя параметра запроса с датой, на которую вычисляется ответ
+    :param Optional[str] date_value: значение параметра запроса с датой
+
+    :return: Значение ETag без кавычек
+    :rtype: str
+    """
+    etag = f'{import_id}-{version}'
+    if date_param is not None and date_value is None:
+        etag += '-' + datetime.utcnow().strftime('%Y%m%d')
+    return etag
+
+
+def get_request_import_version(import_id: int, db: Database) -> Optional[int]:
+    """
+    Возвращает версию поставки, прочитанную для текущего запроса декоратором conditional_response.
+
+    Если версия для текущего запроса еще не прочитана, она читается из базы данных.
+    :param int import_id: уникальный идентификатор поставки
+    :param Database db: объект базы данных, в которую записываются наборы данных о жителях
+
+    :return: Версия поставки или None, если поставка не найдена
+    :rtype: Optional[int]
+    """
+    if has_app_context() and g.get('import_version', (None, None))[0] == import_id:
+        return g.import_version[1]
+    return shared.get_import_version(import_id, db)
+
+
+def conditional_response(db: Database, date_param: str = None):
+    """
+    Декоратор, добавляющий к ответу обработчика ETag по версии поставки и отвечающий 304 Not Modified,
+    если ETag из заголовка If-None-Match запроса совпадает с текущим.
+
+    Версия поставки читается одним запросом до выполнения обработчика, поэтому на повторный запрос без изменений
+    поставки ответ отправляется без чтения жителей и кеша. Прочитанная версия сохраняется во flask.g, чтобы
+    декоратор cache_response не читал ее еще раз. ETag слабый, так как тело может быть сжато gzip.
+    :param Database db: объект базы данных, в которую записываются наборы данных о жителях
+    :param str date_param: имя параметра запроса с датой, без которого ответ вычисляется на текущую дату
+    """
+
+    def decorator(f):
+        @wraps(f)
+        def wrap(*args, **kwargs):
+            import_id = kwargs['import_id']
+            version = shared.get_import_version(import_id, db)
+            g.import_version = (import_id, version)
+            if version is None:
+                return f(*args, **kwargs)
+
+            etag = make_etag(import_id, version, date_param, request.args.get(date_param) if date_param else None)
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+            else:
+                response = f(*args, **kwargs)
+                if not isinstance(response, Response) or response.status_code >= 300:
+                    return response
+            response.set_etag(etag, weak=True)
+            return response
+
+        return wrap
+
+    return decorator
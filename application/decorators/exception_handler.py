@@ -1,5 +1,6 @@
 import logging
 from functools import wraps
+from json import JSONDecodeError
 from typing import Tuple
 
 from jsonschema import ValidationError
@@ -38,6 +39,8 @@ def handle_exceptions(logger: logging.Logger):
                 return _make_error_response(logger, 'Input data is not valid: ' + str(e), 400)
             except BadRequest as e:
                 return _make_error_response(logger, 'Error when parsing JSON: ' + str(e), 400)
+            except JSONDecodeError as e:
+                return _make_error_response(logger, 'Error when parsing JSON: ' + str(e), 400)
             except PyMongoError as e:
                 return _make_error_response(logger, 'Database error: ' + str(e), 400)
             except ValueError as e:
@@ -1,64 +1,175 @@
-import json
 import os
+from datetime import datetime, timezone
 from functools import wraps
+from typing import Iterable, Optional, Tuple
 
-from flask import Response
+from flask import Response, has_request_context, request
 from mongolock import MongoLock
 from pymongo.database import Database
+from werkzeug.http import http_date, parse_date
 
+from application import metrics, response_body
+from application.decorators.conditional_response import get_request_import_version
+from application.handlers import shared
+from application.memory_cache import MemoryCache
 
-def _get_cached_data(import_id: int, collection_name: str, db: Database) -> dict:
+
+def _get_cached_data(import_id: int, collection_name: str, db: Database,
+                     key_params: dict = None) -> Tuple[Optional[dict], Optional[datetime]]:
     """
-    Возвращает закешированные ранее данные из указанной поставки.
+    Возвращает закешированное ранее тело ответа для указанной поставки.
 
-    Если закешированные данные отсутствуют, возвращается None.
+    Тело хранится уже сериализованным и, при достаточном размере, сжатым, поэтому не требует разбора и повторной
+    сериализации. Если тело удалено при модификации жителей или документ сохранен до появления тел ответов, оно
+    собирается из структурированных данных и записывается в документ, если ревизия документа не изменилась.
+    Если закешированные данные отсутствуют или срок их действия истек, возвращается None.
     :param int import_id: уникальный идентификатор поставки
     :param str collection_name: имя коллекции, в которой находятся кешированные данные
     :param Database db: объект базы данных, в которую записываются наборы данных о жителях
+    :param dict key_params: параметры запроса, входящие в ключ кеша вместе с import_id
 
-    :return: Закешированные данные
-    :rtype: dict
+    :return: Поля body и gzip_body закешированного ответа и время по UTC, начиная с которого он устаревает
+    :rtype: Tuple[Optional[dict], Optional[datetime]]
     """
-    cached_data = db[collection_name].find_one({'import_id': import_id}, {'_id': 0, 'import_id': 0})
-    return cached_data
+    key_params = key_params or {}
+    projection = {'import_id': 0, **{param: 0 for param in key_params}}
+    cached_data = db[collection_name].find_one({'import_id': import_id, **key_params}, projection)
+    if cached_data is None:
+        return None, None
+    expires = cached_data.get('expires')
+    if expires is not None and expires <= datetime.utcnow():
+        return None, None
+    if 'body' not in cached_data:
+        body_fields = response_body.make_body_fields(
+            response_body.encode_body(response_body.read_cached_data(cached_data)))
+        db[collection_name].update_one(
+            {'_id': cached_data['_id'], 'revision': cached_data.get('revision'), 'body': {'$exists': False}},
+            {'$set': body_fields})
+        return body_fields, expires
+    return {'body': cached_data['body'], 'gzip_body': cached_data.get('gzip_body')}, expires
 
 
-def _cache_data(import_id: int, collection_name: str, response_data: dict, db: Database):
+def _cache_data(import_id: int, collection_name: str, body: bytes, data: dict, db: Database,
+                key_params: dict = None, expires: datetime = None) -> dict:
     """
-    Сохраняет данные, полученные из указанной поставки в базу данных.
+    Сохраняет тело ответа для указанной поставки в базу данных, заменяя устаревшие данные с тем же ключом.
 
+    Вместе с телом сохраняются структурированные данные ответа, которые изменяются при модификации жителей.
     :param int import_id: уникальный идентификатор поставки
     :param str collection_name: имя коллекции, в которую производится запись
-    :param dict response_data: данные для закеширования
+    :param bytes body: сериализованное тело ответа
+    :param dict data: данные ответа, из которых сериализовано тело
     :param Database db: объект базы данных, в которую записываются наборы данных о жителях
+    :param dict key_params: параметры запроса, входящие в ключ кеша вместе с import_id
+    :param datetime expires: время по UTC, начиная с которого данные устаревают. Если не указано, данные не устаревают
+
+    :return: Сохраненные поля body и gzip_body
+    :rtype: dict
+    """
+    key = {'import_id': import_id, **(key_params or {})}
+    cache_fields = response_body.make_cache_fields(body, data)
+    data = {**key, **cache_fields}
+    if expires is not None:
+        data['expires'] = expires
+    db[collection_name].replace_one(key, data, upsert=True)
+    return {'body': cache_fields['body'], 'gzip_body': cache_fields['gzip_body']}
+
+
+def _get_expires(response: Response) -> Optional[datetime]:
+    """
+    Возвращает время устаревания ответа из заголовка Expires.
+
+    :param Response response: ответ обработчика
+
+    :return: Время по UTC без часового пояса или None, если заголовок отсутствует
+    :rtype: Optional[datetime]
     """
-    data = {'import_id': import_id}
-    data = {**data, **response_data}
-    db[collection_name].insert_one(data)
+    expires = parse_date(response.headers.get('Expires'))
+    if expires is not None and expires.tzinfo is not None:
+        expires = expires.astimezone(timezone.utc).replace(tzinfo=None)
+    return expires
 
 
-def cache_response(collection_name: str, db: Database, lock: MongoLock):
+def _make_response(body: bytes, gzip_body: Optional[bytes], expires: Optional[datetime]) -> Response:
+    """
+    Создает ответ из закешированного тела.
+
+    Если у тела есть сжатый вариант и клиент принимает gzip, отправляется сжатый вариант.
+    :param bytes body: сериализованное тело ответа
+    :param Optional[bytes] gzip_body: сжатое gzip тело ответа
+    :param Optional[datetime] expires: время по UTC, начиная с которого ответ устаревает
+
+    :return: Ответ с заголовком Expires, если время устаревания указано
+    :rtype: Response
+    """
+    accepts_gzip = has_request_context() and 'gzip' in request.accept_encodings
+    response = Response(gzip_body if gzip_body is not None and accepts_gzip else body, 201,
+                        mimetype='application/json; charset=utf-8')
+    if gzip_body is not None:
+        response.vary.add('Accept-Encoding')
+        if accepts_gzip:
+            response.content_encoding = 'gzip'
+    if expires is not None:
+        response.headers['Expires'] = http_date(expires)
+    return response
+
+
+def cache_response(collection_name: str, db: Database, lock: MongoLock, key_params: Iterable[str] = (),
+                   memory_cache: MemoryCache = None):
     """
     Декоратор, проверяющий наличие закешированных данных в указанной коллекции перед выполнением обработчика.
 
+    Закешированные данные читаются, вычисляются и сохраняются только для завершенной поставки, иначе возникает
+    ImportNotFoundError, поэтому данные незавершенной или удаленной поставки не отдаются из кеша.
     При отсутсвии закешированных данных выполняет обработчик и сохраняет результат его работы в указанную коллекцию.
+    Закешированные данные читаются без блокировки, так как документ кеша заменяется целиком. Блокировка берется
+    только при их отсутствии, чтобы одновременные запросы не вычисляли одни и те же данные несколько раз.
+    Если ответ обработчика содержит заголовок Expires, данные считаются отсутствующими начиная с указанного времени
+    и пересчитываются при следующем запросе.
+
+    Ответ хранится в виде готового тела в UTF-8 и его сжатого gzip варианта, поэтому отдается без сериализации.
+    Обработчик должен сохранить в ответе данные, из которых сериализовано тело, функцией
+    response_body.with_response_data, чтобы они были записаны в кеш без разбора тела.
+    Если указан кеш в памяти процесса, сериализованный ответ сохраняется и в нем вместе с версией поставки. Пока
+    версия поставки не изменилась, ответ отдается из памяти без блокировки и чтения коллекции кеша.
+    Результат каждого обращения к кешу (memory_hit, hit или miss) учитывается в метрике cache_requests_total.
     :param str collection_name: имя коллекции, в которой находятся кешированные данные
     :param Database db: объект базы данных, в которую записываются наборы данных о жителях
     :param MongoLock lock: объект для ограничения одновременного доступа к ресурсам из разных процессов
+    :param Iterable[str] key_params: имена параметров запроса, значения которых входят в ключ кеша
+    :param MemoryCache memory_cache: кеш сериализованных ответов в памяти процесса
     """
 
     def decorator(f):
         @wraps(f)
         def wrap(*args, **kwargs):
             import_id = kwargs['import_id']
-            with lock(f'{collection_name}_{import_id}', str(os.getpid()), expire=60, timeout=10):
-                cached_data = _get_cached_data(import_id, collection_name, db)
-                if cached_data is not None:
-                    return Response(json.dumps(cached_data, ensure_ascii=False), 201,
-                                    mimetype='application/json; charset=utf-8')
-                response: Response = f(*args, **kwargs)
-                _cache_data(import_id, collection_name, response.json, db)
-                return response
+            request_params = {param: request.args.get(param) for param in key_params}
+            memory_key = (collection_name, import_id, *request_params.values())
+            version = get_request_import_version(import_id, db)
+            if version is None:
+                raise shared.ImportNotFoundError()
+            if memory_cache is not None:
+                entry = memory_cache.get(memory_key, version)
+                if entry is not None:
+                    metrics.CACHE_REQUESTS.inc(cache=collection_name, result='memory_hit')
+                    return _make_response(entry.body, entry.gzip_body, entry.expires)
+
+            body_fields, expires = _get_cached_data(import_id, collection_name, db, request_params)
+            result = 'hit'
+            if body_fields is None:
+                with lock(f'{collection_name}_{import_id}', str(os.getpid()), expire=60, timeout=10):
+                    body_fields, expires = _get_cached_data(import_id, collection_name, db, request_params)
+                    if body_fields is None:
+                        result = 'miss'
+                        response: Response = f(*args, **kwargs)
+                        expires = _get_expires(response)
+                        body_fields = _cache_data(import_id, collection_name, response.get_data(),
+                                                  response.response_data, db, request_params, expires)
+            metrics.CACHE_REQUESTS.inc(cache=collection_name, result=result)
+            if memory_cache is not None:
+                memory_cache.put(memory_key, version, body_fields['body'], expires, body_fields['gzip_body'])
+            return _make_response(body_fields['body'], body_fields['gzip_body'], expires)
 
         return wrap
 
@@ -0,0 +1,177 @@
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from pymongo import UpdateOne
+from pymongo.client_session import ClientSession
+from pymongo.database import Database
+from pymongo.errors import PyMongoError
+from pymongo.results import InsertManyResult
+
+
+def _date_key(birth_date: datetime) -> str:
+    """
+    Возвращает ключ даты рождения в гистограмме.
+
+    :param datetime birth_date: дата рождения
+
+    :return: Дата рождения в формате ISO 8601
+    :rtype: str
+    """
+    return birth_date.strftime('%Y-%m-%d')
+
+
+def create_histograms() -> Dict[str, Counter]:
+    """
+    Создает пустые гистограммы дат рождения жителей по городам.
+
+    :return: Словарь количества жителей по датам рождения для каждого города
+    :rtype: Dict[str, Counter]
+    """
+    return defaultdict(Counter)
+
+
+def add_citizen(histograms: Dict[str, Counter], citizen: dict):
+    """
+    Учитывает жителя в гистограмме его города.
+
+    :param Dict[str, Counter] histograms: гистограммы дат рождения жителей по городам
+    :param dict citizen: житель с полями town и birth_date
+    """
+    histograms[citizen['town']][_date_key(citizen['birth_date'])] += 1
+
+
+def write_histograms(import_id: int, histograms: Dict[str, Counter], db: Database):
+    """
+    Записывает гистограммы дат рождения в базу данных, каждый город отдельным документом.
+
+    Название города хранится в значении поля, а не в ключе, поэтому может содержать любые символы.
+    :param int import_id: уникальный идентификатор поставки
+    :param Dict[str, Counter] histograms: гистограммы дат рождения жителей по городам
+    :param Database db: объект базы данных, в которую записываются наборы данных о жителях
+    :raises: :class:`PyMongoError`: Операция записи в базу данных не была разрешена
+    """
+    if not histograms:
+        return
+    db_response: InsertManyResult = db['age_histograms'].insert_many(
+        [{'import_id': import_id, 'town': town, 'birth_dates': dict(birth_dates)}
+         for town, birth_dates in histograms.items()])
+    if not db_response.acknowledged:
+        raise PyMongoError('Operation was not acknowledged')
+
+
+def read_histograms(import_id: int, db: Database,
+                    session: ClientSession = None) -> Tuple[Optional[List[str]], np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Загружает гистограммы дат рождения указанной поставки в массивы numpy.
+
+    Города упорядочены по названию, нулевые столбцы и города без жителей пропускаются.
+    :param int import_id: уникальный идентификатор поставки
+    :param Database db: объект базы данных, в которую записываются наборы данных о жителях
+    :param ClientSession session: сессия соединения с базой данных, через которую производятся все запросы
+
+    :return: Названия городов по их кодам, а также коды городов, даты рождения и количество жителей
+        для каждого столбца гистограмм. Если гистограммы поставки не найдены, список городов равен None.
+    :rtype: Tuple[Optional[List[str]], np.ndarray, np.ndarray, np.ndarray]
+    """
+    documents = db['age_histograms'].find({'import_id': import_id}, {'_id': 0, 'town': 1, 'birth_dates': 1},
+                                          session=session).sort('town', 1)
+    return load_histograms(documents)
+
+
+def load_histograms(documents: Iterable[dict]) -> Tuple[Optional[List[str]], np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Загружает документы гистограмм дат рождения в массивы numpy.
+
+    Нулевые столбцы и города без жителей пропускаются, порядок городов сохраняется.
+    :param Iterable[dict] documents: документы гистограмм с полями town и birth_dates
+
+    :return: Названия городов по их кодам, а также коды городов, даты рождения и количество жителей
+        для каждого столбца гистограмм. Если документов нет, список городов равен None.
+    :rtype: Tuple[Optional[List[str]], np.ndarray, np.ndarray, np.ndarray]
+    """
+    towns, codes, birth_dates, counts = [], [], [], []
+    histograms_found = False
+    for document in documents:
+        histograms_found = True
+        columns = [(birth_date, count) for birth_date, count in document['birth_dates'].items() if count > 0]
+        if not columns:
+            continue
+        codes.extend([len(towns)] * len(columns))
+        towns.append(document['town'])
+        for birth_date, count in columns:
+            birth_dates.append(birth_date)
+            counts.append(count)
+    return (towns if histograms_found else None, np.array(codes, dtype=np.int64),
+            np.array(birth_dates, dtype='datetime64[D]'), np.array(counts, dtype=np.int64))
+
+
+def move_citizen(import_id: int, old_citizen: dict, new_citizen: dict, db: Database, session: ClientSession) -> bool:
+    """
+    Переносит жителя из столбца его старых города и даты рождения в столбец новых.
+
+    :param int import_id: уникальный идентификатор поставки
+    :param dict old_citizen: информация о жителе до модификации
+    :param dict new_citizen: информация о жителе после модификации
+    :param Database db: объект базы данных, в которую записываются наборы данных о жителях
+    :param ClientSession session: сессия соединения с базой данных, через которую производятся все запросы
+
+    :return: Были ли найдены гистограммы поставки. Поставки, загруженные до появления гистограмм, их не имеют.
+    :rtype: bool
+    """
+    old_key, new_key = _date_key(old_citizen['birth_date']), _date_key(new_citizen['birth_date'])
+    db_response = db['age_histograms'].update_one({'import_id': import_id, 'town': old_citizen['town']},
+                                                  {'$inc': {f'birth_dates.{old_key}': -1}}, session=session)
+    if not db_response.matched_count:
+        return False
+    db['age_histograms'].update_one({'import_id': import_id, 'town': new_citizen['town']},
+                                    {'$inc': {f'birth_dates.{new_key}': 1}}, upsert=True, session=session)
+    return True
+
+
+def _get_histograms_difference(old_citizens: List[dict], new_citizens: List[dict]) -> Dict[str, Dict[str, int]]:
+    """
+    Вычисляет изменение гистограмм после модификации нескольких жителей.
+
+    :param List[dict] old_citizens: информация о жителях до модификации
+    :param List[dict] new_citizens: информация о тех же жителях после модификации
+
+    :return: Ненулевые изменения количества жителей по датам рождения для каждого затронутого города
+    :rtype: Dict[str, Dict[str, int]]
+    """
+    difference = create_histograms()
+    for old_citizen, new_citizen in zip(old_citizens, new_citizens):
+        difference[old_citizen['town']][_date_key(old_citizen['birth_date'])] -= 1
+        difference[new_citizen['town']][_date_key(new_citizen['birth_date'])] += 1
+    difference = {town: {date_key: count for date_key, count in birth_dates.items() if count}
+                  for town, birth_dates in difference.items()}
+    return {town: birth_dates for town, birth_dates in difference.items() if birth_dates}
+
+
+def move_citizens(import_id: int, old_citizens: List[dict], new_citizens: List[dict], db: Database,
+                  session: ClientSession) -> bool:
+    """
+    Переносит нескольких жителей из столбцов их старых городов и дат рождения в столбцы новых.
+
+    Изменения суммируются по городам, поэтому каждый город обновляется одним запросом, а все запросы
+    отправляются одной пакетной записью.
+    :param int import_id: уникальный идентификатор поставки
+    :param List[dict] old_citizens: информация о жителях до модификации
+    :param List[dict] new_citizens: информация о тех же жителях после модификации
+    :param Database db: объект базы данных, в которую записываются наборы данных о жителях
+    :param ClientSession session: сессия соединения с базой данных, через которую производятся все запросы
+
+    :return: Были ли найдены гистограммы поставки. Поставки, загруженные до появления гистограмм, их не имеют.
+    :rtype: bool
+    """
+    if not db['age_histograms'].count_documents({'import_id': import_id}, limit=1, session=session):
+        return False
+    difference = _get_histograms_difference(old_citizens, new_citizens)
+    if difference:
+        db['age_histograms'].bulk_write(
+            [UpdateOne({'import_id': import_id, 'town': town},
+                       {'$inc': {f'birth_dates.{date_key}': count for date_key, count in birth_dates.items()}},
+                       upsert=True)
+             for town, birth_dates in difference.items()], session=session)
+    return True
@@ -2,10 +2,48 @@ import os
 from collections import defaultdict
 from typing import List, Tuple
 
-from mongolock import MongoLock
 from pymongo.database import Database
+from pymongo.errors import OperationFailure
 
 from application.handlers import shared
+from application.read_write_lock import ReadWriteMongoLock
+
+
+def _get_birthdays_pipeline(import_id: int) -> List[dict]:
+    """
+    Возвращает агрегацию, которая считает количество подарков для каждого жителя по месяцам на стороне базы данных.
+
+    Каждая связь с родственником разворачивается в отдельный документ с месяцем рождения жителя, после чего
+    документы группируются по месяцу и идентификатору родственника. Из базы данных передаются только итоговые
+    пары (месяц, родственник) с количеством подарков.
+    :param int import_id: уникальный идентификатор поставки
+
+    :return: Стадии агрегации
+    :rtype: List[dict]
+    """
+    return [
+        {'$match': {'import_id': import_id}},
+        {'$project': {'_id': 0, 'month': {'$month': '$birth_date'}, 'relatives': 1}},
+        {'$unwind': '$relatives'},
+        {'$group': {'_id': {'month': '$month', 'citizen_id': '$relatives'}, 'presents': {'$sum': 1}}}
+    ]
+
+
+def _aggregate_birthdays_data(import_id: int, db: Database) -> dict:
+    """
+    Возвращает жителей и количество подарков по месяцам, посчитанные агрегацией в базе данных.
+
+    :param int import_id: уникальный идентификатор поставки
+    :param Database db: объект базы данных, в которую записываются наборы данных о жителях
+    :raises: :class:`OperationFailure`: База данных не смогла выполнить агрегацию
+
+    :return: Словарь количества подарков для каждого жителя по месяцам
+    :rtype: dict
+    """
+    birthdays_data = defaultdict(dict)
+    for group in db['citizens'].aggregate(_get_birthdays_pipeline(import_id)):
+        birthdays_data[group['_id']['month']][group['_id']['citizen_id']] = group['presents']
+    return birthdays_data
 
 
 def _get_birthdays_data(citizens: List[dict]) -> dict:
@@ -28,6 +66,7 @@ def _get_birthdays_representation(birthdays_data: dict) -> dict:
     """
     Преобразует данные о подарках в формат для отправки ответа.
 
+    Жители в каждом месяце упорядочены по идентификатору, так как порядок результатов агрегации не определен.
     :param dict birthdays_data: данные о подарках
 
     :return: Данные о подарках в формате для отправки
@@ -35,24 +74,33 @@ def _get_birthdays_representation(birthdays_data: dict) -> dict:
     """
     months = {str(i): [] for i in range(1, 13)}
     for month in birthdays_data:
-        months[str(month)] = [{'citizen_id': key, 'presents': value} for key, value in birthdays_data[month].items()]
+        months[str(month)] = [{'citizen_id': key, 'presents': value}
+                              for key, value in sorted(birthdays_data[month].items())]
     return {'data': months}
 
 
-def get_birthdays(import_id: int, db: Database, lock: MongoLock) -> Tuple[dict, int]:
+def get_birthdays(import_id: int, db: Database, lock: ReadWriteMongoLock) -> Tuple[dict, int]:
     """
     Возвращает жителей и количество подарков, которые они будут покупать своим ближайшим родственникам
     (1-го порядка), сгруппированных по месяцам из указанного набора данных.
 
+    Подарки считаются агрегацией в базе данных. Если база данных не может выполнить агрегацию,
+    жители загружаются и подарки считаются в python. Жители читаются только после проверки, что поставка завершена.
     :param int import_id: уникальный идентификатор поставки
     :param Database db: объект базы данных, в которую записываются наборы данных о жителях
-    :param MongoLock lock: объект для ограничения одновременного доступа к ресурсам из разных процессов
+    :param ReadWriteMongoLock lock: объект для ограничения одновременного доступа к ресурсам из разных процессов
+    :raises: :class:`ImportNotFoundError`: Завершенная поставка с указанным уникальным идентификатором
+        остутствует в базе данных
 
     :return: Данные о подарках и http статус
     :rtype: dict
     """
-    with lock(str(import_id), str(os.getpid()), expire=60, timeout=10):
-        citizens = shared.get_citizens(import_id, db, {'citizens.birth_date': 1, 'citizens.relatives': 1})
-        birthdays_data = _get_birthdays_data(citizens)
+    with lock.shared(str(import_id), str(os.getpid()), expire=60, timeout=10):
+        shared.check_import_exists(import_id, db)
+        try:
+            birthdays_data = _aggregate_birthdays_data(import_id, db)
+        except OperationFailure:
+            citizens = list(shared.find_citizens(import_id, db, {'_id': 0, 'birth_date': 1, 'relatives': 1}))
+            birthdays_data = _get_birthdays_data(citizens)
         birthdays_data = _get_birthdays_representation(birthdays_data)
         return birthdays_data, 201
@@ -0,0 +1,172 @@
+import os
+from typing import Iterator, List, Mapping, Optional, Tuple
+
+from pymongo.database import Database
+
+from application import response_body
+from application.handlers import shared
+from application.read_write_lock import ReadWriteMongoLock
+
+CHUNK_SIZE = 1000
+GENDERS = ('male', 'female')
+CITIZEN_FIELDS = ('citizen_id', 'town', 'street', 'building', 'apartment', 'name', 'birth_date', 'gender', 'relatives')
+
+
+def _parse_int(args: Mapping[str, str], name: str, min_value: int, max_value: int = None) -> Optional[int]:
+    """
+    Разбирает целочисленный параметр запроса.
+
+    :param Mapping[str, str] args: параметры запроса
+    :param str name: имя параметра
+    :param int min_value: минимальное допустимое значение
+    :param int max_value: максимальное допустимое значение или None, если оно не ограничено
+    :raises: :class:`ValueError`: Значение параметра не является целым числом в допустимых пределах
+
+    :return: Значение параметра или None, если параметр не указан
+    :rtype: Optional[int]
+    """
+    value = args.get(name)
+    if value is None:
+        return None
+    if not value.isdigit() or int(value) < min_value or (max_value is not None and int(value) > max_value):
+        raise ValueError(f'{name} must be an integer from {min_value} to {max_value or "infinity"}')
+    return int(value)
+
+
+def _parse_projection(fields: Optional[str]) -> dict:
+    """
+    Создает проекцию выборки жителей из списка полей через запятую.
+
+    Проекция применяется в базе данных, поэтому невыбранные поля не читаются драйвером и не сериализуются.
+    :param Optional[str] fields: имена полей жителя через запятую или None, если нужны все поля
+    :raises: :class:`ValueError`: Указано неизвестное поле
+
+    :return: Словарь проекции выборки
+    :rtype: dict
+    """
+    if fields is None:
+        return shared.CITIZEN_PROJECTION
+    fields = fields.split(',')
+    unknown_fields = [field for field in fields if field not in CITIZEN_FIELDS]
+    if unknown_fields:
+        raise ValueError('Unknown citizen fields: ' + ', '.join(unknown_fields))
+    return {'_id': 0, **{field: 1 for field in fields}}
+
+
+def parse_citizens_query(args: Mapping[str, str]) -> dict:
+    """
+    Разбирает параметры запроса списка жителей: фильтры town, gender, birth_month, пагинацию limit, after_citizen_id
+    и список возвращаемых полей fields.
+
+    :param Mapping[str, str] args: параметры запроса
+    :raises: :class:`ValueError`: Параметр указан в неверном формате
+
+    :return: Именованные аргументы обработчика get_citizens
+    :rtype: dict
+    """
+    filters = {}
+    if 'town' in args:
+        if not args['town']:
+            raise ValueError('town must not be empty')
+        filters['town'] = args['town']
+    if 'gender' in args:
+        if args['gender'] not in GENDERS:
+            raise ValueError('gender must be one of ' + ', '.join(GENDERS))
+        filters['gender'] = args['gender']
+    birth_month = _parse_int(args, 'birth_month', 1, 12)
+    if birth_month is not None:
+        filters['birth_month'] = birth_month
+    return {'filters': filters, 'after_citizen_id': _parse_int(args, 'after_citizen_id', 0),
+            'limit': _parse_int(args, 'limit', 1) or 0, 'projection': _parse_projection(args.get('fields'))}
+
+
+def _get_chunk_representation(citizens: List[dict]) -> bytes:
+    """
+    Сериализует часть списка жителей для отправки ответа одним вызовом кодека.
+
+    Даты рождения сериализуются кодеком в формате ДД.ММ.ГГГГ.
+    :param List[dict] citizens: информация о жителях из базы данных
+
+    :return: JSON жителей через запятую без окружающих квадратных скобок
+    :rtype: bytes
+    """
+    return response_body.encode_body(citizens)[1:-1]
+
+
+def _generate_citizens_chunks(import_id: int, db: Database, lock: ReadWriteMongoLock, filters: dict = None,
+                              after_citizen_id: int = None, limit: int = 0, projection: dict = None,
+                              chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Генерирует ответ со списком жителей частями по мере чтения курсора из базы данных.
+
+    Жители читаются только после проверки, что поставка завершена, поэтому первая часть генерируется только
+    для завершенной поставки. Блокировка поставки удерживается,
+    пока не будет сгенерирована последняя часть или генератор не будет закрыт.
+    :param int import_id: уникальный идентификатор поставки
+    :param Database db: объект базы данных, в которую записываются наборы данных о жителях
+    :param ReadWriteMongoLock lock: объект для ограничения одновременного доступа к ресурсам из разных процессов
+    :param dict filters: значения полей town, gender и birth_month, которым должны соответствовать жители
+    :param int after_citizen_id: уникальный идентификатор жителя, после которого начинается страница
+    :param int limit: максимальное количество жителей на странице, 0 - без ограничения
+    :param dict projection: словарь проекции выборки, по умолчанию все поля жителя
+    :param int chunk_size: количество жителей в одной части ответа
+    :raises: :class:`ImportNotFoundError`: Завершенная поставка с указанным уникальным идентификатором
+        остутствует в базе данных
+    """
+    with lock.shared(str(import_id), str(os.getpid()), expire=60, timeout=10):
+        shared.check_import_exists(import_id, db)
+        cursor = shared.find_citizens(import_id, db, projection or shared.CITIZEN_PROJECTION, filters,
+                                      after_citizen_id, limit)
+        cursor = cursor.batch_size(chunk_size)
+        try:
+            first_citizen = next(cursor, None)
+            if first_citizen is None:
+                yield b'{"data": []}'
+                return
+
+            chunk = [first_citizen]
+            yield b'{"data": ['
+            for citizen in cursor:
+                if len(chunk) >= chunk_size:
+                    yield _get_chunk_representation(chunk) + b', '
+                    chunk = []
+                chunk.append(citizen)
+            yield _get_chunk_representation(chunk) + b']}'
+        finally:
+            cursor.close()
+
+
+def get_citizens(import_id: int, db: Database, lock: ReadWriteMongoLock, filters: dict = None,
+                 after_citizen_id: int = None, limit: int = 0,
+                 projection: dict = None) -> Tuple[Iterator[bytes], int]:
+    """
+    Возвращает список жителей для указанного набора данных в виде генератора частей ответа.
+
+    Ответ формируется из курсора по частям, поэтому время до первого байта и потребление памяти
+    не зависят от размера поставки. Ошибка отсутствия завершенной поставки возникает до возврата генератора.
+    Жители возвращаются в порядке citizen_id, следующая страница запрашивается с after_citizen_id,
+    равным citizen_id последнего жителя на странице.
+    :param int import_id: уникальный идентификатор поставки
+    :param Database db: объект базы данных, в которую записываются наборы данных о жителях
+    :param ReadWriteMongoLock lock: объект для ограничения одновременного доступа к ресурсам из разных процессов
+    :param dict filters: значения полей town, gender и birth_month, которым должны соответствовать жители
+    :param int after_citizen_id: уникальный идентификатор жителя, после которого начинается страница
+    :param int limit: максимальное количество жителей на странице, 0 - без ограничения
+    :param dict projection: словарь проекции выборки, по умолчанию все поля жителя
+    :raises: :class:`ImportNotFoundError`: Завершенная поставка с указанным уникальным идентификатором
+        остутствует в базе данных
+
+    :return: Генератор частей ответа со списком жителей и http статус
+    :rtype: Tuple[Iterator[bytes], int]
+    """
+    chunks = _generate_citizens_chunks(import_id, db, lock, filters, after_citizen_id, limit, projection)
+    first_chunk = next(chunks)
+
+    def generate():
+        try:
+            yield first_chunk
+            yield from chunks
+        finally:
+            chunks.close()
+
+    return generate(), 201
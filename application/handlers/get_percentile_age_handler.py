@@ -1,49 +1,133 @@
+import calendar
 import os
-from collections import defaultdict
-from datetime import datetime
-from typing import Tuple, List
+from array import array
+from datetime import date, datetime, time
+from typing import Iterable, List, Optional, Tuple
 
 import numpy as np
-from mongolock import MongoLock
 from pymongo.database import Database
 
-from application.handlers import shared
+from application.handlers import age_histograms, shared
+from application.read_write_lock import ReadWriteMongoLock
 
+PERCENTILES = [50, 75, 99]
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
 
-def _calculate_age(citizens: List[dict]):
+
+def _load_citizens(citizens: Iterable[dict]) -> Tuple[List[str], np.ndarray, np.ndarray]:
     """
-    Вычисляет возраст всех жителей в переданном списке.
+    Загружает города и даты рождения жителей в массивы numpy.
+
+    Города кодируются целыми числами в порядке первого появления, поэтому дальнейшие вычисления не работают
+    со строками.
+    :param Iterable[dict] citizens: жители с полями town и birth_date
 
-    :param List[dict] citizens: список жителей
+    :return: Названия городов по их кодам, коды городов жителей и даты рождения жителей
+    :rtype: Tuple[List[str], np.ndarray, np.ndarray]
     """
-    days_in_year = 365.2425
+    town_codes = {}
+    codes = array('q')
+    birth_days = array('q')
     for citizen in citizens:
-        citizen['age'] = int((datetime.utcnow() - citizen['birth_date']).days / days_in_year)
+        codes.append(town_codes.setdefault(citizen['town'], len(town_codes)))
+        birth_days.append(citizen['birth_date'].toordinal())
+    birth_dates = (np.frombuffer(birth_days, dtype=np.int64) - _EPOCH_ORDINAL).astype('datetime64[D]')
+    return list(town_codes), np.frombuffer(codes, dtype=np.int64), birth_dates
 
 
-def _group_by_town(citizens: List[dict]) -> dict:
+def _get_birth_years_and_days(birth_dates: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
     """
-    Группирует возраст жителей по городам.
+    Разделяет даты рождения на год и день в году, записанный числом вида ММДД.
 
-    :param dict citizens: список жителей
+    :param np.ndarray birth_dates: даты рождения жителей
 
-    :return: возрасты всех жителей, сгруппированные по городам
-    :rtype: dict
+    :return: Годы рождения и дни рождения жителей
+    :rtype: Tuple[np.ndarray, np.ndarray]
     """
-    grouped = defaultdict(list)
-    for citizen in citizens:
-        grouped[citizen['town']].append(citizen['age'])
-    return grouped
+    years = birth_dates.astype('datetime64[Y]')
+    months = birth_dates.astype('datetime64[M]')
+    birth_days = ((months - years).astype(np.int64) + 1) * 100 + (birth_dates - months).astype(np.int64) + 1
+    return years.astype(np.int64) + 1970, birth_days
 
 
-def _calculate_percentile(grouped: dict):
+def _calculate_ages(birth_dates: np.ndarray, reference_date: date) -> np.ndarray:
     """
-    Вычисляет процентили p50, p75, p99 по возрастам жителей в городах
+    Вычисляет количество полных лет жителей на указанную дату.
+
+    Житель становится на год старше в день рождения, а родившийся 29 февраля в невисокосный год - 1 марта.
+    :param np.ndarray birth_dates: даты рождения жителей
+    :param date reference_date: дата, на которую вычисляется возраст
 
-    :param dict grouped: возраста жителей, сгруппированные по городам
+    :return: Возраст жителей в полных годах
+    :rtype: np.ndarray
     """
-    for town in grouped:
-        grouped[town] = [round(p, 2) for p in np.percentile(grouped[town], [50, 75, 99], interpolation='linear')]
+    birth_years, birth_days = _get_birth_years_and_days(birth_dates)
+    reference_day = reference_date.month * 100 + reference_date.day
+    return reference_date.year - birth_years - (birth_days > reference_day)
+
+
+def _get_next_age_change(birth_dates: np.ndarray, reference_date: date) -> Optional[date]:
+    """
+    Возвращает ближайшую дату после указанной, в которую меняется возраст хотя бы одного жителя.
+
+    До этой даты возрасты всех жителей, а значит и процентили, остаются такими же, как на указанную дату.
+    :param np.ndarray birth_dates: даты рождения жителей
+    :param date reference_date: дата, на которую вычислен возраст
+
+    :return: Дата ближайшего дня рождения или None, если жителей нет
+    :rtype: Optional[date]
+    """
+    if not len(birth_dates):
+        return None
+    _, birth_days = _get_birth_years_and_days(birth_dates)
+    upcoming_days = birth_days[birth_days > reference_date.month * 100 + reference_date.day]
+    if len(upcoming_days):
+        year, birth_day = reference_date.year, upcoming_days.min()
+    else:
+        year, birth_day = reference_date.year + 1, birth_days.min()
+    month, day = divmod(int(birth_day), 100)
+    if (month, day) == (2, 29) and not calendar.isleap(year):
+        month, day = 3, 1
+    return date(year, month, day)
+
+
+def _calculate_percentiles(codes: np.ndarray, ages: np.ndarray, counts: np.ndarray, towns_count: int) -> np.ndarray:
+    """
+    Вычисляет процентили p50, p75, p99 по возрастам жителей во всех городах за одну сортировку.
+
+    Возрасты задаются столбцами гистограмм: каждый столбец - это город, возраст и количество жителей. Столбцы
+    сортируются по паре (город, возраст), одинаковые столбцы объединяются, после чего процентиль находится
+    бинарным поиском нужного по счету жителя в накопленных количествах. Процентили вычисляются линейной
+    интерполяцией так же, как в np.percentile по развернутому списку возрастов.
+    :param np.ndarray codes: коды городов столбцов
+    :param np.ndarray ages: возраст столбцов
+    :param np.ndarray counts: количество жителей в столбцах, положительное
+    :param int towns_count: количество городов, у каждого из которых есть хотя бы один столбец
+
+    :return: Массив процентилей размера (количество городов, 3), округленных до двух знаков
+    :rtype: np.ndarray
+    """
+    if not len(ages):
+        return np.empty((0, len(PERCENTILES)))
+    min_age = ages.min()
+    width = ages.max() - min_age + 1
+    keys, inverse = np.unique(codes * width + (ages - min_age), return_inverse=True)
+    key_counts = np.bincount(inverse, weights=counts).astype(np.int64)
+    sorted_ages = keys % width + min_age
+    cumulative_counts = np.cumsum(key_counts)
+
+    totals = np.bincount(keys // width, weights=key_counts, minlength=towns_count).astype(np.int64)
+    starts = (np.cumsum(totals) - totals)[:, np.newaxis]
+    positions = (totals - 1)[:, np.newaxis] * (np.asarray(PERCENTILES) / 100)
+    lower = np.floor(positions).astype(np.int64)
+    upper = np.minimum(lower + 1, (totals - 1)[:, np.newaxis])
+    weights = positions - lower
+
+    lower_ages = sorted_ages[np.searchsorted(cumulative_counts, starts + lower, side='right')].astype(np.float64)
+    upper_ages = sorted_ages[np.searchsorted(cumulative_counts, starts + upper, side='right')].astype(np.float64)
+    difference = upper_ages - lower_ages
+    percentiles = np.where(weights >= 0.5, upper_ages - difference * (1 - weights), lower_ages + difference * weights)
+    return np.round(percentiles, 2)
 
 
 def _get_percentiles_representation(percentiles_data: dict) -> dict:
@@ -60,22 +144,83 @@ def _get_percentiles_representation(percentiles_data: dict) -> dict:
     return representation
 
 
-def get_percentile_age(import_id: int, db: Database, lock: MongoLock) -> Tuple[dict, int]:
+def calculate_percentile_age(towns: List[str], codes: np.ndarray, birth_dates: np.ndarray, counts: np.ndarray,
+                             reference_date: date) -> dict:
+    """
+    Вычисляет статистику по городам в разрезе возраста на указанную дату.
+
+    :param List[str] towns: названия городов по их кодам
+    :param np.ndarray codes: коды городов столбцов гистограмм
+    :param np.ndarray birth_dates: даты рождения столбцов гистограмм
+    :param np.ndarray counts: количество жителей в столбцах гистограмм
+    :param date reference_date: дата, на которую вычисляется возраст
+
+    :return: Статистика по городам, упорядоченным по названию, в формате для отправки
+    :rtype: dict
+    """
+    ages = _calculate_ages(birth_dates, reference_date)
+    percentiles = _calculate_percentiles(codes, ages, counts, len(towns))
+    return _get_percentiles_representation(dict(sorted(zip(towns, percentiles.tolist()))))
+
+
+def parse_as_of(as_of: Optional[str]) -> Optional[date]:
+    """
+    Разбирает дату, на которую запрошена статистика по городам.
+
+    :param Optional[str] as_of: дата в формате ДД.ММ.ГГГГ или None, если дата не указана
+    :raises: :class:`ValueError`: Дата указана в неверном формате
+
+    :return: Указанная дата или None, если дата не указана
+    :rtype: Optional[date]
+    """
+    if as_of is None:
+        return None
+    return datetime.strptime(as_of, '%d.%m.%Y').date()
+
+
+def get_expires(birth_dates: np.ndarray, as_of: Optional[date]) -> Optional[datetime]:
     """
-    Возвращает статистику по городам для указанного набора данных в разрезе возраста (полных лет) жителей:
+    Возвращает время по UTC, до которого статистика по городам остается актуальной.
+
+    :param np.ndarray birth_dates: даты рождения столбцов гистограмм
+    :param Optional[date] as_of: дата, на которую вычислена статистика. Если не указана, используется текущая дата
+
+    :return: Начало дня ближайшего изменения возраста или None, если статистика не устаревает
+    :rtype: Optional[datetime]
+    """
+    if as_of is not None:
+        return None
+    next_age_change = _get_next_age_change(birth_dates, datetime.utcnow().date())
+    return datetime.combine(next_age_change, time()) if next_age_change is not None else None
+
+
+def get_percentile_age(import_id: int, db: Database, lock: ReadWriteMongoLock,
+                       as_of: date = None) -> Tuple[dict, int, Optional[datetime]]:
+    """
+    Возвращает статистику по городам для указанного набора данных в разрезе возраста (полных лет) жителей:
     p50, p75, p99, где число - это значение перцентиля.
 
+    Статистика вычисляется по гистограммам дат рождения, сохраненным при загрузке поставки, поэтому время ответа
+    не зависит от количества жителей. Для поставок без гистограмм загружаются сами жители.
+
     :param int import_id: уникальный идентификатор поставки
     :param Database db: объект базы данных, в которую записываются наборы данных о жителях
-    :param MongoLock lock: объект для ограничения одновременного доступа к ресурсам из разных процессов
-
-    :return: статистика по городам в разрезе возраста и http статус
-    :rtype: Tuple[dict, int]
-    """
-    with lock(str(import_id), str(os.getpid()), expire=60, timeout=10):
-        citizens = shared.get_citizens(import_id, db, {'citizens.birth_date': 1, 'citizens.town': 1})
-        _calculate_age(citizens)
-        grouped = _group_by_town(citizens)
-        _calculate_percentile(grouped)
-        percentiles_data = _get_percentiles_representation(grouped)
-        return percentiles_data, 201
+    :param ReadWriteMongoLock lock: объект для ограничения одновременного доступа к ресурсам из разных процессов
+    :param date as_of: дата, на которую вычисляется возраст. Если не указана, используется текущая дата по UTC
+    :raises: :class:`ImportNotFoundError`: Завершенная поставка с указанным уникальным идентификатором
+        остутствует в базе данных
+
+    :return: статистика по городам в разрезе возраста, http статус и время по UTC, до которого статистика
+        остается актуальной (None, если статистика не устаревает)
+    :rtype: Tuple[dict, int, Optional[datetime]]
+    """
+    with lock.shared(str(import_id), str(os.getpid()), expire=60, timeout=10):
+        shared.check_import_exists(import_id, db)
+        towns, codes, birth_dates, counts = age_histograms.read_histograms(import_id, db)
+        if towns is None:
+            citizens = shared.find_citizens(import_id, db, {'_id': 0, 'birth_date': 1, 'town': 1})
+            towns, codes, birth_dates = _load_citizens(citizens)
+            counts = np.ones(len(codes), dtype=np.int64)
+        reference_date = as_of or datetime.utcnow().date()
+        percentile_age_data = calculate_percentile_age(towns, codes, birth_dates, counts, reference_date)
+        return percentile_age_data, 201, get_expires(birth_dates, as_of)
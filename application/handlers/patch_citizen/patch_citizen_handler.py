@@ -2,13 +2,16 @@ import os
 from datetime import datetime
 from typing import Tuple
 
-from mongolock import MongoLock
 from pymongo import ReturnDocument
 from pymongo.client_session import ClientSession
 from pymongo.database import Database
 from pymongo.errors import PyMongoError
 
+from application.handlers import shared
+from application.handlers.patch_citizen.update_birthdays import update_birthdays
+from application.handlers.patch_citizen.update_percentile_age import update_percentile_age
 from application.handlers.patch_citizen.update_relatives import update_relatives
+from application.read_write_lock import ReadWriteMongoLock
 
 
 def _parse_birth_date(patch_data: dict):
@@ -22,10 +25,13 @@ def _parse_birth_date(patch_data: dict):
 
 
 def _write_citizen_update(citizen_id: int, import_id: int, patch_data: dict, db: Database,
-                          session: ClientSession) -> dict:
+                          session: ClientSession) -> Tuple[dict, dict]:
     """
     Записывает обновление информации о жителе в базу данных.
 
+    Информация до обновления возвращается тем же запросом, что и запись, а информация после обновления
+    получается наложением новых данных на нее.
+
     :param int citizen_id: Уникальный идентификатор модифицируемого жителя
     :param int import_id: Уникальный идентификатор поставки
     :param dict patch_data: Новая информация о жителе
@@ -33,73 +39,21 @@ def _write_citizen_update(citizen_id: int, import_id: int, patch_data: dict, db:
     :param ClientSession session: сессия соединения с базой данных, через которую производятся все запросы
     :raises: :class:`PyMongoError`: Объект с указанным уникальным идентификатором не был найден в базе данных
 
-    :return: Обновленная информация о жителе
-    :rtype: dict
+    :return: Пара из информации о жителе до и после обновления
+    :rtype: Tuple[dict, dict]
     """
-    update_data = {'$set': {f'citizens.$.{key}': val for key, val in patch_data.items()}}
-    projection = {'_id': 0, 'import_id': 0, 'citizens': {'$elemMatch': {'citizen_id': citizen_id}}}
-
-    db_response: dict = db['imports'].find_one_and_update(
-        filter={'import_id': import_id, 'citizens.citizen_id': citizen_id}, update=update_data,
-        projection=projection, return_document=ReturnDocument.AFTER, session=session)
+    db_response: dict = db['citizens'].find_one_and_update(
+        filter={'import_id': import_id, 'citizen_id': citizen_id},
+        update={'$set': shared.with_birth_month(patch_data)},
+        projection=shared.CITIZEN_PROJECTION, return_document=ReturnDocument.BEFORE, session=session)
 
     if db_response is None:
-        raise PyMongoError('Import or citizen with specified id not found')
-    return db_response
-
-
-def _get_citizen_data(db_response: dict) -> dict:
-    """
-    Извлекает информацию о жителе из полученной из базы данных информации о поставке.
-
-    Так же преобразует birth_date из datetime в строку
-    :param dict db_response: информация о поставке из базы данных
+        raise PyMongoError(shared.CITIZEN_NOT_FOUND_MESSAGE)
+    return db_response, {**db_response, **patch_data}
 
-    :return: Информация о жителе
-    :rtype: dict
-    """
-    citizen_data = db_response['citizens'][0]
-    birth_date = citizen_data['birth_date']
-    citizen_data['birth_date'] = birth_date.strftime('%d.%m.%Y')
-    return citizen_data
-
-
-def _delete_birthdays_data(import_id: int, patch_data: dict, lock: MongoLock, db: Database, session: ClientSession):
-    """
-    Удаляет сохраненные данные о подарках для указанной поставки при наличии поля relatives или birth_date
-    в новых данных о жителе
 
-    :param int import_id уникальный идентификатор поставки:
-    :param dict patch_data: новые данные о жителе
-    :param MongoLock lock: объект для ограничения одновременного доступа к ресурсам из разных процессов
-    :param Database db: объект базы данных, в которую записываются наборы данных о жителях
-    :param ClientSession session: сессия соединения с базой данных, через которую производятся все запросы
-    """
-    if 'relatives' not in patch_data and 'birth_date' not in patch_data:
-        return
-    with lock(f'birthdays_{import_id}', str(os.getpid()), timeout=60, expire=10):
-        db['birthdays'].delete_one({'import_id': import_id}, session=session)
-
-
-def _delete_percentile_age_data(import_id: int, patch_data: dict, lock: MongoLock, db: Database,
-                                session: ClientSession):
-    """
-    Удаляет сохраненные данные о возрастах по городам для указанной поставки при наличии поля town или birth_date
-    в новых данных о жителе
-
-    :param int import_id уникальный идентификатор поставки:
-    :param dict patch_data: новые данные о жителе
-    :param MongoLock lock: объект для ограничения одновременного доступа к ресурсам из разных процессов
-    :param Database db: объект базы данных, в которую записываются наборы данных о жителях
-    :param ClientSession session: сессия соединения с базой данных, через которую производятся все запросы
-    """
-    if 'town' not in patch_data and 'birth_date' not in patch_data:
-        return
-    with lock(f'percentile_age_{import_id}', str(os.getpid()), timeout=60, expire=10):
-        db['percentile_age'].delete_one({'import_id': import_id}, session=session)
-
-
-def patch_citizen(import_id: int, citizen_id: int, patch_data: dict, lock: MongoLock, db: Database) -> Tuple[dict, int]:
+def patch_citizen(import_id: int, citizen_id: int, patch_data: dict, lock: ReadWriteMongoLock,
+                  db: Database) -> Tuple[dict, int]:
     """
     Изменяет информацию о жителе в указанном наборе данных.
     На вход подается JSON в котором можно указать любые данные о жителе.
@@ -107,8 +61,10 @@ def patch_citizen(import_id: int, citizen_id: int, patch_data: dict, lock: Mongo
     :param int import_id: Уникальный идентификатор поставки, в которой изменяется информация о жителе
     :param int citizen_id: Уникальный индентификатор жителя в поставке
     :param dict patch_data: Новая информация о жителе
-    :param MongoLock lock: объект для ограничения одновременного доступа к ресурсам из разных процессов
+    :param ReadWriteMongoLock lock: объект для ограничения одновременного доступа к ресурсам из разных процессов
     :param Database db: объект базы данных, в которую записываются наборы данных о жителях
+    :raises: :class:`ImportNotFoundError`: Завершенная поставка с указанным уникальным идентификатором
+        остутствует в базе данных
 
     :return: Пара из актуальной информации о жителе и http статуса
     :rtype: Tuple[dict, int]
@@ -117,10 +73,11 @@ def patch_citizen(import_id: int, citizen_id: int, patch_data: dict, lock: Mongo
 
     with db.client.start_session() as session, \
             session.start_transaction(), \
-            lock(str(import_id), str(os.getpid()), expire=60, timeout=10):
-        update_relatives(citizen_id, import_id, patch_data, db, session)
-
-        db_response = _write_citizen_update(citizen_id, import_id, patch_data, db, session)
-        _delete_birthdays_data(import_id, patch_data, lock, db, session)
-        _delete_percentile_age_data(import_id, patch_data, lock, db, session)
-        return {'data': _get_citizen_data(db_response)}, 201
+            lock.exclusive(str(import_id), str(os.getpid()), expire=60, timeout=10):
+        shared.check_import_exists(import_id, db, session, shared.CITIZEN_NOT_FOUND_MESSAGE)
+        old_citizen, new_citizen = _write_citizen_update(citizen_id, import_id, patch_data, db, session)
+        to_push, to_pull = update_relatives(citizen_id, import_id, old_citizen, patch_data, db, session)
+        update_birthdays(import_id, old_citizen, new_citizen, to_push, to_pull, lock, db, session)
+        update_percentile_age(import_id, old_citizen, new_citizen, lock, db, session)
+        shared.increment_import_version(import_id, db, session)
+        return {'data': new_citizen}, 201
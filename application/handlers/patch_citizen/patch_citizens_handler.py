@@ -0,0 +1,123 @@
+import os
+from typing import Dict, List, Tuple
+
+from pymongo import UpdateOne
+from pymongo.client_session import ClientSession
+from pymongo.database import Database
+from pymongo.errors import PyMongoError
+from pymongo.results import BulkWriteResult
+
+from application.handlers import shared
+from application.handlers.patch_citizen.patch_citizen_handler import _parse_birth_date
+from application.handlers.patch_citizen.update_birthdays import update_birthdays_batch
+from application.handlers.patch_citizen.update_percentile_age import update_percentile_age_batch
+from application.handlers.patch_citizen.update_relatives import prepare_relatives_update_batch
+from application.read_write_lock import ReadWriteMongoLock
+
+
+def _get_citizens(citizens_ids: List[int], import_id: int, db: Database, session: ClientSession) -> Dict[int, dict]:
+    """
+    Возвращает информацию об указанных жителях одним запросом.
+
+    :param List[int] citizens_ids: Уникальные идентификаторы жителей
+    :param int import_id: Уникальный идентификатор поставки
+    :param Database db: объект базы данных, в которую записываются наборы данных о жителях
+    :param ClientSession session: сессия соединения с базой данных, через которую производятся все запросы
+    :raises: :class:`PyMongoError`: Объект с указанным уникальным идентификатором не был найден в базе данных
+
+    :return: Словарь информации о жителях по их идентификаторам
+    :rtype: Dict[int, dict]
+    """
+    citizens = db['citizens'].find({'import_id': import_id, 'citizen_id': {'$in': citizens_ids}},
+                                   shared.CITIZEN_PROJECTION, session=session)
+    citizens = {citizen['citizen_id']: citizen for citizen in citizens}
+    if len(citizens) != len(citizens_ids):
+        raise PyMongoError(shared.CITIZEN_NOT_FOUND_MESSAGE)
+    return citizens
+
+
+def _make_citizens_requests(old_citizens: Dict[int, dict], new_citizens: Dict[int, dict],
+                            import_id: int) -> List[UpdateOne]:
+    """
+    Создает запросы на обновление модифицируемых жителей, в которые входят только изменившиеся поля.
+
+    Вместе с изменившейся датой рождения записывается месяц рождения.
+
+    :param Dict[int, dict] old_citizens: информация о жителях до модификации по их идентификаторам
+    :param Dict[int, dict] new_citizens: информация о жителях после модификации по их идентификаторам
+    :param int import_id: Уникальный идентификатор поставки
+
+    :return: Список из запросов к базе данных на обновление одного документа
+    :rtype: List[UpdateOne]
+    """
+    db_requests = []
+    for citizen_id, new_citizen in new_citizens.items():
+        old_citizen = old_citizens[citizen_id]
+        update = {key: value for key, value in new_citizen.items() if old_citizen.get(key) != value}
+        if update:
+            db_requests.append(UpdateOne({'import_id': import_id, 'citizen_id': citizen_id},
+                                         {'$set': shared.with_birth_month(update)}))
+    return db_requests
+
+
+def _write_citizens_update(db_requests: list, expected_count: int, db: Database, session: ClientSession):
+    """
+    При наличии запросов производит их запись в базу данных одной пакетной записью.
+
+    :param list db_requests: Список запросов к базе данных на обновление жителей и их родственников
+    :param int expected_count: Количество документов жителей, которые должны быть найдены запросами
+    :param Database db: объект базы данных, в которую записываются наборы данных о жителях
+    :param ClientSession session: сессия соединения с базой данных, через которую производятся все запросы
+    :raises: :class:`PyMongoError`: Объект с указанным уникальным идентификатором не был найден в базе данных
+    """
+    if db_requests:
+        bulk_response: BulkWriteResult = db['citizens'].bulk_write(db_requests, ordered=False, session=session)
+        if bulk_response.matched_count != expected_count:
+            raise PyMongoError(shared.CITIZEN_NOT_FOUND_MESSAGE)
+
+
+def patch_citizens(import_id: int, patches: List[dict], lock: ReadWriteMongoLock, db: Database) -> Tuple[dict, int]:
+    """
+    Изменяет информацию о нескольких жителях в указанном наборе данных.
+
+    Результат такой же, как при модификации жителей по одной в указанном порядке, но все изменения, в том числе
+    родственников, вычисляются заранее и записываются одной пакетной записью в одной транзакции под одной
+    блокировкой поставки, а сохраненные данные о подарках и возрастах обновляются один раз.
+    :param int import_id: Уникальный идентификатор поставки, в которой изменяется информация о жителях
+    :param List[dict] patches: Новая информация о жителях с уникальным идентификатором жителя в поле citizen_id
+    :param ReadWriteMongoLock lock: объект для ограничения одновременного доступа к ресурсам из разных процессов
+    :param Database db: объект базы данных, в которую записываются наборы данных о жителях
+    :raises: :class:`ImportNotFoundError`: Завершенная поставка с указанным уникальным идентификатором
+        остутствует в базе данных
+    :raises: :class:`PyMongoError`: Объект с указанным уникальным идентификатором не был найден в базе данных
+
+    :return: Пара из актуальной информации о жителях в порядке модификаций и http статуса
+    :rtype: Tuple[dict, int]
+    """
+    for patch_data in patches:
+        _parse_birth_date(patch_data)
+    citizens_ids = [patch_data['citizen_id'] for patch_data in patches]
+
+    with db.client.start_session() as session, \
+            session.start_transaction(), \
+            lock.exclusive(str(import_id), str(os.getpid()), expire=60, timeout=10):
+        shared.check_import_exists(import_id, db, session, shared.CITIZEN_NOT_FOUND_MESSAGE)
+        old_citizens = _get_citizens(citizens_ids, import_id, db, session)
+        relatives = {citizen_id: list(citizen['relatives']) for citizen_id, citizen in old_citizens.items()}
+        relatives_changes, relatives_requests = prepare_relatives_update_batch(relatives, patches, import_id, db,
+                                                                               session)
+        new_citizens = {patch_data['citizen_id']: {**old_citizens[patch_data['citizen_id']], **patch_data}
+                        for patch_data in patches}
+        for citizen_id, citizen_relatives in relatives.items():
+            new_citizens[citizen_id]['relatives'] = citizen_relatives
+
+        citizens_requests = _make_citizens_requests(old_citizens, new_citizens, import_id)
+        _write_citizens_update(citizens_requests + relatives_requests,
+                               len(citizens_requests) + len(relatives_changes), db, session)
+
+        old_citizens = [old_citizens[citizen_id] for citizen_id in citizens_ids]
+        new_citizens = [new_citizens[citizen_id] for citizen_id in citizens_ids]
+        update_birthdays_batch(import_id, old_citizens, new_citizens, relatives_changes, lock, db, session)
+        update_percentile_age_batch(import_id, old_citizens, new_citizens, lock, db, session)
+        shared.increment_import_version(import_id, db, session)
+        return {'data': new_citizens}, 201
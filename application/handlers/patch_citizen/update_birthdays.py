@@ -0,0 +1,186 @@
+import os
+from collections import defaultdict
+from typing import Dict, List, Set, Tuple
+
+from mongolock import MongoLock
+from pymongo.client_session import ClientSession
+from pymongo.database import Database
+
+from application import response_body
+
+
+def _get_relatives_months(relatives_ids: Set[int], import_id: int, db: Database,
+                          session: ClientSession) -> Dict[int, int]:
+    """
+    Возвращает месяцы рождения указанных жителей.
+
+    :param Set[int] relatives_ids: уникальные идентификаторы жителей
+    :param int import_id: уникальный идентификатор поставки
+    :param Database db: объект базы данных, в которую записываются наборы данных о жителях
+    :param ClientSession session: сессия соединения с базой данных, через которую производятся все запросы
+
+    :return: Словарь месяцев рождения по идентификаторам жителей
+    :rtype: Dict[int, int]
+    """
+    if not relatives_ids:
+        return {}
+    relatives = db['citizens'].find({'import_id': import_id, 'citizen_id': {'$in': list(relatives_ids)}},
+                                    {'_id': 0, 'citizen_id': 1, 'birth_date': 1}, session=session)
+    return {relative['citizen_id']: relative['birth_date'].month for relative in relatives}
+
+
+def _get_birthdays_difference(old_citizen: dict, new_citizen: dict, to_push: Set[int], to_pull: Set[int],
+                              relatives_months: Dict[int, int]) -> Dict[Tuple[int, int], int]:
+    """
+    Вычисляет изменение количества подарков по месяцам после модификации жителя.
+
+    Подарки, которые покупает сам житель, переносятся из старого месяца его рождения со старыми родственниками
+    в новый месяц рождения с новыми родственниками. Добавленные и удаленные родственники начинают или перестают
+    покупать подарок жителю в месяц своего рождения.
+    :param dict old_citizen: информация о жителе до модификации
+    :param dict new_citizen: информация о жителе после модификации
+    :param Set[int] to_push: родственники, добавленные жителю
+    :param Set[int] to_pull: родственники, удаленные у жителя
+    :param Dict[int, int] relatives_months: месяцы рождения добавленных и удаленных родственников
+
+    :return: Ненулевые изменения количества подарков по парам (месяц, идентификатор жителя)
+    :rtype: Dict[Tuple[int, int], int]
+    """
+    citizen_id = new_citizen['citizen_id']
+    relatives_changes = {**{(relative_id, citizen_id): 1 for relative_id in to_push},
+                         **{(relative_id, citizen_id): -1 for relative_id in to_pull}}
+    return _get_batch_birthdays_difference([old_citizen], [new_citizen], relatives_changes, relatives_months)
+
+
+def _get_batch_birthdays_difference(old_citizens: List[dict], new_citizens: List[dict],
+                                    relatives_changes: Dict[Tuple[int, int], int],
+                                    relatives_months: Dict[int, int]) -> Dict[Tuple[int, int], int]:
+    """
+    Вычисляет изменение количества подарков по месяцам после модификации нескольких жителей.
+
+    Подарки, которые покупают модифицированные жители, переносятся так же, как в _get_birthdays_difference.
+    Остальные жители, у которых изменились родственники, начинают или перестают покупать подарок
+    добавленному или удаленному родственнику в месяц своего рождения.
+    :param List[dict] old_citizens: информация о модифицированных жителях до модификации
+    :param List[dict] new_citizens: информация о тех же жителях после модификации
+    :param Dict[Tuple[int, int], int] relatives_changes: изменения по парам (идентификатор немодифицированного
+        жителя, идентификатор родственника): 1, если родственник добавлен, и -1, если удален
+    :param Dict[int, int] relatives_months: месяцы рождения немодифицированных жителей из relatives_changes
+
+    :return: Ненулевые изменения количества подарков по парам (месяц, идентификатор жителя)
+    :rtype: Dict[Tuple[int, int], int]
+    """
+    difference = defaultdict(int)
+    for old_citizen, new_citizen in zip(old_citizens, new_citizens):
+        for relative_id in old_citizen['relatives']:
+            difference[old_citizen['birth_date'].month, relative_id] -= 1
+        for relative_id in new_citizen['relatives']:
+            difference[new_citizen['birth_date'].month, relative_id] += 1
+
+    for (citizen_id, relative_id), value in relatives_changes.items():
+        difference[relatives_months[citizen_id], relative_id] += value
+    return {key: value for key, value in difference.items() if value}
+
+
+def _apply_birthdays_difference(months: dict, difference: Dict[Tuple[int, int], int]) -> dict:
+    """
+    Применяет изменение количества подарков к сохраненным данным о подарках.
+
+    Жители, у которых количество подарков стало нулевым, удаляются, порядок жителей по идентификатору сохраняется.
+    :param dict months: сохраненные данные о подарках по месяцам
+    :param Dict[Tuple[int, int], int] difference: изменения количества подарков по парам (месяц, идентификатор жителя)
+
+    :return: Новые данные о подарках для затронутых месяцев
+    :rtype: dict
+    """
+    presents = {month: {item['citizen_id']: item['presents'] for item in months.get(str(month), [])}
+                for month, _ in difference}
+    for (month, citizen_id), value in difference.items():
+        presents[month][citizen_id] = presents[month].get(citizen_id, 0) + value
+    return {str(month): [{'citizen_id': citizen_id, 'presents': value}
+                         for citizen_id, value in sorted(month_presents.items()) if value]
+            for month, month_presents in presents.items()}
+
+
+def update_birthdays(import_id: int, old_citizen: dict, new_citizen: dict, to_push: Set[int], to_pull: Set[int],
+                     lock: MongoLock, db: Database, session: ClientSession):
+    """
+    Обновляет сохраненные данные о подарках для указанной поставки после модификации жителя.
+
+    Вместо удаления сохраненных данных изменяются только затронутые месяцы, поэтому следующий запрос подарков
+    не пересчитывает всю поставку. Если данные о подарках еще не сохранены, ничего не происходит.
+    :param int import_id: уникальный идентификатор поставки
+    :param dict old_citizen: информация о жителе до модификации
+    :param dict new_citizen: информация о жителе после модификации
+    :param Set[int] to_push: родственники, добавленные жителю
+    :param Set[int] to_pull: родственники, удаленные у жителя
+    :param MongoLock lock: объект для ограничения одновременного доступа к ресурсам из разных процессов
+    :param Database db: объект базы данных, в которую записываются наборы данных о жителях
+    :param ClientSession session: сессия соединения с базой данных, через которую производятся все запросы
+    """
+    if old_citizen['birth_date'].month == new_citizen['birth_date'].month and not to_push and not to_pull:
+        return
+    with lock(f'birthdays_{import_id}', str(os.getpid()), timeout=60, expire=10):
+        if not db['birthdays'].count_documents({'import_id': import_id}, limit=1, session=session):
+            return
+        relatives_months = _get_relatives_months(to_push | to_pull, import_id, db, session)
+        difference = _get_birthdays_difference(old_citizen, new_citizen, to_push, to_pull, relatives_months)
+        _write_birthdays_difference(import_id, difference, db, session)
+
+
+def update_birthdays_batch(import_id: int, old_citizens: List[dict], new_citizens: List[dict],
+                           relatives_changes: Dict[Tuple[int, int], int], lock: MongoLock, db: Database,
+                           session: ClientSession):
+    """
+    Обновляет сохраненные данные о подарках для указанной поставки после модификации нескольких жителей.
+
+    Изменения всех жителей суммируются, поэтому сохраненные данные изменяются одной записью.
+    Если данные о подарках еще не сохранены, ничего не происходит.
+    :param int import_id: уникальный идентификатор поставки
+    :param List[dict] old_citizens: информация о модифицированных жителях до модификации
+    :param List[dict] new_citizens: информация о тех же жителях после модификации
+    :param Dict[Tuple[int, int], int] relatives_changes: изменения по парам (идентификатор немодифицированного
+        жителя, идентификатор родственника): 1, если родственник добавлен, и -1, если удален
+    :param MongoLock lock: объект для ограничения одновременного доступа к ресурсам из разных процессов
+    :param Database db: объект базы данных, в которую записываются наборы данных о жителях
+    :param ClientSession session: сессия соединения с базой данных, через которую производятся все запросы
+    """
+    if not relatives_changes and all(
+            old_citizen['birth_date'].month == new_citizen['birth_date'].month
+            and old_citizen['relatives'] == new_citizen['relatives']
+            for old_citizen, new_citizen in zip(old_citizens, new_citizens)):
+        return
+    with lock(f'birthdays_{import_id}', str(os.getpid()), timeout=60, expire=10):
+        if not db['birthdays'].count_documents({'import_id': import_id}, limit=1, session=session):
+            return
+        relatives_months = _get_relatives_months({citizen_id for citizen_id, _ in relatives_changes}, import_id, db,
+                                                 session)
+        difference = _get_batch_birthdays_difference(old_citizens, new_citizens, relatives_changes, relatives_months)
+        _write_birthdays_difference(import_id, difference, db, session)
+
+
+def _write_birthdays_difference(import_id: int, difference: Dict[Tuple[int, int], int], db: Database,
+                                session: ClientSession):
+    """
+    Применяет изменение количества подарков к затронутым месяцам сохраненных данных о подарках.
+
+    Тело ответа не сериализуется и не сжимается под блокировкой, а удаляется и собирается при следующем запросе
+    подарков. Документы, сохраненные только с телом ответа, удаляются.
+    Должна вызываться под блокировкой данных о подарках указанной поставки.
+    :param int import_id: уникальный идентификатор поставки
+    :param Dict[Tuple[int, int], int] difference: изменения количества подарков по парам (месяц, идентификатор жителя)
+    :param Database db: объект базы данных, в которую записываются наборы данных о жителях
+    :param ClientSession session: сессия соединения с базой данных, через которую производятся все запросы
+    """
+    if not difference:
+        return
+
+    projection = {'_id': 0, **{f'data.{month}': 1 for month, _ in difference}}
+    cached_data = db['birthdays'].find_one({'import_id': import_id}, projection, session=session)
+    if 'data' not in cached_data:
+        db['birthdays'].delete_one({'import_id': import_id}, session=session)
+        return
+    months = _apply_birthdays_difference(cached_data['data'], difference)
+    update = {'$set': {f'data.{month}': value for month, value in months.items()}}
+    db['birthdays'].update_one({'import_id': import_id}, response_body.make_invalidating_update(update),
+                               session=session)
@@ -0,0 +1,84 @@
+import os
+from datetime import datetime
+from typing import List
+
+from mongolock import MongoLock
+from pymongo.client_session import ClientSession
+from pymongo.database import Database
+
+from application import response_body
+from application.handlers import age_histograms
+from application.handlers.get_percentile_age_handler import calculate_percentile_age, get_expires, parse_as_of
+
+
+def update_percentile_age(import_id: int, old_citizen: dict, new_citizen: dict, lock: MongoLock, db: Database,
+                          session: ClientSession):
+    """
+    Обновляет гистограммы дат рождения и сохраненные данные о возрастах по городам после модификации жителя.
+
+    При изменении города или даты рождения житель переносится в другой столбец гистограмм, после чего
+    сохраненные данные о возрастах на каждую из дат, если они есть, пересчитываются по гистограммам вместо
+    удаления. Для поставок, загруженных без гистограмм, сохраненные данные удаляются.
+    :param int import_id: уникальный идентификатор поставки
+    :param dict old_citizen: информация о жителе до модификации
+    :param dict new_citizen: информация о жителе после модификации
+    :param MongoLock lock: объект для ограничения одновременного доступа к ресурсам из разных процессов
+    :param Database db: объект базы данных, в которую записываются наборы данных о жителях
+    :param ClientSession session: сессия соединения с базой данных, через которую производятся все запросы
+    """
+    if old_citizen['town'] == new_citizen['town'] and old_citizen['birth_date'] == new_citizen['birth_date']:
+        return
+    histograms_found = age_histograms.move_citizen(import_id, old_citizen, new_citizen, db, session)
+    with lock(f'percentile_age_{import_id}', str(os.getpid()), timeout=60, expire=10):
+        _update_cached_percentile_age(import_id, histograms_found, db, session)
+
+
+def update_percentile_age_batch(import_id: int, old_citizens: List[dict], new_citizens: List[dict], lock: MongoLock,
+                                db: Database, session: ClientSession):
+    """
+    Обновляет гистограммы дат рождения и сохраненные данные о возрастах по городам после модификации нескольких
+    жителей.
+
+    Гистограммы обновляются одной пакетной записью, а сохраненные данные пересчитываются один раз для всех жителей.
+    :param int import_id: уникальный идентификатор поставки
+    :param List[dict] old_citizens: информация о жителях до модификации
+    :param List[dict] new_citizens: информация о тех же жителях после модификации
+    :param MongoLock lock: объект для ограничения одновременного доступа к ресурсам из разных процессов
+    :param Database db: объект базы данных, в которую записываются наборы данных о жителях
+    :param ClientSession session: сессия соединения с базой данных, через которую производятся все запросы
+    """
+    moved = [(old_citizen, new_citizen) for old_citizen, new_citizen in zip(old_citizens, new_citizens)
+             if old_citizen['town'] != new_citizen['town'] or old_citizen['birth_date'] != new_citizen['birth_date']]
+    if not moved:
+        return
+    histograms_found = age_histograms.move_citizens(import_id, [old_citizen for old_citizen, _ in moved],
+                                                    [new_citizen for _, new_citizen in moved], db, session)
+    with lock(f'percentile_age_{import_id}', str(os.getpid()), timeout=60, expire=10):
+        _update_cached_percentile_age(import_id, histograms_found, db, session)
+
+
+def _update_cached_percentile_age(import_id: int, histograms_found: bool, db: Database, session: ClientSession):
+    """
+    Пересчитывает по гистограммам сохраненные данные о возрастах по городам на каждую из дат.
+
+    Тело ответа не сериализуется и не сжимается под блокировкой, а удаляется и собирается при следующем запросе.
+    Должна вызываться под блокировкой данных о возрастах указанной поставки.
+    :param int import_id: уникальный идентификатор поставки
+    :param bool histograms_found: были ли найдены гистограммы поставки. Если нет, сохраненные данные удаляются
+    :param Database db: объект базы данных, в которую записываются наборы данных о жителях
+    :param ClientSession session: сессия соединения с базой данных, через которую производятся все запросы
+    """
+    if not histograms_found:
+        db['percentile_age'].delete_many({'import_id': import_id}, session=session)
+        return
+    cached_entries = list(db['percentile_age'].find({'import_id': import_id}, {'as_of': 1}, session=session))
+    if not cached_entries:
+        return
+    towns, codes, birth_dates, counts = age_histograms.read_histograms(import_id, db, session)
+    for cached_entry in cached_entries:
+        as_of = parse_as_of(cached_entry.get('as_of'))
+        percentile_age_data = calculate_percentile_age(towns, codes, birth_dates, counts,
+                                                       as_of or datetime.utcnow().date())
+        update = {'$set': {**percentile_age_data, 'expires': get_expires(birth_dates, as_of)}}
+        db['percentile_age'].update_one({'_id': cached_entry['_id']}, response_body.make_invalidating_update(update),
+                                        session=session)
@@ -1,4 +1,5 @@
-from typing import Set, Tuple, List
+from collections import defaultdict
+from typing import Dict, List, Set, Tuple
 
 from pymongo import UpdateMany
 from pymongo.client_session import ClientSession
@@ -12,8 +13,9 @@ def _make_update_relatives_request(operation: str, import_id: int, citizen_id: i
     Создает объект запроса к базе данных для изменения
     списка уникальных идентификаторов родственников у нескольких жителей.
 
-    В запросе происходит вставка/удаление citizen_id в/из списка родственников у всех жителей данной в данной
-    поставке, индекс которых находится в relative_ids.
+    В запросе происходит вставка/удаление citizen_id в/из списка родственников у всех жителей в данной
+    поставке, индекс которых находится в relative_ids. Каждый житель хранится отдельным документом,
+    поэтому запрос затрагивает только документы родственников.
     :param str operation: Имя операции - $push или $pull для вставки и удаления родственника соответственно
     :param int import_id: Уникальный идентификатор поставки, в которой модифицируется житель
     :param int citizen_id: Уникальный идентификатор модифицируемого жителя
@@ -26,9 +28,8 @@ def _make_update_relatives_request(operation: str, import_id: int, citizen_id: i
     """
     if operation not in ['$push', '$pull']:
         raise ValueError(f'Operation {operation} is not valid operation')
-    return UpdateMany({'import_id': import_id},
-                      {operation: {'citizens.$[element].relatives': citizen_id}},
-                      array_filters=[{'element.citizen_id': {'$in': relatives_ids}}])
+    return UpdateMany({'import_id': import_id, 'citizen_id': {'$in': relatives_ids}},
+                      {operation: {'relatives': citizen_id}})
 
 
 def _make_db_requests(to_push: Set[int], to_pull: Set[int], import_id: int, citizen_id: int) -> List[UpdateMany]:
@@ -51,28 +52,6 @@ def _make_db_requests(to_push: Set[int], to_pull: Set[int], import_id: int, citi
     return db_requests
 
 
-def _get_relatives(citizen_id: int, import_id: int, db: Database, session: ClientSession) -> Set[int]:
-    """
-    Возвращает сет родственников указанного жителя в указанной поставке.
-
-    :param int citizen_id: Уникальный идентификатор жителя, чьих родственников необходимо вернуть
-    :param int import_id: Уникальный индетификатор поставки, в которой ищется житель
-    :param Database db: объект базы данных, в которую записываются наборы данных о жителях
-    :param ClientSession session: сессия соединения с базой данных, через которую производятся все запросы
-    :raises: :class:`PyMongoError`: Объект с указанным уникальным идентификатором не был найден в базе данных
-
-    :return: сет родственников указанного жителя в указанной поставке
-    :rtype: Set[int]
-    """
-    db_response: dict = db['imports'].find_one({'import_id': import_id, 'citizens.citizen_id': citizen_id},
-                                               {'citizens': {'$elemMatch': {'citizen_id': citizen_id}}},
-                                               session=session)
-    if db_response is None:
-        raise PyMongoError('Import or citizen with specified id not found')
-    relatives = set(db_response['citizens'][0]['relatives'])
-    return relatives
-
-
 def _get_relatives_difference(old_relatives: Set[int], patch_data: dict) -> Tuple[Set[int], Set[int]]:
     """
     Находит уникальные идентификаторы родственников, у которых нужно добавить/убрать из поля relatives
@@ -104,43 +83,138 @@ def _check_all_citizens_exist(citizens_ids: Set[int], import_id: int, db: Databa
     if not citizens_ids:
         return
 
-    count = db['imports'].count_documents(
-        {'import_id': import_id, 'citizens.citizen_id': {'$all': list(citizens_ids)}}, session=session, limit=1)
-    if count == 0:
+    count = db['citizens'].count_documents(
+        {'import_id': import_id, 'citizen_id': {'$in': list(citizens_ids)}}, session=session)
+    if count != len(citizens_ids):
         raise PyMongoError('Citizens with specified id not found')
 
 
-def _write_relatives_update(db_requests: List[UpdateMany], db: Database, session: ClientSession):
+def _write_relatives_update(db_requests: List[UpdateMany], expected_count: int, db: Database,
+                            session: ClientSession):
     """
     При наличии запросов в db_request производит их запись в базу данных.
 
     :param List[UpdateMany] db_requests: Список запросов к базе данных на обновление множества документов
+    :param int expected_count: Количество документов жителей, которые должны быть изменены запросами
     :param Database db: объект базы данных, в которую записываются наборы данных о жителях
     :param ClientSession session: сессия соединения с базой данных, через которую производятся все запросы
     :raises: :class:`PyMongoError`: Объект с указанным уникальным идентификатором не был найден в базе данных
     """
     if db_requests:
-        bulk_response: BulkWriteResult = db['imports'].bulk_write(db_requests, session=session)
-        if bulk_response.modified_count != len(db_requests):
-            raise PyMongoError('Import with specified id not found')
+        bulk_response: BulkWriteResult = db['citizens'].bulk_write(db_requests, ordered=False, session=session)
+        if bulk_response.modified_count != expected_count:
+            raise PyMongoError('Citizens with specified id not found')
 
 
-def update_relatives(citizen_id: int, import_id: int, patch_data: dict, db: Database, session: ClientSession):
+def update_relatives(citizen_id: int, import_id: int, old_citizen: dict, patch_data: dict, db: Database,
+                     session: ClientSession) -> Tuple[Set[int], Set[int]]:
     """
     При наличии поля relatives в patch_data производит обновление поля relatives
     у всех родственников обновляемого жителя.
 
+    Старые родственники берутся из информации о жителе, полученной при записи его обновления, а наличие
+    добавленных родственников проверяется по количеству измененных документов, поэтому обновление выполняется
+    одной пакетной записью без дополнительных запросов.
     :param int citizen_id: Уникальный индентификатор обновляемого жителя
     :param int import_id: Уникальный идентификатор поставки, в которой обновляется житель
+    :param dict old_citizen: Информация о жителе до обновления
     :param dict patch_data: Новые данные жителя
     :param Database db: объект базы данных, в которую записываются наборы данных о жителях
     :param ClientSession session: сессия соединения с базой данных, через которую производятся все запросы
+    :raises: :class:`PyMongoError`: Добавленный родственник не был найден в базе данных
+
+    :return: Пара сетов добавленных и удаленных родственников жителя
+    :rtype: Tuple[Set[int], Set[int]]
     """
     if 'relatives' not in patch_data:
-        return
+        return set(), set()
 
-    old_relatives = _get_relatives(citizen_id, import_id, db, session)
-    to_push, to_pull = _get_relatives_difference(old_relatives, patch_data)
-    _check_all_citizens_exist(to_push, import_id, db, session)
+    to_push, to_pull = _get_relatives_difference(set(old_citizen['relatives']), patch_data)
     db_requests = _make_db_requests(to_push, to_pull, import_id, citizen_id)
-    _write_relatives_update(db_requests, db, session)
+    _write_relatives_update(db_requests, len(to_push) + len(to_pull), db, session)
+    return to_push, to_pull
+
+
+def _get_batch_relatives_changes(relatives: Dict[int, List[int]],
+                                 patches: List[dict]) -> Tuple[Dict[Tuple[int, int], int], Set[int]]:
+    """
+    Применяет изменения родственников из модификаций нескольких жителей по порядку, как если бы
+    модификации выполнялись по одной.
+
+    Списки родственников модифицируемых жителей изменяются на месте, а для остальных жителей накапливается
+    итоговое изменение, поэтому добавление и последующее удаление одного родственника взаимно уничтожаются.
+    :param Dict[int, List[int]] relatives: списки родственников модифицируемых жителей по их идентификаторам
+    :param List[dict] patches: модификации жителей с идентификатором жителя в поле citizen_id
+
+    :return: Ненулевые изменения по парам (идентификатор немодифицируемого жителя, идентификатор родственника):
+        1, если родственник добавлен, и -1, если удален, а также идентификаторы немодифицируемых жителей,
+        которым добавлялись родственники
+    :rtype: Tuple[Dict[Tuple[int, int], int], Set[int]]
+    """
+    relatives_changes = defaultdict(int)
+    pushed_ids = set()
+    for patch_data in patches:
+        if 'relatives' not in patch_data:
+            continue
+        citizen_id = patch_data['citizen_id']
+        to_push, to_pull = _get_relatives_difference(set(relatives[citizen_id]), patch_data)
+        relatives[citizen_id] = list(patch_data['relatives'])
+        for relative_id in to_push:
+            if relative_id in relatives:
+                relatives[relative_id].append(citizen_id)
+            else:
+                relatives_changes[relative_id, citizen_id] += 1
+                pushed_ids.add(relative_id)
+        for relative_id in to_pull:
+            if relative_id in relatives:
+                if citizen_id in relatives[relative_id]:
+                    relatives[relative_id].remove(citizen_id)
+            else:
+                relatives_changes[relative_id, citizen_id] -= 1
+    return {key: value for key, value in relatives_changes.items() if value}, pushed_ids
+
+
+def _make_batch_db_requests(relatives_changes: Dict[Tuple[int, int], int], import_id: int) -> List[UpdateMany]:
+    """
+    Создает запросы для применения изменений родственников немодифицируемых жителей, по одному запросу
+    вставки и удаления на каждого модифицируемого жителя.
+
+    :param Dict[Tuple[int, int], int] relatives_changes: изменения по парам (идентификатор немодифицируемого
+        жителя, идентификатор родственника): 1, если родственник добавлен, и -1, если удален
+    :param int import_id: уникальный идентификатор поставки
+
+    :return: Список из запросов к базе данных на обновление множества документов
+    :rtype: List[UpdateMany]
+    """
+    to_push, to_pull = defaultdict(set), defaultdict(set)
+    for (citizen_id, relative_id), value in relatives_changes.items():
+        (to_push if value > 0 else to_pull)[relative_id].add(citizen_id)
+    db_requests = []
+    for relative_id in sorted(to_push.keys() | to_pull.keys()):
+        db_requests.extend(_make_db_requests(to_push.get(relative_id, set()), to_pull.get(relative_id, set()),
+                                             import_id, relative_id))
+    return db_requests
+
+
+def prepare_relatives_update_batch(
+        relatives: Dict[int, List[int]], patches: List[dict], import_id: int, db: Database,
+        session: ClientSession) -> Tuple[Dict[Tuple[int, int], int], List[UpdateMany]]:
+    """
+    Вычисляет общее изменение родственников для модификаций нескольких жителей и создает запросы для его записи.
+
+    Запросы не выполняются, чтобы их можно было отправить одной пакетной записью вместе с обновлениями
+    самих жителей.
+    :param Dict[int, List[int]] relatives: списки родственников модифицируемых жителей по их идентификаторам,
+        которые изменяются на месте
+    :param List[dict] patches: модификации жителей с идентификатором жителя в поле citizen_id
+    :param int import_id: уникальный идентификатор поставки
+    :param Database db: объект базы данных, в которую записываются наборы данных о жителях
+    :param ClientSession session: сессия соединения с базой данных, через которую производятся все запросы
+    :raises: :class:`PyMongoError`: Объект с указанным уникальным идентификатором не был найден в базе данных
+
+    :return: Изменения родственников немодифицируемых жителей и запросы для их записи
+    :rtype: Tuple[Dict[Tuple[int, int], int], List[UpdateMany]]
+    """
+    relatives_changes, pushed_ids = _get_batch_relatives_changes(relatives, patches)
+    _check_all_citizens_exist(pushed_ids, import_id, db, session)
+    return relatives_changes, _make_batch_db_requests(relatives_changes, import_id)
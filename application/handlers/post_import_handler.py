@@ -1,68 +1,158 @@
-import os
 from datetime import datetime
-from typing import Tuple
+from typing import Tuple, Iterable, List
 
-from mongolock import MongoLock
+from pymongo import ReturnDocument
 from pymongo.database import Database
-from pymongo.errors import PyMongoError
-from pymongo.results import InsertOneResult
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from pymongo.results import InsertOneResult, InsertManyResult
 
+from application.handlers import age_histograms
 
-def _parse_birth_date(import_data: dict):
+BATCH_SIZE = 1000
+IMPORT_ID_COUNTER = 'import_id'
+
+
+def _parse_birth_date(citizen: dict):
+    """
+    Парсит поле birth_date жителя из строки в datetime и записывает месяц рождения в поле birth_month.
+
+    :param dict citizen: данные о жителе
     """
-    Парсит поле birth_date у каждого жителя из строки в datetime.
+    citizen['birth_date'] = datetime.strptime(citizen['birth_date'], '%d.%m.%Y')
+    citizen['birth_month'] = citizen['birth_date'].month
 
-    :param dict import_data: набор с данными о жителях
+
+def _init_import_id_counter(db: Database):
+    """
+    Создает счетчик идентификаторов поставок, если его еще нет.
+
+    Счетчик начинается с количества уже записанных поставок, так как до его появления идентификатором поставки
+    было количество поставок на момент записи. Если счетчик одновременно создан другим процессом, ничего не происходит.
+    :param Database db: объект базы данных, в которую записываются наборы данных о жителях
     """
-    for citizen in import_data['citizens']:
-        citizen['birth_date'] = datetime.strptime(citizen['birth_date'], '%d.%m.%Y')
+    try:
+        db['counters'].insert_one({'_id': IMPORT_ID_COUNTER, 'value': db['imports'].count_documents({})})
+    except DuplicateKeyError:
+        pass
 
 
 def _add_import_id(import_data: dict, db: Database):
     """
-    Добавляет в данные о жителях поле с уникальным идентификатором набора import_id.
+    Добавляет в данные о поставке поле с уникальным идентификатором набора import_id.
 
-    :param dict import_data: валидированный набор с данными о жителях
+    Идентификатор выделяется атомарным увеличением счетчика, поэтому одновременные поставки получают разные
+    идентификаторы без блокировки и подсчета документов коллекции imports.
+    :param dict import_data: заголовок поставки
     :param Database db: объект базы данных, в которую записываются наборы данных о жителях
     """
-    import_id = db['imports'].count()
-    import_data['import_id'] = import_id
+    counter = db['counters'].find_one_and_update({'_id': IMPORT_ID_COUNTER}, {'$inc': {'value': 1}},
+                                                 return_document=ReturnDocument.AFTER)
+    if counter is None:
+        _init_import_id_counter(db)
+        counter = db['counters'].find_one_and_update({'_id': IMPORT_ID_COUNTER}, {'$inc': {'value': 1}},
+                                                     return_document=ReturnDocument.AFTER)
+    import_data['import_id'] = counter['value'] - 1
 
 
-def _write_to_db(import_data: dict, db: Database) -> Tuple[dict, int]:
+def _write_import_header(import_data: dict, db: Database):
     """
-    Производит запись набора данных о жителях в базу данных.
+    Записывает незавершенный заголовок поставки, резервируя за ней уникальный идентификатор.
 
-    :param import_data: валидированный набор данных о жителях
-    :param db: объект базы данных, в которую записываются наборы данных о жителях
+    Пока поставка не завершена, она не видна обработчикам чтения.
+    :param dict import_data: заголовок поставки с идентификатором import_id
+    :param Database db: объект базы данных, в которую записываются наборы данных о жителях
+    :raises: :class:`PyMongoError`: Операция записи в базу данных не была разрешена
+    """
+    db_response: InsertOneResult = db['imports'].insert_one({**import_data, 'complete': False})
+    if not db_response.acknowledged:
+        raise PyMongoError('Operation was not acknowledged')
+
+
+def _write_citizens_batch(import_id: int, citizens: List[dict], db: Database):
+    """
+    Производит запись пачки жителей в базу данных, каждого отдельным документом.
+
+    :param int import_id: уникальный идентификатор поставки
+    :param List[dict] citizens: пачка валидированных жителей
+    :param Database db: объект базы данных, в которую записываются наборы данных о жителях
+    :raises: :class:`PyMongoError`: Операция записи в базу данных не была разрешена
+    """
+    for citizen in citizens:
+        citizen['import_id'] = import_id
+    db_response: InsertManyResult = db['citizens'].insert_many(citizens)
+    if not db_response.acknowledged:
+        raise PyMongoError('Operation was not acknowledged')
+
+
+def _write_citizens(import_id: int, citizens: Iterable[dict], db: Database, batch_size: int = BATCH_SIZE):
+    """
+    Парсит дату рождения жителей по мере их поступления и записывает их в базу данных пачками.
+
+    В памяти одновременно находится не больше одной пачки жителей. После записи всех жителей записываются
+    гистограммы дат рождения жителей по городам, размер которых не зависит от количества жителей.
+    :param int import_id: уникальный идентификатор поставки
+    :param Iterable[dict] citizens: валидированные жители поставки
+    :param Database db: объект базы данных, в которую записываются наборы данных о жителях
+    :param int batch_size: максимальное количество жителей в одной пачке
+    :raises: :class:`PyMongoError`: Операция записи в базу данных не была разрешена
+    """
+    histograms = age_histograms.create_histograms()
+    batch = []
+    for citizen in citizens:
+        _parse_birth_date(citizen)
+        age_histograms.add_citizen(histograms, citizen)
+        batch.append(citizen)
+        if len(batch) >= batch_size:
+            _write_citizens_batch(import_id, batch, db)
+            batch = []
+    if batch:
+        _write_citizens_batch(import_id, batch, db)
+    age_histograms.write_histograms(import_id, histograms, db)
+
+
+def _complete_import(import_id: int, db: Database) -> Tuple[dict, int]:
+    """
+    Помечает поставку завершенной, после чего она становится видна обработчикам чтения.
+
+    :param int import_id: уникальный идентификатор поставки
+    :param Database db: объект базы данных, в которую записываются наборы данных о жителях
     :raises: :class:`PyMongoError`: Операция записи в базу данных не была разрешена
 
     :returns: В случае успеха возвращается пару из ответа с идентификатором импорта и http кода 201
     :rtype: Tuple[dict, int]
     """
-    db_response: InsertOneResult = db['imports'].insert_one(import_data)
+    db_response = db['imports'].update_one({'import_id': import_id}, {'$set': {'complete': True}})
     if db_response.acknowledged:
-        response = {'data': {'import_id': import_data['import_id']}}
+        response = {'data': {'import_id': import_id}}
         return response, 201
     else:
         raise PyMongoError('Operation was not acknowledged')
 
 
-def post_import(import_data: dict, lock: MongoLock, db: Database) -> Tuple[dict, int]:
+def post_import(citizens: Iterable[dict], db: Database) -> Tuple[dict, int]:
     """
-    Принимает на вход набор с данными о жителях в формате json
-    и сохраняет его с уникальным идентификатором import_id.
+    Принимает на вход жителей поставки по одному и сохраняет их с уникальным идентификатором import_id.
 
-    :param dict import_data: валидированный набор с данными о жителях
-    :param MongoLock lock: объект для ограничения одновременного доступа к ресурсам из разных процессов
+    Идентификатор резервируется до чтения жителей, после чего жители записываются пачками по мере поступления.
+    Одновременные поставки не блокируют друг друга. При любой ошибке уже записанные жители
+    поставки удаляются вместе с ее заголовком.
+    :param Iterable[dict] citizens: валидируемые по мере поступления жители поставки
     :param Database db: объект базы данных, в которую записываются наборы данных о жителях
     :raises: :class:`PyMongoError`: Операция записи в базу данных не была разрешена
 
     :returns: В случае успеха возвращается пару из ответа с идентификатором импорта и http кода 201
     :rtype: Tuple[dict, int]
     """
-    _parse_birth_date(import_data)
-
-    with lock('post_imports', str(os.getpid()), timeout=60, expire=10):
-        _add_import_id(import_data, db)
-        return _write_to_db(import_data, db)
+    import_data = {}
+    _add_import_id(import_data, db)
+    _write_import_header(import_data, db)
+
+    import_id = import_data['import_id']
+    try:
+        _write_citizens(import_id, citizens, db)
+    except Exception:
+        db['citizens'].delete_many({'import_id': import_id})
+        db['age_histograms'].delete_many({'import_id': import_id})
+        db['imports'].delete_one({'import_id': import_id})
+        raise
+    return _complete_import(import_id, db)
@@ -1,22 +1,136 @@
-from typing import List
+from typing import List, Optional
 
+from pymongo.client_session import ClientSession
+from pymongo.cursor import Cursor
 from pymongo.database import Database
 from pymongo.errors import PyMongoError
 
+CITIZEN_PROJECTION = {'_id': 0, 'import_id': 0, 'birth_month': 0}
+CITIZENS_FILTERS = ('town', 'gender', 'birth_month')
+CITIZEN_NOT_FOUND_MESSAGE = 'Import or citizen with specified id not found'
+
+
+class ImportNotFoundError(PyMongoError):
+    """Поставка с указанным уникальным идентификатором отсутствует в базе данных или еще не завершена."""
+
+    def __init__(self, message: str = 'Import with specified id not found'):
+        super().__init__(message)
+
+
+def check_import_exists(import_id: int, db: Database, session: ClientSession = None,
+                        message: str = 'Import with specified id not found'):
+    """
+    Проверяет наличие заголовка завершенной поставки с указанным уникальным идентификатором.
+
+    Жители незавершенной поставки уже могут быть записаны, поэтому проверка выполняется до любого чтения жителей.
+    :param int import_id: уникальный идентификатор поставки
+    :param Database db: объект базы данных, в которую записываются наборы данных о жителях
+    :param ClientSession session: сессия соединения с базой данных, через которую производятся все запросы
+    :param str message: сообщение ошибки об отсутствии поставки
+    :raises :class:`ImportNotFoundError`: Завершенная поставка с указанным уникальным идентификатором
+        остутствует в базе данных
+    """
+    if db['imports'].count_documents({'import_id': import_id, 'complete': True}, limit=1, session=session) == 0:
+        raise ImportNotFoundError(message)
+
+
+def get_import_version(import_id: int, db: Database) -> Optional[int]:
+    """
+    Возвращает версию завершенной поставки, которая увеличивается при каждом изменении жителей поставки.
+
+    :param int import_id: уникальный идентификатор поставки
+    :param Database db: объект базы данных, в которую записываются наборы данных о жителях
+
+    :return: Версия поставки или None, если поставка не найдена. Поставки без сохраненной версии имеют версию 0
+    :rtype: Optional[int]
+    """
+    import_header = db['imports'].find_one({'import_id': import_id, 'complete': True}, {'_id': 0, 'version': 1})
+    if import_header is None:
+        return None
+    return import_header.get('version', 0)
+
+
+def increment_import_version(import_id: int, db: Database, session: ClientSession = None):
+    """
+    Увеличивает версию поставки, делая недействительными ответы, закешированные для предыдущей версии.
+
+    :param int import_id: уникальный идентификатор поставки
+    :param Database db: объект базы данных, в которую записываются наборы данных о жителях
+    :param ClientSession session: сессия соединения с базой данных, через которую производятся все запросы
+    """
+    db['imports'].update_one({'import_id': import_id}, {'$inc': {'version': 1}}, session=session)
+
+
+def with_birth_month(citizen_data: dict) -> dict:
+    """
+    Добавляет к данным о жителе месяц рождения, если в них есть дата рождения.
+
+    Месяц рождения хранится в документе жителя отдельным полем, чтобы фильтр по нему мог использовать индекс.
+    :param dict citizen_data: данные о жителе с датой рождения в datetime
+
+    :return: Данные о жителе для записи в базу данных
+    :rtype: dict
+    """
+    if 'birth_date' not in citizen_data:
+        return citizen_data
+    return {**citizen_data, 'birth_month': citizen_data['birth_date'].month}
+
+
+def make_citizens_query(import_id: int, filters: dict = None, after_citizen_id: int = None) -> dict:
+    """
+    Создает запрос жителей поставки с указанными фильтрами.
+
+    :param int import_id: уникальный идентификатор поставки
+    :param dict filters: значения полей town, gender и birth_month, которым должны соответствовать жители
+    :param int after_citizen_id: уникальный идентификатор жителя, после которого начинается выборка
+
+    :return: Запрос к коллекции citizens
+    :rtype: dict
+    """
+    query = {'import_id': import_id}
+    if filters:
+        query.update({key: filters[key] for key in CITIZENS_FILTERS if key in filters})
+    if after_citizen_id is not None:
+        query['citizen_id'] = {'$gt': after_citizen_id}
+    return query
+
+
+def find_citizens(import_id: int, db: Database, projection: dict = None, filters: dict = None,
+                  after_citizen_id: int = None, limit: int = 0) -> Cursor:
+    """
+    Возвращает курсор по жителям в указанной поставке в порядке citizen_id, выбранным с указанной проекцией.
+
+    Наличие поставки не проверяется, поэтому перед выборкой вызывается check_import_exists. Каждому фильтру
+    соответствует индекс, заканчивающийся полем citizen_id, поэтому выборка страницы после указанного жителя
+    не читает предыдущие страницы.
+    :param int import_id: уникальный идентификатор поставки
+    :param Database db: объект базы данных, в которую записываются наборы данных о жителях
+    :param dict projection: словарь проекции выборки
+    :param dict filters: значения полей town, gender и birth_month, которым должны соответствовать жители
+    :param int after_citizen_id: уникальный идентификатор жителя, после которого начинается выборка
+    :param int limit: максимальное количество жителей в выборке, 0 - без ограничения
+
+    :return: Курсор по жителям
+    :rtype: Cursor
+    """
+    query = make_citizens_query(import_id, filters, after_citizen_id)
+    return db['citizens'].find(query, projection).sort('citizen_id', 1).limit(limit)
+
 
 def get_citizens(import_id: int, db: Database, projection: dict = None) -> List[dict]:
     """
     Возвращает список жителей в указанной поставке, выбранный с указанной проекцией.
 
+    Каждый житель хранится отдельным документом в коллекции citizens, жители возвращаются в порядке citizen_id.
+    Жители читаются только после проверки, что поставка завершена.
     :param int import_id: уникальный идентификатор поставки
     :param Database db: объект базы данных, в которую записываются наборы данных о жителях
     :param dict projection: словарь проекции выборки
-    :raises :class:`PyMongoError`: Поставка с указанным уникальным идентификатором остутствует в базе данных
+    :raises :class:`ImportNotFoundError`: Завершенная поставка с указанным уникальным идентификатором
+        остутствует в базе данных
 
     :return: Список жителей
     :rtype: List[dict]
     """
-    import_data = db['imports'].find_one({'import_id': import_id}, projection)
-    if import_data is None:
-        raise PyMongoError('Import with specified id not found')
-    return import_data['citizens']
+    check_import_exists(import_id, db)
+    return list(find_citizens(import_id, db, projection))
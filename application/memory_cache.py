@@ -0,0 +1,120 @@
+from collections import OrderedDict
+from datetime import datetime
+from threading import Lock
+from typing import Hashable, NamedTuple, Optional
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+class MemoryCacheEntry(NamedTuple):
+    """
+    Закешированный в памяти процесса ответ.
+
+    :ivar: int version: версия поставки, для которой сформирован ответ
+    :ivar: bytes body: тело ответа
+    :ivar: Optional[datetime] expires: время по UTC, начиная с которого ответ устаревает
+    :ivar: Optional[bytes] gzip_body: сжатое gzip тело ответа
+    """
+    version: int
+    body: bytes
+    expires: Optional[datetime]
+    gzip_body: Optional[bytes] = None
+
+    @property
+    def size(self) -> int:
+        """
+        Размер тела ответа вместе со сжатым вариантом в байтах.
+
+        :rtype: int
+        """
+        return len(self.body) + (len(self.gzip_body) if self.gzip_body is not None else 0)
+
+
+class MemoryCache(object):
+    """
+    Класс для хранения сериализованных ответов в памяти процесса с вытеснением давно не использованных (LRU).
+
+    Каждый ответ хранится вместе с версией поставки, для которой он сформирован. Версия увеличивается при каждом
+    изменении поставки, поэтому ответ устаревшей версии считается отсутствующим и не требует явного удаления.
+    Ответы вытесняются, если их количество или суммарный размер тел превышает ограничение. Сжатые варианты тел
+    учитываются в размере.
+    :ivar: int max_entries: максимальное количество хранимых ответов
+    :ivar: int max_bytes: максимальный суммарный размер тел хранимых ответов в байтах
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size(self) -> int:
+        """
+        Суммарный размер тел хранимых ответов вместе со сжатыми вариантами в байтах.
+
+        :rtype: int
+        """
+        return self._size
+
+    def get(self, key: Hashable, version: int) -> Optional[MemoryCacheEntry]:
+        """
+        Возвращает ответ, сохраненный для указанной версии поставки, и отмечает его как недавно использованный.
+
+        Ответ другой версии или устаревший по времени удаляется.
+        :param Hashable key: ключ ответа
+        :param int version: текущая версия поставки
+
+        :return: Сохраненный ответ или None, если он отсутствует или устарел
+        :rtype: Optional[MemoryCacheEntry]
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.version != version or (entry.expires is not None and entry.expires <= datetime.utcnow()):
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Hashable, version: int, body: bytes, expires: datetime = None, gzip_body: bytes = None):
+        """
+        Сохраняет ответ для указанной версии поставки, вытесняя давно не использованные ответы при необходимости.
+
+        Ответ, размер которого превышает ограничение на суммарный размер, не сохраняется.
+        :param Hashable key: ключ ответа
+        :param int version: версия поставки, для которой сформирован ответ
+        :param bytes body: тело ответа
+        :param datetime expires: время по UTC, начиная с которого ответ устаревает. Если не указано, не устаревает
+        :param bytes gzip_body: сжатое gzip тело ответа
+        """
+        entry = MemoryCacheEntry(version, body, expires, gzip_body)
+        if entry.size > self.max_bytes or self.max_entries <= 0:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._size += entry.size
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        """Удаляет все сохраненные ответы."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _remove(self, key: Hashable):
+        """
+        Удаляет ответ с указанным ключом. Вызывается под блокировкой.
+
+        :param Hashable key: ключ ответа
+        """
+        self._size -= self._entries.pop(key).size
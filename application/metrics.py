@@ -0,0 +1,274 @@
+import bisect
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, Sequence, Tuple
+
+from pymongo import monitoring
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (100, 1000, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7, 10 ** 8, 10 ** 9)
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    """
+    Форматирует метки метрики в текстовом формате Prometheus.
+
+    :param Dict[str, str] labels: значения меток по их именам
+
+    :return: Метки в фигурных скобках или пустая строка, если меток нет
+    :rtype: str
+    """
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for value in labels.values())
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + '}'
+
+
+def _format_value(value: float) -> str:
+    """
+    Форматирует значение метрики, целые значения записываются без дробной части.
+
+    :param float value: значение
+
+    :return: Значение в текстовом формате Prometheus
+    :rtype: str
+    """
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric(object):
+    """
+    Базовый класс метрики с метками.
+
+    Значения метрики хранятся в памяти процесса, поэтому каждый процесс приложения отдает свои значения.
+    :ivar: str name: имя метрики
+    :ivar: str documentation: описание метрики
+    :ivar: Tuple[str] labelnames: имена меток
+    """
+    type_name = None
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _get_key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        """
+        Возвращает ключ значения метрики по значениям меток.
+
+        :param Dict[str, str] labels: значения меток по их именам
+        :raises: :class:`ValueError`: Указаны не все метки метрики или лишние метки
+
+        :return: Значения меток в порядке их имен
+        :rtype: Tuple[str, ...]
+        """
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'Metric {self.name} expects labels {", ".join(self.labelnames)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _render_samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        """
+        Форматирует метрику в текстовом формате Prometheus.
+
+        :return: Описание, тип и значения метрики
+        :rtype: str
+        """
+        with self._lock:
+            samples = list(self._render_samples())
+        return '\n'.join([f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}'] +
+                         samples)
+
+
+class Counter(_Metric):
+    """Метрика, значение которой только увеличивается."""
+    type_name = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        """
+        Увеличивает значение метрики с указанными метками.
+
+        :param float amount: на сколько увеличить значение
+        :param labels: значения меток
+        """
+        key = self._get_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        """
+        Возвращает значение метрики с указанными метками.
+
+        :param labels: значения меток
+
+        :return: Значение метрики или 0, если оно еще не увеличивалось
+        :rtype: float
+        """
+        with self._lock:
+            return self._values.get(self._get_key(labels), 0)
+
+    def _render_samples(self) -> Iterator[str]:
+        for key, value in sorted(self._values.items()):
+            yield f'{self.name}{_format_labels(dict(zip(self.labelnames, key)))} {_format_value(value)}'
+
+
+class Histogram(_Metric):
+    """
+    Метрика распределения наблюдаемых значений по корзинам.
+
+    :ivar: Tuple[float] buckets: верхние границы корзин по возрастанию
+    """
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DURATION_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        """
+        Добавляет наблюдаемое значение к метрике с указанными метками.
+
+        :param float value: наблюдаемое значение
+        :param labels: значения меток
+        """
+        key = self._get_key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def get_count(self, **labels) -> int:
+        """
+        Возвращает количество наблюдений метрики с указанными метками.
+
+        :param labels: значения меток
+
+        :return: Количество наблюдений
+        :rtype: int
+        """
+        with self._lock:
+            counts, _ = self._values.get(self._get_key(labels), ([0], 0))
+            return sum(counts)
+
+    def _render_samples(self) -> Iterator[str]:
+        for key, (counts, total) in sorted(self._values.items()):
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bucket, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bucket == float('inf') else _format_value(bucket)
+                yield f'{self.name}_bucket{_format_labels({**labels, "le": le})} {cumulative}'
+            yield f'{self.name}_sum{_format_labels(labels)} {_format_value(total)}'
+            yield f'{self.name}_count{_format_labels(labels)} {cumulative}'
+
+
+class Registry(object):
+    """Набор метрик, которые отдаются обработчиком /metrics."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        """
+        Добавляет метрику в набор.
+
+        :param _Metric metric: метрика
+
+        :return: Добавленная метрика
+        :rtype: _Metric
+        """
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> bytes:
+        """
+        Форматирует все метрики набора в текстовом формате Prometheus.
+
+        :return: Тело ответа обработчика /metrics
+        :rtype: bytes
+        """
+        return ('\n'.join(metric.render() for metric in self._metrics) + '\n').encode('utf-8')
+
+
+REGISTRY = Registry()
+REQUESTS = REGISTRY.register(Counter('http_requests_total', 'Number of handled HTTP requests.',
+                                     ['route', 'method', 'status']))
+REQUEST_DURATION = REGISTRY.register(Histogram('http_request_duration_seconds',
+                                               'HTTP request duration until the last byte of the body is sent.',
+                                               ['route', 'method']))
+RESPONSE_SIZE = REGISTRY.register(Histogram('http_response_size_bytes', 'HTTP response body size.',
+                                            ['route', 'method'], SIZE_BUCKETS))
+CACHE_REQUESTS = REGISTRY.register(Counter('cache_requests_total',
+                                           'Cached responses lookups by result: memory_hit, hit or miss.',
+                                           ['cache', 'result']))
+LOCK_WAIT = REGISTRY.register(Histogram('lock_wait_seconds', 'Time spent waiting until a lock is acquired.',
+                                        ['lock', 'mode']))
+MONGO_COMMAND_DURATION = REGISTRY.register(Histogram('mongo_command_duration_seconds',
+                                                     'MongoDB command duration by command name and outcome.',
+                                                     ['command', 'outcome']))
+
+
+def observe_request(route: str, method: str, status: int, duration: float, size: int):
+    """
+    Записывает метрики обработанного запроса.
+
+    :param str route: шаблон пути обработчика
+    :param str method: метод запроса
+    :param int status: http статус ответа
+    :param float duration: время обработки запроса в секундах до отправки последнего байта тела
+    :param int size: размер тела ответа в байтах
+    """
+    REQUESTS.inc(route=route, method=method, status=status)
+    REQUEST_DURATION.observe(duration, route=route, method=method)
+    RESPONSE_SIZE.observe(size, route=route, method=method)
+
+
+def count_bytes(chunks: Iterable[bytes], on_close: Callable[[int], None]) -> Iterator[bytes]:
+    """
+    Передает части потокового ответа дальше, подсчитывая их размер.
+
+    После отправки последней части или закрытия генератора исходный генератор закрывается, а размер
+    отправленных частей передается в on_close.
+    :param Iterable[bytes] chunks: части ответа
+    :param Callable[[int], None] on_close: функция, которая вызывается с размером отправленных частей
+    """
+    size = 0
+    try:
+        for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+        on_close(size)
+
+
+def observe_lock_wait(lock: str, mode: str, start: float):
+    """
+    Записывает время ожидания полученной блокировки.
+
+    :param str lock: имя блокировки
+    :param str mode: режим блокировки: lock, shared или exclusive
+    :param float start: значение time.perf_counter() перед первой попыткой получить блокировку
+    """
+    LOCK_WAIT.observe(time.perf_counter() - start, lock=lock, mode=mode)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Слушатель команд pymongo, записывающий длительность каждой команды к базе данных."""
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        pass
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        MONGO_COMMAND_DURATION.observe(event.duration_micros / 10 ** 6, command=event.command_name,
+                                       outcome='succeeded')
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        MONGO_COMMAND_DURATION.observe(event.duration_micros / 10 ** 6, command=event.command_name, outcome='failed')
@@ -0,0 +1,207 @@
+import contextlib
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Iterator, Optional
+
+from mongolock import MongoLock, MongoLockLocked
+from pymongo.errors import DuplicateKeyError
+
+from application import metrics
+
+
+class ReadWriteMongoLock(MongoLock):
+    """
+    Класс блокировки с разделяемым (чтение) и исключительным (запись) режимами поверх монго.
+
+    Любое количество читателей удерживают блокировку одновременно, писатель исключает и читателей, и других писателей.
+    Блокировка хранится одним документом в коллекции с суффиксом _rw: писатель записывается в поле writer,
+    читатели - элементами массива readers. Писатель занимает поле writer до ожидания читателей, поэтому новые
+    читатели не проходят, пока он ждет, и писатель не голодает. Записи читателей и писателя с истекшим сроком
+    не учитываются, поэтому упавший процесс не оставляет блокировку навсегда.
+    Обычная исключительная блокировка MongoLock по-прежнему доступна через вызов объекта.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rw_collection = self.collection.database[f'{self.collection.name}_rw']
+
+    def lock(self, key: str, owner: str, timeout: float = None, expire: float = None) -> bool:
+        """
+        Получает обычную исключительную блокировку так же, как MongoLock.lock, и записывает время ожидания.
+
+        :param str key: имя блокировки
+        :param str owner: владелец блокировки
+        :param float timeout: сколько секунд ждать, пока блокировка занята
+        :param float expire: через сколько секунд блокировка считается освобожденной, если не была отпущена
+
+        :return: Получена ли блокировка
+        :rtype: bool
+        """
+        start = time.perf_counter()
+        locked = super().lock(key, owner, timeout, expire)
+        if locked:
+            metrics.observe_lock_wait(key, 'lock', start)
+        return locked
+
+    @contextlib.contextmanager
+    def shared(self, key: str, owner: str, timeout: float = None, expire: float = None) -> Iterator[None]:
+        """
+        Удерживает блокировку в разделяемом режиме.
+
+        :param str key: имя блокировки
+        :param str owner: владелец блокировки, сохраняется для диагностики
+        :param float timeout: сколько секунд ждать, пока блокировку удерживает писатель
+        :param float expire: через сколько секунд блокировка считается освобожденной, если не была отпущена
+        :raises: :class:`MongoLockLocked`: Блокировка не получена за указанное время
+        """
+        token = uuid.uuid4().hex
+        deadline = self._get_deadline(timeout)
+        start = time.perf_counter()
+        while not self._try_lock_shared(key, owner, token, expire):
+            self._wait(key, deadline)
+        metrics.observe_lock_wait(key, 'shared', start)
+        try:
+            yield
+        finally:
+            self.rw_collection.update_one({'_id': key}, {'$pull': {'readers': {'token': token}}})
+
+    @contextlib.contextmanager
+    def exclusive(self, key: str, owner: str, timeout: float = None, expire: float = None) -> Iterator[None]:
+        """
+        Удерживает блокировку в исключительном режиме.
+
+        :param str key: имя блокировки
+        :param str owner: владелец блокировки, сохраняется для диагностики
+        :param float timeout: сколько секунд ждать, пока блокировку удерживают другой писатель или читатели
+        :param float expire: через сколько секунд блокировка считается освобожденной, если не была отпущена
+        :raises: :class:`MongoLockLocked`: Блокировка не получена за указанное время
+        """
+        token = uuid.uuid4().hex
+        deadline = self._get_deadline(timeout)
+        start = time.perf_counter()
+        while not self._try_lock_exclusive(key, owner, token, expire):
+            self._wait(key, deadline)
+        try:
+            while self._has_readers(key):
+                self._wait(key, deadline)
+            metrics.observe_lock_wait(key, 'exclusive', start)
+            yield
+        finally:
+            self.rw_collection.update_one({'_id': key, 'writer': token}, {'$set': {'writer': None}})
+
+    def is_locked(self, key: str) -> bool:
+        """
+        Проверяет, удерживается ли блокировка в любом режиме.
+
+        :param str key: имя блокировки
+
+        :return: Удерживают ли блокировку писатель, читатели или обычная исключительная блокировка
+        :rtype: bool
+        """
+        if super().is_locked(key):
+            return True
+        now = datetime.utcnow()
+        return self.rw_collection.count_documents(
+            {'_id': key, '$or': [{'writer': {'$ne': None}, 'writer_expire': {'$gte': now}},
+                                 {'readers': {'$elemMatch': {'expire': {'$gte': now}}}}]}, limit=1) > 0
+
+    @staticmethod
+    def _get_deadline(timeout: Optional[float]) -> Optional[datetime]:
+        """
+        Возвращает время, после которого ожидание блокировки прекращается.
+
+        :param Optional[float] timeout: сколько секунд ждать блокировку
+
+        :return: Время по UTC или None, если ждать не нужно
+        :rtype: Optional[datetime]
+        """
+        return datetime.utcnow() + timedelta(seconds=timeout) if timeout else None
+
+    @staticmethod
+    def _get_expire(expire: Optional[float]) -> datetime:
+        """
+        Возвращает время, после которого блокировка считается освобожденной.
+
+        :param Optional[float] expire: через сколько секунд блокировка считается освобожденной
+
+        :return: Время по UTC. Если срок не указан, блокировка не освобождается сама
+        :rtype: datetime
+        """
+        return datetime.utcnow() + timedelta(seconds=expire) if expire else datetime.max
+
+    @staticmethod
+    def _free_writer_filter(key: str) -> dict:
+        """
+        Возвращает фильтр документа блокировки, которую не удерживает писатель.
+
+        :param str key: имя блокировки
+
+        :return: Фильтр запроса
+        :rtype: dict
+        """
+        return {'_id': key, '$or': [{'writer': None}, {'writer_expire': {'$lt': datetime.utcnow()}}]}
+
+    def _try_lock_shared(self, key: str, owner: str, token: str, expire: Optional[float]) -> bool:
+        """
+        Пытается добавить читателя, если блокировку не удерживает писатель.
+
+        :param str key: имя блокировки
+        :param str owner: владелец блокировки
+        :param str token: уникальный идентификатор этого получения блокировки
+        :param Optional[float] expire: через сколько секунд блокировка считается освобожденной
+
+        :return: Получена ли блокировка
+        :rtype: bool
+        """
+        reader = {'token': token, 'owner': owner, 'expire': self._get_expire(expire)}
+        try:
+            self.rw_collection.update_one(self._free_writer_filter(key),
+                                          {'$set': {'writer': None}, '$push': {'readers': reader}}, upsert=True)
+        except DuplicateKeyError:
+            return False
+        return True
+
+    def _try_lock_exclusive(self, key: str, owner: str, token: str, expire: Optional[float]) -> bool:
+        """
+        Пытается занять место писателя, если его не удерживает другой писатель.
+
+        :param str key: имя блокировки
+        :param str owner: владелец блокировки
+        :param str token: уникальный идентификатор этого получения блокировки
+        :param Optional[float] expire: через сколько секунд блокировка считается освобожденной
+
+        :return: Получено ли место писателя. Читатели при этом еще могут удерживать блокировку
+        :rtype: bool
+        """
+        writer = {'writer': token, 'writer_owner': owner, 'writer_expire': self._get_expire(expire)}
+        try:
+            self.rw_collection.update_one(self._free_writer_filter(key), {'$set': writer}, upsert=True)
+        except DuplicateKeyError:
+            return False
+        return True
+
+    def _has_readers(self, key: str) -> bool:
+        """
+        Удаляет читателей с истекшим сроком и проверяет, остались ли читатели.
+
+        :param str key: имя блокировки
+
+        :return: Удерживают ли блокировку читатели
+        :rtype: bool
+        """
+        self.rw_collection.update_one({'_id': key}, {'$pull': {'readers': {'expire': {'$lt': datetime.utcnow()}}}})
+        return self.rw_collection.count_documents({'_id': key, 'readers.0': {'$exists': True}}, limit=1) > 0
+
+    def _wait(self, key: str, deadline: Optional[datetime]):
+        """
+        Ждет перед следующей попыткой получить блокировку.
+
+        :param str key: имя блокировки
+        :param Optional[datetime] deadline: время, после которого ожидание прекращается
+        :raises: :class:`MongoLockLocked`: Время ожидания истекло
+        """
+        if deadline is None or datetime.utcnow() >= deadline:
+            status = self.rw_collection.find_one({'_id': key})
+            raise MongoLockLocked(f'Timeout, read-write lock {key} is held: {status}')
+        time.sleep(self.acquire_retry_step)
@@ -0,0 +1,147 @@
+from array import array
+from itertools import repeat
+from typing import Sequence, Tuple
+
+import numpy as np
+from jsonschema import ValidationError
+
+NUMPY_THRESHOLD = 2000  # см. benchmarks/relatives_graph_benchmark.py
+_MAX_ENCODING_BASE = 3037000499
+
+
+def _validate_python(citizen_ids: Sequence[int], sources: Sequence[int], targets: Sequence[int]):
+    """
+    Проверяет граф родственных связей с помощью множеств python.
+
+    Пункты проверяются в том же порядке, что и в _validate_numpy, поэтому при нескольких нарушениях оба способа
+    сообщают об одной и той же ошибке.
+
+    :param Sequence[int] citizen_ids: идентификаторы жителей
+    :param Sequence[int] sources: идентификаторы жителей, у которых указан родственник
+    :param Sequence[int] targets: идентификаторы указанных родственников
+    :raises: :class:`ValidationError`: Граф родственных связей некорректен
+    """
+    if any(source == target for source, target in zip(sources, targets)):
+        raise ValidationError('Citizen can not be relative to himself')
+
+    edges = set()
+    for source, target in zip(sources, targets):
+        if (source, target) in edges:
+            raise ValidationError('Relatives ids should be unique')
+        edges.add((source, target))
+
+    ids = set(citizen_ids)
+    for _, target in edges:
+        if target not in ids:
+            raise ValidationError('Citizen relative does not exists')
+    for source, target in edges:
+        if (target, source) not in edges:
+            raise ValidationError('Citizen relatives are not duplex')
+
+
+def _encode_edges(citizen_ids: np.ndarray, sources: np.ndarray, targets: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Кодирует каждую связь и обратную к ней одним 64-битным числом.
+
+    Если идентификаторы достаточно малы, код составляется из самих идентификаторов, иначе - из их номеров
+    в отсортированном списке всех встречающихся идентификаторов.
+    :param np.ndarray citizen_ids: идентификаторы жителей
+    :param np.ndarray sources: идентификаторы жителей, у которых указан родственник
+    :param np.ndarray targets: идентификаторы указанных родственников
+
+    :return: Коды связей и коды обратных связей
+    :rtype: Tuple[np.ndarray, np.ndarray]
+    """
+    base = int(max(citizen_ids.max(), targets.max())) + 1
+    if base > _MAX_ENCODING_BASE:
+        universe = np.unique(np.concatenate([citizen_ids, targets]))
+        sources, targets = np.searchsorted(universe, sources), np.searchsorted(universe, targets)
+        base = len(universe)
+    return sources * base + targets, targets * base + sources
+
+
+def _validate_numpy(citizen_ids: np.ndarray, sources: np.ndarray, targets: np.ndarray):
+    """
+    Проверяет граф родственных связей операциями над массивами numpy.
+
+    Связи кодируются числами и сортируются, после чего повторы находятся сравнением соседних элементов,
+    а обратные связи есть у всех связей, только если отсортированные коды прямых и обратных связей совпадают.
+    Существование родственников проверяется бинарным поиском отсортированных идентификаторов родственников
+    среди отсортированных идентификаторов жителей.
+    :param np.ndarray citizen_ids: идентификаторы жителей
+    :param np.ndarray sources: идентификаторы жителей, у которых указан родственник
+    :param np.ndarray targets: идентификаторы указанных родственников
+    :raises: :class:`ValidationError`: Граф родственных связей некорректен
+    """
+    if not len(sources):
+        return
+    if np.any(sources == targets):
+        raise ValidationError('Citizen can not be relative to himself')
+
+    edges, reverse_edges = _encode_edges(citizen_ids, sources, targets)
+    edges.sort()
+    if np.any(edges[1:] == edges[:-1]):
+        raise ValidationError('Relatives ids should be unique')
+
+    sorted_ids, sorted_targets = np.sort(citizen_ids), np.sort(targets)
+    target_indexes = np.searchsorted(sorted_ids, sorted_targets)
+    if np.any(sorted_ids[np.minimum(target_indexes, len(sorted_ids) - 1)] != sorted_targets):
+        raise ValidationError('Citizen relative does not exists')
+
+    reverse_edges.sort()
+    if not np.array_equal(edges, reverse_edges):
+        raise ValidationError('Citizen relatives are not duplex')
+
+
+class RelativesGraph(object):
+    """
+    Класс для накопления и проверки графа родственных связей поставки.
+
+    Связи хранятся в компактных массивах 64-битных чисел. Если граф содержит не меньше numpy_threshold связей,
+    он проверяется операциями над массивами numpy, иначе - множествами python, которые быстрее на малых
+    графах. Если идентификатор не помещается в 64 бита, массивы заменяются списками и используется python.
+    :ivar: int numpy_threshold: минимальное количество связей, начиная с которого используется numpy
+    """
+
+    def __init__(self, numpy_threshold: int = NUMPY_THRESHOLD):
+        self.numpy_threshold = numpy_threshold
+        self._citizen_ids = array('q')
+        self._sources = array('q')
+        self._targets = array('q')
+
+    def add_citizen(self, citizen_id: int, relatives: Sequence[int]):
+        """
+        Добавляет в граф жителя и его связи с родственниками.
+
+        :param int citizen_id: уникальный идентификатор жителя
+        :param Sequence[int] relatives: идентификаторы родственников жителя
+        """
+        ids_count, edges_count = len(self._citizen_ids), len(self._sources)
+        try:
+            self._citizen_ids.append(citizen_id)
+            self._sources.extend(repeat(citizen_id, len(relatives)))
+            self._targets.extend(relatives)
+        except OverflowError:
+            del self._citizen_ids[ids_count:], self._sources[edges_count:], self._targets[edges_count:]
+            self._citizen_ids, self._sources, self._targets = \
+                list(self._citizen_ids), list(self._sources), list(self._targets)
+            self.add_citizen(citizen_id, relatives)
+
+    def validate(self):
+        """
+        Проверяет граф родственных связей.
+
+        Проверяется:
+        1. Родственность жителя к самому себе
+        2. Уникальность идентификаторов родственников каждого жителя
+        3. Существование родственника с указанным индексом
+        4. Наличие обратной родственной связи
+
+        :raises: :class:`ValidationError`: Нарушение любого из указанных пунктов
+        """
+        if isinstance(self._sources, array) and len(self._sources) >= self.numpy_threshold:
+            _validate_numpy(np.frombuffer(self._citizen_ids, dtype=np.int64),
+                            np.frombuffer(self._sources, dtype=np.int64),
+                            np.frombuffer(self._targets, dtype=np.int64))
+        else:
+            _validate_python(self._citizen_ids, self._sources, self._targets)
@@ -0,0 +1,179 @@
+import gzip
+import json
+from datetime import date
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+GZIP_MIN_SIZE = 1024
+GZIP_LEVEL = 6
+DATE_FORMAT = '%d.%m.%Y'
+CACHE_SERVICE_FIELDS = ('_id', 'body', 'gzip_body', 'expires', 'revision')
+
+
+def _encode_default(value: Any) -> str:
+    """
+    Сериализует значения, которые не поддерживаются JSON напрямую.
+
+    Даты, в том числе datetime, сериализуются в формате ДД.ММ.ГГГГ, в котором они принимаются и отдаются в API.
+    :param Any value: значение
+
+    :raises: :class:`TypeError`: Значение не поддерживается
+    :return: Строковое представление значения
+    :rtype: str
+    """
+    if isinstance(value, date):
+        return value.strftime(DATE_FORMAT)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+class JsonCodec(object):
+    """Кодек JSON на основе стандартного модуля json."""
+
+    name = 'json'
+
+    def encode(self, data: Any) -> bytes:
+        """
+        Сериализует данные в JSON в кодировке UTF-8.
+
+        :param Any data: данные
+
+        :return: JSON в кодировке UTF-8
+        :rtype: bytes
+        """
+        return json.dumps(data, ensure_ascii=False, default=_encode_default).encode('utf-8')
+
+    def decode(self, body: Union[bytes, str]) -> Any:
+        """
+        Разбирает JSON.
+
+        :param Union[bytes, str] body: JSON в кодировке UTF-8
+        :raises: :class:`json.JSONDecodeError`: Тело не является корректным JSON
+
+        :return: Данные
+        :rtype: Any
+        """
+        return json.loads(body.decode('utf-8') if isinstance(body, bytes) else body)
+
+
+class OrjsonCodec(JsonCodec):
+    """
+    Кодек JSON на основе orjson, который сериализует и разбирает JSON в несколько раз быстрее стандартного модуля.
+
+    Ошибка разбора orjson.JSONDecodeError наследуется от json.JSONDecodeError, поэтому обрабатывается так же.
+    """
+
+    name = 'orjson'
+
+    def encode(self, data: Any) -> bytes:
+        return orjson.dumps(data, default=_encode_default,
+                            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+
+    def decode(self, body: Union[bytes, str]) -> Any:
+        return orjson.loads(body)
+
+
+codec = OrjsonCodec() if orjson is not None else JsonCodec()
+
+
+def encode_body(data: Any) -> bytes:
+    """
+    Сериализует данные ответа в тело в кодировке UTF-8 установленным кодеком.
+
+    Используется orjson, если он установлен, иначе стандартный модуль json. Даты сериализуются в формате ДД.ММ.ГГГГ.
+    :param Any data: данные ответа
+
+    :return: Тело ответа
+    :rtype: bytes
+    """
+    return codec.encode(data)
+
+
+def decode_body(body: Union[bytes, str]) -> Any:
+    """
+    Разбирает тело запроса или ответа в кодировке UTF-8 установленным кодеком.
+
+    :param Union[bytes, str] body: тело запроса или ответа
+    :raises: :class:`json.JSONDecodeError`: Тело не является корректным JSON
+
+    :return: Данные
+    :rtype: Any
+    """
+    return codec.decode(body)
+
+
+def make_body_fields(body: bytes) -> dict:
+    """
+    Возвращает поля документа кеша с телом ответа и его сжатым вариантом.
+
+    Тела меньше GZIP_MIN_SIZE байт не сжимаются, так как выигрыш не окупает заголовки gzip.
+    :param bytes body: тело ответа
+
+    :return: Словарь с полями body и gzip_body. Если тело не сжимается, gzip_body равен None
+    :rtype: dict
+    """
+    gzip_body = gzip.compress(body, GZIP_LEVEL) if len(body) >= GZIP_MIN_SIZE else None
+    return {'body': body, 'gzip_body': gzip_body}
+
+
+def make_cache_fields(body: bytes, data: dict) -> dict:
+    """
+    Возвращает поля документа кеша со структурированными данными ответа, телом ответа и его сжатым вариантом.
+
+    Структурированные данные хранятся рядом с телом, чтобы модификация жителей изменяла их операциями $set и $inc
+    без разбора и повторной сериализации тела.
+    :param bytes body: тело ответа
+    :param dict data: данные ответа, из которых сериализовано тело
+
+    :return: Словарь с полями данных ответа и полями body и gzip_body
+    :rtype: dict
+    """
+    return {**data, **make_body_fields(body)}
+
+
+def with_response_data(response, data: dict):
+    """
+    Сохраняет в ответе данные, из которых сериализовано его тело.
+
+    Декоратор cache_response записывает их в документ кеша вместе с телом, поэтому тело не разбирается заново.
+    :param response: ответ flask или starlette
+    :param dict data: данные ответа
+
+    :return: Тот же ответ
+    """
+    response.response_data = data
+    return response
+
+
+def make_invalidating_update(update: dict) -> dict:
+    """
+    Дополняет обновление структурированных данных документа кеша удалением тела ответа.
+
+    Тело и его сжатый вариант собираются заново при следующем чтении. Ревизия документа увеличивается, чтобы
+    собранное по старым данным тело не было записано поверх новых данных.
+    :param dict update: обновление структурированных данных
+
+    :return: Обновление документа кеша
+    :rtype: dict
+    """
+    return {**update, '$unset': {'body': '', 'gzip_body': ''}, '$inc': {'revision': 1}}
+
+
+def read_cached_data(document: dict) -> dict:
+    """
+    Возвращает данные ответа из документа кеша.
+
+    Данные ответа хранятся в собственных полях документа. Документы, сохраненные только с телом ответа,
+    разбираются из тела.
+    :param dict document: документ кеша без ключевых полей
+
+    :return: Данные ответа
+    :rtype: dict
+    """
+    data = {key: value for key, value in document.items() if key not in CACHE_SERVICE_FIELDS}
+    if not data and 'body' in document:
+        return decode_body(document['body'])
+    return data
@@ -1,26 +1,71 @@
-import json
 import logging
-import os
+import time
 
-from flask import Flask, request, Response
-from mongolock import MongoLock
+from flask import Flask, g, request, Response
 from pymongo.database import Database
 from werkzeug.exceptions import BadRequest
+from werkzeug.http import http_date
 
+from application import metrics, response_body
+from application.citizens_stream import iter_citizens
 from application.data_validator import DataValidator
+from application.decorators.conditional_response import conditional_response
 from application.decorators.exception_handler import handle_exceptions
 from application.decorators.response_cacher import cache_response
-from application.handlers import shared
 from application.handlers.get_birthdays_handler import get_birthdays
-from application.handlers.get_percentile_age_handler import get_percentile_age
+from application.handlers.get_citizens_handler import get_citizens, parse_citizens_query
+from application.handlers.get_percentile_age_handler import get_percentile_age, parse_as_of
 from application.handlers.patch_citizen.patch_citizen_handler import patch_citizen
+from application.handlers.patch_citizen.patch_citizens_handler import patch_citizens
 from application.handlers.post_import_handler import post_import
+from application.memory_cache import MemoryCache
+from application.read_write_lock import ReadWriteMongoLock
 
 logger = logging.getLogger(__name__)
 
 
-def make_app(db: Database, data_validator: DataValidator, lock: MongoLock) -> Flask:
+def make_app(db: Database, data_validator: DataValidator, lock: ReadWriteMongoLock,
+             memory_cache: MemoryCache = None) -> Flask:
     app = Flask(__name__)
+    memory_cache = memory_cache if memory_cache is not None else MemoryCache()
+
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response: Response) -> Response:
+        """
+        Записывает количество, длительность и размер ответов по шаблону пути обработчика.
+
+        Тело потокового ответа оборачивается генератором, подсчитывающим отправленные байты, поэтому метрики такого
+        ответа записываются после отправки последней части.
+        :param flask.Response response: ответ обработчика
+
+        :return: Ответ, тело которого отправляется с подсчетом размера
+        :rtype: flask.Response
+        """
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        method, status, start = request.method, response.status_code, g.request_start
+
+        def observe(size: int):
+            metrics.observe_request(route, method, status, time.perf_counter() - start, size)
+
+        if response.is_streamed:
+            response.response = metrics.count_bytes(response.response, observe)
+        else:
+            observe(response.calculate_content_length() or 0)
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics_endpoint():
+        """
+        Возвращает метрики процесса в текстовом формате Prometheus.
+
+        :return: Метрики запросов, кеша ответов, ожидания блокировок и команд к базе данных
+        :rtype: flask.Response
+        """
+        return Response(metrics.REGISTRY.render(), 200, content_type=metrics.CONTENT_TYPE)
 
     @app.route('/imports', methods=['POST'])
     @handle_exceptions(logger)
@@ -29,7 +74,9 @@ def make_app(db: Database, data_validator: DataValidator, lock: MongoLock) -> Fl
         Принимает на вход набор с данными о жителях в формате json
         и сохраняет его с уникальным идентификатором import_id.
 
+        Тело запроса разбирается из потока по одному жителю, поэтому потребление памяти не зависит от размера поставки.
         :raises: :class:`BadRequest`: Content-Type в заголовке запроса не равен application/json
+        :raises: :class:`JSONDecodeError`: Тело запроса не является корректным JSON
         :raises: :class:`PyMongoError`: Операция записи в базу данных не была разрешена
 
         :returns: В случае успеха возвращается ответ с идентификатором импорта
@@ -38,10 +85,9 @@ def make_app(db: Database, data_validator: DataValidator, lock: MongoLock) -> Fl
         if not request.is_json:
             raise BadRequest('Content-Type must be application/json')
 
-        import_data = request.get_json()
-        data_validator.validate_import(import_data)
-        data, status = post_import(import_data, lock, db)
-        return Response(json.dumps(data, ensure_ascii=False), status, mimetype='application/json; charset=utf-8')
+        citizens = data_validator.validate_import_stream(iter_citizens(request.stream))
+        data, status = post_import(citizens, db)
+        return Response(response_body.encode_body(data), status, mimetype='application/json; charset=utf-8')
 
     @app.route('/imports/<int:import_id>/citizens/<int:citizen_id>', methods=['PATCH'])
     @handle_exceptions(logger)
@@ -61,32 +107,56 @@ def make_app(db: Database, data_validator: DataValidator, lock: MongoLock) -> Fl
         if not request.is_json:
             raise BadRequest('Content-Type must be application/json')
 
-        patch_data = request.get_json()
+        patch_data = response_body.decode_body(request.get_data())
         data_validator.validate_citizen_patch(citizen_id, patch_data)
         data, status = patch_citizen(import_id, citizen_id, patch_data, lock, db)
-        return Response(json.dumps(data, ensure_ascii=False), status, mimetype='application/json; charset=utf-8')
+        return Response(response_body.encode_body(data), status, mimetype='application/json; charset=utf-8')
+
+    @app.route('/imports/<int:import_id>/citizens', methods=['PATCH'])
+    @handle_exceptions(logger)
+    def citizens_batch(import_id: int):
+        """
+        Изменяет информацию о нескольких жителях в указанном наборе данных.
+        На вход подается JSON, в поле citizens которого перечислены изменения жителей с полем citizen_id.
+
+        :param int import_id: Уникальный идентификатор поставки, в которой изменяется информация о жителях
+        :raises: :class:`BadRequest`: Content-Type в заголовке запроса не равен application/json
+        :raises: :class:`PyMongoError`: Объект с указанным уникальным идентификатором не был найден в базе данных
+
+        :return: Актуальная информация об указанных жителях
+        :rtype: flask.Response
+        """
+        if not request.is_json:
+            raise BadRequest('Content-Type must be application/json')
+
+        patches_data = response_body.decode_body(request.get_data())
+        data_validator.validate_citizens_patch(patches_data)
+        data, status = patch_citizens(import_id, patches_data['citizens'], lock, db)
+        return Response(response_body.encode_body(data), status, mimetype='application/json; charset=utf-8')
 
     @app.route('/imports/<int:import_id>/citizens', methods=['GET'])
     @handle_exceptions(logger)
+    @conditional_response(db)
     def citizens(import_id: int):
         """
         Возвращает список всех жителей для указанного набора данных.
 
+        Ответ отправляется частями (chunked) по мере чтения жителей из базы данных. Необязательные параметры
+        запроса town, gender и birth_month фильтруют жителей, limit и after_citizen_id задают страницу,
+        fields - список возвращаемых полей через запятую.
         :param int import_id: Уникальный идентификатор поставки
+        :raises: :class:`ValueError`: Параметр запроса указан в неверном формате
 
         :return: Список жителей в указанной поставке
         :rtype: flask.Response
         """
-        with lock(str(import_id), str(os.getpid()), expire=60, timeout=10):
-            citizens_list = shared.get_citizens(import_id, db, {'_id': 0, 'import_id': 0})
-            for citizen in citizens_list:
-                citizen['birth_date'] = citizen['birth_date'].strftime('%d.%m.%Y')
-            return Response(json.dumps({'data': citizens_list}, ensure_ascii=False), 201,
-                            mimetype='application/json; charset=utf-8')
+        chunks, status = get_citizens(import_id, db, lock, **parse_citizens_query(request.args))
+        return Response(chunks, status, mimetype='application/json; charset=utf-8')
 
     @app.route('/imports/<int:import_id>/citizens/birthdays', methods=['GET'])
     @handle_exceptions(logger)
-    @cache_response('birthdays', db, lock)
+    @conditional_response(db)
+    @cache_response('birthdays', db, lock, memory_cache=memory_cache)
     def birthdays(import_id: int):
         """
         Возвращает жителей и количество подарков, которые они будут покупать своим ближайшим родственникам
@@ -97,24 +167,34 @@ def make_app(db: Database, data_validator: DataValidator, lock: MongoLock) -> Fl
         :rtype: flask.Response
         """
         birthdays_data, status = get_birthdays(import_id, db, lock)
-        return Response(json.dumps(birthdays_data, ensure_ascii=False), status,
-                        mimetype='application/json; charset=utf-8')
+        response = Response(response_body.encode_body(birthdays_data), status,
+                            mimetype='application/json; charset=utf-8')
+        return response_body.with_response_data(response, birthdays_data)
 
     @app.route('/imports/<int:import_id>/towns/stat/percentile/age', methods=['GET'])
     @handle_exceptions(logger)
-    @cache_response('percentile_age', db, lock)
+    @conditional_response(db, date_param='as_of')
+    @cache_response('percentile_age', db, lock, key_params=['as_of'], memory_cache=memory_cache)
     def percentile_age(import_id: int):
         """
         Возвращает статистику по городам для указанного набора данных в разрезе возраста (полных лет) жителей:
         p50, p75, p99, где число - это значение перцентиля.
 
+        Необязательный параметр запроса as_of (ДД.ММ.ГГГГ) задает дату, на которую вычисляется возраст. Без него
+        возраст вычисляется на текущую дату, а заголовок Expires указывает ближайший день рождения, после которого
+        статистика пересчитывается.
         :param int import_id: уникальный идентификатор поставки
+        :raises: :class:`ValueError`: Параметр as_of указан в неверном формате
 
         :return: статистика по городам в разрезе возраста
         :rtype: flask.Response
         """
-        percentile_data, status = get_percentile_age(import_id, db, lock)
-        return Response(json.dumps(percentile_data, ensure_ascii=False), status,
-                        mimetype='application/json; charset=utf-8')
+        as_of = parse_as_of(request.args.get('as_of'))
+        percentile_data, status, expires = get_percentile_age(import_id, db, lock, as_of)
+        response = Response(response_body.encode_body(percentile_data), status,
+                            mimetype='application/json; charset=utf-8')
+        if expires is not None:
+            response.headers['Expires'] = http_date(expires)
+        return response_body.with_response_data(response, percentile_data)
 
     return app
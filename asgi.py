@@ -0,0 +1,36 @@
+import os
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
+from application import metrics
+from application.aio.read_write_lock import AsyncReadWriteMongoLock
+from application.aio.service import make_app
+from application.custom_mongo_client import CustomMongoClient
+from application.data_validator import DataValidator
+from application.memory_cache import MemoryCache, DEFAULT_MAX_BYTES, DEFAULT_MAX_ENTRIES
+from application.read_write_lock import ReadWriteMongoLock
+
+db_uri = os.environ['DATABASE_URI']
+port = int(os.environ['DATABASE_PORT'])
+db_name = os.environ['DATABASE_NAME']
+replica_set = os.environ['REPLICA_SET']
+memory_cache_max_entries = int(os.environ.get('MEMORY_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES))
+memory_cache_max_bytes = int(os.environ.get('MEMORY_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+
+monitoring.register(metrics.MongoCommandListener())
+with CustomMongoClient(db_uri, port, replica_set) as sync_client:
+    with ReadWriteMongoLock(client=sync_client, db=db_name)('indexes', str(os.getpid()), timeout=60, expire=10):
+        sync_client.create_db_indexes(db_name)
+
+client = AsyncIOMotorClient(db_uri, port, replicaset=replica_set)
+lock = AsyncReadWriteMongoLock(client=client, db=db_name)
+db = client[db_name]
+data_validator = DataValidator()
+memory_cache = MemoryCache(memory_cache_max_entries, memory_cache_max_bytes)
+app = make_app(db, data_validator, lock, memory_cache)
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(app, host='0.0.0.0', port=8080)
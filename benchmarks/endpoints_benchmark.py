@@ -0,0 +1,237 @@
+"""
+Бенчмарк обработчиков REST API на поставках разного размера.
+
+Для каждого размера поставки и каждого обработчика (POST /imports, PATCH жителя, GET жителей, подарков по месяцам и
+статистики возрастов) запускается отдельный процесс с приложением make_app. Процесс загружает поставку, после чего
+последовательно выполняет запросы через тестовый клиент flask и измеряет пропускную способность, задержку первого
+запроса, p50 и p99 задержки и пиковое потребление памяти процессом (RSS). Результаты выводятся таблицей и сохраняются
+в JSON, чтобы сравнивать запуски между собой.
+
+По умолчанию база данных - mongomock в памяти процесса, поэтому измеряется в основном python часть обработчиков.
+Для измерения с реальной базой указываются параметры подключения к mongod, запущенному в режиме replica set.
+
+Запуск из корня репозитория:
+    python -m benchmarks.endpoints_benchmark --sizes 10000 100000 --output benchmark.json
+    python -m benchmarks.endpoints_benchmark --mongo-host localhost --mongo-port 27017 --replica-set rs0
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from flask.testing import FlaskClient
+from mongomock import MongoClient as MockMongoClient
+
+from application import response_body
+from application.custom_mongo_client import CustomMongoClient
+from application.data_validator import DataValidator
+from application.memory_cache import MemoryCache
+from application.read_write_lock import ReadWriteMongoLock
+from application.service import make_app
+from benchmarks.import_generator import ImportGenerator
+
+
+class _StandInSession(object):
+    """Сессия без транзакций для mongomock, который не поддерживает сессии."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def __bool__(self):
+        return False
+
+    def start_transaction(self):
+        return self
+
+
+class StandInMongoClient(MockMongoClient):
+    """Клиент mongomock, заменяющий локальный mongod. Транзакции не выполняются, запросы выполняются сразу."""
+
+    def start_session(self):
+        return _StandInSession()
+
+
+def _post_import(app: FlaskClient, body: bytes, import_id: int, rng: random.Random, citizens_count: int):
+    return app.post('/imports', data=body, content_type='application/json')
+
+
+def _patch_citizen(app: FlaskClient, body: bytes, import_id: int, rng: random.Random, citizens_count: int):
+    patch_data = {'name': f'Житель {rng.randrange(citizens_count)}',
+                  'birth_date': f'{rng.randint(1, 28):02}.{rng.randint(1, 12):02}.{rng.randint(1940, 2018)}'}
+    return app.patch(f'/imports/{import_id}/citizens/{rng.randrange(citizens_count)}',
+                     data=response_body.encode_body(patch_data), content_type='application/json')
+
+
+def _get_citizens(app: FlaskClient, body: bytes, import_id: int, rng: random.Random, citizens_count: int):
+    return app.get(f'/imports/{import_id}/citizens')
+
+
+def _get_birthdays(app: FlaskClient, body: bytes, import_id: int, rng: random.Random, citizens_count: int):
+    return app.get(f'/imports/{import_id}/citizens/birthdays')
+
+
+def _get_percentile_age(app: FlaskClient, body: bytes, import_id: int, rng: random.Random, citizens_count: int):
+    return app.get(f'/imports/{import_id}/towns/stat/percentile/age')
+
+
+ENDPOINTS: Dict[str, Callable] = {
+    'post_import': _post_import,
+    'patch_citizen': _patch_citizen,
+    'get_citizens': _get_citizens,
+    'get_birthdays': _get_birthdays,
+    'get_percentile_age': _get_percentile_age
+}
+
+
+def _get_peak_rss_mb() -> float:
+    """
+    Возвращает пиковое потребление памяти текущим процессом.
+
+    :return: Пиковый RSS в мегабайтах
+    :rtype: float
+    """
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss / 1024 / (1024 if sys.platform == 'darwin' else 1)
+
+
+def _connect(args: argparse.Namespace, db_name: str):
+    """
+    Подключается к mongod, если указан его адрес, или создает mongomock в памяти процесса.
+
+    :param argparse.Namespace args: аргументы запуска бенчмарка
+    :param str db_name: имя базы данных
+
+    :return: Клиент монго
+    """
+    if args.mongo_host is None:
+        return StandInMongoClient()
+    client = CustomMongoClient(args.mongo_host, args.mongo_port, args.replica_set)
+    client.create_db_indexes(db_name)
+    return client
+
+
+def measure_endpoint(endpoint: str, citizens_count: int, requests_count: int, args: argparse.Namespace) -> dict:
+    """
+    Измеряет обработчик на поставке указанного размера. Выполняется в отдельном процессе.
+
+    Поставка загружается до измерения, кроме измерения POST /imports. Первый запрос к обработчикам с кешем
+    вычисляет ответ, остальные читают его из кеша, поэтому задержка первого запроса выводится отдельно.
+    :param str endpoint: имя обработчика из ENDPOINTS
+    :param int citizens_count: количество жителей в поставке
+    :param int requests_count: количество измеряемых запросов
+    :param argparse.Namespace args: аргументы запуска бенчмарка
+
+    :return: Результаты измерения
+    :rtype: dict
+    """
+    db_name = f'benchmark_{os.getpid()}'
+    client = _connect(args, db_name)
+    db = client[db_name]
+    lock = ReadWriteMongoLock(client=client, db=db_name)
+    app = make_app(db, DataValidator(), lock, MemoryCache()).test_client()
+    body = io.BytesIO()
+    ImportGenerator(args.seed, relatives_mean=args.relatives).write(body, citizens_count)
+    body = body.getvalue()
+    rng = random.Random(args.seed)
+
+    import_id = None
+    if endpoint != 'post_import':
+        import_data = response_body.decode_body(_post_import(app, body, 0, rng, citizens_count).get_data())
+        import_id = import_data['data']['import_id']
+    rss_before = _get_peak_rss_mb()
+
+    latencies, response_bytes = [], 0
+    for _ in range(requests_count):
+        start = time.perf_counter()
+        http_response = ENDPOINTS[endpoint](app, body, import_id, rng, citizens_count)
+        data = http_response.get_data()
+        latencies.append(time.perf_counter() - start)
+        if http_response.status_code >= 300:
+            raise RuntimeError(f'{endpoint} responded with {http_response.status_code}: {data[:200]}')
+        response_bytes = len(data)
+
+    if args.mongo_host is not None:
+        client.drop_database(db_name)
+    return {'endpoint': endpoint, 'citizens': citizens_count, 'requests': requests_count,
+            'throughput_rps': requests_count / sum(latencies),
+            'first_ms': latencies[0] * 1000,
+            'p50_ms': float(np.percentile(latencies, 50)) * 1000,
+            'p99_ms': float(np.percentile(latencies, 99)) * 1000,
+            'peak_rss_mb': _get_peak_rss_mb(),
+            'peak_rss_before_mb': rss_before,
+            'response_bytes': response_bytes}
+
+
+def run(args: argparse.Namespace) -> List[dict]:
+    """
+    Запускает измерения всех указанных обработчиков на всех размерах поставок, каждое в новом процессе,
+    чтобы пиковый RSS одного измерения не влиял на другие.
+
+    :param argparse.Namespace args: аргументы запуска бенчмарка
+
+    :return: Результаты измерений
+    :rtype: List[dict]
+    """
+    context = multiprocessing.get_context('spawn')
+    results = []
+    print(f'{"endpoint":>20} {"citizens":>10} {"rps":>10} {"first, ms":>12} {"p50, ms":>12} {"p99, ms":>12} '
+          f'{"rss, MB":>10}')
+    for citizens_count in args.sizes:
+        for endpoint in args.endpoints:
+            requests_count = args.import_requests if endpoint == 'post_import' else args.requests
+            with context.Pool(1) as pool:
+                result = pool.apply(measure_endpoint, (endpoint, citizens_count, requests_count, args))
+            results.append(result)
+            print(f'{endpoint:>20} {citizens_count:>10} {result["throughput_rps"]:>10.2f} {result["first_ms"]:>12.1f} '
+                  f'{result["p50_ms"]:>12.1f} {result["p99_ms"]:>12.1f} {result["peak_rss_mb"]:>10.1f}')
+    return results
+
+
+def save_results(results: List[dict], args: argparse.Namespace, output: Optional[str]):
+    """
+    Сохраняет результаты измерений вместе с параметрами запуска и окружением в JSON.
+
+    :param List[dict] results: результаты измерений
+    :param argparse.Namespace args: аргументы запуска бенчмарка
+    :param Optional[str] output: путь к файлу результатов или None, если сохранять не нужно
+    """
+    if output is None:
+        return
+    report = {'date': datetime.utcnow().isoformat(), 'python': platform.python_version(),
+              'platform': platform.platform(), 'database': 'mongomock' if args.mongo_host is None else 'mongod',
+              'relatives': args.relatives, 'seed': args.seed, 'results': results}
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--endpoints', nargs='+', choices=list(ENDPOINTS), default=list(ENDPOINTS))
+    parser.add_argument('--requests', type=int, default=20, help='количество запросов к каждому обработчику')
+    parser.add_argument('--import-requests', type=int, default=3, help='количество запросов POST /imports')
+    parser.add_argument('--relatives', type=float, default=2, help='среднее количество родственников жителя')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='путь к JSON файлу для сохранения результатов')
+    parser.add_argument('--mongo-host', help='адрес mongod, по умолчанию используется mongomock')
+    parser.add_argument('--mongo-port', type=int, default=27017)
+    parser.add_argument('--replica-set', default='rs0')
+    args = parser.parse_args()
+
+    save_results(run(args), args, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+"""
+Генератор корректных синтетических поставок для нагрузочного тестирования и бенчмарков.
+
+Жители генерируются и записываются блоками, родственники каждого жителя выбираются только внутри его блока,
+поэтому потребление памяти зависит от размера блока, а не от количества жителей. Результат полностью определяется
+параметрами генератора и начальным значением seed: используется numpy.random.RandomState, последовательность которого
+не меняется между версиями numpy.
+
+Запуск из корня репозитория:
+    python -m benchmarks.import_generator 1000000 --seed 1 --town-skew 1.2 --output import.json
+"""
+import argparse
+import json
+import sys
+from datetime import date
+from typing import BinaryIO, Iterator, List
+
+import numpy as np
+
+TOWNS = ['Москва', 'Санкт-Петербург', 'Новосибирск', 'Екатеринбург', 'Казань', 'Нижний Новгород', 'Челябинск',
+         'Самара', 'Омск', 'Ростов-на-Дону', 'Уфа', 'Красноярск', 'Воронеж', 'Пермь', 'Волгоград']
+STREETS = ['Льва Толстого', 'Ленина', 'Пушкина', 'Гагарина', 'Садовая', 'Советская', 'Мира', 'Лесная']
+SURNAMES = ['Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Петров', 'Соколов', 'Михайлов']
+MALE_NAMES = ['Иван', 'Сергей', 'Алексей', 'Дмитрий', 'Андрей', 'Михаил']
+FEMALE_NAMES = ['Мария', 'Анна', 'Елена', 'Ольга', 'Наталья', 'Татьяна']
+PATRONYMICS = ['Иванов', 'Сергеев', 'Алексеев', 'Дмитриев', 'Андреев', 'Михайлов']
+BIRTH_DATE_DISTRIBUTIONS = ('uniform', 'normal')
+DEGREE_DISTRIBUTIONS = ('poisson', 'fixed', 'powerlaw')
+
+
+class ImportGenerator(object):
+    """
+    Класс для генерации поставок, проходящих DataValidator.validate_import.
+
+    :ivar: int seed: начальное значение генератора случайных чисел
+    :ivar: List[str] towns: названия городов
+    :ivar: np.ndarray town_weights: вероятности городов, убывающие по закону Ципфа с показателем town_skew
+    :ivar: str birth_dates: распределение возрастов: uniform - равномерное от 0 до max_age лет,
+        normal - нормальное со средним mean_age и отклонением age_std лет
+    :ivar: str degrees: распределение количества родственников: poisson, fixed или powerlaw (Ципф)
+    :ivar: float relatives_mean: среднее количество родственников жителя
+    :ivar: int block_size: количество жителей в блоке, внутри которого выбираются родственники
+    :ivar: date reference_date: дата, от которой отсчитываются возрасты
+    """
+
+    def __init__(self, seed: int = 0, towns_count: int = 10, town_skew: float = 1.0, birth_dates: str = 'uniform',
+                 mean_age: float = 35, age_std: float = 18, max_age: int = 100, degrees: str = 'poisson',
+                 relatives_mean: float = 2, block_size: int = 1000, reference_date: date = date(2020, 1, 1)):
+        if birth_dates not in BIRTH_DATE_DISTRIBUTIONS:
+            raise ValueError('birth_dates must be one of ' + ', '.join(BIRTH_DATE_DISTRIBUTIONS))
+        if degrees not in DEGREE_DISTRIBUTIONS:
+            raise ValueError('degrees must be one of ' + ', '.join(DEGREE_DISTRIBUTIONS))
+        if towns_count < 1 or block_size < 2:
+            raise ValueError('towns_count must be positive and block_size must be at least 2')
+
+        self.seed = seed
+        self.towns = (TOWNS + [f'Город {i}' for i in range(len(TOWNS), towns_count)])[:towns_count]
+        weights = 1 / np.arange(1, towns_count + 1) ** town_skew
+        self.town_weights = weights / weights.sum()
+        self.birth_dates = birth_dates
+        self.mean_age = mean_age
+        self.age_std = age_std
+        self.max_age = max_age
+        self.degrees = degrees
+        self.relatives_mean = relatives_mean
+        self.block_size = block_size
+        self.reference_date = reference_date
+
+    def _make_birth_dates(self, rng: np.random.RandomState, count: int) -> List[str]:
+        """
+        Создает даты рождения по возрастам из выбранного распределения.
+
+        :param np.random.RandomState rng: генератор случайных чисел
+        :param int count: количество дат
+
+        :return: Даты рождения в формате ДД.ММ.ГГГГ
+        :rtype: List[str]
+        """
+        if self.birth_dates == 'uniform':
+            ages = rng.uniform(0, self.max_age, count)
+        else:
+            ages = np.clip(rng.normal(self.mean_age, self.age_std, count), 0, self.max_age)
+        ordinals = self.reference_date.toordinal() - (ages * 365.25).astype(np.int64)
+        return [date.fromordinal(ordinal).strftime('%d.%m.%Y') for ordinal in ordinals.tolist()]
+
+    def _make_degrees(self, rng: np.random.RandomState, count: int) -> np.ndarray:
+        """
+        Создает желаемое количество родственников каждого жителя блока из выбранного распределения.
+
+        :param np.random.RandomState rng: генератор случайных чисел
+        :param int count: количество жителей в блоке
+
+        :return: Количество родственников каждого жителя, не больше count - 1
+        :rtype: np.ndarray
+        """
+        if self.degrees == 'poisson':
+            degrees = rng.poisson(self.relatives_mean, count)
+        elif self.degrees == 'fixed':
+            degrees = np.full(count, int(round(self.relatives_mean)))
+        else:
+            degrees = rng.zipf(2 + 1 / max(self.relatives_mean, 1e-9), count) - 1
+        return np.minimum(degrees, count - 1)
+
+    def _make_relatives(self, rng: np.random.RandomState, first_id: int, count: int) -> List[List[int]]:
+        """
+        Создает симметричный граф родственных связей внутри блока жителей конфигурационной моделью.
+
+        Концы связей жителей перемешиваются и соединяются попарно, петли и повторные связи отбрасываются,
+        поэтому итоговое распределение количества родственников близко к заданному.
+        :param np.random.RandomState rng: генератор случайных чисел
+        :param int first_id: идентификатор первого жителя блока
+        :param int count: количество жителей в блоке
+
+        :return: Отсортированные идентификаторы родственников каждого жителя блока
+        :rtype: List[List[int]]
+        """
+        stubs = np.repeat(np.arange(count), self._make_degrees(rng, count))
+        rng.shuffle(stubs)
+        if len(stubs) % 2:
+            stubs = stubs[:-1]
+        relatives = [set() for _ in range(count)]
+        for first, second in zip(stubs[0::2].tolist(), stubs[1::2].tolist()):
+            if first != second:
+                relatives[first].add(first_id + second)
+                relatives[second].add(first_id + first)
+        return [sorted(citizen_relatives) for citizen_relatives in relatives]
+
+    def iter_citizens(self, citizens_count: int) -> Iterator[dict]:
+        """
+        Генерирует жителей поставки по одному с идентификаторами от 0 до citizens_count - 1.
+
+        :param int citizens_count: количество жителей
+        """
+        rng = np.random.RandomState(self.seed)
+        for first_id in range(0, citizens_count, self.block_size):
+            count = min(self.block_size, citizens_count - first_id)
+            towns = rng.choice(len(self.towns), count, p=self.town_weights).tolist()
+            streets = rng.randint(len(STREETS), size=count).tolist()
+            buildings = rng.randint(1, 200, size=count).tolist()
+            apartments = rng.randint(1, 500, size=count).tolist()
+            genders = rng.randint(2, size=count).tolist()
+            names = rng.randint(len(SURNAMES) * len(MALE_NAMES) * len(PATRONYMICS), size=count).tolist()
+            birth_dates = self._make_birth_dates(rng, count)
+            relatives = self._make_relatives(rng, first_id, count)
+
+            for i in range(count):
+                yield {'citizen_id': first_id + i, 'town': self.towns[towns[i]], 'street': STREETS[streets[i]],
+                       'building': str(buildings[i]), 'apartment': apartments[i],
+                       'name': _make_name(names[i], genders[i] == 0), 'birth_date': birth_dates[i],
+                       'gender': 'male' if genders[i] == 0 else 'female', 'relatives': relatives[i]}
+
+    def write(self, stream: BinaryIO, citizens_count: int):
+        """
+        Записывает поставку в формате тела запроса POST /imports в поток по мере генерации жителей.
+
+        :param BinaryIO stream: поток, в который записывается поставка
+        :param int citizens_count: количество жителей
+        """
+        stream.write(b'{"citizens": [')
+        for citizen in self.iter_citizens(citizens_count):
+            if citizen['citizen_id'] > 0:
+                stream.write(b',\n')
+            stream.write(json.dumps(citizen, ensure_ascii=False).encode('utf-8'))
+        stream.write(b']}')
+
+
+def _make_name(index: int, is_male: bool) -> str:
+    """
+    Составляет ФИО жителя по номеру сочетания фамилии, имени и отчества.
+
+    :param int index: номер сочетания
+    :param bool is_male: житель мужского пола
+
+    :return: ФИО жителя
+    :rtype: str
+    """
+    index, surname = divmod(index, len(SURNAMES))
+    patronymic, name = divmod(index, len(MALE_NAMES))
+    if is_male:
+        return f'{SURNAMES[surname]} {MALE_NAMES[name]} {PATRONYMICS[patronymic]}ич'
+    return f'{SURNAMES[surname]}а {FEMALE_NAMES[name]} {PATRONYMICS[patronymic]}на'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('citizens', type=int, help='количество жителей')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--towns', type=int, default=10, help='количество городов')
+    parser.add_argument('--town-skew', type=float, default=1.0,
+                        help='показатель закона Ципфа для размеров городов, 0 - равномерно')
+    parser.add_argument('--birth-dates', choices=BIRTH_DATE_DISTRIBUTIONS, default='uniform')
+    parser.add_argument('--mean-age', type=float, default=35)
+    parser.add_argument('--age-std', type=float, default=18)
+    parser.add_argument('--max-age', type=int, default=100)
+    parser.add_argument('--degrees', choices=DEGREE_DISTRIBUTIONS, default='poisson',
+                        help='распределение количества родственников')
+    parser.add_argument('--relatives', type=float, default=2, help='среднее количество родственников жителя')
+    parser.add_argument('--block-size', type=int, default=1000,
+                        help='количество жителей в блоке, внутри которого выбираются родственники')
+    parser.add_argument('--output', help='путь к файлу поставки, по умолчанию stdout')
+    args = parser.parse_args()
+
+    generator = ImportGenerator(args.seed, args.towns, args.town_skew, args.birth_dates, args.mean_age, args.age_std,
+                                args.max_age, args.degrees, args.relatives, args.block_size)
+    if args.output is None:
+        generator.write(sys.stdout.buffer, args.citizens)
+    else:
+        with open(args.output, 'wb') as f:
+            generator.write(f, args.citizens)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+"""
+Микро-бенчмарки чистых функций обработчиков на входах растущего размера.
+
+Для каждой функции измеряется минимальное время выполнения на каждом размере входа, по измерениям оценивается
+показатель степени роста времени и подбирается ближайшая кривая сложности: O(1), O(log n), O(n), O(n log n)
+или O(n^2). Результаты можно сохранить как базовые и сравнивать с ними следующие запуски: функция отмечается как
+регрессия, если на наибольшем общем размере она стала медленнее больше, чем на порог, или показатель степени роста
+времени увеличился больше, чем на порог. Кривые O(n) и O(n log n) на практических размерах почти не различаются,
+поэтому сама смена кривой регрессией не считается. При наличии регрессий процесс завершается с кодом 1.
+
+Входные данные создаются генератором поставок benchmarks.import_generator, поэтому не меняются между запусками.
+
+Запуск из корня репозитория:
+    python -m benchmarks.micro_benchmark --save-baseline baseline.json
+    python -m benchmarks.micro_benchmark --baseline baseline.json --threshold 0.2
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from application.data_validator import DataValidator
+from application.handlers import get_birthdays_handler, get_percentile_age_handler, post_import_handler
+from benchmarks.import_generator import ImportGenerator
+
+COMPLEXITIES: Dict[str, Callable[[np.ndarray], np.ndarray]] = {
+    'O(1)': lambda n: np.ones_like(n),
+    'O(log n)': np.log,
+    'O(n)': lambda n: n,
+    'O(n log n)': lambda n: n * np.log(n),
+    'O(n^2)': lambda n: n ** 2
+}
+REFERENCE_DATE = date(2020, 1, 1)
+
+
+@lru_cache(maxsize=None)
+def _make_citizens(size: int) -> List[dict]:
+    """
+    Создает жителей поставки указанного размера с датами рождения в виде строк, как в теле запроса.
+
+    :param int size: количество жителей
+
+    :return: Жители поставки
+    :rtype: List[dict]
+    """
+    return list(ImportGenerator(seed=0).iter_citizens(size))
+
+
+@lru_cache(maxsize=None)
+def _make_parsed_citizens(size: int) -> List[dict]:
+    """
+    Создает жителей поставки указанного размера с датами рождения в datetime, как в базе данных.
+
+    :param int size: количество жителей
+
+    :return: Жители поставки
+    :rtype: List[dict]
+    """
+    return [{**citizen, 'birth_date': datetime.strptime(citizen['birth_date'], '%d.%m.%Y')}
+            for citizen in _make_citizens(size)]
+
+
+def _parse_birth_dates(citizens: List[dict]):
+    for citizen in citizens:
+        post_import_handler._parse_birth_date(citizen)
+
+
+def _calculate_percentiles(codes: np.ndarray, birth_dates: np.ndarray, towns_count: int):
+    ages = get_percentile_age_handler._calculate_ages(birth_dates, REFERENCE_DATE)
+    get_percentile_age_handler._calculate_percentiles(codes, ages, np.ones_like(ages), towns_count)
+
+
+def _prepare_percentiles(size: int) -> tuple:
+    towns, codes, birth_dates = get_percentile_age_handler._load_citizens(_make_parsed_citizens(size))
+    return codes, birth_dates, len(towns)
+
+
+_validator = DataValidator()
+
+CASES: Dict[str, Tuple[Callable[[int], tuple], Callable]] = {
+    'parse_birth_date': (lambda size: ([{'birth_date': citizen['birth_date']} for citizen in _make_citizens(size)],),
+                         _parse_birth_dates),
+    'validate_import': (lambda size: ({'citizens': _make_citizens(size)},), _validator.validate_import),
+    'get_birthdays_data': (lambda size: (_make_parsed_citizens(size),), get_birthdays_handler._get_birthdays_data),
+    'get_birthdays_representation': (
+        lambda size: (get_birthdays_handler._get_birthdays_data(_make_parsed_citizens(size)),),
+        get_birthdays_handler._get_birthdays_representation),
+    'load_citizens': (lambda size: (_make_parsed_citizens(size),), get_percentile_age_handler._load_citizens),
+    'calculate_ages': (lambda size: (_prepare_percentiles(size)[1], REFERENCE_DATE),
+                       get_percentile_age_handler._calculate_ages),
+    'calculate_percentiles': (_prepare_percentiles, _calculate_percentiles)
+}
+
+
+def measure(prepare: Callable[[int], tuple], function: Callable, size: int, repeat: int) -> float:
+    """
+    Измеряет минимальное время выполнения функции.
+
+    Входные данные готовятся заново перед каждым запуском, так как функция может их изменять.
+
+    :param Callable prepare: функция, создающая аргументы по размеру входа
+    :param Callable function: измеряемая функция
+    :param int size: размер входа
+    :param int repeat: количество запусков
+
+    :return: Минимальное время выполнения в секундах
+    :rtype: float
+    """
+    times = []
+    for _ in range(repeat):
+        args = prepare(size)
+        start = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def fit_complexity(sizes: List[int], times: List[float]) -> Tuple[float, str]:
+    """
+    Оценивает рост времени выполнения от размера входа.
+
+    Показатель степени - наклон прямой по логарифмам размеров и времени. Кривая сложности выбирается по наименьшей
+    относительной ошибке приближения времени функцией a * f(n) + b с неотрицательным a.
+    :param List[int] sizes: размеры входов
+    :param List[float] times: время выполнения на каждом размере
+
+    :return: Показатель степени и название ближайшей кривой сложности
+    :rtype: Tuple[float, str]
+    """
+    n, t = np.asarray(sizes, dtype=np.float64), np.asarray(times, dtype=np.float64)
+    exponent = float(np.polyfit(np.log(n), np.log(t), 1)[0])
+
+    best_complexity, best_error = None, float('inf')
+    for name, complexity in COMPLEXITIES.items():
+        f = complexity(n)
+        if name == 'O(1)':
+            predicted = np.full_like(t, t.mean())
+        else:
+            (a, b), *_ = np.linalg.lstsq(np.column_stack([f, np.ones_like(f)]), t, rcond=None)
+            predicted = max(a, 0) * f + b
+        error = float(np.sqrt(np.mean(((predicted - t) / t) ** 2)))
+        if error < best_error:
+            best_complexity, best_error = name, error
+    return exponent, best_complexity
+
+
+def run(cases: List[str], sizes: List[int], repeat: int) -> Dict[str, dict]:
+    """
+    Измеряет указанные функции на всех размерах входа и оценивает их сложность.
+
+    :param List[str] cases: имена функций из CASES
+    :param List[int] sizes: размеры входов по возрастанию
+    :param int repeat: количество запусков на каждом размере
+
+    :return: Результаты по имени функции: размеры, время, показатель степени и кривая сложности
+    :rtype: Dict[str, dict]
+    """
+    results = {}
+    for case in cases:
+        prepare, function = CASES[case]
+        times = [measure(prepare, function, size, repeat) for size in sizes]
+        exponent, complexity = fit_complexity(sizes, times)
+        results[case] = {'sizes': sizes, 'times': times, 'exponent': exponent, 'complexity': complexity}
+        print(f'{case:>30} {complexity:>12} {exponent:>6.2f}  ' +
+              ' '.join(f'{size}: {t * 1000:.3f}ms' for size, t in zip(sizes, times)))
+    return results
+
+
+def find_regressions(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float,
+                     exponent_threshold: float) -> List[str]:
+    """
+    Сравнивает результаты с базовыми.
+
+    :param Dict[str, dict] results: результаты текущего запуска
+    :param Dict[str, dict] baseline: базовые результаты
+    :param float threshold: допустимое относительное замедление на наибольшем общем размере входа
+    :param float exponent_threshold: допустимое увеличение показателя степени роста времени
+
+    :return: Описания найденных регрессий
+    :rtype: List[str]
+    """
+    regressions = []
+    for case, result in results.items():
+        if case not in baseline:
+            continue
+        base = baseline[case]
+        common_sizes = sorted(set(result['sizes']) & set(base['sizes']))
+        if common_sizes:
+            size = common_sizes[-1]
+            ratio = result['times'][result['sizes'].index(size)] / base['times'][base['sizes'].index(size)]
+            if ratio > 1 + threshold:
+                regressions.append(f'{case}: {ratio:.2f}x slower than baseline at size {size}')
+        if result['exponent'] - base['exponent'] > exponent_threshold:
+            regressions.append(f'{case}: growth exponent changed from {base["exponent"]:.2f} '
+                               f'({base["complexity"]}) to {result["exponent"]:.2f} ({result["complexity"]})')
+    return regressions
+
+
+def _save(path: Optional[str], results: Dict[str, dict]):
+    if path is not None:
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES))
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 2000, 4000, 8000, 16000, 32000, 64000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--baseline', help='путь к JSON с базовыми результатами для сравнения')
+    parser.add_argument('--threshold', type=float, default=0.2, help='допустимое относительное замедление')
+    parser.add_argument('--exponent-threshold', type=float, default=0.3,
+                        help='допустимое увеличение показателя степени роста времени')
+    parser.add_argument('--save-baseline', help='путь для сохранения результатов как базовых')
+    parser.add_argument('--output', help='путь к JSON файлу для сохранения результатов')
+    args = parser.parse_args()
+
+    print(f'{"function":>30} {"complexity":>12} {"exp":>6}  time by size')
+    results = run(args.cases, sorted(args.sizes), args.repeat)
+    _save(args.output, results)
+    _save(args.save_baseline, results)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.threshold, args.exponent_threshold)
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        if regressions:
+            sys.exit(1)
+        print('No regressions against baseline')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Сравнение скорости проверки графа родственных связей множествами python и массивами numpy.
+
+Запуск из корня репозитория:
+    python -m benchmarks.relatives_graph_benchmark
+"""
+import argparse
+import random
+import timeit
+from typing import Dict, List
+
+from application.relatives_graph import RelativesGraph
+
+
+def make_relatives(citizens_count: int, relatives_per_citizen: int, seed: int) -> Dict[int, List[int]]:
+    """
+    Создает родственников жителей, образующих корректный симметричный граф родственных связей.
+
+    :param int citizens_count: количество жителей
+    :param int relatives_per_citizen: среднее количество родственников жителя
+    :param int seed: начальное значение генератора случайных чисел
+
+    :return: Словарь из идентификатора жителя в список идентификаторов его родственников
+    :rtype: Dict[int, List[int]]
+    """
+    rng = random.Random(seed)
+    relatives = {citizen_id: set() for citizen_id in range(citizens_count)}
+    for _ in range(citizens_count * relatives_per_citizen // 2):
+        first, second = rng.randrange(citizens_count), rng.randrange(citizens_count)
+        if first != second:
+            relatives[first].add(second)
+            relatives[second].add(first)
+    return {citizen_id: list(citizen_relatives) for citizen_id, citizen_relatives in relatives.items()}
+
+
+def measure(relatives: Dict[int, List[int]], numpy_threshold: float, repeat: int) -> float:
+    """
+    Измеряет минимальное время заполнения и проверки графа.
+
+    Заполнение графа входит в измерение, так как при проверке поставки массивы numpy создаются из накопленных
+    связей каждый раз заново.
+    :param Dict[int, List[int]] relatives: родственники жителей
+    :param float numpy_threshold: минимальное количество связей, начиная с которого используется numpy
+    :param int repeat: количество повторов измерения
+
+    :return: Минимальное время в секундах
+    :rtype: float
+    """
+    def run():
+        graph = RelativesGraph(numpy_threshold)
+        for citizen_id, citizen_relatives in relatives.items():
+            graph.add_citizen(citizen_id, citizen_relatives)
+        graph.validate()
+
+    return min(timeit.repeat(run, number=1, repeat=repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 3000, 10000, 30000, 100000, 1000000])
+    parser.add_argument('--relatives', type=int, default=2, help='среднее количество родственников жителя')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f'{"citizens":>10} {"edges":>10} {"python, ms":>12} {"numpy, ms":>12} {"speedup":>8}')
+    crossover = None
+    for size in args.sizes:
+        relatives = make_relatives(size, args.relatives, args.seed)
+        python_time, numpy_time = measure(relatives, float('inf'), args.repeat), measure(relatives, 0, args.repeat)
+        edges_count = sum(map(len, relatives.values()))
+        if crossover is None and numpy_time < python_time:
+            crossover = edges_count
+        print(f'{size:>10} {edges_count:>10} {python_time * 1000:>12.3f} {numpy_time * 1000:>12.3f} '
+              f'{python_time / numpy_time:>8.2f}')
+
+    if crossover is None:
+        print('numpy was not faster on any of the measured sizes')
+    else:
+        print(f'numpy is faster starting from about {crossover} edges')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,23 +1,30 @@
 import os
 
-from mongolock import MongoLock
+from pymongo import monitoring
 
+from application import metrics
 from application.data_validator import DataValidator
 from application.custom_mongo_client import CustomMongoClient
+from application.memory_cache import MemoryCache, DEFAULT_MAX_BYTES, DEFAULT_MAX_ENTRIES
+from application.read_write_lock import ReadWriteMongoLock
 from application.service import make_app
 
 db_uri = os.environ['DATABASE_URI']
 port = int(os.environ['DATABASE_PORT'])
 db_name = os.environ['DATABASE_NAME']
 replica_set = os.environ['REPLICA_SET']
+memory_cache_max_entries = int(os.environ.get('MEMORY_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES))
+memory_cache_max_bytes = int(os.environ.get('MEMORY_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
 
+monitoring.register(metrics.MongoCommandListener())
 client = CustomMongoClient(db_uri, port, replica_set)
-lock = MongoLock(client=client, db=db_name)
+lock = ReadWriteMongoLock(client=client, db=db_name)
 with lock('indexes', str(os.getpid()), timeout=60, expire=10):
     client.create_db_indexes(db_name)
 db = client[db_name]
 data_validator = DataValidator()
-app = make_app(db, data_validator, lock)
+memory_cache = MemoryCache(memory_cache_max_entries, memory_cache_max_bytes)
+app = make_app(db, data_validator, lock, memory_cache)
 
 if __name__ == '__main__':
     app.run()
@@ -0,0 +1,120 @@
+import unittest
+from datetime import datetime, timedelta
+
+from mongolock import MongoLock, MongoLockLocked
+
+from application import metrics
+from application.aio.read_write_lock import AsyncReadWriteMongoLock
+from application.read_write_lock import ReadWriteMongoLock
+from tests import test_utils
+
+
+class AsyncReadWriteMongoLockTests(unittest.TestCase):
+    def setUp(self):
+        self.db = test_utils.get_fake_db()
+        async_db = test_utils.AsyncMockDatabase(self.db)
+        self.lock = AsyncReadWriteMongoLock(client=async_db.client, db=self.db.name, acquire_retry_step=0.01)
+        self.sync_lock = ReadWriteMongoLock(client=self.db.client, db=self.db.name)
+
+    def test_shared_should_allow_many_readers(self):
+        async def f():
+            async with self.lock.shared('key', 'a', timeout=0.1), self.lock.shared('key', 'b', timeout=0.1):
+                return self.db['lock_rw'].find_one({'_id': 'key'})['readers']
+
+        self.assertEqual(2, len(test_utils.run(f())))
+        self.assertEqual([], self.db['lock_rw'].find_one({'_id': 'key'})['readers'])
+
+    def test_should_record_wait_of_acquired_lock(self):
+        async def f():
+            async with self.lock.shared('wait_key', 'a'):
+                pass
+            async with self.lock.exclusive('wait_key', 'b'), self.lock('wait_key', 'c'):
+                pass
+
+        counts = {mode: metrics.LOCK_WAIT.get_count(lock='wait_key', mode=mode)
+                  for mode in ('lock', 'shared', 'exclusive')}
+        test_utils.run(f())
+        for mode, count in counts.items():
+            self.assertEqual(count + 1, metrics.LOCK_WAIT.get_count(lock='wait_key', mode=mode))
+
+    def test_exclusive_should_wait_for_sync_reader(self):
+        async def f():
+            async with self.lock.exclusive('key', 'b', timeout=0.05):
+                pass
+
+        with self.sync_lock.shared('key', 'a'):
+            with self.assertRaises(MongoLockLocked):
+                test_utils.run(f())
+            self.assertIsNone(self.db['lock_rw'].find_one({'_id': 'key'})['writer'])
+
+    def test_sync_shared_should_wait_for_writer(self):
+        async def f():
+            async with self.lock.exclusive('key', 'a'):
+                with self.assertRaises(MongoLockLocked):
+                    with self.sync_lock.shared('key', 'b', timeout=0.05):
+                        pass
+
+        test_utils.run(f())
+
+    def test_exclusive_should_not_wait_for_expired_reader(self):
+        self.db['lock_rw'].insert_one({'_id': 'key', 'writer': None,
+                                       'readers': [{'token': 'a', 'expire': datetime.utcnow() - timedelta(1)}]})
+
+        async def f():
+            async with self.lock.exclusive('key', 'b', timeout=0.05):
+                return self.db['lock_rw'].find_one({'_id': 'key'})['readers']
+
+        self.assertEqual([], test_utils.run(f()))
+
+    def test_call_should_wait_for_sync_lock(self):
+        async def f():
+            async with self.lock('key', 'b', timeout=0.05):
+                pass
+
+        with MongoLock(client=self.db.client, db=self.db.name)('key', 'a'):
+            with self.assertRaises(MongoLockLocked):
+                test_utils.run(f())
+        test_utils.run(f())
+        self.assertFalse(self.sync_lock.is_locked('key'))
+
+    def test_call_should_not_wait_for_expired_lock(self):
+        self.db['lock'].insert_one({'_id': 'key', 'locked': True, 'owner': 'a', 'created': datetime.utcnow(),
+                                    'expire': datetime.utcnow() - timedelta(1)})
+
+        async def f():
+            async with self.lock('key', 'b', timeout=0.05):
+                return self.db['lock'].find_one({'_id': 'key'})['owner']
+
+        self.assertTrue(test_utils.run(f()).startswith('b:'))
+
+    def test_call_should_not_release_lock_taken_after_expire_by_same_owner(self):
+        async def f():
+            first, second = self.lock('key', 'a', expire=60), self.lock('key', 'a', timeout=0.05, expire=60)
+            await first.__aenter__()
+            self.db['lock'].update_one({'_id': 'key'}, {'$set': {'expire': datetime.utcnow() - timedelta(1)}})
+            await second.__aenter__()
+            await first.__aexit__(None, None, None)
+            locked = self.sync_lock.is_locked('key')
+            await second.__aexit__(None, None, None)
+            return locked
+
+        self.assertTrue(test_utils.run(f()))
+        self.assertFalse(self.sync_lock.is_locked('key'))
+
+    def test_is_locked_should_check_all_modes(self):
+        async def f():
+            locked = [await self.lock.is_locked('key')]
+            async with self.lock.shared('key', 'a', expire=60):
+                locked.append(await self.lock.is_locked('key'))
+            async with self.lock.exclusive('key', 'a', expire=60):
+                locked.append(await self.lock.is_locked('key'))
+            async with self.lock('key', 'a', expire=60):
+                locked.append(await self.lock.is_locked('key'))
+            locked.append(await self.lock.is_locked('key'))
+            return locked
+
+        self.assertEqual([False, True, True, True, False], test_utils.run(f()))
+
+
+if __name__ == '__main__':
+    unittest.main()
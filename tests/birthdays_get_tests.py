@@ -1,25 +1,26 @@
 import unittest
 from datetime import datetime
-from unittest import mock
 
 from tests import test_utils
 
 
 class BirthdaysGetTests(unittest.TestCase):
+    async_mode = False
+
     @classmethod
     def setUp(cls):
-        cls.app, cls.db, cls.validator = test_utils.set_up_service()
+        cls.app, cls.db, cls.validator = test_utils.set_up_service(cls.async_mode)
         import_data = test_utils.read_data('import.json')
         import_data['import_id'] = 0
         for citizen in import_data['citizens']:
             citizen['birth_date'] = datetime.strptime(citizen['birth_date'], '%d.%m.%Y')
-        cls.db['imports'].insert_one(import_data)
+        test_utils.insert_import(cls.db, import_data)
 
     def test_should_return_birthday_data(self):
         http_response = self.app.get('/imports/0/citizens/birthdays')
         birthday_data = http_response.get_json()
         expected_result = {str(i): [] for i in range(1, 13)}
-        expected_result['2'] = [{'citizen_id': 3, 'presents': 1}, {'citizen_id': 1, 'presents': 1}]
+        expected_result['2'] = [{'citizen_id': 1, 'presents': 1}, {'citizen_id': 3, 'presents': 1}]
         self.assertEqual(201, http_response.status_code)
         self.assertEqual(expected_result, birthday_data['data'])
 
@@ -32,21 +33,53 @@ class BirthdaysGetTests(unittest.TestCase):
         self.assertEqual(expected_result, birthday_data['data'])
 
     def test_should_cache_birthday_data(self):
-        with mock.patch('application.decorators.response_cacher._cache_data') as cache_birthdays_mock:
+        with test_utils.patch_cache_data(self.async_mode) as cache_birthdays_mock:
             http_response = self.app.get('/imports/0/citizens/birthdays')
             self.assertEqual(201, http_response.status_code)
             cache_birthdays_mock.assert_called()
 
     def test_should_not_cache_when_birthday_data_in_cache(self):
-        with mock.patch('application.decorators.response_cacher._cache_data') as cache_birthdays_mock:
+        with test_utils.patch_cache_data(self.async_mode) as cache_birthdays_mock:
             self.db['birthdays'].insert_one({'import_id': 0})
             http_response = self.app.get('/imports/0/citizens/birthdays')
             self.assertEqual(201, http_response.status_code)
             cache_birthdays_mock.assert_not_called()
 
+    def test_should_return_updated_birthday_data_after_patch(self):
+        self.app.get('/imports/0/citizens/birthdays')
+        self.app.patch('/imports/0/citizens/1', json={'birth_date': '01.03.2000'})
+        http_response = self.app.get('/imports/0/citizens/birthdays')
+        birthday_data = http_response.get_json()
+        self.assertEqual([{'citizen_id': 3, 'presents': 1}], birthday_data['data']['3'])
+
     def test_should_return_bad_request_when_id_incorrect(self):
         self.db['imports'].delete_one({'import_id': 0})
+        self.db['citizens'].delete_many({'import_id': 0})
         http_response = self.app.get('/imports/0/citizens/birthdays')
         response_data = http_response.get_data(as_text=True)
         self.assertEqual(400, http_response.status_code)
         self.assertIn('Import with specified id not found', response_data)
+
+    def test_should_return_bad_request_when_import_not_complete(self):
+        self.db['imports'].update_one({'import_id': 0}, {'$set': {'complete': False}})
+        self.assertEqual(400, self.app.get('/imports/0/citizens/birthdays').status_code)
+        self.assertEqual(0, self.db['birthdays'].count_documents({}))
+
+    def test_should_not_return_cached_data_when_import_not_complete(self):
+        self.app.get('/imports/0/citizens/birthdays')
+        self.db['imports'].update_one({'import_id': 0}, {'$set': {'complete': False}})
+        self.db['citizens'].delete_many({'import_id': 0})
+        self.assertEqual(400, self.app.get('/imports/0/citizens/birthdays').status_code)
+
+    def test_should_return_not_modified_without_reading_cache_when_etag_matches(self):
+        etag = self.app.get('/imports/0/citizens/birthdays').headers['ETag']
+        self.db['birthdays'].delete_many({})
+
+        http_response = self.app.get('/imports/0/citizens/birthdays', headers=[('If-None-Match', etag)])
+
+        self.assertEqual(304, http_response.status_code)
+        self.assertEqual(0, self.db['birthdays'].count_documents({}))
+
+
+class BirthdaysGetAsyncTests(BirthdaysGetTests):
+    async_mode = True
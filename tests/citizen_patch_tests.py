@@ -10,14 +10,16 @@ import tests.test_utils as test_utils
 
 
 class CitizenPatchTests(unittest.TestCase):
+    async_mode = False
+
     @classmethod
     def setUp(cls):
-        cls.app, cls.db, cls.validator = test_utils.set_up_service()
-        import_data = test_utils.read_data('import.json')
-        import_data['import_id'] = 0
-        for citizen in import_data['citizens']:
+        cls.app, cls.db, cls.validator = test_utils.set_up_service(cls.async_mode)
+        cls.import_data = test_utils.read_data('import.json')
+        cls.import_data['import_id'] = 0
+        for citizen in cls.import_data['citizens']:
             citizen['birth_date'] = datetime.strptime(citizen['birth_date'], '%d.%m.%Y')
-        cls.db['imports'].insert_one(import_data)
+        test_utils.insert_import(cls.db, cls.import_data)
 
     def test_update_db_when_patch_received(self):
         headers = [('Content-Type', 'application/json')]
@@ -52,6 +54,17 @@ class CitizenPatchTests(unittest.TestCase):
         self.assertIn('Import or citizen with specified id not found', response_data)
         self.assertEqual(400, http_response.status_code)
 
+    def test_should_not_change_citizen_when_import_not_complete(self):
+        headers = [('Content-Type', 'application/json')]
+        self.db['imports'].update_one({'import_id': 0}, {'$set': {'complete': False}})
+        citizen = self.db['citizens'].find_one({'import_id': 0, 'citizen_id': 1}, {'_id': 0})
+
+        http_response = self.app.patch('/imports/0/citizens/1', data=json_util.dumps({'name': 'test'}),
+                                       headers=headers)
+
+        self.assertEqual(400, http_response.status_code)
+        self.assertEqual(citizen, self.db['citizens'].find_one({'import_id': 0, 'citizen_id': 1}, {'_id': 0}))
+
     def test_should_return_bad_request_when_patch_not_valid(self):
         headers = [('Content-Type', 'application/json')]
         patch_data = {'name': 'test'}
@@ -93,6 +106,26 @@ class CitizenPatchTests(unittest.TestCase):
         self.assertEqual(http_response.status_code, 201)
         self.assertEqual(patch_data['birth_date'], response_data['data']['birth_date'])
 
+    def test_should_update_relatives_of_other_citizens(self):
+        headers = [('Content-Type', 'application/json')]
+        patch_data = {'relatives': [2]}
+
+        http_response = self.app.patch('/imports/0/citizens/1', data=json_util.dumps(patch_data), headers=headers)
+
+        self.assertEqual(http_response.status_code, 201)
+        self.assertEqual([2], http_response.get_json()['data']['relatives'])
+        self.assertEqual([1], self.db['citizens'].find_one({'import_id': 0, 'citizen_id': 2})['relatives'])
+        self.assertEqual([], self.db['citizens'].find_one({'import_id': 0, 'citizen_id': 3})['relatives'])
+
+    def test_should_return_bad_request_when_relative_not_found(self):
+        headers = [('Content-Type', 'application/json')]
+        patch_data = {'relatives': [2, 5]}
+
+        http_response = self.app.patch('/imports/0/citizens/1', data=json_util.dumps(patch_data), headers=headers)
+
+        self.assertIn('Citizens with specified id not found', http_response.get_data(as_text=True))
+        self.assertEqual(400, http_response.status_code)
+
     def test_should_not_delete_birthdays_when_no_relatives_and_no_birth_date(self):
         headers = [('Content-Type', 'application/json')]
         patch_data = {'name': 'aaa'}
@@ -103,15 +136,22 @@ class CitizenPatchTests(unittest.TestCase):
         self.assertEqual(http_response.status_code, 201)
         self.assertEqual(1, self.db['birthdays'].count_documents({'import_id': 0}))
 
-    def test_should_delete_birthdays_when_birth_date_in_patch(self):
+    @parameterized.expand([
+        [{'birth_date': '01.01.2019'}],
+        [{'relatives': [2]}],
+        [{'relatives': [], 'birth_date': '31.12.2000'}]
+    ])
+    def test_should_update_birthdays_when_relatives_or_birth_date_in_patch(self, patch_data: dict):
         headers = [('Content-Type', 'application/json')]
-        patch_data = {'birth_date': '01.01.2019'}
-        self.db['birthdays'].insert_one({'import_id': 0})
+        self.app.get('/imports/0/citizens/birthdays')
 
         http_response = self.app.patch('/imports/0/citizens/1', data=json_util.dumps(patch_data), headers=headers)
 
         self.assertEqual(http_response.status_code, 201)
-        self.assertEqual(0, self.db['birthdays'].count_documents({'import_id': 0}))
+        self.assertEqual(1, self.db['birthdays'].count_documents({'import_id': 0}))
+        cached_data = self.app.get('/imports/0/citizens/birthdays').get_json()
+        self.db['birthdays'].delete_one({'import_id': 0})
+        self.assertEqual(self.app.get('/imports/0/citizens/birthdays').get_json(), cached_data)
 
     def test_should_not_raise_when_no_birthday_data(self):
         headers = [('Content-Type', 'application/json')]
@@ -152,6 +192,28 @@ class CitizenPatchTests(unittest.TestCase):
         self.assertEqual(http_response.status_code, 201)
         self.assertEqual(0, self.db['percentile_age'].count_documents({'import_id': 0}))
 
+    @parameterized.expand([
+        [{'town': 'Москва'}],
+        [{'birth_date': '01.01.1950'}],
+        [{'town': 'Казань', 'birth_date': '29.02.2000'}]
+    ])
+    def test_should_update_percentile_age_when_town_or_birth_date_in_patch(self, patch_data: dict):
+        headers = [('Content-Type', 'application/json')]
+        test_utils.insert_age_histograms(self.db, self.import_data)
+        self.app.get('/imports/0/towns/stat/percentile/age')
+
+        http_response = self.app.patch('/imports/0/citizens/1', data=json_util.dumps(patch_data), headers=headers)
+
+        self.assertEqual(http_response.status_code, 201)
+        self.assertEqual(1, self.db['percentile_age'].count_documents({'import_id': 0}))
+        cached_data = self.app.get('/imports/0/towns/stat/percentile/age').get_json()
+        self.db['percentile_age'].delete_one({'import_id': 0})
+        histograms_data = self.app.get('/imports/0/towns/stat/percentile/age').get_json()
+        self.db['percentile_age'].delete_one({'import_id': 0})
+        self.db['age_histograms'].delete_many({'import_id': 0})
+        self.assertEqual(histograms_data, cached_data)
+        self.assertEqual(self.app.get('/imports/0/towns/stat/percentile/age').get_json(), cached_data)
+
     def test_should_not_raise_when_no_percentile_age_data(self):
         headers = [('Content-Type', 'application/json')]
         patch_data = {'birth_date': '01.01.2019'}
@@ -162,5 +224,9 @@ class CitizenPatchTests(unittest.TestCase):
         self.assertEqual(0, self.db['percentile_age'].count_documents({'import_id': 0}))
 
 
+class CitizenPatchAsyncTests(CitizenPatchTests):
+    async_mode = True
+
+
 if __name__ == '__main__':
     unittest.main()
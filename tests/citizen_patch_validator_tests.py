@@ -74,6 +74,23 @@ class CitizenPatchValidatorTests(unittest.TestCase):
     def test_patch_should_be_incorrect_empty_string(self, patch_data: dict):
         self.assert_exception(0, patch_data, 'is too short')
 
+    def test_citizens_patch_should_be_valid(self):
+        self.data_validator.validate_citizens_patch({'citizens': [{'citizen_id': 0, 'name': 'a'},
+                                                                  {'citizen_id': 1, 'relatives': [0]}]})
+
+    @parameterized.expand([
+        [{'citizens': []}, 'is too short'],
+        [{'citizens': [{'name': 'a'}]}, '\'citizen_id\' is a required property'],
+        [{'citizens': [{'citizen_id': 0, 'name': 'a'}, {'citizen_id': 0, 'town': 'b'}]}, 'Citizens ids are not unique'],
+        [{'citizens': [{'citizen_id': 0}]}, 'does not have enough properties'],
+        [{'citizens': [{'citizen_id': 0, 'relatives': [0]}]}, 'Citizen can not be relative to himself'],
+        [{'citizens': [{'citizen_id': 0, 'test': 1}]}, 'Additional properties are not allowed']
+    ])
+    def test_citizens_patch_should_be_invalid(self, patches_data: dict, expected_exception_message: str):
+        with self.assertRaises(ValidationError) as context:
+            self.data_validator.validate_citizens_patch(patches_data)
+        self.assertIn(expected_exception_message, str(context.exception))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,24 +1,32 @@
 import unittest
+import unittest.mock
 from datetime import datetime
+from typing import List
+
+from parameterized import parameterized
 
 from tests import test_utils
 
 
 class CitizensGetTests(unittest.TestCase):
+    async_mode = False
+
     @classmethod
     def setUp(cls):
-        cls.app, cls.db, cls.validator = test_utils.set_up_service()
+        cls.app, cls.db, cls.validator = test_utils.set_up_service(cls.async_mode)
         import_data = test_utils.read_data('import.json')
         for citizen in import_data['citizens']:
             citizen['birth_date'] = datetime.strptime(citizen['birth_date'], '%d.%m.%Y')
         import_data['import_id'] = 0
-        cls.db['imports'].insert_one(import_data)
+        test_utils.insert_import(cls.db, import_data)
 
     def test_should_return_citizens_when_id_correct(self):
         http_response = self.app.get('/imports/0/citizens')
         response_data = http_response.get_json()
         self.assertEqual(201, http_response.status_code)
-        expected_data = self.db['imports'].find_one({'import_id': 0}, {'_id': 0, 'import_id': 0})
+        expected_data = test_utils.find_import(self.db, 0)
+        for citizen in expected_data['citizens']:
+            citizen['birth_date'] = citizen['birth_date'].strftime('%d.%m.%Y')
         self.assertEqual(expected_data['citizens'], response_data['data'])
 
     def test_should_return_bad_request_when_id_incorrect(self):
@@ -27,6 +35,93 @@ class CitizensGetTests(unittest.TestCase):
         self.assertEqual(400, http_response.status_code)
         self.assertIn('Import with specified id not found', response_data)
 
+    def test_should_return_bad_request_when_import_not_complete(self):
+        self.db['imports'].update_one({'import_id': 0}, {'$set': {'complete': False}})
+        http_response = self.app.get('/imports/0/citizens')
+        self.assertEqual(400, http_response.status_code)
+        self.assertNotIn('citizen_id', http_response.get_data(as_text=True))
+
+    def get_citizens_ids(self, query: str) -> List[int]:
+        http_response = self.app.get('/imports/0/citizens?' + query)
+        self.assertEqual(201, http_response.status_code)
+        return [citizen['citizen_id'] for citizen in http_response.get_json()['data']]
+
+    @parameterized.expand([
+        ['limit=2', [1, 2]],
+        ['limit=2&after_citizen_id=2', [3]],
+        ['after_citizen_id=3', []],
+        ['town=Челябинск', [2]],
+        ['gender=male', [1, 3]],
+        ['gender=male&after_citizen_id=1', [3]],
+        ['birth_month=2&limit=1&after_citizen_id=1', [2]],
+        ['birth_month=3', []],
+        ['town=Москва&gender=female', []]
+    ])
+    def test_should_filter_and_paginate_citizens(self, query: str, expected_ids: List[int]):
+        self.assertEqual(expected_ids, self.get_citizens_ids(query))
+
+    def test_should_filter_by_patched_birth_month(self):
+        self.app.patch('/imports/0/citizens/2', data='{"birth_date": "01.05.1984"}',
+                       headers=[('Content-Type', 'application/json')])
+        self.app.patch('/imports/0/citizens', data='{"citizens": [{"citizen_id": 3, "birth_date": "10.05.1998"}]}',
+                       headers=[('Content-Type', 'application/json')])
+
+        self.assertEqual([2, 3], self.get_citizens_ids('birth_month=5'))
+        self.assertEqual([1], self.get_citizens_ids('birth_month=2'))
+
+    def test_should_not_return_birth_month(self):
+        http_response = self.app.get('/imports/0/citizens?birth_month=2')
+        for citizen in http_response.get_json()['data']:
+            self.assertNotIn('birth_month', citizen)
+
+    def test_should_return_only_requested_fields(self):
+        http_response = self.app.get('/imports/0/citizens?fields=citizen_id,town,birth_date&gender=female')
+        self.assertEqual(201, http_response.status_code)
+        self.assertEqual([{'citizen_id': 2, 'town': 'Челябинск', 'birth_date': '01.02.1984'}],
+                         http_response.get_json()['data'])
+
+    @parameterized.expand([
+        ['fields=citizen_id,_id'],
+        ['limit=0'],
+        ['limit=-1'],
+        ['limit=a'],
+        ['after_citizen_id=-1'],
+        ['birth_month=13'],
+        ['gender=other'],
+        ['town=']
+    ])
+    def test_should_return_bad_request_when_query_not_valid(self, query: str):
+        http_response = self.app.get('/imports/0/citizens?' + query)
+        self.assertEqual(400, http_response.status_code)
+        self.assertIn('Value error', http_response.get_data(as_text=True))
+
+    def test_should_return_not_modified_when_etag_matches(self):
+        etag = self.app.get('/imports/0/citizens').headers['ETag']
+
+        with unittest.mock.patch('application.handlers.shared.find_citizens') as find_citizens, \
+                unittest.mock.patch('application.aio.handlers.shared.find_citizens') as async_find_citizens:
+            http_response = self.app.get('/imports/0/citizens', headers=[('If-None-Match', etag)])
+            find_citizens.assert_not_called()
+            async_find_citizens.assert_not_called()
+
+        self.assertEqual(304, http_response.status_code)
+        self.assertEqual(etag, http_response.headers['ETag'])
+        self.assertEqual(b'', http_response.get_data())
+
+    def test_should_change_etag_when_import_patched(self):
+        etag = self.app.get('/imports/0/citizens').headers['ETag']
+        self.app.patch('/imports/0/citizens/1', data='{"name": "test"}', headers=[('Content-Type', 'application/json')])
+
+        http_response = self.app.get('/imports/0/citizens', headers=[('If-None-Match', etag)])
+
+        self.assertEqual(201, http_response.status_code)
+        self.assertNotEqual(etag, http_response.headers['ETag'])
+        self.assertEqual('test', http_response.get_json()['data'][0]['name'])
+
+
+class CitizensGetAsyncTests(CitizensGetTests):
+    async_mode = True
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,119 @@
+import unittest
+from datetime import datetime
+from typing import List
+
+from bson import json_util
+from parameterized import parameterized
+
+import tests.test_utils as test_utils
+
+
+class CitizensPatchTests(unittest.TestCase):
+    async_mode = False
+    headers = [('Content-Type', 'application/json')]
+
+    def setUp(self):
+        self.app, self.db, self.validator = self.set_up_import()
+
+    def set_up_import(self):
+        app, db, validator = test_utils.set_up_service(self.async_mode)
+        import_data = test_utils.read_data('import.json')
+        import_data['import_id'] = 0
+        for citizen in import_data['citizens']:
+            citizen['birth_date'] = datetime.strptime(citizen['birth_date'], '%d.%m.%Y')
+        test_utils.insert_import(db, import_data)
+        test_utils.insert_age_histograms(db, import_data)
+        return app, db, validator
+
+    @staticmethod
+    def get_state(app) -> tuple:
+        return (app.get('/imports/0/citizens').get_json(),
+                app.get('/imports/0/citizens/birthdays').get_json(),
+                app.get('/imports/0/towns/stat/percentile/age?as_of=01.01.2020').get_json())
+
+    def test_should_return_patched_citizens_in_patch_order(self):
+        patches = [{'citizen_id': 3, 'name': 'test'}, {'citizen_id': 1, 'birth_date': '01.01.2012'}]
+
+        http_response = self.app.patch('/imports/0/citizens', data=json_util.dumps({'citizens': patches}),
+                                       headers=self.headers)
+
+        self.assertEqual(201, http_response.status_code)
+        citizens = http_response.get_json()['data']
+        self.assertEqual([3, 1], [citizen['citizen_id'] for citizen in citizens])
+        self.assertEqual('test', citizens[0]['name'])
+        self.assertEqual('01.01.2012', citizens[1]['birth_date'])
+
+    @parameterized.expand([
+        [[{'citizen_id': 1, 'relatives': [2]}, {'citizen_id': 2, 'relatives': []}]],
+        [[{'citizen_id': 1, 'relatives': [2, 3]}, {'citizen_id': 3, 'birth_date': '01.12.1990', 'town': 'Казань'}]],
+        [[{'citizen_id': 2, 'relatives': [1, 3]}, {'citizen_id': 3, 'relatives': [2]}]],
+        [[{'citizen_id': 1, 'town': 'Москва', 'birth_date': '29.02.2000'}, {'citizen_id': 2, 'town': 'Москва'}]]
+    ])
+    def test_should_give_same_result_as_sequential_patches(self, patches: List[dict]):
+        self.get_state(self.app)
+        http_response = self.app.patch('/imports/0/citizens', data=json_util.dumps({'citizens': patches}),
+                                       headers=self.headers)
+        self.assertEqual(201, http_response.status_code)
+
+        sequential_app, _, _ = self.set_up_import()
+        self.get_state(sequential_app)
+        for patch_data in patches:
+            citizen_data = {key: value for key, value in patch_data.items() if key != 'citizen_id'}
+            sequential_app.patch(f'/imports/0/citizens/{patch_data["citizen_id"]}', data=json_util.dumps(citizen_data),
+                                 headers=self.headers)
+
+        self.assertEqual(self.get_state(sequential_app), self.get_state(self.app))
+
+    def test_should_increment_import_version_once(self):
+        patches = [{'citizen_id': 1, 'name': 'a'}, {'citizen_id': 2, 'name': 'b'}]
+
+        self.app.patch('/imports/0/citizens', data=json_util.dumps({'citizens': patches}), headers=self.headers)
+
+        self.assertEqual(1, self.db['imports'].find_one({'import_id': 0})['version'])
+
+    def test_should_not_change_citizens_when_import_not_complete(self):
+        self.db['imports'].update_one({'import_id': 0}, {'$set': {'complete': False}})
+
+        http_response = self.app.patch('/imports/0/citizens', data=json_util.dumps({'citizens': [
+            {'citizen_id': 1, 'name': 'a'}]}), headers=self.headers)
+
+        self.assertEqual(400, http_response.status_code)
+        self.assertEqual('Иванов Иван Иванович',
+                         self.db['citizens'].find_one({'import_id': 0, 'citizen_id': 1})['name'])
+
+    @parameterized.expand([
+        [[{'citizen_id': 1, 'name': 'a'}, {'citizen_id': 5, 'name': 'b'}]],
+        [[{'citizen_id': 1, 'relatives': [5]}]]
+    ])
+    def test_should_not_change_citizens_when_citizen_not_found(self, patches: List[dict]):
+        http_response = self.app.patch('/imports/0/citizens', data=json_util.dumps({'citizens': patches}),
+                                       headers=self.headers)
+
+        self.assertEqual(400, http_response.status_code)
+        self.assertIn('not found', http_response.get_data(as_text=True))
+        self.assertEqual('Иванов Иван Иванович',
+                         self.db['citizens'].find_one({'import_id': 0, 'citizen_id': 1})['name'])
+
+    def test_should_return_bad_request_when_patch_not_valid(self):
+        patches = [{'citizen_id': 1, 'name': 'a'}, {'citizen_id': 1, 'name': 'b'}]
+
+        http_response = self.app.patch('/imports/0/citizens', data=json_util.dumps({'citizens': patches}),
+                                       headers=self.headers)
+
+        self.assertIn('Input data is not valid', http_response.get_data(as_text=True))
+        self.assertEqual(400, http_response.status_code)
+
+    def test_should_return_bad_request_when_no_content_type(self):
+        http_response = self.app.patch('/imports/0/citizens',
+                                       data=json_util.dumps({'citizens': [{'citizen_id': 1, 'name': 'a'}]}))
+
+        self.assertIn('Content-Type must be application/json', http_response.get_data(as_text=True))
+        self.assertEqual(400, http_response.status_code)
+
+
+class CitizensPatchAsyncTests(CitizensPatchTests):
+    async_mode = True
+
+
+if __name__ == '__main__':
+    unittest.main()
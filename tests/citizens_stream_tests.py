@@ -0,0 +1,66 @@
+import io
+import json
+import unittest
+
+from jsonschema import ValidationError
+from parameterized import parameterized
+
+from application.citizens_stream import iter_citizens
+from tests import test_utils
+
+
+class CitizensStreamTests(unittest.TestCase):
+    @staticmethod
+    def parse(data: str, chunk_size: int = 64 * 1024) -> list:
+        return list(iter_citizens(io.BytesIO(data.encode('utf-8')), chunk_size))
+
+    @parameterized.expand([
+        [1],
+        [2],
+        [7],
+        [64 * 1024]
+    ])
+    def test_should_return_all_citizens_with_any_chunk_size(self, chunk_size: int):
+        import_data = test_utils.read_data('import.json')
+        citizens = self.parse(json.dumps(import_data, ensure_ascii=False), chunk_size)
+        self.assertEqual(import_data['citizens'], citizens)
+
+    def test_should_return_empty_when_citizens_empty(self):
+        self.assertEqual([], self.parse(' { "citizens" : [ ] } '))
+
+    def test_should_read_citizens_lazily(self):
+        stream = io.BytesIO(b'{"citizens": [{"citizen_id": 1}, {"citizen_id": 2}, ')
+        citizens = iter_citizens(stream, 4)
+        self.assertEqual({'citizen_id': 1}, next(citizens))
+        self.assertEqual({'citizen_id': 2}, next(citizens))
+        with self.assertRaises(json.JSONDecodeError):
+            next(citizens)
+
+    def test_should_not_split_number_on_chunk_border(self):
+        self.assertEqual([1234567], self.parse('{"citizens": [1234567]}', 3))
+
+    @parameterized.expand([
+        ['{'],
+        ['[]'],
+        ['{"citizens": [1,]}'],
+        ['{"citizens": [1] "a"}'],
+        ['{"citizens": []} {}'],
+        ['{"citizens": [], "citizens": []}'],
+    ])
+    def test_should_raise_when_incorrect_json(self, data: str):
+        with self.assertRaises(json.JSONDecodeError):
+            self.parse(data)
+
+    @parameterized.expand([
+        ['{}', '\'citizens\' is a required property'],
+        ['{"test": 1, "citizens": []}', 'Additional properties are not allowed'],
+        ['{"citizens": null}', 'is not of type \'array\''],
+    ])
+    def test_should_raise_when_import_not_valid(self, data: str, expected_exception_message: str):
+        with self.assertRaises(ValidationError) as context:
+            self.parse(data)
+        self.assertIn(expected_exception_message, str(context.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+from unittest import mock
+
+import jsonschema
+from jsonschema import ValidationError, SchemaError
+from parameterized import parameterized
+
+from application.compiled_schema import CompiledSchema, _compile_checker
+from application.data_validator import DataValidator
+
+
+class CompiledSchemaTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.citizen_patch_schema = DataValidator().citizen_patch_schema
+
+    @parameterized.expand([
+        [{'name': 'A'}],
+        [{'name': ''}],
+        [{'apartment': 0}],
+        [{'apartment': -1}],
+        [{'apartment': True}],
+        [{'apartment': 1.0}],
+        [{'gender': 'female'}],
+        [{'gender': 'helicopter'}],
+        [{'gender': 1}],
+        [{'relatives': [1, 2]}],
+        [{'relatives': [1, '2']}],
+        [{'relatives': None}],
+        [{'test': 1}],
+        [{}],
+        [[]],
+        [None],
+    ])
+    def test_validate_should_agree_with_jsonschema(self, instance):
+        compiled = CompiledSchema(self.citizen_patch_schema)
+        try:
+            jsonschema.validate(instance, self.citizen_patch_schema)
+            expected_error = None
+        except ValidationError as e:
+            expected_error = e.message
+
+        try:
+            compiled.validate(instance)
+            error = None
+        except ValidationError as e:
+            error = e.message
+        self.assertEqual(expected_error, error)
+
+    def test_validate_should_not_use_jsonschema_when_valid(self):
+        compiled = CompiledSchema(self.citizen_patch_schema)
+        with mock.patch.object(compiled, '_validator') as validator_mock:
+            compiled.validate({'name': 'A', 'relatives': [1]})
+            validator_mock.iter_errors.assert_not_called()
+
+    def test_validate_should_accept_integer_valued_float_as_jsonschema_does(self):
+        compiled = CompiledSchema({'type': 'integer'})
+        compiled.validate(1.0)
+
+    def test_should_check_schema_once_when_created(self):
+        with self.assertRaises(SchemaError):
+            CompiledSchema({'type': 'unknown'})
+
+    def test_compile_checker_should_return_none_when_keyword_not_supported(self):
+        self.assertIsNone(_compile_checker({'type': 'string', 'pattern': 'a'}))
+
+    def test_validate_should_use_jsonschema_when_keyword_not_supported(self):
+        compiled = CompiledSchema({'type': 'string', 'pattern': '^a'})
+        compiled.validate('abc')
+        with self.assertRaises(ValidationError):
+            compiled.validate('b')
+
+    @parameterized.expand([
+        [{'citizens': [{'citizen_id': 1, 'name': 'a'}]}],
+        [{'citizens': []}],
+        [{'citizens': [{'name': 'a'}]}],
+        [{}],
+    ])
+    def test_validate_citizens_patch_should_agree_with_jsonschema(self, instance):
+        schema = DataValidator().citizens_patch_schema
+        try:
+            jsonschema.validate(instance, schema)
+            expected_error = None
+        except ValidationError as e:
+            expected_error = e.message
+
+        try:
+            CompiledSchema(schema).validate(instance)
+            error = None
+        except ValidationError as e:
+            error = e.message
+        self.assertEqual(expected_error, error)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from flask import Flask, Response, g
+
+from application.decorators import conditional_response
+from tests import test_utils
+
+
+class ConditionalResponseTests(unittest.TestCase):
+    def setUp(self):
+        self.db = test_utils.get_fake_db()
+        self.db['imports'].insert_one({'import_id': 0, 'complete': True, 'version': 3})
+        self.app = Flask(__name__)
+        self.handler = mock.MagicMock(return_value=Response(b'{}', 201))
+
+        @self.app.route('/<int:import_id>')
+        @conditional_response.conditional_response(self.db, date_param='as_of')
+        def view(import_id: int):
+            return self.handler(import_id)
+
+    def test_make_etag_should_depend_on_import_and_version(self):
+        self.assertEqual('0-3', conditional_response.make_etag(0, 3))
+        self.assertEqual('0-3', conditional_response.make_etag(0, 3, 'as_of', '01.10.2019'))
+
+    def test_make_etag_should_contain_current_date_when_no_date_param(self):
+        self.assertEqual(f'0-3-{datetime.utcnow().strftime("%Y%m%d")}', conditional_response.make_etag(0, 3, 'as_of'))
+
+    def test_should_set_weak_etag(self):
+        http_response = self.app.test_client().get('/0?as_of=01.10.2019')
+        self.assertEqual('W/"0-3"', http_response.headers['ETag'])
+        self.handler.assert_called_once_with(0)
+
+    def test_should_not_call_handler_when_etag_matches(self):
+        http_response = self.app.test_client().get('/0?as_of=01.10.2019', headers=[('If-None-Match', 'W/"0-3"')])
+        self.assertEqual(304, http_response.status_code)
+        self.handler.assert_not_called()
+
+    def test_should_not_set_etag_when_import_not_found(self):
+        http_response = self.app.test_client().get('/1', headers=[('If-None-Match', '*')])
+        self.assertNotIn('ETag', http_response.headers)
+        self.handler.assert_called_once_with(1)
+
+    def test_get_request_import_version_should_reuse_version_of_request(self):
+        with self.app.app_context():
+            g.import_version = (0, 5)
+            self.assertEqual(5, conditional_response.get_request_import_version(0, self.db))
+            self.assertEqual(None, conditional_response.get_request_import_version(1, self.db))
+        self.assertEqual(3, conditional_response.get_request_import_version(0, self.db))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,40 +1,96 @@
+import gzip
 import json
 import unittest
+from datetime import datetime, timedelta
 from unittest import mock
 from unittest.mock import MagicMock
 
-from flask import Response
+from flask import Flask, Response
 from mongolock import MongoLock
 
+from application import response_body
 from application.decorators import response_cacher
+from application.handlers import shared
+from application.memory_cache import MemoryCache
 from tests import test_utils
 
 
 class ResponseCacherTests(unittest.TestCase):
     def setUp(self) -> None:
         self.db = test_utils.get_fake_db()
+        test_utils.insert_import(self.db, {'import_id': 0, 'citizens': []})
+
+    @staticmethod
+    def make_response(data: dict) -> Response:
+        return response_body.with_response_data(
+            Response(response_body.encode_body(data), 201, mimetype='application/json; charset=utf-8'), data)
 
     def test_cache_data_should_write_to_db(self):
-        response_cacher._cache_data(0, 'cache', {'test': 'aaa'}, self.db)
+        response_cacher._cache_data(0, 'cache', b'{"test": "aaa"}', {'test': 'aaa'}, self.db)
         cached_data = self.db['cache'].find_one({'import_id': 0}, {'import_id': 0, '_id': 0})
         self.assertIsNotNone(cached_data)
-        self.assertEqual({'test': 'aaa'}, cached_data)
+        self.assertEqual({'test': 'aaa', 'body': b'{"test": "aaa"}', 'gzip_body': None}, cached_data)
 
-    def test_cache_data_should_write_all_dict_fields(self):
-        response_cacher._cache_data(0, 'cache', {'test': 'aaa', 'test1': {'test2': 2}}, self.db)
+    def test_cache_data_should_write_gzip_body_when_body_large(self):
+        data = {'test': 'a' * response_body.GZIP_MIN_SIZE}
+        body_fields = response_cacher._cache_data(0, 'cache', json.dumps(data).encode(), data, self.db)
         cached_data = self.db['cache'].find_one({'import_id': 0}, {'import_id': 0, '_id': 0})
-        self.assertIsNotNone(cached_data)
-        self.assertEqual({'test': 'aaa', 'test1': {'test2': 2}}, cached_data)
+        self.assertEqual({'test': 'a' * response_body.GZIP_MIN_SIZE, **body_fields}, cached_data)
+        self.assertEqual(json.dumps(data).encode(), gzip.decompress(cached_data['gzip_body']))
 
     def test_get_cached_data_should_read_from_db(self):
+        self.db['cache'].insert_one({'import_id': 0, 'body': b'{"test": "aaa"}', 'gzip_body': b'gzip'})
+        cached_data, expires = response_cacher._get_cached_data(0, 'cache', self.db)
+        self.assertEqual({'body': b'{"test": "aaa"}', 'gzip_body': b'gzip'}, cached_data)
+        self.assertIsNone(expires)
+
+    def test_get_cached_data_should_encode_data_when_no_body(self):
+        self.db['cache'].insert_one({'import_id': 0, 'test': 'aaa', 'test1': {'test2': 2}})
+        cached_data, _ = response_cacher._get_cached_data(0, 'cache', self.db)
+        self.assertEqual({'test': 'aaa', 'test1': {'test2': 2}}, json.loads(cached_data['body']))
+        self.assertIsNone(cached_data['gzip_body'])
+        self.assertEqual(cached_data['body'], self.db['cache'].find_one({'import_id': 0})['body'])
+
+    def test_get_cached_data_should_not_write_body_when_revision_changed(self):
         self.db['cache'].insert_one({'import_id': 0, 'test': 'aaa'})
-        cached_data = response_cacher._get_cached_data(0, 'cache', self.db)
-        self.assertEqual({'test': 'aaa'}, cached_data)
+
+        def encode_body(data):
+            self.db['cache'].update_one({'import_id': 0}, response_body.make_invalidating_update(
+                {'$set': {'test': 'bbb'}}))
+            return response_body.codec.encode(data)
+
+        with mock.patch('application.response_body.encode_body', encode_body):
+            cached_data, _ = response_cacher._get_cached_data(0, 'cache', self.db)
+        self.assertEqual({'test': 'aaa'}, json.loads(cached_data['body']))
+        self.assertNotIn('body', self.db['cache'].find_one({'import_id': 0}))
 
     def test_get_cached_data_should_return_None_when_no_cache(self):
-        cached_data = response_cacher._get_cached_data(0, 'cache', self.db)
+        cached_data, _ = response_cacher._get_cached_data(0, 'cache', self.db)
         self.assertIsNone(cached_data)
 
+    def test_cache_data_should_replace_data_with_same_key_params(self):
+        response_cacher._cache_data(0, 'cache', b'{"test": "aaa"}', {'test': 'aaa'}, self.db, {'as_of': '01.01.2019'})
+        response_cacher._cache_data(0, 'cache', b'{"test": "bbb"}', {'test': 'bbb'}, self.db, {'as_of': '01.01.2019'})
+        response_cacher._cache_data(0, 'cache', b'{"test": "ccc"}', {'test': 'ccc'}, self.db, {'as_of': '02.01.2019'})
+        self.assertEqual(2, self.db['cache'].count_documents({'import_id': 0}))
+        cached_data, _ = response_cacher._get_cached_data(0, 'cache', self.db, {'as_of': '01.01.2019'})
+        self.assertEqual(b'{"test": "bbb"}', cached_data['body'])
+
+    def test_get_cached_data_should_return_None_when_expired(self):
+        self.db['cache'].insert_one({'import_id': 0, 'test': 'aaa', 'expires': datetime.utcnow() - timedelta(days=1)})
+        self.assertEqual((None, None), response_cacher._get_cached_data(0, 'cache', self.db))
+
+    def test_get_cached_data_should_return_data_and_expires_when_not_expired(self):
+        expires = datetime.utcnow().replace(microsecond=0) + timedelta(days=1)
+        self.db['cache'].insert_one({'import_id': 0, 'body': b'aaa', 'gzip_body': None, 'expires': expires})
+        self.assertEqual(({'body': b'aaa', 'gzip_body': None}, expires),
+                         response_cacher._get_cached_data(0, 'cache', self.db))
+
+    def test_get_expires_should_return_naive_utc_time(self):
+        response = Response(headers={'Expires': 'Sat, 15 Jun 2019 00:00:00 GMT'})
+        self.assertEqual(datetime(2019, 6, 15), response_cacher._get_expires(response))
+        self.assertIsNone(response_cacher._get_expires(Response()))
+
     def test_decorator_should_return_cached_data_when_present(self):
         lock = MongoLock(client=self.db.client, db=self.db.name)
 
@@ -61,8 +117,7 @@ class ResponseCacherTests(unittest.TestCase):
 
         @response_cacher.cache_response('cache', self.db, lock)
         def f(import_id: int):
-            return Response(json.dumps({'import_id': import_id, 'test': 'aaa'}, ensure_ascii=False), 201,
-                            mimetype='application/json; charset=utf-8')
+            return self.make_response({'import_id': import_id, 'test': 'aaa'})
 
         response = f(import_id=0)
         self.assertEqual(201, response.status_code)
@@ -73,13 +128,21 @@ class ResponseCacherTests(unittest.TestCase):
 
         @response_cacher.cache_response('cache', self.db, lock)
         def f(import_id: int):
-            return Response(json.dumps({'import_id': import_id, 'test': 'aaa'}, ensure_ascii=False), 201,
-                            mimetype='application/json; charset=utf-8')
+            return self.make_response({'import_id': import_id, 'test': 'aaa'})
 
         with mock.patch('application.decorators.response_cacher._cache_data') as cache_mock:
             f(import_id=0)
             cache_mock.assert_called()
 
+    def test_decorator_should_cache_response_data_without_decoding_body(self):
+        lock = MongoLock(client=self.db.client, db=self.db.name)
+        wrap = response_cacher.cache_response('cache', self.db, lock)(lambda import_id: self.make_response({'a': 1}))
+
+        with mock.patch('application.response_body.decode_body') as decode_body_mock:
+            wrap(import_id=0)
+            decode_body_mock.assert_not_called()
+        self.assertEqual(1, self.db['cache'].find_one({'import_id': 0})['a'])
+
     def test_decorator_should_not_cache_when_exception_in_func(self):
         lock = MongoLock(client=self.db.client, db=self.db.name)
 
@@ -93,3 +156,88 @@ class ResponseCacherTests(unittest.TestCase):
             except ValueError:
                 pass
             cache_mock.assert_not_called()
+
+    def test_decorator_should_return_response_from_memory_when_version_not_changed(self):
+        lock = MongoLock(client=self.db.client, db=self.db.name)
+        f = MagicMock(return_value=self.make_response({'test': 'aaa'}))
+        wrap = response_cacher.cache_response('cache', self.db, lock, memory_cache=MemoryCache())(f)
+        wrap(import_id=0)
+        self.db['cache'].delete_many({})
+
+        with mock.patch('application.decorators.response_cacher._get_cached_data') as get_cached_data_mock:
+            response = wrap(import_id=0)
+            get_cached_data_mock.assert_not_called()
+        f.assert_called_once()
+        self.assertEqual({'test': 'aaa'}, response.json)
+
+    def test_decorator_should_not_return_response_from_memory_when_version_changed(self):
+        lock = MongoLock(client=self.db.client, db=self.db.name)
+        memory_cache = MemoryCache()
+
+        @response_cacher.cache_response('cache', self.db, lock, memory_cache=memory_cache)
+        def f(import_id: int):
+            pass
+
+        self.db['cache'].insert_one({'import_id': 0, 'test': 'aaa'})
+        f(import_id=0)
+        self.db['cache'].update_one({'import_id': 0}, response_body.make_invalidating_update({'$set': {'test': 'bbb'}}))
+        shared.increment_import_version(0, self.db)
+        self.assertEqual({'test': 'bbb'}, f(import_id=0).json)
+
+    def test_decorator_should_raise_when_import_not_complete(self):
+        lock = MongoLock(client=self.db.client, db=self.db.name)
+        memory_cache = MemoryCache()
+        f = MagicMock()
+        wrap = response_cacher.cache_response('cache', self.db, lock, memory_cache=memory_cache)(f)
+        self.db['imports'].insert_one({'import_id': 1, 'complete': False})
+        self.db['cache'].insert_one({'import_id': 1, 'test': 'aaa'})
+
+        with mock.patch('application.decorators.response_cacher._cache_data') as cache_mock:
+            for import_id in (1, 2):
+                with self.assertRaises(shared.ImportNotFoundError):
+                    wrap(import_id=import_id)
+            cache_mock.assert_not_called()
+        f.assert_not_called()
+        self.assertEqual(0, len(memory_cache))
+
+    def test_decorator_should_return_gzip_body_when_accepted(self):
+        lock = MongoLock(client=self.db.client, db=self.db.name)
+        data = {'test': 'a' * response_body.GZIP_MIN_SIZE}
+        body = response_body.encode_body(data)
+
+        @response_cacher.cache_response('cache', self.db, lock)
+        def f(import_id: int):
+            return self.make_response(data)
+
+        with Flask(__name__).test_request_context(headers={'Accept-Encoding': 'gzip'}):
+            first_response, cached_response = f(import_id=0), f(import_id=0)
+        for response in (first_response, cached_response):
+            self.assertEqual('gzip', response.content_encoding)
+            self.assertIn('Accept-Encoding', response.vary)
+            self.assertEqual(body, gzip.decompress(response.get_data()))
+
+    def test_decorator_should_return_plain_body_when_gzip_not_accepted(self):
+        lock = MongoLock(client=self.db.client, db=self.db.name)
+        body = json.dumps({'test': 'a' * response_body.GZIP_MIN_SIZE}).encode()
+        self.db['cache'].insert_one({'import_id': 0, **response_body.make_body_fields(body)})
+
+        @response_cacher.cache_response('cache', self.db, lock)
+        def f(import_id: int):
+            pass
+
+        with Flask(__name__).test_request_context():
+            response = f(import_id=0)
+        self.assertIsNone(response.content_encoding)
+        self.assertEqual(body, response.get_data())
+
+    def test_decorator_should_not_lock_when_cached_data_present(self):
+        self.db['cache'].insert_one({'import_id': 0, 'test': 'aaa'})
+        lock = MagicMock()
+        wrap = response_cacher.cache_response('cache', self.db, lock)(MagicMock())
+        response = wrap(import_id=0)
+        lock.assert_not_called()
+        self.assertEqual({'test': 'aaa'}, response.json)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+from datetime import datetime
+
+from application.handlers import age_histograms
+from tests import test_utils
+
+
+class AgeHistogramsTests(unittest.TestCase):
+    def setUp(self):
+        self.db = test_utils.get_fake_db()
+
+    def write_histograms(self, citizens: list):
+        histograms = age_histograms.create_histograms()
+        for citizen in citizens:
+            age_histograms.add_citizen(histograms, citizen)
+        age_histograms.write_histograms(0, histograms, self.db)
+
+    def test_write_histograms_should_do_nothing_when_no_citizens(self):
+        self.write_histograms([])
+        self.assertEqual(0, self.db['age_histograms'].count_documents({}))
+
+    def test_write_histograms_should_support_any_town_name(self):
+        self.write_histograms([{'town': 'г. $Москва', 'birth_date': datetime(2000, 1, 2)}])
+        histogram = self.db['age_histograms'].find_one({'import_id': 0}, {'_id': 0})
+        self.assertEqual({'import_id': 0, 'town': 'г. $Москва', 'birth_dates': {'2000-01-02': 1}}, histogram)
+
+    def test_read_histograms_should_return_none_when_histograms_not_found(self):
+        towns, codes, birth_dates, counts = age_histograms.read_histograms(0, self.db)
+        self.assertIsNone(towns)
+        self.assertEqual(0, len(codes))
+
+    def test_read_histograms_should_return_columns_ordered_by_town(self):
+        self.write_histograms([{'town': 'B', 'birth_date': datetime(2000, 1, 2)},
+                               {'town': 'A', 'birth_date': datetime(2001, 3, 4)},
+                               {'town': 'B', 'birth_date': datetime(2000, 1, 2)}])
+        towns, codes, birth_dates, counts = age_histograms.read_histograms(0, self.db)
+        self.assertEqual(['A', 'B'], towns)
+        self.assertEqual([0, 1], codes.tolist())
+        self.assertEqual(['2001-03-04', '2000-01-02'], [str(birth_date) for birth_date in birth_dates])
+        self.assertEqual([1, 2], counts.tolist())
+
+    def test_read_histograms_should_skip_empty_columns_and_towns(self):
+        self.db['age_histograms'].insert_many([
+            {'import_id': 0, 'town': 'A', 'birth_dates': {'2000-01-02': 0}},
+            {'import_id': 0, 'town': 'B', 'birth_dates': {'2000-01-02': 0, '2000-01-03': 1}}])
+        towns, codes, birth_dates, counts = age_histograms.read_histograms(0, self.db)
+        self.assertEqual(['B'], towns)
+        self.assertEqual([0], codes.tolist())
+        self.assertEqual([1], counts.tolist())
+
+    def test_move_citizen_should_move_one_count(self):
+        self.write_histograms([{'town': 'A', 'birth_date': datetime(2000, 1, 2)},
+                               {'town': 'A', 'birth_date': datetime(2000, 1, 2)}])
+        moved = age_histograms.move_citizen(0, {'town': 'A', 'birth_date': datetime(2000, 1, 2)},
+                                            {'town': 'B', 'birth_date': datetime(2001, 1, 2)}, self.db, None)
+        self.assertTrue(moved)
+        self.assertEqual({'2000-01-02': 1}, self.db['age_histograms'].find_one({'town': 'A'})['birth_dates'])
+        self.assertEqual({'2001-01-02': 1}, self.db['age_histograms'].find_one({'town': 'B'})['birth_dates'])
+
+    def test_move_citizen_should_return_false_when_no_histograms(self):
+        moved = age_histograms.move_citizen(0, {'town': 'A', 'birth_date': datetime(2000, 1, 2)},
+                                            {'town': 'B', 'birth_date': datetime(2001, 1, 2)}, self.db, None)
+        self.assertFalse(moved)
+        self.assertEqual(0, self.db['age_histograms'].count_documents({}))
+
+    def test_move_citizens_should_move_counts_with_one_update_per_town(self):
+        self.write_histograms([{'town': 'A', 'birth_date': datetime(2000, 1, 2)},
+                               {'town': 'A', 'birth_date': datetime(2000, 1, 3)}])
+        moved = age_histograms.move_citizens(
+            0, [{'town': 'A', 'birth_date': datetime(2000, 1, 2)}, {'town': 'A', 'birth_date': datetime(2000, 1, 3)}],
+            [{'town': 'B', 'birth_date': datetime(2000, 1, 2)}, {'town': 'A', 'birth_date': datetime(2000, 1, 2)}],
+            self.db, None)
+        self.assertTrue(moved)
+        self.assertEqual({'2000-01-02': 1, '2000-01-03': 0},
+                         self.db['age_histograms'].find_one({'town': 'A'})['birth_dates'])
+        self.assertEqual({'2000-01-02': 1}, self.db['age_histograms'].find_one({'town': 'B'})['birth_dates'])
+
+    def test_move_citizens_should_return_false_when_no_histograms(self):
+        moved = age_histograms.move_citizens(0, [{'town': 'A', 'birth_date': datetime(2000, 1, 2)}],
+                                             [{'town': 'B', 'birth_date': datetime(2001, 1, 2)}], self.db, None)
+        self.assertFalse(moved)
+        self.assertEqual(0, self.db['age_histograms'].count_documents({}))
+
+
+if __name__ == '__main__':
+    unittest.main()
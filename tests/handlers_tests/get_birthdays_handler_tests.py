@@ -1,7 +1,12 @@
 import unittest
 from datetime import datetime
+from unittest import mock
+
+from pymongo.errors import OperationFailure, PyMongoError
 
 import application.handlers.get_birthdays_handler as get_birthdays_handler
+from application.read_write_lock import ReadWriteMongoLock
+from tests import test_utils
 
 
 class GetBirthdaysHandler(unittest.TestCase):
@@ -38,3 +43,52 @@ class GetBirthdaysHandler(unittest.TestCase):
         expected_representation['data']['2'] = [{'citizen_id': 1, 'presents': 1}, {'citizen_id': 2, 'presents': 1}]
         expected_representation['data']['3'] = [{'citizen_id': 0, 'presents': 2}, {'citizen_id': 1, 'presents': 1}]
         self.assertEqual(expected_representation, birthday_representation)
+
+    @staticmethod
+    def make_db(citizens: list):
+        db = test_utils.get_fake_db()
+        test_utils.insert_import(db, {'import_id': 0, 'citizens': citizens})
+        return db
+
+    def test_aggregate_birthdays_should_match_python_calculation(self):
+        citizens = [{'citizen_id': 0, 'birth_date': datetime(2019, 2, 1), 'relatives': [1, 2]},
+                    {'citizen_id': 1, 'birth_date': datetime(2019, 3, 1), 'relatives': [0]},
+                    {'citizen_id': 2, 'birth_date': datetime(2019, 3, 1), 'relatives': [0, 1]},
+                    {'citizen_id': 3, 'birth_date': datetime(2019, 5, 1), 'relatives': []}]
+        db = self.make_db(citizens)
+        birthdays_data = get_birthdays_handler._aggregate_birthdays_data(0, db)
+        self.assertEqual({2: {1: 1, 2: 1}, 3: {0: 2, 1: 1}}, birthdays_data)
+
+    def test_aggregate_birthdays_should_ignore_other_imports(self):
+        db = self.make_db([{'citizen_id': 0, 'birth_date': datetime(2019, 2, 1), 'relatives': [1]},
+                           {'citizen_id': 1, 'birth_date': datetime(2019, 3, 1), 'relatives': [0]}])
+        test_utils.insert_import(db, {'import_id': 1, 'citizens': [
+            {'citizen_id': 0, 'birth_date': datetime(2019, 7, 1), 'relatives': [1]},
+            {'citizen_id': 1, 'birth_date': datetime(2019, 7, 1), 'relatives': [0]}]})
+        birthdays_data = get_birthdays_handler._aggregate_birthdays_data(0, db)
+        self.assertEqual({2: {1: 1}, 3: {0: 1}}, birthdays_data)
+
+    def test_get_birthdays_should_fallback_to_python_when_aggregation_fails(self):
+        db = self.make_db([{'citizen_id': 0, 'birth_date': datetime(2019, 2, 1), 'relatives': [1]},
+                           {'citizen_id': 1, 'birth_date': datetime(2019, 3, 1), 'relatives': [0]}])
+        with mock.patch.object(get_birthdays_handler, '_aggregate_birthdays_data',
+                               side_effect=OperationFailure('not supported')):
+            birthdays_data, status = get_birthdays_handler.get_birthdays(
+                0, db, ReadWriteMongoLock(client=db.client, db=db.name))
+        self.assertEqual(201, status)
+        self.assertEqual([{'citizen_id': 1, 'presents': 1}], birthdays_data['data']['2'])
+        self.assertEqual([{'citizen_id': 0, 'presents': 1}], birthdays_data['data']['3'])
+
+    def test_get_birthdays_should_return_empty_months_when_no_relatives(self):
+        db = self.make_db([{'citizen_id': 0, 'birth_date': datetime(2019, 2, 1), 'relatives': []}])
+        birthdays_data, _ = get_birthdays_handler.get_birthdays(0, db, ReadWriteMongoLock(client=db.client, db=db.name))
+        self.assertEqual({'data': {str(i): [] for i in range(1, 13)}}, birthdays_data)
+
+    def test_get_birthdays_should_raise_when_import_not_found(self):
+        db = test_utils.get_fake_db()
+        with self.assertRaises(PyMongoError):
+            get_birthdays_handler.get_birthdays(0, db, ReadWriteMongoLock(client=db.client, db=db.name))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import json
+import unittest
+from datetime import datetime
+
+from parameterized import parameterized
+from pymongo.errors import PyMongoError
+
+from application.handlers import get_citizens_handler, shared
+from application.read_write_lock import ReadWriteMongoLock
+from tests import test_utils
+
+
+class GetCitizensHandlerTests(unittest.TestCase):
+    def setUp(self):
+        self.db = test_utils.get_fake_db()
+        self.lock = ReadWriteMongoLock(client=self.db.client, db=self.db.name)
+
+    def insert_citizens(self, count: int):
+        citizens = [{'citizen_id': i, 'birth_date': datetime(2000, 1, i + 1), 'relatives': []} for i in range(count)]
+        test_utils.insert_import(self.db, {'import_id': 0, 'citizens': citizens})
+
+    def test_get_chunk_representation_should_stringify_birth_date(self):
+        representation = get_citizens_handler._get_chunk_representation(
+            [{'citizen_id': 1, 'town': 'Москва', 'birth_date': datetime(2019, 12, 31)}, {'citizen_id': 2}])
+        self.assertEqual([{'citizen_id': 1, 'town': 'Москва', 'birth_date': '31.12.2019'}, {'citizen_id': 2}],
+                         json.loads(b'[' + representation + b']'))
+
+    @parameterized.expand([
+        [0, 1],
+        [1, 2],
+        [2, 2],
+        [3, 3],
+        [5, 4]
+    ])
+    def test_generate_chunks_should_split_citizens_into_chunks(self, citizens_count: int, expected_chunks: int):
+        self.insert_citizens(citizens_count)
+        chunks = list(get_citizens_handler._generate_citizens_chunks(0, self.db, self.lock, chunk_size=2))
+        self.assertEqual(expected_chunks, len(chunks))
+        citizens = json.loads(b''.join(chunks))['data']
+        self.assertEqual(list(range(citizens_count)), [citizen['citizen_id'] for citizen in citizens])
+
+    def test_parse_citizens_query_should_parse_filters_and_pagination(self):
+        args = {'town': 'A', 'gender': 'female', 'birth_month': '12', 'after_citizen_id': '5', 'limit': '10',
+                'fields': 'citizen_id,town'}
+        self.assertEqual({'filters': {'town': 'A', 'gender': 'female', 'birth_month': 12}, 'after_citizen_id': 5,
+                          'limit': 10, 'projection': {'_id': 0, 'citizen_id': 1, 'town': 1}},
+                         get_citizens_handler.parse_citizens_query(args))
+        self.assertEqual({'filters': {}, 'after_citizen_id': None, 'limit': 0, 'projection': shared.CITIZEN_PROJECTION},
+                         get_citizens_handler.parse_citizens_query({}))
+
+    @parameterized.expand([
+        [{'limit': '0'}],
+        [{'limit': '1.5'}],
+        [{'birth_month': '0'}],
+        [{'after_citizen_id': 'a'}],
+        [{'gender': 'Male'}],
+        [{'fields': 'citizen_id,import_id'}],
+        [{'fields': ''}]
+    ])
+    def test_parse_citizens_query_should_raise_when_not_valid(self, args: dict):
+        with self.assertRaises(ValueError):
+            get_citizens_handler.parse_citizens_query(args)
+
+    def test_get_citizens_should_return_only_projected_fields(self):
+        self.insert_citizens(3)
+        chunks, _ = get_citizens_handler.get_citizens(0, self.db, self.lock, projection={'_id': 0, 'birth_date': 1})
+        self.assertEqual({'data': [{'birth_date': '01.01.2000'}, {'birth_date': '02.01.2000'},
+                                   {'birth_date': '03.01.2000'}]}, json.loads(b''.join(chunks)))
+
+    def test_get_citizens_should_return_empty_page_when_import_exists(self):
+        self.insert_citizens(2)
+        chunks, _ = get_citizens_handler.get_citizens(0, self.db, self.lock, after_citizen_id=1)
+        self.assertEqual({'data': []}, json.loads(b''.join(chunks)))
+
+    def test_get_citizens_should_raise_before_streaming_when_import_not_found(self):
+        with self.assertRaises(PyMongoError):
+            get_citizens_handler.get_citizens(0, self.db, self.lock)
+
+    def test_get_citizens_should_release_lock_when_closed(self):
+        self.insert_citizens(3)
+        chunks, status = get_citizens_handler.get_citizens(0, self.db, self.lock)
+        self.assertEqual(201, status)
+        self.assertTrue(self.lock.is_locked('0'))
+        next(chunks)
+        chunks.close()
+        self.assertFalse(self.lock.is_locked('0'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,65 +1,113 @@
 import unittest
-from datetime import datetime
+from datetime import date, datetime
+
+import numpy as np
+from pymongo.errors import PyMongoError
 
 from application.handlers import get_percentile_age_handler
+from application.read_write_lock import ReadWriteMongoLock
+from tests import test_utils
 
 
 class GetPercentileAgeHandlerTests(unittest.TestCase):
 
-    def test_calculate_age_should_do_nothing_when_citizens_empty(self):
-        get_percentile_age_handler._calculate_age([])
-        self.assertTrue(True)
-
-    def test_calculate_age_should_append_age_when_one_citizen(self):
-        citizens = [{'birth_date': datetime(2000, 12, 1)}]
-        get_percentile_age_handler._calculate_age(citizens)
-        age = citizens[0]['age']
-        self.assertTrue(age == datetime.now().year - 2000 or age == datetime.now().year - 2001)
-
-    def test_calculate_age_should_calculate_when_birth_date_in_leap_year(self):
-        citizens = [{'birth_date': datetime(2004, 2, 29)}]
-        get_percentile_age_handler._calculate_age(citizens)
-        for citizen in citizens:
-            age = citizen['age']
-            self.assertTrue(age == datetime.now().year - 2004 or age == datetime.now().year - 2004)
-
-    def test_group_by_should_return_empty_when_citizens_empty(self):
-        grouped = get_percentile_age_handler._group_by_town([])
-        self.assertEqual({}, grouped)
-
-    def test_group_by_should_group_when_one_town(self):
-        grouped = get_percentile_age_handler._group_by_town([{'town': 'A', 'age': 20}, {'town': 'A', 'age': 19}])
-        self.assertEqual({'A': [20, 19]}, grouped)
-
-    def test_group_by_should_group_when_multiple_towns(self):
-        grouped = get_percentile_age_handler._group_by_town(
-            [{'town': 'A', 'age': 20}, {'town': 'A', 'age': 19}, {'town': 'B', 'age': 19}])
-        self.assertEqual({'A': [20, 19], 'B': [19]}, grouped)
-
-    def test_calculate_percentile_should_do_nothing_when_empty_grouped(self):
-        get_percentile_age_handler._calculate_percentile({})
-        self.assertTrue(True)
-
-    def test_calculate_percentile_should_return_integers(self):
-        grouped = {'A': [19]}
-        get_percentile_age_handler._calculate_percentile(grouped)
-        for p in grouped['A']:
+    @staticmethod
+    def to_dates(*dates: datetime) -> np.ndarray:
+        return np.array(dates, dtype='datetime64[D]')
+
+    @staticmethod
+    def calculate_percentiles(grouped: dict) -> dict:
+        codes = [code for code, town in enumerate(grouped) for _ in grouped[town]]
+        ages = [age for town in grouped for age in grouped[town]]
+        percentiles = get_percentile_age_handler._calculate_percentiles(
+            np.array(codes, dtype=np.int64), np.array(ages, dtype=np.int64), np.ones(len(ages), dtype=np.int64),
+            len(grouped))
+        return dict(zip(grouped, percentiles.tolist()))
+
+    def test_load_citizens_should_return_empty_when_citizens_empty(self):
+        towns, codes, birth_dates = get_percentile_age_handler._load_citizens([])
+        self.assertEqual([], towns)
+        self.assertEqual(0, len(codes))
+        self.assertEqual(0, len(birth_dates))
+
+    def test_load_citizens_should_encode_towns_in_order_of_appearance(self):
+        citizens = [{'town': 'B', 'birth_date': datetime(2000, 1, 1)}, {'town': 'A', 'birth_date': datetime(2001, 2, 3)},
+                    {'town': 'B', 'birth_date': datetime(2002, 3, 4)}]
+        towns, codes, birth_dates = get_percentile_age_handler._load_citizens(citizens)
+        self.assertEqual(['B', 'A'], towns)
+        self.assertEqual([0, 1, 0], codes.tolist())
+        self.assertEqual(self.to_dates(datetime(2000, 1, 1), datetime(2001, 2, 3), datetime(2002, 3, 4)).tolist(),
+                         birth_dates.tolist())
+
+    def test_calculate_ages_should_count_only_completed_years(self):
+        birth_dates = self.to_dates(datetime(2000, 12, 1), datetime(2000, 6, 15), datetime(2000, 6, 16))
+        ages = get_percentile_age_handler._calculate_ages(birth_dates, date(2019, 6, 15))
+        self.assertEqual([18, 19, 18], ages.tolist())
+
+    def test_calculate_ages_should_calculate_when_birth_date_in_leap_year(self):
+        birth_dates = self.to_dates(datetime(2004, 2, 29))
+        self.assertEqual([0], get_percentile_age_handler._calculate_ages(birth_dates, date(2005, 2, 28)).tolist())
+        self.assertEqual([1], get_percentile_age_handler._calculate_ages(birth_dates, date(2005, 3, 1)).tolist())
+        self.assertEqual([4], get_percentile_age_handler._calculate_ages(birth_dates, date(2008, 2, 29)).tolist())
+
+    def test_calculate_ages_should_return_zero_when_born_on_reference_date(self):
+        ages = get_percentile_age_handler._calculate_ages(self.to_dates(datetime(2019, 6, 15)), date(2019, 6, 15))
+        self.assertEqual([0], ages.tolist())
+
+    def test_get_next_age_change_should_return_nearest_upcoming_birthday(self):
+        birth_dates = self.to_dates(datetime(2000, 12, 1), datetime(2000, 6, 15), datetime(1990, 7, 1))
+        self.assertEqual(date(2019, 7, 1),
+                         get_percentile_age_handler._get_next_age_change(birth_dates, date(2019, 6, 15)))
+
+    def test_get_next_age_change_should_return_birthday_in_next_year_when_all_passed(self):
+        birth_dates = self.to_dates(datetime(2000, 3, 1), datetime(2000, 6, 15))
+        self.assertEqual(date(2020, 3, 1),
+                         get_percentile_age_handler._get_next_age_change(birth_dates, date(2019, 6, 15)))
+
+    def test_get_next_age_change_should_return_march_first_when_birth_date_in_leap_year(self):
+        birth_dates = self.to_dates(datetime(2004, 2, 29))
+        self.assertEqual(date(2019, 3, 1),
+                         get_percentile_age_handler._get_next_age_change(birth_dates, date(2019, 2, 1)))
+        self.assertEqual(date(2020, 2, 29),
+                         get_percentile_age_handler._get_next_age_change(birth_dates, date(2020, 2, 1)))
+
+    def test_get_next_age_change_should_return_None_when_no_citizens(self):
+        self.assertIsNone(get_percentile_age_handler._get_next_age_change(self.to_dates(), date(2019, 6, 15)))
+
+    def test_get_expires_should_return_None_when_as_of_specified(self):
+        birth_dates = self.to_dates(datetime(2000, 12, 1))
+        self.assertIsNone(get_percentile_age_handler.get_expires(birth_dates, date(2019, 6, 15)))
+
+    def test_parse_as_of_should_parse_date(self):
+        self.assertEqual(date(2019, 6, 15), get_percentile_age_handler.parse_as_of('15.06.2019'))
+        self.assertIsNone(get_percentile_age_handler.parse_as_of(None))
+
+    def test_parse_as_of_should_raise_when_format_incorrect(self):
+        with self.assertRaises(ValueError):
+            get_percentile_age_handler.parse_as_of('2019-06-15')
+
+    def test_calculate_percentile_should_return_empty_when_no_citizens(self):
+        self.assertEqual({}, self.calculate_percentiles({}))
+
+    def test_calculate_percentile_should_return_floats(self):
+        for p in self.calculate_percentiles({'A': [19]})['A']:
             self.assertIsInstance(p, float)
 
     def test_calculate_percentile_when_one_citizen(self):
-        grouped = {'A': [19]}
-        get_percentile_age_handler._calculate_percentile(grouped)
-        self.assertEqual({'A': [19, 19, 19]}, grouped)
+        self.assertEqual({'A': [19, 19, 19]}, self.calculate_percentiles({'A': [19]}))
 
     def test_calculate_percentile_when_multiple_citizens(self):
-        grouped = {'A': [19, 25, 40, 50, 51, 53, 55]}
-        get_percentile_age_handler._calculate_percentile(grouped)
-        self.assertEqual({'A': [50.0, 52.0, 54.88]}, grouped)
+        grouped = {'A': [55, 25, 40, 50, 51, 53, 19]}
+        self.assertEqual({'A': [50.0, 52.0, 54.88]}, self.calculate_percentiles(grouped))
 
     def test_calculate_percentile_when_multiple_towns(self):
         grouped = {'A': [19, 25, 40, 50, 51, 53, 55], 'B': [19]}
-        get_percentile_age_handler._calculate_percentile(grouped)
-        self.assertEqual({'A': [50.0, 52.0, 54.88], 'B': [19.0, 19.0, 19.0]}, grouped)
+        self.assertEqual({'A': [50.0, 52.0, 54.88], 'B': [19.0, 19.0, 19.0]}, self.calculate_percentiles(grouped))
+
+    def test_calculate_percentile_should_match_numpy_percentile(self):
+        grouped = {'A': [3, 90, 7, 7, 41, 12, 65, 30], 'B': [0, 100], 'C': [5, 6, 7]}
+        expected = {town: [round(p, 2) for p in np.percentile(ages, [50, 75, 99])] for town, ages in grouped.items()}
+        self.assertEqual(expected, self.calculate_percentiles(grouped))
 
     def test_get_representation_should_be_empty_when_percentile_empty(self):
         representation = get_percentile_age_handler._get_percentiles_representation({})
@@ -75,3 +123,17 @@ class GetPercentileAgeHandlerTests(unittest.TestCase):
         representation = get_percentile_age_handler._get_percentiles_representation(percentiles)
         self.assertEqual({'data': [{'town': 'A', 'p50': 50, 'p75': 52, 'p99': 54},
                                    {'town': 'B', 'p50': 19, 'p75': 19, 'p99': 19}]}, representation)
+
+    def test_get_percentile_age_should_return_empty_when_import_has_no_citizens(self):
+        db = test_utils.get_fake_db()
+        test_utils.insert_import(db, {'import_id': 0, 'citizens': []})
+        percentiles_data, status, expires = get_percentile_age_handler.get_percentile_age(
+            0, db, ReadWriteMongoLock(client=db.client, db=db.name))
+        self.assertEqual(201, status)
+        self.assertEqual({'data': []}, percentiles_data)
+        self.assertIsNone(expires)
+
+    def test_get_percentile_age_should_raise_when_import_not_found(self):
+        db = test_utils.get_fake_db()
+        with self.assertRaises(PyMongoError):
+            get_percentile_age_handler.get_percentile_age(0, db, ReadWriteMongoLock(client=db.client, db=db.name))
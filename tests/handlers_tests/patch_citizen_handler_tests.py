@@ -37,19 +37,20 @@ class PatchCitizenHandlerTests(unittest.TestCase):
 
     def test_write_citizen_update_should_update_one_field(self):
         db = test_utils.get_fake_db()
-        db['imports'].insert_one({'import_id': 0, 'citizens': [{'citizen_id': 0, 'name': 'test'}]})
-        db_response = patch_citizen_handler._write_citizen_update(0, 0, {'name': 'aaa'}, db, None)
-        self.assertEqual('aaa', db_response['citizens'][0]['name'])
-        self.assertEqual('aaa', db['imports'].find_one({'import_id': 0})['citizens'][0]['name'])
+        db['citizens'].insert_one({'import_id': 0, 'citizen_id': 0, 'name': 'test'})
+        old_citizen, db_response = patch_citizen_handler._write_citizen_update(0, 0, {'name': 'aaa'}, db, None)
+        self.assertEqual('test', old_citizen['name'])
+        self.assertEqual('aaa', db_response['name'])
+        self.assertEqual('aaa', db['citizens'].find_one({'import_id': 0, 'citizen_id': 0})['name'])
 
     def test_write_citizen_update_should_update_all_fields(self):
         db = test_utils.get_fake_db()
-        db['imports'].insert_one({'import_id': 0, 'citizens': [{'citizen_id': 0, 'name': 'test', 'city': 'test'}]})
-        db_response = patch_citizen_handler._write_citizen_update(0, 0, {'name': 'aaa', 'city': 'bbb'}, db, None)
-        self.assertEqual('aaa', db_response['citizens'][0]['name'])
-        self.assertEqual('bbb', db_response['citizens'][0]['city'])
-        self.assertEqual('aaa', db['imports'].find_one({'import_id': 0})['citizens'][0]['name'])
-        self.assertEqual('bbb', db['imports'].find_one({'import_id': 0})['citizens'][0]['city'])
+        db['citizens'].insert_one({'import_id': 0, 'citizen_id': 0, 'name': 'test', 'city': 'test'})
+        _, db_response = patch_citizen_handler._write_citizen_update(0, 0, {'name': 'aaa', 'city': 'bbb'}, db, None)
+        self.assertEqual('aaa', db_response['name'])
+        self.assertEqual('bbb', db_response['city'])
+        self.assertEqual('aaa', db['citizens'].find_one({'import_id': 0, 'citizen_id': 0})['name'])
+        self.assertEqual('bbb', db['citizens'].find_one({'import_id': 0, 'citizen_id': 0})['city'])
 
     def test_write_citizen_update_should_raise_when_import_not_found(self):
         db = test_utils.get_fake_db()
@@ -58,78 +59,6 @@ class PatchCitizenHandlerTests(unittest.TestCase):
 
     def test_write_citizen_update_should_raise_when_citizen_not_found(self):
         db = test_utils.get_fake_db()
-        db['imports'].insert_one({'import_id': 0, 'citizens': []})
+        db['citizens'].insert_one({'import_id': 0, 'citizen_id': 1})
         with self.assertRaises(PyMongoError):
             patch_citizen_handler._write_citizen_update(0, 0, {}, db, None)
-
-    def test_get_citizen_data_should_extract_citizen_data_from_db_request(self):
-        citizen = {'citizen_id': 1, 'birth_date': datetime(2019, 12, 31)}
-        db_request = {'citizens': [citizen]}
-        citizen_data = patch_citizen_handler._get_citizen_data(db_request)
-        self.assertEqual(citizen, citizen_data)
-
-    def test_get_citizen_data_should_stringify_birth_date(self):
-        citizen = {'citizen_id': 1, 'birth_date': datetime(2019, 12, 31)}
-        db_request = {'citizens': [citizen]}
-        citizen_data = patch_citizen_handler._get_citizen_data(db_request)
-        self.assertEqual('31.12.2019', citizen_data['birth_date'])
-
-    def test_delete_birthdays_should_do_nothing_when_no_relatives_and_no_birth_date_in_patch(self):
-        db = test_utils.get_fake_db()
-        db['birthdays'].insert_one({'import_id': 0})
-        patch_citizen_handler._delete_birthdays_data(0, {}, None, db, None)
-        count = db['birthdays'].count_documents({'import_id': 0})
-        self.assertEqual(1, count)
-
-    def test_delete_birthdays_should_delete_when_relatives_in_patch(self):
-        db = test_utils.get_fake_db()
-        lock = MongoLock(client=db.client, db='db')
-        db['birthdays'].insert_one({'import_id': 0})
-        patch_citizen_handler._delete_birthdays_data(0, {'relatives': []}, lock, db, None)
-        count = db['birthdays'].count_documents({'import_id': 0})
-        self.assertEqual(0, count)
-
-    def test_delete_birthdays_should_delete_when_birth_date_in_patch(self):
-        db = test_utils.get_fake_db()
-        lock = MongoLock(client=db.client, db='db')
-        db['birthdays'].insert_one({'import_id': 0})
-        patch_citizen_handler._delete_birthdays_data(0, {'birth_date': datetime(2019, 1, 1)}, lock, db, None)
-        count = db['birthdays'].count_documents({'import_id': 0})
-        self.assertEqual(0, count)
-
-    def test_delete_birthdays_should_do_nothing_when_no_birthdays(self):
-        db = test_utils.get_fake_db()
-        lock = MongoLock(client=db.client, db='db')
-        patch_citizen_handler._delete_birthdays_data(0, {'birth_date': datetime(2019, 1, 1)}, lock, db, None)
-        count = db['birthdays'].count_documents({'import_id': 0})
-        self.assertEqual(0, count)
-
-    def test_delete_percentile_age_should_do_nothing_when_no_town_and_no_birth_date_in_patch(self):
-        db = test_utils.get_fake_db()
-        db['percentile_age'].insert_one({'import_id': 0})
-        patch_citizen_handler._delete_percentile_age_data(0, {}, None, db, None)
-        count = db['percentile_age'].count_documents({'import_id': 0})
-        self.assertEqual(1, count)
-
-    def test_delete_percentile_age_should_delete_when_town_in_patch(self):
-        db = test_utils.get_fake_db()
-        lock = MongoLock(client=db.client, db='db')
-        db['percentile_age'].insert_one({'import_id': 0})
-        patch_citizen_handler._delete_percentile_age_data(0, {'town': 'A'}, lock, db, None)
-        count = db['percentile_age'].count_documents({'import_id': 0})
-        self.assertEqual(0, count)
-
-    def test_delete_percentile_age_should_delete_when_birth_date_in_patch(self):
-        db = test_utils.get_fake_db()
-        lock = MongoLock(client=db.client, db='db')
-        db['percentile_age'].insert_one({'import_id': 0})
-        patch_citizen_handler._delete_percentile_age_data(0, {'birth_date': datetime(2019, 1, 1)}, lock, db, None)
-        count = db['percentile_age'].count_documents({'import_id': 0})
-        self.assertEqual(0, count)
-
-    def test_delete_percentile_age_should_do_nothing_when_no_percentile_age(self):
-        db = test_utils.get_fake_db()
-        lock = MongoLock(client=db.client, db='db')
-        patch_citizen_handler._delete_percentile_age_data(0, {'birth_date': datetime(2019, 1, 1)}, lock, db, None)
-        count = db['percentile_age'].count_documents({'import_id': 0})
-        self.assertEqual(0, count)
@@ -1,5 +1,6 @@
 import unittest
 from datetime import datetime
+from unittest import mock
 from unittest.mock import MagicMock
 
 from parameterized import parameterized
@@ -10,32 +11,16 @@ from tests import test_utils
 
 
 class PostImportHandlerTests(unittest.TestCase):
-    def test_parse_birth_date_should_not_throw_error_when_no_citizens(self):
-        import_data = {'citizens': []}
-        post_import_handler._parse_birth_date(import_data)
-        self.assertEqual(0, len(import_data['citizens']))
-        self.assertEqual(1, len(import_data))
-
-    def test_parse_birth_date_should_parse_string_to_datetime_when_one_citizen(self):
-        import_data = {'citizens': [{'birth_date': '01.02.2019'}]}
+    def test_parse_birth_date_should_parse_string_to_datetime(self):
+        citizen = {'birth_date': '01.02.2019'}
         expected_result = datetime(2019, 2, 1)
-        post_import_handler._parse_birth_date(import_data)
-        birth_date = import_data['citizens'][0]['birth_date']
+        post_import_handler._parse_birth_date(citizen)
+        birth_date = citizen['birth_date']
         self.assertIsInstance(birth_date, datetime)
         self.assertEqual(birth_date.year, expected_result.year)
         self.assertEqual(birth_date.month, expected_result.month)
         self.assertEqual(birth_date.day, expected_result.day)
-
-    def test_parse_birth_date_should_parse_string_to_datetime_when_multiple_citizens(self):
-        import_data = {'citizens': [{'birth_date': '01.02.2019'}, {'birth_date': '02.01.2017'}]}
-        expected_result = [datetime(2019, 2, 1), datetime(2017, 1, 2)]
-        post_import_handler._parse_birth_date(import_data)
-        for i in range(len(expected_result)):
-            birth_date = import_data['citizens'][i]['birth_date']
-            self.assertIsInstance(birth_date, datetime)
-            self.assertEqual(birth_date.year, expected_result[i].year)
-            self.assertEqual(birth_date.month, expected_result[i].month)
-            self.assertEqual(birth_date.day, expected_result[i].day)
+        self.assertEqual(2, citizen['birth_month'])
 
     @parameterized.expand([
         ('aaa',),
@@ -44,9 +29,8 @@ class PostImportHandlerTests(unittest.TestCase):
         ('12.14.2019',)
     ])
     def test_parse_birth_should_throw_exception_when_datetime_in_wrong_format(self, birth_date: str):
-        import_date = {'citizens': [{'birth_date': birth_date}]}
         with self.assertRaises(ValueError):
-            post_import_handler._parse_birth_date(import_date)
+            post_import_handler._parse_birth_date({'birth_date': birth_date})
 
     def test_add_import_id_should_add_zero_when_db_empty(self):
         db = test_utils.get_fake_db()
@@ -63,16 +47,39 @@ class PostImportHandlerTests(unittest.TestCase):
         self.assertIn('import_id', import_data)
         self.assertEqual(1, import_data['import_id'])
 
-    def test_write_to_db_should_insert_import_data_in_db(self):
+    def test_add_import_id_should_increment_counter(self):
         db = test_utils.get_fake_db()
-        import_data = {'import_id': 0}
-        data, status = post_import_handler._write_to_db(import_data, db)
-        self.assertEqual(201, status)
-        self.assertEqual(import_data['import_id'], data['data']['import_id'])
-        inserted_import_data = db['imports'].find_one({'import_id': import_data['import_id']})
-        self.assertEqual(import_data, inserted_import_data)
+        import_ids = []
+        for _ in range(3):
+            import_data = {}
+            post_import_handler._add_import_id(import_data, db)
+            import_ids.append(import_data['import_id'])
+        self.assertEqual([0, 1, 2], import_ids)
+        self.assertEqual(3, db['counters'].find_one({'_id': post_import_handler.IMPORT_ID_COUNTER})['value'])
+
+    def test_add_import_id_should_not_reuse_id_of_deleted_import(self):
+        db = test_utils.get_fake_db()
+        import_data = {}
+        post_import_handler._add_import_id(import_data, db)
+        db['imports'].delete_many({})
+        post_import_handler._add_import_id(import_data, db)
+        self.assertEqual(1, import_data['import_id'])
+
+    def test_add_import_id_should_not_count_imports_when_counter_exists(self):
+        db = test_utils.get_fake_db()
+        db['counters'].insert_one({'_id': post_import_handler.IMPORT_ID_COUNTER, 'value': 5})
+        with mock.patch.object(db['imports'], 'count_documents') as count_mock:
+            import_data = {}
+            post_import_handler._add_import_id(import_data, db)
+            count_mock.assert_not_called()
+        self.assertEqual(5, import_data['import_id'])
 
-    def test_write_to_db_should_raise_error_when_write_not_acknowledged(self):
+    def test_write_import_header_should_insert_incomplete_header(self):
+        db = test_utils.get_fake_db()
+        post_import_handler._write_import_header({'import_id': 0}, db)
+        self.assertEqual({'import_id': 0, 'complete': False}, db['imports'].find_one({'import_id': 0}, {'_id': 0}))
+
+    def test_write_import_header_should_raise_error_when_write_not_acknowledged(self):
         class FakeInsertOneResult:
             def __init__(self):
                 self.acknowledged = False
@@ -80,4 +87,63 @@ class PostImportHandlerTests(unittest.TestCase):
         db = test_utils.get_fake_db()
         db['imports'].insert_one = MagicMock(return_value=FakeInsertOneResult())
         with self.assertRaises(PyMongoError):
-            post_import_handler._write_to_db({}, db)
+            post_import_handler._write_import_header({'import_id': 0}, db)
+
+    def test_write_citizens_should_insert_each_citizen_as_document(self):
+        db = test_utils.get_fake_db()
+        citizens = [{'citizen_id': 1, 'town': 'A', 'birth_date': '01.02.2019'},
+                    {'citizen_id': 2, 'town': 'A', 'birth_date': '02.01.2017'}]
+        post_import_handler._write_citizens(0, iter(citizens), db)
+        inserted = list(db['citizens'].find({'import_id': 0}, {'_id': 0}))
+        self.assertEqual([{'citizen_id': 1, 'town': 'A', 'birth_date': datetime(2019, 2, 1), 'birth_month': 2,
+                           'import_id': 0},
+                          {'citizen_id': 2, 'town': 'A', 'birth_date': datetime(2017, 1, 2), 'birth_month': 1,
+                           'import_id': 0}],
+                         inserted)
+
+    def test_write_citizens_should_write_age_histograms_by_town(self):
+        db = test_utils.get_fake_db()
+        citizens = [{'citizen_id': 1, 'town': 'A', 'birth_date': '01.02.2019'},
+                    {'citizen_id': 2, 'town': 'B', 'birth_date': '02.01.2017'},
+                    {'citizen_id': 3, 'town': 'A', 'birth_date': '01.02.2019'}]
+        post_import_handler._write_citizens(0, iter(citizens), db)
+        histograms = list(db['age_histograms'].find({'import_id': 0}, {'_id': 0, 'import_id': 0}).sort('town', 1))
+        self.assertEqual([{'town': 'A', 'birth_dates': {'2019-02-01': 2}},
+                          {'town': 'B', 'birth_dates': {'2017-01-02': 1}}], histograms)
+
+    @parameterized.expand([
+        (0, 0),
+        (1, 1),
+        (5, 3),
+        (6, 3),
+        (7, 4)
+    ])
+    def test_write_citizens_should_write_in_batches(self, citizens_count: int, expected_batches: int):
+        db = test_utils.get_fake_db()
+        citizens = ({'citizen_id': i, 'town': 'A', 'birth_date': '01.02.2019'} for i in range(citizens_count))
+        with mock.patch('application.handlers.post_import_handler._write_citizens_batch') as batch_mock:
+            post_import_handler._write_citizens(0, citizens, db, batch_size=2)
+            self.assertEqual(expected_batches, batch_mock.call_count)
+
+    def test_complete_import_should_mark_header_complete(self):
+        db = test_utils.get_fake_db()
+        db['imports'].insert_one({'import_id': 0, 'complete': False})
+        data, status = post_import_handler._complete_import(0, db)
+        self.assertEqual(201, status)
+        self.assertEqual(0, data['data']['import_id'])
+        self.assertTrue(db['imports'].find_one({'import_id': 0})['complete'])
+
+    def test_post_import_should_delete_written_citizens_and_header_when_error(self):
+        db = test_utils.get_fake_db()
+
+        def write_citizens(import_id, citizens, db):
+            db['citizens'].insert_one({'import_id': import_id, 'citizen_id': 1})
+            db['age_histograms'].insert_one({'import_id': import_id, 'town': 'A', 'birth_dates': {}})
+            raise ValueError()
+
+        with mock.patch('application.handlers.post_import_handler._write_citizens', write_citizens):
+            with self.assertRaises(ValueError):
+                post_import_handler.post_import(iter([]), db)
+        self.assertEqual(0, db['citizens'].count_documents({}))
+        self.assertEqual(0, db['age_histograms'].count_documents({}))
+        self.assertIsNone(db['imports'].find_one({'import_id': 0}))
@@ -1,4 +1,5 @@
 import unittest
+from datetime import datetime
 
 from pymongo.errors import PyMongoError
 
@@ -9,8 +10,8 @@ from tests import test_utils
 class SharedTests(unittest.TestCase):
     def test_get_citizens_should_return_data_if_found(self):
         db = test_utils.get_fake_db()
-        db['imports'].insert_one({'import_id': 0, 'citizens': [{'birth_date': 0, 'relatives': []}]})
-        citizens = shared.get_citizens(0, db)
+        test_utils.insert_import(db, {'import_id': 0, 'citizens': [{'birth_date': 0, 'relatives': []}]})
+        citizens = shared.get_citizens(0, db, {'_id': 0, 'import_id': 0})
         self.assertEqual([{'birth_date': 0, 'relatives': []}], citizens)
 
     def test_get_citizens_should_raise_if_not_found(self):
@@ -20,6 +21,34 @@ class SharedTests(unittest.TestCase):
 
     def test_get_citizens_should_select_with_projection(self):
         db = test_utils.get_fake_db()
-        db['imports'].insert_one({'import_id': 0, 'citizens': [{'citizen_id': 0, 'birth_date': 0, 'relatives': []}]})
-        citizens = shared.get_citizens(0, db, {'citizens.citizen_id': 0})
+        test_utils.insert_import(db, {'import_id': 0, 'citizens': [{'citizen_id': 0, 'birth_date': 0, 'relatives': []}]})
+        citizens = shared.get_citizens(0, db, {'_id': 0, 'import_id': 0, 'citizen_id': 0})
         self.assertEqual([{'birth_date': 0, 'relatives': []}], citizens)
+
+    def test_get_citizens_should_return_empty_when_import_has_no_citizens(self):
+        db = test_utils.get_fake_db()
+        test_utils.insert_import(db, {'import_id': 0, 'citizens': []})
+        self.assertEqual([], shared.get_citizens(0, db))
+
+    def test_get_citizens_should_sort_by_citizen_id(self):
+        db = test_utils.get_fake_db()
+        test_utils.insert_import(db, {'import_id': 0, 'citizens': [{'citizen_id': 2}, {'citizen_id': 1}]})
+        citizens = shared.get_citizens(0, db, {'_id': 0, 'import_id': 0})
+        self.assertEqual([{'citizen_id': 1}, {'citizen_id': 2}], citizens)
+
+    def test_find_citizens_should_filter_and_paginate(self):
+        db = test_utils.get_fake_db()
+        test_utils.insert_import(db, {'import_id': 0, 'citizens': [
+            {'citizen_id': i, 'town': 'A' if i % 2 else 'B', 'gender': 'male'} for i in range(6)]})
+        citizens = shared.find_citizens(0, db, {'_id': 0, 'citizen_id': 1}, {'town': 'A', 'gender': 'male'}, 1, 2)
+        self.assertEqual([{'citizen_id': 3}, {'citizen_id': 5}], list(citizens))
+
+    def test_make_citizens_query_should_ignore_unknown_filters(self):
+        self.assertEqual({'import_id': 0, 'birth_month': 5, 'citizen_id': {'$gt': 3}},
+                         shared.make_citizens_query(0, {'birth_month': 5, 'name': 'a'}, 3))
+
+    def test_with_birth_month_should_add_month_of_birth_date(self):
+        self.assertEqual({'birth_date': datetime(2000, 5, 1), 'birth_month': 5},
+                         shared.with_birth_month({'birth_date': datetime(2000, 5, 1)}))
+        self.assertEqual({'name': 'a'}, shared.with_birth_month({'name': 'a'}))
+
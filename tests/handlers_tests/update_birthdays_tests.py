@@ -0,0 +1,121 @@
+import unittest
+from datetime import datetime
+
+import application.handlers.patch_citizen.update_birthdays as update_birthdays
+from application import response_body
+from application.handlers import get_birthdays_handler
+from application.read_write_lock import ReadWriteMongoLock
+from tests import test_utils
+
+
+class UpdateBirthdaysTests(unittest.TestCase):
+    @staticmethod
+    def make_citizen(citizen_id: int, month: int, relatives: list) -> dict:
+        return {'citizen_id': citizen_id, 'birth_date': datetime(2000, month, 1), 'relatives': relatives}
+
+    def set_up_db(self, citizens: list):
+        self.db = test_utils.get_fake_db()
+        self.lock = ReadWriteMongoLock(client=self.db.client, db=self.db.name)
+        test_utils.insert_import(self.db, {'import_id': 0, 'citizens': citizens})
+        birthdays_data, _ = get_birthdays_handler.get_birthdays(0, self.db, self.lock)
+        body = response_body.encode_body(birthdays_data)
+        self.db['birthdays'].insert_one({'import_id': 0, **response_body.make_cache_fields(body, birthdays_data)})
+
+    def assert_cache_is_actual(self):
+        cached_document = self.db['birthdays'].find_one({'import_id': 0}, {'_id': 0, 'import_id': 0})
+        expected_data, _ = get_birthdays_handler.get_birthdays(0, self.db, self.lock)
+        self.assertEqual(expected_data, response_body.read_cached_data(cached_document))
+        self.assertNotIn('body', cached_document)
+        self.assertNotIn('gzip_body', cached_document)
+
+    def patch(self, citizen_id: int, to_push: set, to_pull: set, patch_data: dict):
+        old_citizen = self.db['citizens'].find_one({'import_id': 0, 'citizen_id': citizen_id}, {'_id': 0})
+        old_citizen['relatives'] = list(old_citizen['relatives'])
+        for relative_id in to_push:
+            self.db['citizens'].update_one({'import_id': 0, 'citizen_id': relative_id},
+                                           {'$push': {'relatives': citizen_id}})
+        for relative_id in to_pull:
+            self.db['citizens'].update_one({'import_id': 0, 'citizen_id': relative_id},
+                                           {'$pull': {'relatives': citizen_id}})
+        self.db['citizens'].update_one({'import_id': 0, 'citizen_id': citizen_id}, {'$set': patch_data})
+        new_citizen = {**old_citizen, **patch_data}
+        update_birthdays.update_birthdays(0, old_citizen, new_citizen, to_push, to_pull, self.lock, self.db, None)
+
+    def test_get_birthdays_difference_should_be_empty_when_nothing_changed(self):
+        citizen = self.make_citizen(0, 2, [1])
+        self.assertEqual({}, update_birthdays._get_birthdays_difference(citizen, citizen, set(), set(), {}))
+
+    def test_get_birthdays_difference_should_move_presents_when_birth_month_changed(self):
+        difference = update_birthdays._get_birthdays_difference(
+            self.make_citizen(0, 2, [1, 2]), self.make_citizen(0, 5, [1, 2]), set(), set(), {})
+        self.assertEqual({(2, 1): -1, (2, 2): -1, (5, 1): 1, (5, 2): 1}, difference)
+
+    def test_get_birthdays_difference_when_relatives_changed(self):
+        difference = update_birthdays._get_birthdays_difference(
+            self.make_citizen(0, 2, [1, 2]), self.make_citizen(0, 2, [2, 3]), {3}, {1}, {1: 7, 3: 9})
+        self.assertEqual({(2, 1): -1, (2, 3): 1, (7, 0): -1, (9, 0): 1}, difference)
+
+    def test_apply_birthdays_difference_should_keep_order_and_drop_zero_presents(self):
+        months = {'2': [{'citizen_id': 1, 'presents': 1}, {'citizen_id': 4, 'presents': 2}]}
+        updated = update_birthdays._apply_birthdays_difference(months, {(2, 1): -1, (2, 3): 1, (2, 4): -1, (5, 0): 1})
+        self.assertEqual({'2': [{'citizen_id': 3, 'presents': 1}, {'citizen_id': 4, 'presents': 1}],
+                          '5': [{'citizen_id': 0, 'presents': 1}]}, updated)
+
+    def test_update_birthdays_should_do_nothing_when_no_cache(self):
+        self.set_up_db([self.make_citizen(0, 2, [1]), self.make_citizen(1, 3, [0])])
+        self.db['birthdays'].delete_many({})
+        self.patch(0, set(), set(), {'birth_date': datetime(2000, 4, 1)})
+        self.assertEqual(0, self.db['birthdays'].count_documents({}))
+
+    def test_update_birthdays_when_birth_date_changed(self):
+        self.set_up_db([self.make_citizen(0, 2, [1, 2]), self.make_citizen(1, 3, [0]), self.make_citizen(2, 2, [0])])
+        self.patch(0, set(), set(), {'birth_date': datetime(2000, 11, 1)})
+        self.assert_cache_is_actual()
+
+    def test_update_birthdays_when_patched_twice(self):
+        self.set_up_db([self.make_citizen(0, 2, [1, 2]), self.make_citizen(1, 3, [0]), self.make_citizen(2, 2, [0])])
+        self.patch(0, set(), set(), {'birth_date': datetime(2000, 11, 1)})
+        self.patch(1, set(), set(), {'birth_date': datetime(2000, 11, 1)})
+        self.assert_cache_is_actual()
+        self.assertEqual(2, self.db['birthdays'].find_one({'import_id': 0})['revision'])
+
+    def test_update_birthdays_should_delete_cache_when_cache_stores_only_body(self):
+        self.set_up_db([self.make_citizen(0, 2, [1]), self.make_citizen(1, 3, [0])])
+        cached_document = self.db['birthdays'].find_one({'import_id': 0}, {'_id': 0, 'import_id': 0})
+        self.db['birthdays'].replace_one({'import_id': 0}, {'import_id': 0, 'body': cached_document['body']})
+        self.patch(0, set(), set(), {'birth_date': datetime(2000, 4, 1)})
+        self.assertEqual(0, self.db['birthdays'].count_documents({}))
+
+    def test_update_birthdays_when_relatives_changed(self):
+        self.set_up_db([self.make_citizen(0, 2, [1, 2]), self.make_citizen(1, 3, [0]), self.make_citizen(2, 2, [0]),
+                        self.make_citizen(3, 2, [])])
+        self.patch(0, {3}, {1}, {'relatives': [2, 3]})
+        self.assert_cache_is_actual()
+
+    def test_update_birthdays_when_birth_date_and_relatives_changed(self):
+        self.set_up_db([self.make_citizen(0, 2, [1]), self.make_citizen(1, 3, [0, 2]), self.make_citizen(2, 3, [1]),
+                        self.make_citizen(3, 12, [])])
+        self.patch(1, {3}, {0}, {'relatives': [2, 3], 'birth_date': datetime(2000, 12, 31)})
+        self.assert_cache_is_actual()
+
+    def test_get_batch_birthdays_difference_should_count_changes_of_not_patched_citizens(self):
+        difference = update_birthdays._get_batch_birthdays_difference(
+            [self.make_citizen(0, 2, [1]), self.make_citizen(1, 3, [0])],
+            [self.make_citizen(0, 5, [1, 2]), self.make_citizen(1, 3, [0])], {(2, 0): 1}, {2: 9})
+        self.assertEqual({(2, 1): -1, (5, 1): 1, (5, 2): 1, (9, 0): 1}, difference)
+
+    def test_update_birthdays_batch_when_birth_dates_and_relatives_changed(self):
+        self.set_up_db([self.make_citizen(0, 2, [1]), self.make_citizen(1, 3, [0, 2]), self.make_citizen(2, 3, [1]),
+                        self.make_citizen(3, 12, [])])
+        old_citizens = list(self.db['citizens'].find({'import_id': 0, 'citizen_id': {'$in': [0, 1]}}, {'_id': 0}))
+        new_citizens = [{**old_citizens[0], 'birth_date': datetime(2000, 7, 1)},
+                        {**old_citizens[1], 'relatives': [0, 2, 3]}]
+        for new_citizen in new_citizens:
+            self.db['citizens'].replace_one({'import_id': 0, 'citizen_id': new_citizen['citizen_id']}, new_citizen)
+        self.db['citizens'].update_one({'import_id': 0, 'citizen_id': 3}, {'$push': {'relatives': 1}})
+        update_birthdays.update_birthdays_batch(0, old_citizens, new_citizens, {(3, 1): 1}, self.lock, self.db, None)
+        self.assert_cache_is_actual()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+from datetime import date, datetime
+
+from application import response_body
+from application.handlers import get_percentile_age_handler
+from application.handlers.patch_citizen import update_percentile_age
+from application.read_write_lock import ReadWriteMongoLock
+from tests import test_utils
+
+
+class UpdatePercentileAgeTests(unittest.TestCase):
+    def setUp(self):
+        self.db = test_utils.get_fake_db()
+        self.lock = ReadWriteMongoLock(client=self.db.client, db=self.db.name)
+        self.citizens = [{'citizen_id': 0, 'town': 'A', 'birth_date': datetime(1990, 5, 1)},
+                         {'citizen_id': 1, 'town': 'A', 'birth_date': datetime(2000, 5, 1)},
+                         {'citizen_id': 2, 'town': 'B', 'birth_date': datetime(1980, 5, 1)}]
+        import_data = {'import_id': 0, 'citizens': self.citizens}
+        test_utils.insert_import(self.db, import_data)
+        test_utils.insert_age_histograms(self.db, import_data)
+
+    def cache_percentile_age(self):
+        percentile_age_data, _, expires = get_percentile_age_handler.get_percentile_age(0, self.db, self.lock)
+        cache_fields = response_body.make_cache_fields(response_body.encode_body(percentile_age_data),
+                                                       percentile_age_data)
+        self.db['percentile_age'].insert_one({'import_id': 0, **cache_fields, 'expires': expires})
+
+    def patch(self, citizen_id: int, patch_data: dict):
+        old_citizen = self.citizens[citizen_id]
+        new_citizen = {**old_citizen, **patch_data}
+        self.db['citizens'].update_one({'import_id': 0, 'citizen_id': citizen_id}, {'$set': patch_data})
+        update_percentile_age.update_percentile_age(0, old_citizen, new_citizen, self.lock, self.db, None)
+
+    def test_should_do_nothing_when_town_and_birth_date_not_changed(self):
+        self.cache_percentile_age()
+        histograms = list(self.db['age_histograms'].find({}, {'_id': 0}))
+        self.patch(0, {'town': 'A'})
+        self.assertEqual(histograms, list(self.db['age_histograms'].find({}, {'_id': 0})))
+
+    def test_should_recalculate_cache_when_town_changed(self):
+        self.cache_percentile_age()
+        self.patch(0, {'town': 'B'})
+        cached_document = self.db['percentile_age'].find_one({'import_id': 0}, {'_id': 0, 'import_id': 0})
+        cached_data = response_body.read_cached_data(cached_document)
+        expected_data, _, expires = get_percentile_age_handler.get_percentile_age(0, self.db, self.lock)
+        self.assertEqual(expected_data, cached_data)
+        self.assertEqual(expires, cached_document['expires'])
+        self.assertNotIn('body', cached_document)
+        self.assertNotIn('gzip_body', cached_document)
+        self.assertEqual(['A', 'B'], [town['town'] for town in cached_data['data']])
+
+    def test_should_remove_town_without_citizens_from_cache(self):
+        self.cache_percentile_age()
+        self.patch(2, {'town': 'A'})
+        cached_document = self.db['percentile_age'].find_one({'import_id': 0}, {'_id': 0, 'import_id': 0})
+        cached_data = response_body.read_cached_data(cached_document)
+        self.assertEqual(['A'], [town['town'] for town in cached_data['data']])
+
+    def test_should_recalculate_cache_on_its_date_when_as_of_specified(self):
+        as_of = date(2000, 6, 1)
+        percentile_age_data, _, _ = get_percentile_age_handler.get_percentile_age(0, self.db, self.lock, as_of)
+        self.db['percentile_age'].insert_one({'import_id': 0, 'as_of': '01.06.2000', **percentile_age_data})
+        self.patch(1, {'town': 'B'})
+        cached_document = self.db['percentile_age'].find_one({'import_id': 0, 'as_of': '01.06.2000'})
+        self.assertEqual([{'town': 'A', 'p50': 10, 'p75': 10, 'p99': 10},
+                          {'town': 'B', 'p50': 10, 'p75': 15, 'p99': 19.8}],
+                         response_body.read_cached_data(cached_document)['data'])
+        self.assertIsNone(cached_document['expires'])
+
+    def test_should_set_data_when_cache_stores_only_body(self):
+        percentile_age_data, _, expires = get_percentile_age_handler.get_percentile_age(0, self.db, self.lock)
+        body_fields = response_body.make_body_fields(response_body.encode_body(percentile_age_data))
+        self.db['percentile_age'].insert_one({'import_id': 0, **body_fields, 'expires': expires})
+        self.patch(2, {'town': 'A'})
+        cached_document = self.db['percentile_age'].find_one({'import_id': 0}, {'_id': 0, 'import_id': 0})
+        self.assertNotIn('body', cached_document)
+        self.assertEqual(['A'], [town['town'] for town in response_body.read_cached_data(cached_document)['data']])
+
+    def test_should_not_create_cache_when_not_cached(self):
+        self.patch(0, {'birth_date': datetime(1950, 1, 1)})
+        self.assertEqual(0, self.db['percentile_age'].count_documents({}))
+        self.assertEqual({'1950-01-01': 1, '1990-05-01': 0, '2000-05-01': 1},
+                         self.db['age_histograms'].find_one({'town': 'A'})['birth_dates'])
+
+    def test_should_delete_cache_when_no_histograms(self):
+        self.cache_percentile_age()
+        self.db['age_histograms'].delete_many({})
+        self.patch(0, {'town': 'B'})
+        self.assertEqual(0, self.db['percentile_age'].count_documents({}))
+        self.assertEqual(0, self.db['age_histograms'].count_documents({}))
+
+
+if __name__ == '__main__':
+    unittest.main()
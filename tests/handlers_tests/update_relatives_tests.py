@@ -15,32 +15,8 @@ class UpdateRelativesTests(unittest.TestCase):
 
     def test_make_update_request_should_create_correct_request(self):
         request = update_relatives._make_update_relatives_request('$push', 0, 0, [1])
-        self.assertEqual({'import_id': 0}, request._filter)
-        self.assertEqual({'$push': {'citizens.$[element].relatives': 0}}, request._doc)
-        self.assertEqual([{'element.citizen_id': {'$in': [1]}}], request._array_filters)
-
-    def test_get_relatives_should_return_set_of_relatives(self):
-        db = test_utils.get_fake_db()
-        db['imports'].insert_one({'import_id': 0, 'citizens': [{'citizen_id': 0, 'relatives': [1, 2, 3]}]})
-        relatives = update_relatives._get_relatives(0, 0, db, None)
-        self.assertEqual({1, 2, 3}, relatives)
-
-    def test_get_relatives_should_make_set_of_relatives(self):
-        db = test_utils.get_fake_db()
-        db['imports'].insert_one({'import_id': 0, 'citizens': [{'citizen_id': 0, 'relatives': [1, 1, 2, 2, 3, 3]}]})
-        relatives = update_relatives._get_relatives(0, 0, db, None)
-        self.assertEqual({1, 2, 3}, relatives)
-
-    def test_get_relatives_should_raise_exception_when_import_not_found(self):
-        db = test_utils.get_fake_db()
-        with self.assertRaises(PyMongoError):
-            update_relatives._get_relatives(0, 0, db, None)
-
-    def test_get_relatives_should_raise_exception_when_citizen_not_found(self):
-        db = test_utils.get_fake_db()
-        db['imports'].insert_one({'import_id': 0, 'citizens': []})
-        with self.assertRaises(PyMongoError):
-            update_relatives._get_relatives(0, 0, db, None)
+        self.assertEqual({'import_id': 0, 'citizen_id': {'$in': [1]}}, request._filter)
+        self.assertEqual({'$push': {'relatives': 0}}, request._doc)
 
     @parameterized.expand([
         [{1, 2, 3}, {'relatives': [2, 3]}, set(), {1}],
@@ -77,7 +53,7 @@ class UpdateRelativesTests(unittest.TestCase):
 
     def test_check_citizens_exists_should_not_raise_when_citizen_exists(self):
         db = test_utils.get_fake_db()
-        db['imports'].insert_one({'import_id': 0, 'citizens': [{'citizen_id': 0}]})
+        db['citizens'].insert_one({'import_id': 0, 'citizen_id': 0})
         update_relatives._check_all_citizens_exist({0}, 0, db, None)
         self.assertTrue(True)
 
@@ -88,12 +64,87 @@ class UpdateRelativesTests(unittest.TestCase):
 
     def test_check_citizens_exists_should_raise_when_at_least_one_citizen_dont_exists(self):
         db = test_utils.get_fake_db()
-        db['imports'].insert_one({'import_id': 0, 'citizens': [{'citizen_id': 0}]})
+        db['citizens'].insert_one({'import_id': 0, 'citizen_id': 0})
         with self.assertRaises(PyMongoError):
             update_relatives._check_all_citizens_exist({0, 1}, 0, db, None)
 
     def test_write_relatives_update_should_do_nothing_if_requests_empty(self):
         db = test_utils.get_fake_db()
-        update_relatives._write_relatives_update([], db, None)
-        db_response = db['imports'].find({})
+        update_relatives._write_relatives_update([], 0, db, None)
+        db_response = db['citizens'].find({})
         self.assertEqual(0, db_response.count())
+
+    def test_write_relatives_update_should_update_each_relative_document(self):
+        db = test_utils.get_fake_db()
+        db['citizens'].insert_many([{'import_id': 0, 'citizen_id': 1, 'relatives': []},
+                                    {'import_id': 0, 'citizen_id': 2, 'relatives': [0]}])
+        db_requests = update_relatives._make_db_requests({1}, {2}, 0, 0)
+        update_relatives._write_relatives_update(db_requests, 2, db, None)
+        self.assertEqual([0], db['citizens'].find_one({'citizen_id': 1})['relatives'])
+        self.assertEqual([], db['citizens'].find_one({'citizen_id': 2})['relatives'])
+
+    def test_write_relatives_update_should_raise_when_not_all_relatives_modified(self):
+        db = test_utils.get_fake_db()
+        db['citizens'].insert_one({'import_id': 0, 'citizen_id': 1, 'relatives': []})
+        db_requests = update_relatives._make_db_requests({1, 2}, set(), 0, 0)
+        with self.assertRaises(PyMongoError):
+            update_relatives._write_relatives_update(db_requests, 2, db, None)
+
+    def test_update_relatives_should_return_empty_difference_when_no_relatives_in_patch(self):
+        db = test_utils.get_fake_db()
+        self.assertEqual((set(), set()),
+                         update_relatives.update_relatives(0, 0, {'relatives': [1]}, {'name': 'a'}, db, None))
+
+    def test_update_relatives_should_return_pushed_and_pulled_relatives(self):
+        db = test_utils.get_fake_db()
+        db['citizens'].insert_many([{'import_id': 0, 'citizen_id': 0, 'relatives': [1]},
+                                    {'import_id': 0, 'citizen_id': 1, 'relatives': [0]},
+                                    {'import_id': 0, 'citizen_id': 2, 'relatives': []}])
+        to_push, to_pull = update_relatives.update_relatives(0, 0, {'relatives': [1]}, {'relatives': [2]}, db, None)
+        self.assertEqual(({2}, {1}), (to_push, to_pull))
+        self.assertEqual([], db['citizens'].find_one({'citizen_id': 1})['relatives'])
+        self.assertEqual([0], db['citizens'].find_one({'citizen_id': 2})['relatives'])
+
+    def test_update_relatives_should_raise_when_pushed_relative_not_found(self):
+        db = test_utils.get_fake_db()
+        db['citizens'].insert_many([{'import_id': 0, 'citizen_id': 0, 'relatives': []},
+                                    {'import_id': 0, 'citizen_id': 1, 'relatives': []}])
+        with self.assertRaises(PyMongoError):
+            update_relatives.update_relatives(0, 0, {'relatives': []}, {'relatives': [1, 2]}, db, None)
+
+    def test_update_relatives_should_make_one_request(self):
+        db = mock.MagicMock()
+        db['citizens'].bulk_write.return_value.modified_count = 2
+        update_relatives.update_relatives(0, 0, {'relatives': [1]}, {'relatives': [2]}, db, None)
+        self.assertEqual(['bulk_write'], [call[0] for call in db['citizens'].method_calls])
+
+    def test_get_batch_relatives_changes_should_apply_patches_in_order(self):
+        relatives = {0: [1], 2: []}
+        changes, pushed_ids = update_relatives._get_batch_relatives_changes(
+            relatives, [{'citizen_id': 0, 'relatives': [2, 3]}, {'citizen_id': 2, 'relatives': [3]}])
+        self.assertEqual({0: [3], 2: [3]}, relatives)
+        self.assertEqual({(1, 0): -1, (3, 0): 1, (3, 2): 1}, changes)
+        self.assertEqual({3}, pushed_ids)
+
+    def test_get_batch_relatives_changes_should_cancel_push_and_pull_of_same_relative(self):
+        relatives = {0: [], 1: []}
+        changes, pushed_ids = update_relatives._get_batch_relatives_changes(
+            relatives, [{'citizen_id': 0, 'relatives': [2]}, {'citizen_id': 1, 'name': 'a'},
+                        {'citizen_id': 0, 'relatives': []}])
+        self.assertEqual({0: [], 1: []}, relatives)
+        self.assertEqual({}, changes)
+        self.assertEqual({2}, pushed_ids)
+
+    def test_make_batch_db_requests_should_group_changes_by_relative(self):
+        db_requests = update_relatives._make_batch_db_requests({(1, 0): -1, (3, 0): 1, (4, 0): 1, (3, 2): 1}, 0)
+        self.assertEqual([({'import_id': 0, 'citizen_id': {'$in': [3, 4]}}, {'$push': {'relatives': 0}}),
+                          ({'import_id': 0, 'citizen_id': {'$in': [1]}}, {'$pull': {'relatives': 0}}),
+                          ({'import_id': 0, 'citizen_id': {'$in': [3]}}, {'$push': {'relatives': 2}})],
+                         [(request._filter, request._doc) for request in db_requests])
+
+    def test_prepare_relatives_update_batch_should_raise_when_pushed_citizen_not_found(self):
+        db = test_utils.get_fake_db()
+        db['citizens'].insert_one({'import_id': 0, 'citizen_id': 0, 'relatives': []})
+        with self.assertRaises(PyMongoError):
+            update_relatives.prepare_relatives_update_batch({0: []}, [{'citizen_id': 0, 'relatives': [1]}], 0, db,
+                                                            None)
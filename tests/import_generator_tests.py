@@ -0,0 +1,63 @@
+import io
+import json
+import unittest
+from collections import Counter
+from datetime import datetime
+
+from parameterized import parameterized
+
+from application.data_validator import DataValidator
+from benchmarks.import_generator import ImportGenerator
+
+
+class ImportGeneratorTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.validator = DataValidator()
+
+    @staticmethod
+    def generate(generator: ImportGenerator, citizens_count: int) -> dict:
+        stream = io.BytesIO()
+        generator.write(stream, citizens_count)
+        return json.loads(stream.getvalue().decode('utf-8'))
+
+    @parameterized.expand([
+        [{}],
+        [{'birth_dates': 'normal', 'degrees': 'fixed', 'relatives_mean': 3}],
+        [{'degrees': 'powerlaw', 'block_size': 7, 'towns_count': 30, 'town_skew': 0}],
+        [{'relatives_mean': 0}]
+    ])
+    def test_should_generate_valid_import(self, params: dict):
+        import_data = self.generate(ImportGenerator(**params), 500)
+        self.validator.validate_import(import_data)
+        self.assertEqual(list(range(500)), [citizen['citizen_id'] for citizen in import_data['citizens']])
+        for citizen in import_data['citizens']:
+            self.assertLessEqual(datetime.strptime(citizen['birth_date'], '%d.%m.%Y'), datetime(2020, 1, 1))
+
+    def test_should_generate_same_import_for_same_seed(self):
+        self.assertEqual(self.generate(ImportGenerator(seed=1), 300), self.generate(ImportGenerator(seed=1), 300))
+        self.assertNotEqual(self.generate(ImportGenerator(seed=1), 300), self.generate(ImportGenerator(seed=2), 300))
+
+    def test_should_choose_relatives_within_block(self):
+        for citizen in ImportGenerator(block_size=10, relatives_mean=4).iter_citizens(100):
+            for relative_id in citizen['relatives']:
+                self.assertEqual(citizen['citizen_id'] // 10, relative_id // 10)
+
+    def test_should_keep_mean_relatives_count(self):
+        citizens = list(ImportGenerator(relatives_mean=3).iter_citizens(5000))
+        mean = sum(len(citizen['relatives']) for citizen in citizens) / len(citizens)
+        self.assertAlmostEqual(3, mean, delta=0.3)
+
+    def test_should_skew_towns(self):
+        uniform = Counter(citizen['town'] for citizen in ImportGenerator(town_skew=0).iter_citizens(5000))
+        skewed = Counter(citizen['town'] for citizen in ImportGenerator(town_skew=2).iter_citizens(5000))
+        self.assertLess(max(uniform.values()), 1000)
+        self.assertGreater(skewed['Москва'], 3000)
+
+    def test_should_raise_when_distribution_unknown(self):
+        with self.assertRaises(ValueError):
+            ImportGenerator(degrees='normal')
+
+
+if __name__ == '__main__':
+    unittest.main()
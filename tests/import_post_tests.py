@@ -1,5 +1,8 @@
+import tempfile
+import threading
 import unittest
 from datetime import datetime
+from unittest import mock
 from unittest.mock import MagicMock
 
 from bson import json_util
@@ -9,9 +12,11 @@ import tests.test_utils as test_utils
 
 
 class ImportPostTests(unittest.TestCase):
+    async_mode = False
+
     @classmethod
     def setUp(cls):
-        cls.app, cls.db, cls.validator = test_utils.set_up_service()
+        cls.app, cls.db, cls.validator = test_utils.set_up_service(cls.async_mode)
 
     def test_successful_import_post_should_return_import_id(self):
         headers = [('Content-Type', 'application/json')]
@@ -26,7 +31,7 @@ class ImportPostTests(unittest.TestCase):
             citizen['birth_date'] = datetime.strptime(citizen['birth_date'], '%d.%m.%Y')
         self.assertEqual(import_id, response_data['data']['import_id'])
         self.assertEqual(http_response.status_code, 201)
-        self.assertEqual(import_data, self.db['imports'].find_one({'import_id': import_id}, {'_id': 0}))
+        self.assertEqual(import_data, test_utils.find_import(self.db, import_id))
 
     def test_import_id_should_increase_for_each_import(self):
         headers = [('Content-Type', 'application/json')]
@@ -41,7 +46,7 @@ class ImportPostTests(unittest.TestCase):
                 citizen['birth_date'] = datetime.strptime(citizen['birth_date'], '%d.%m.%Y')
             self.assertEqual(import_id, response_data['data']['import_id'])
             self.assertEqual(http_response.status_code, 201)
-            self.assertEqual(import_data, self.db['imports'].find_one({'import_id': import_id}, {'_id': 0}))
+            self.assertEqual(import_data, test_utils.find_import(self.db, import_id))
 
     def test_when_no_content_type_should_return_bad_request(self):
         http_response = self.app.post('/imports', data=json_util.dumps({'test': 1}))
@@ -52,15 +57,37 @@ class ImportPostTests(unittest.TestCase):
 
     def test_when_database_error_should_return_bad_request(self):
         headers = [('Content-Type', 'application/json')]
-        import_data = {'_id': '5a8f1e368f7936badfbb0cfa', 'citizens': []}
+        import_data = {'citizens': [{'citizen_id': 0, 'town': 'A', 'birth_date': '01.01.2019'},
+                                    {'citizen_id': 0, 'town': 'A', 'birth_date': '01.01.2019'}]}
+        self.db['citizens'].create_index([('import_id', 1), ('citizen_id', 1)], unique=True)
 
-        self.app.post('/imports', data=json_util.dumps(import_data), headers=headers)
         http_response = self.app.post('/imports', data=json_util.dumps(import_data), headers=headers)
 
         http_data = http_response.get_data(as_text=True)
         self.assertIn('Database error: ', http_data)
         self.assertEqual(400, http_response.status_code)
 
+    def test_when_database_error_should_not_leave_citizens(self):
+        headers = [('Content-Type', 'application/json')]
+        import_data = {'citizens': [{'citizen_id': 0, 'town': 'A', 'birth_date': '01.01.2019'},
+                                    {'citizen_id': 0, 'town': 'A', 'birth_date': '01.01.2019'}]}
+        self.db['citizens'].create_index([('import_id', 1), ('citizen_id', 1)], unique=True)
+
+        self.app.post('/imports', data=json_util.dumps(import_data), headers=headers)
+
+        self.assertEqual(0, self.db['citizens'].count_documents({}))
+        self.assertEqual(0, self.db['imports'].count_documents({'import_id': 0}))
+        self.assertEqual(400, self.app.get('/imports/0/citizens').status_code)
+
+    def test_when_extra_top_level_field_should_return_bad_request(self):
+        headers = [('Content-Type', 'application/json')]
+
+        http_response = self.app.post('/imports', data=json_util.dumps({'test': 1, 'citizens': []}), headers=headers)
+
+        response_data = http_response.get_data(as_text=True)
+        self.assertIn('Input data is not valid', response_data)
+        self.assertEqual(400, http_response.status_code)
+
     def test_when_incorrect_json_should_return_bad_request(self):
         headers = [('Content-Type', 'application/json')]
 
@@ -73,8 +100,8 @@ class ImportPostTests(unittest.TestCase):
     def test_when_invalid_import_should_return_bad_request(self):
         headers = [('Content-Type', 'application/json')]
         mock_validation = MagicMock(side_effect=ValidationError('message'))
-        with unittest.mock.patch.object(self.validator, 'validate_import', mock_validation):
-            http_response = self.app.post('/imports', data=json_util.dumps({'test': 1}), headers=headers)
+        with unittest.mock.patch.object(self.validator, 'validate_import_stream', mock_validation):
+            http_response = self.app.post('/imports', data=json_util.dumps({'citizens': []}), headers=headers)
 
             response_data = http_response.get_data(as_text=True)
             self.assertIn('Input data is not valid', response_data)
@@ -92,5 +119,28 @@ class ImportPostTests(unittest.TestCase):
         self.assertEqual(400, http_response.status_code)
 
 
+class ImportPostAsyncTests(ImportPostTests):
+    async_mode = True
+
+    def test_should_spool_large_body_to_disk_outside_event_loop(self):
+        import_data = test_utils.read_data('import.json')
+        rollover = tempfile.SpooledTemporaryFile.rollover
+        rollover_threads = []
+
+        def record_rollover(body):
+            rollover_threads.append(threading.current_thread())
+            rollover(body)
+
+        with mock.patch('application.aio.service.SPOOL_MAX_SIZE', 16), \
+                mock.patch.object(tempfile.SpooledTemporaryFile, 'rollover', record_rollover):
+            http_response = self.app.post('/imports', data=json_util.dumps(import_data),
+                                          headers=[('Content-Type', 'application/json')])
+
+        self.assertEqual(201, http_response.status_code)
+        self.assertEqual(len(import_data['citizens']), self.db['citizens'].count_documents({'import_id': 0}))
+        self.assertNotIn(threading.current_thread(), rollover_threads)
+        self.assertTrue(rollover_threads)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -19,6 +19,11 @@ class ImportValidatorTests(unittest.TestCase):
         print(str(context.exception))
         self.assertIn(expected_exception_message, str(context.exception))
 
+    @staticmethod
+    def make_citizen(citizen_id: int, relatives: list) -> dict:
+        return {'citizen_id': citizen_id, 'town': 'A', 'street': 'A', 'building': 'A', 'apartment': 0, 'name': 'A',
+                'birth_date': '01.01.2019', 'gender': 'male', 'relatives': relatives}
+
     def test_correct_import_should_be_valid(self):
         import_data = test_utils.read_data('import.json')
         self.data_validator.validate_import(import_data)
@@ -91,9 +96,8 @@ class ImportValidatorTests(unittest.TestCase):
     def test_import_should_be_incorrect_when_containing_extra_fields(self, import_data: dict):
         self.assert_exception(import_data, '')
 
-    @unittest.mock.patch('jsonschema.validate')
-    def test_import_should_be_incorrect_when_citizen_ids_not_unique(self, _):
-        import_data = {'citizens': [{'citizen_id': 1}, {'citizen_id': 1}]}
+    def test_import_should_be_incorrect_when_citizen_ids_not_unique(self):
+        import_data = {'citizens': [self.make_citizen(1, []), self.make_citizen(1, [])]}
         self.assert_exception(import_data, 'Citizens ids are not unique')
 
     def test_import_should_be_incorrect_when_relatives_not_duplex(self):
@@ -105,23 +109,20 @@ class ImportValidatorTests(unittest.TestCase):
         ]}
         self.assert_exception(import_data, 'Citizen relatives are not duplex')
 
-    @unittest.mock.patch('jsonschema.validate')
-    def test_import_should_be_incorrect_when_citizen_is_relative_to_himself(self, _):
-        import_data = {'citizens': [{'citizen_id': 1, 'relatives': [1]}]}
+    def test_import_should_be_incorrect_when_citizen_is_relative_to_himself(self):
+        import_data = {'citizens': [self.make_citizen(1, [1])]}
         self.assert_exception(import_data, 'Citizen can not be relative to himself')
 
-    @unittest.mock.patch('jsonschema.validate')
-    def test_import_should_be_incorrect_when_citizen_relative_not_exists(self, _):
-        import_data = {'citizens': [{'citizen_id': 1, 'relatives': [2]}]}
+    def test_import_should_be_incorrect_when_citizen_relative_not_exists(self):
+        import_data = {'citizens': [self.make_citizen(1, [2])]}
         self.assert_exception(import_data, 'Citizen relative does not exists')
 
     def test_import_should_be_correct_when_no_citizens(self):
         import_data = {'citizens': []}
         self.data_validator.validate_import(import_data)
 
-    @unittest.mock.patch('jsonschema.validate')
-    def test_import_should_be_incorrect_when_relatives_not_unique(self, _):
-        import_data = {'citizens': [{'citizen_id': 0, 'relatives': [1, 1]}]}
+    def test_import_should_be_incorrect_when_relatives_not_unique(self):
+        import_data = {'citizens': [self.make_citizen(0, [1, 1])]}
         self.assert_exception(import_data, 'Relatives ids should be unique')
 
     def test_import_should_be_incorrect_when_gender_not_male_or_female(self):
@@ -152,6 +153,66 @@ class ImportValidatorTests(unittest.TestCase):
     def test_import_should_be_incorrect_empty_string(self, import_data: dict):
         self.assert_exception(import_data, 'is too short')
 
+    def assert_stream_exception(self, citizens: list, expected_exception_message: str):
+        with self.assertRaises(ValidationError) as context:
+            list(self.data_validator.validate_import_stream(iter(citizens)))
+        self.assertIn(expected_exception_message, str(context.exception))
+
+    def test_correct_import_stream_should_be_valid(self):
+        citizens = test_utils.read_data('import.json')['citizens']
+        self.assertEqual(citizens, list(self.data_validator.validate_import_stream(iter(citizens))))
+
+    def test_import_stream_should_be_incorrect_when_missing_field(self):
+        citizen = self.make_citizen(0, [])
+        del citizen['relatives']
+        self.assert_stream_exception([citizen], '\'relatives\' is a required property')
+
+    @parameterized.expand([
+        [[(1, []), (1, [])], 'Citizens ids are not unique'],
+        [[(0, [1, 1])], 'Relatives ids should be unique'],
+        [[(1, [1])], 'Citizen can not be relative to himself'],
+        [[(1, [2])], 'Citizen relative does not exists'],
+        [[(1, [2]), (2, [])], 'Citizen relatives are not duplex'],
+        [[(1, []), (2, [1])], 'Citizen relatives are not duplex'],
+    ])
+    def test_import_stream_should_be_incorrect(self, citizens: list, expected_exception_message: str):
+        citizens = [self.make_citizen(citizen_id, relatives) for citizen_id, relatives in citizens]
+        self.assert_stream_exception(citizens, expected_exception_message)
+
+    def test_import_stream_should_be_correct_when_relatives_duplex(self):
+        citizens = [self.make_citizen(1, [2, 3]), self.make_citizen(2, [1]), self.make_citizen(3, [1])]
+        self.assertEqual(citizens, list(self.data_validator.validate_import_stream(iter(citizens))))
+
+    @parameterized.expand([
+        [[(1, [2, 2]), (2, [1])], 'Relatives ids should be unique'],
+        [[(1, [1, 2]), (2, [1])], 'Citizen can not be relative to himself'],
+    ])
+    def test_import_stream_should_raise_relatives_error_before_reading_rest_of_citizens(
+            self, citizens: list, expected_exception_message: str):
+        read = []
+
+        def read_citizens():
+            for citizen_id, relatives in citizens:
+                read.append(citizen_id)
+                yield self.make_citizen(citizen_id, relatives)
+
+        with self.assertRaises(ValidationError) as context:
+            list(self.data_validator.validate_import_stream(read_citizens()))
+        self.assertEqual(expected_exception_message, context.exception.message)
+        self.assertEqual([1], read)
+
+    def test_import_stream_should_raise_before_reading_rest_of_citizens(self):
+        read = []
+
+        def citizens():
+            for citizen_id in range(3):
+                read.append(citizen_id)
+                yield self.make_citizen(0, [])
+
+        with self.assertRaises(ValidationError):
+            list(self.data_validator.validate_import_stream(citizens()))
+        self.assertEqual([0, 1], read)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+from datetime import datetime, timedelta
+
+from application.memory_cache import MemoryCache
+
+
+class MemoryCacheTests(unittest.TestCase):
+    def test_get_should_return_entry_for_same_version(self):
+        cache = MemoryCache()
+        cache.put('key', 1, b'body')
+        entry = cache.get('key', 1)
+        self.assertEqual(b'body', entry.body)
+        self.assertIsNone(entry.expires)
+
+    def test_get_should_return_None_when_no_entry(self):
+        self.assertIsNone(MemoryCache().get('key', 0))
+
+    def test_get_should_remove_entry_of_other_version(self):
+        cache = MemoryCache()
+        cache.put('key', 1, b'body')
+        self.assertIsNone(cache.get('key', 2))
+        self.assertEqual(0, len(cache))
+        self.assertEqual(0, cache.size)
+
+    def test_get_should_remove_expired_entry(self):
+        cache = MemoryCache()
+        cache.put('key', 1, b'body', datetime.utcnow() - timedelta(seconds=1))
+        self.assertIsNone(cache.get('key', 1))
+        self.assertEqual(0, len(cache))
+
+    def test_put_should_replace_entry_with_same_key(self):
+        cache = MemoryCache()
+        cache.put('key', 1, b'body')
+        cache.put('key', 2, b'new body')
+        self.assertEqual(b'new body', cache.get('key', 2).body)
+        self.assertEqual(1, len(cache))
+        self.assertEqual(len(b'new body'), cache.size)
+
+    def test_put_should_evict_least_recently_used_when_entries_limit_exceeded(self):
+        cache = MemoryCache(max_entries=2)
+        cache.put('a', 0, b'a')
+        cache.put('b', 0, b'b')
+        cache.get('a', 0)
+        cache.put('c', 0, b'c')
+        self.assertIsNotNone(cache.get('a', 0))
+        self.assertIsNone(cache.get('b', 0))
+        self.assertIsNotNone(cache.get('c', 0))
+
+    def test_put_should_evict_when_bytes_limit_exceeded(self):
+        cache = MemoryCache(max_bytes=10)
+        cache.put('a', 0, b'12345')
+        cache.put('b', 0, b'12345')
+        cache.put('c', 0, b'1')
+        self.assertIsNone(cache.get('a', 0))
+        self.assertEqual(6, cache.size)
+
+    def test_put_should_not_store_body_larger_than_limit(self):
+        cache = MemoryCache(max_bytes=4)
+        cache.put('a', 0, b'123')
+        cache.put('b', 0, b'12345')
+        self.assertIsNone(cache.get('b', 0))
+        self.assertIsNotNone(cache.get('a', 0))
+
+    def test_clear_should_remove_all_entries(self):
+        cache = MemoryCache()
+        cache.put('a', 0, b'a')
+        cache.clear()
+        self.assertEqual(0, len(cache))
+        self.assertEqual(0, cache.size)
+
+
+if __name__ == '__main__':
+    unittest.main()
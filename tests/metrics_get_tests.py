@@ -0,0 +1,79 @@
+import unittest
+from datetime import datetime
+
+from application import metrics
+from tests import test_utils
+
+
+class MetricsGetTests(unittest.TestCase):
+    async_mode = False
+    citizens_route = '/imports/<int:import_id>/citizens'
+    birthdays_route = '/imports/<int:import_id>/citizens/birthdays'
+
+    @classmethod
+    def setUp(cls):
+        cls.app, cls.db, cls.validator = test_utils.set_up_service(cls.async_mode)
+        import_data = test_utils.read_data('import.json')
+        for citizen in import_data['citizens']:
+            citizen['birth_date'] = datetime.strptime(citizen['birth_date'], '%d.%m.%Y')
+        import_data['import_id'] = 0
+        test_utils.insert_import(cls.db, import_data)
+
+    def test_should_return_metrics_in_prometheus_format(self):
+        http_response = self.app.get('/metrics')
+        self.assertEqual(200, http_response.status_code)
+        self.assertEqual(metrics.CONTENT_TYPE, http_response.headers['Content-Type'])
+        response_data = http_response.get_data(as_text=True)
+        for name in ('http_requests_total', 'http_request_duration_seconds', 'http_response_size_bytes',
+                     'cache_requests_total', 'lock_wait_seconds', 'mongo_command_duration_seconds'):
+            self.assertIn(f'# TYPE {name} ', response_data)
+
+    def test_should_count_requests_by_route(self):
+        ok_count = metrics.REQUESTS.get(route=self.citizens_route, method='GET', status=201)
+        bad_count = metrics.REQUESTS.get(route=self.citizens_route, method='GET', status=400)
+        sizes_count = metrics.RESPONSE_SIZE.get_count(route=self.citizens_route, method='GET')
+        self.app.get('/imports/0/citizens').get_data()
+        self.app.get('/imports/1/citizens').get_data()
+        self.assertEqual(ok_count + 1, metrics.REQUESTS.get(route=self.citizens_route, method='GET', status=201))
+        self.assertEqual(bad_count + 1, metrics.REQUESTS.get(route=self.citizens_route, method='GET', status=400))
+        self.assertEqual(sizes_count + 2, metrics.RESPONSE_SIZE.get_count(route=self.citizens_route, method='GET'))
+        self.assertIn(f'http_requests_total{{route="{self.citizens_route}",method="GET",status="201"}}',
+                      self.app.get('/metrics').get_data(as_text=True))
+
+    def test_should_count_streamed_response_size(self):
+        http_response = self.app.get('/imports/0/citizens')
+        size = len(http_response.get_data())
+        self.assertIn(f'http_response_size_bytes_bucket{{route="{self.citizens_route}",method="GET",le="1000"}}',
+                      self.app.get('/metrics').get_data(as_text=True))
+        self.assertGreater(size, 100)
+
+    def test_should_count_cache_results(self):
+        hits = {result: metrics.CACHE_REQUESTS.get(cache='birthdays', result=result)
+                for result in ('memory_hit', 'hit', 'miss')}
+        self.app.get('/imports/0/citizens/birthdays')
+        self.app.get('/imports/0/citizens/birthdays')
+        self.assertEqual(hits['miss'] + 1, metrics.CACHE_REQUESTS.get(cache='birthdays', result='miss'))
+        self.assertEqual(hits['memory_hit'] + hits['hit'] + 1,
+                         metrics.CACHE_REQUESTS.get(cache='birthdays', result='memory_hit') +
+                         metrics.CACHE_REQUESTS.get(cache='birthdays', result='hit'))
+        self.assertLess(0, metrics.REQUESTS.get(route=self.birthdays_route, method='GET', status=201))
+
+    def test_should_record_lock_wait(self):
+        count = metrics.LOCK_WAIT.get_count(lock='birthdays_0', mode='lock')
+        self.app.get('/imports/0/citizens/birthdays')
+        self.assertEqual(count + 1, metrics.LOCK_WAIT.get_count(lock='birthdays_0', mode='lock'))
+
+    def test_should_count_unmatched_requests(self):
+        count = metrics.REQUESTS.get(route='unmatched', method='GET', status=404)
+        self.app.get('/unknown').get_data()
+        self.assertEqual(count + 1, metrics.REQUESTS.get(route='unmatched', method='GET', status=404))
+
+
+class MetricsGetAsyncTests(MetricsGetTests):
+    async_mode = True
+    citizens_route = '/imports/{import_id:int}/citizens'
+    birthdays_route = '/imports/{import_id:int}/citizens/birthdays'
+
+
+if __name__ == '__main__':
+    unittest.main()
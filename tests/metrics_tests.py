@@ -0,0 +1,77 @@
+import unittest
+from types import SimpleNamespace
+
+from application import metrics
+
+
+class MetricsTests(unittest.TestCase):
+    def test_counter_should_render_values_by_labels(self):
+        counter = metrics.Counter('requests_total', 'Requests.', ['route', 'status'])
+        counter.inc(route='/a', status=200)
+        counter.inc(2, route='/a', status=200)
+        counter.inc(route='/b"\n', status=400)
+        self.assertEqual('# HELP requests_total Requests.\n'
+                         '# TYPE requests_total counter\n'
+                         'requests_total{route="/a",status="200"} 3\n'
+                         'requests_total{route="/b\\"\\n",status="400"} 1', counter.render())
+        self.assertEqual(3, counter.get(route='/a', status=200))
+
+    def test_histogram_should_render_cumulative_buckets(self):
+        histogram = metrics.Histogram('duration_seconds', 'Duration.', ['route'], buckets=[0.1, 1])
+        for value in (0.05, 0.1, 0.5, 2):
+            histogram.observe(value, route='/a')
+        self.assertEqual('# HELP duration_seconds Duration.\n'
+                         '# TYPE duration_seconds histogram\n'
+                         'duration_seconds_bucket{route="/a",le="0.1"} 2\n'
+                         'duration_seconds_bucket{route="/a",le="1"} 3\n'
+                         'duration_seconds_bucket{route="/a",le="+Inf"} 4\n'
+                         'duration_seconds_sum{route="/a"} 2.65\n'
+                         'duration_seconds_count{route="/a"} 4', histogram.render())
+        self.assertEqual(4, histogram.get_count(route='/a'))
+        self.assertEqual(0, histogram.get_count(route='/b'))
+
+    def test_should_raise_when_labels_incorrect(self):
+        counter = metrics.Counter('requests_total', 'Requests.', ['route'])
+        with self.assertRaises(ValueError):
+            counter.inc(status=200)
+        with self.assertRaises(ValueError):
+            counter.inc(route='/a', status=200)
+
+    def test_registry_should_render_all_metrics(self):
+        registry = metrics.Registry()
+        registry.register(metrics.Counter('first_total', 'First.')).inc()
+        registry.register(metrics.Counter('second_total', 'Second.'))
+        self.assertEqual(b'# HELP first_total First.\n# TYPE first_total counter\nfirst_total 1\n'
+                         b'# HELP second_total Second.\n# TYPE second_total counter\n', registry.render())
+
+    def test_count_bytes_should_report_size_and_close_chunks(self):
+        closed, sizes = [], []
+
+        def chunks():
+            try:
+                yield b'abc'
+                yield b'de'
+            finally:
+                closed.append(True)
+
+        self.assertEqual([b'abc', b'de'], list(metrics.count_bytes(chunks(), sizes.append)))
+        self.assertEqual([5], sizes)
+
+        counted = metrics.count_bytes(chunks(), sizes.append)
+        next(counted)
+        counted.close()
+        self.assertEqual([True, True], closed)
+        self.assertEqual([5, 3], sizes)
+
+    def test_mongo_command_listener_should_observe_duration(self):
+        listener = metrics.MongoCommandListener()
+        succeeded = metrics.MONGO_COMMAND_DURATION.get_count(command='find', outcome='succeeded')
+        failed = metrics.MONGO_COMMAND_DURATION.get_count(command='find', outcome='failed')
+        listener.succeeded(SimpleNamespace(command_name='find', duration_micros=1500))
+        listener.failed(SimpleNamespace(command_name='find', duration_micros=2500))
+        self.assertEqual(succeeded + 1, metrics.MONGO_COMMAND_DURATION.get_count(command='find', outcome='succeeded'))
+        self.assertEqual(failed + 1, metrics.MONGO_COMMAND_DURATION.get_count(command='find', outcome='failed'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+
+from parameterized import parameterized
+
+from benchmarks import micro_benchmark
+
+SIZES = [1000, 2000, 4000, 8000, 16000]
+
+
+class MicroBenchmarkTests(unittest.TestCase):
+    @parameterized.expand([
+        ['O(1)', lambda n: 0.001, 0],
+        ['O(n)', lambda n: n * 1e-6, 1],
+        ['O(n^2)', lambda n: n ** 2 * 1e-9, 2]
+    ])
+    def test_fit_complexity_should_find_curve_and_exponent(self, expected_complexity: str, get_time, expected_exponent):
+        exponent, complexity = micro_benchmark.fit_complexity(SIZES, [get_time(size) for size in SIZES])
+        self.assertEqual(expected_complexity, complexity)
+        self.assertAlmostEqual(expected_exponent, exponent, places=2)
+
+    def test_find_regressions_should_compare_largest_common_size(self):
+        baseline = {'a': {'sizes': [1, 2], 'times': [1, 2], 'exponent': 1.0, 'complexity': 'O(n)'}}
+        results = {'a': {'sizes': [2, 4], 'times': [2.5, 100], 'exponent': 1.0, 'complexity': 'O(n)'},
+                   'b': {'sizes': [2], 'times': [1], 'exponent': 1.0, 'complexity': 'O(n)'}}
+        self.assertEqual(['a: 1.25x slower than baseline at size 2'],
+                         micro_benchmark.find_regressions(results, baseline, 0.2, 0.3))
+        self.assertEqual([], micro_benchmark.find_regressions(results, baseline, 0.3, 0.3))
+
+    def test_find_regressions_should_flag_faster_growth(self):
+        baseline = {'a': {'sizes': [1], 'times': [1], 'exponent': 1.0, 'complexity': 'O(n)'}}
+        results = {'a': {'sizes': [1], 'times': [1], 'exponent': 2.0, 'complexity': 'O(n^2)'}}
+        self.assertEqual(['a: growth exponent changed from 1.00 (O(n)) to 2.00 (O(n^2))'],
+                         micro_benchmark.find_regressions(results, baseline, 0.2, 0.3))
+
+    def test_cases_should_run_on_small_input(self):
+        results = micro_benchmark.run(list(micro_benchmark.CASES), [10, 20], 1)
+        self.assertEqual(set(micro_benchmark.CASES), set(results))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,19 +1,21 @@
 import unittest
 from datetime import datetime
-from unittest import mock
 
+from application import response_body
 from tests import test_utils
 
 
 class PercentileAgeGetTests(unittest.TestCase):
+    async_mode = False
+
     @classmethod
     def setUp(cls):
-        cls.app, cls.db, cls.validator = test_utils.set_up_service()
-        import_data = test_utils.read_data('import.json')
-        import_data['import_id'] = 0
-        for citizen in import_data['citizens']:
+        cls.app, cls.db, cls.validator = test_utils.set_up_service(cls.async_mode)
+        cls.import_data = test_utils.read_data('import.json')
+        cls.import_data['import_id'] = 0
+        for citizen in cls.import_data['citizens']:
             citizen['birth_date'] = datetime.strptime(citizen['birth_date'], '%d.%m.%Y')
-        cls.db['imports'].insert_one(import_data)
+        test_utils.insert_import(cls.db, cls.import_data)
 
     def test_should_return_percentile_age_data(self):
         http_response = self.app.get('/imports/0/towns/stat/percentile/age')
@@ -24,6 +26,17 @@ class PercentileAgeGetTests(unittest.TestCase):
         self.assertEqual(201, http_response.status_code)
         self.assertEqual(expected_result, percentile_age_data['data'])
 
+    def test_should_return_same_percentile_age_data_from_histograms(self):
+        expected_result = self.app.get('/imports/0/towns/stat/percentile/age').get_json()
+        self.db['percentile_age'].delete_one({'import_id': 0})
+        test_utils.insert_age_histograms(self.db, self.import_data)
+        self.db['citizens'].delete_many({'import_id': 0})
+
+        http_response = self.app.get('/imports/0/towns/stat/percentile/age')
+
+        self.assertEqual(201, http_response.status_code)
+        self.assertEqual(expected_result, http_response.get_json())
+
     def test_should_return_cached_percentile_age_data_when_present(self):
         expected_result = []
         self.db['percentile_age'].insert_one({'import_id': 0, 'data': expected_result})
@@ -33,21 +46,82 @@ class PercentileAgeGetTests(unittest.TestCase):
         self.assertEqual(expected_result, birthday_data['data'])
 
     def test_should_cache_percentile_age_data(self):
-        with mock.patch('application.decorators.response_cacher._cache_data') as cache_percentile_age_mock:
+        with test_utils.patch_cache_data(self.async_mode) as cache_percentile_age_mock:
             http_response = self.app.get('/imports/0/towns/stat/percentile/age')
             self.assertEqual(201, http_response.status_code)
             cache_percentile_age_mock.assert_called()
 
     def test_should_not_cache_when_birthday_data_in_cache(self):
-        with mock.patch('application.decorators.response_cacher._cache_data') as cache_percentile_age_mock:
+        with test_utils.patch_cache_data(self.async_mode) as cache_percentile_age_mock:
             self.db['percentile_age'].insert_one({'import_id': 0})
             http_response = self.app.get('/imports/0/towns/stat/percentile/age')
             self.assertEqual(201, http_response.status_code)
             cache_percentile_age_mock.assert_not_called()
 
+    def test_should_return_percentile_age_data_as_of_date(self):
+        http_response = self.app.get('/imports/0/towns/stat/percentile/age?as_of=01.10.2019')
+        expected_result = [{'town': 'Москва', 'p50': 19, 'p75': 19, 'p99': 19},
+                           {'town': 'Челябинск', 'p50': 35, 'p75': 35, 'p99': 35},
+                           {'town': 'Шумиловский', 'p50': 21, 'p75': 21, 'p99': 21}]
+        self.assertEqual(201, http_response.status_code)
+        self.assertEqual(expected_result, http_response.get_json()['data'])
+        self.assertNotIn('Expires', http_response.headers)
+
+    def test_should_cache_percentile_age_data_per_as_of_date(self):
+        self.app.get('/imports/0/towns/stat/percentile/age?as_of=01.10.2019')
+        self.app.get('/imports/0/towns/stat/percentile/age?as_of=01.10.2020')
+        self.app.get('/imports/0/towns/stat/percentile/age')
+        self.assertEqual(3, self.db['percentile_age'].count_documents({'import_id': 0}))
+        self.assertEqual(1, self.db['percentile_age'].count_documents({'import_id': 0, 'as_of': '01.10.2019'}))
+
+    def test_should_return_expires_of_nearest_birthday(self):
+        http_response = self.app.get('/imports/0/towns/stat/percentile/age')
+        expires = self.db['percentile_age'].find_one({'import_id': 0})['expires']
+        self.assertGreater(expires, datetime.utcnow())
+        self.assertEqual(expires, http_response.expires.replace(tzinfo=None))
+
+    def test_should_recalculate_percentile_age_data_when_cache_expired(self):
+        self.db['percentile_age'].insert_one({'import_id': 0, 'data': [], 'expires': datetime(2019, 1, 1)})
+        http_response = self.app.get('/imports/0/towns/stat/percentile/age')
+        self.assertEqual(3, len(http_response.get_json()['data']))
+        self.assertEqual(1, self.db['percentile_age'].count_documents({'import_id': 0}))
+        cached_document = self.db['percentile_age'].find_one({'import_id': 0})
+        self.assertNotEqual([], response_body.read_cached_data(cached_document)['data'])
+
+    def test_should_return_bad_request_when_as_of_incorrect(self):
+        http_response = self.app.get('/imports/0/towns/stat/percentile/age?as_of=2019-10-01')
+        self.assertEqual(400, http_response.status_code)
+        self.assertEqual(0, self.db['percentile_age'].count_documents({}))
+
     def test_should_return_bad_request_when_id_incorrect(self):
         self.db['imports'].delete_one({'import_id': 0})
+        self.db['citizens'].delete_many({'import_id': 0})
         http_response = self.app.get('/imports/0/towns/stat/percentile/age')
         response_data = http_response.get_data(as_text=True)
         self.assertEqual(400, http_response.status_code)
         self.assertIn('Import with specified id not found', response_data)
+
+    def test_should_return_bad_request_when_import_not_complete(self):
+        self.db['imports'].update_one({'import_id': 0}, {'$set': {'complete': False}})
+        self.assertEqual(400, self.app.get('/imports/0/towns/stat/percentile/age').status_code)
+        self.assertEqual(0, self.db['percentile_age'].count_documents({}))
+
+    def test_should_not_return_cached_data_when_import_not_complete(self):
+        self.app.get('/imports/0/towns/stat/percentile/age')
+        self.db['imports'].update_one({'import_id': 0}, {'$set': {'complete': False}})
+        self.db['citizens'].delete_many({'import_id': 0})
+        self.assertEqual(400, self.app.get('/imports/0/towns/stat/percentile/age').status_code)
+
+    def test_should_return_etag_of_current_date_when_no_as_of(self):
+        etag = self.app.get('/imports/0/towns/stat/percentile/age').headers['ETag']
+        as_of_etag = self.app.get('/imports/0/towns/stat/percentile/age?as_of=01.10.2019').headers['ETag']
+
+        self.assertIn(datetime.utcnow().strftime('%Y%m%d'), etag)
+        self.assertNotEqual(etag, as_of_etag)
+        http_response = self.app.get('/imports/0/towns/stat/percentile/age?as_of=01.10.2019',
+                                     headers=[('If-None-Match', as_of_etag)])
+        self.assertEqual(304, http_response.status_code)
+
+
+class PercentileAgeGetAsyncTests(PercentileAgeGetTests):
+    async_mode = True
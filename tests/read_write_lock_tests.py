@@ -0,0 +1,82 @@
+import unittest
+from datetime import datetime, timedelta
+
+from mongolock import MongoLockLocked
+
+from application import metrics
+from application.read_write_lock import ReadWriteMongoLock
+from tests import test_utils
+
+
+class ReadWriteMongoLockTests(unittest.TestCase):
+    def setUp(self):
+        db = test_utils.get_fake_db()
+        self.lock = ReadWriteMongoLock(client=db.client, db=db.name, acquire_retry_step=0.01)
+
+    def test_shared_should_allow_many_readers(self):
+        with self.lock.shared('key', 'a', timeout=0.1), self.lock.shared('key', 'b', timeout=0.1):
+            self.assertEqual(2, len(self.lock.rw_collection.find_one({'_id': 'key'})['readers']))
+        self.assertEqual([], self.lock.rw_collection.find_one({'_id': 'key'})['readers'])
+
+    def test_should_record_wait_of_acquired_lock(self):
+        counts = {mode: metrics.LOCK_WAIT.get_count(lock='wait_key', mode=mode)
+                  for mode in ('lock', 'shared', 'exclusive')}
+        with self.lock.shared('wait_key', 'a'):
+            with self.assertRaises(MongoLockLocked):
+                with self.lock.exclusive('wait_key', 'b', timeout=0.05):
+                    pass
+        with self.lock.exclusive('wait_key', 'b'), self.lock('wait_key', 'c'):
+            pass
+        for mode, count in counts.items():
+            self.assertEqual(count + 1, metrics.LOCK_WAIT.get_count(lock='wait_key', mode=mode))
+
+    def test_exclusive_should_wait_for_readers(self):
+        with self.lock.shared('key', 'a'):
+            with self.assertRaises(MongoLockLocked):
+                with self.lock.exclusive('key', 'b', timeout=0.05):
+                    pass
+            self.assertIsNone(self.lock.rw_collection.find_one({'_id': 'key'})['writer'])
+
+    def test_shared_should_wait_for_writer(self):
+        with self.lock.exclusive('key', 'a'):
+            with self.assertRaises(MongoLockLocked):
+                with self.lock.shared('key', 'b', timeout=0.05):
+                    pass
+
+    def test_exclusive_should_wait_for_writer(self):
+        with self.lock.exclusive('key', 'a'):
+            with self.assertRaises(MongoLockLocked):
+                with self.lock.exclusive('key', 'b', timeout=0.05):
+                    pass
+
+    def test_exclusive_should_not_wait_for_expired_reader(self):
+        self.lock.rw_collection.insert_one({'_id': 'key', 'writer': None,
+                                            'readers': [{'token': 'a', 'expire': datetime.utcnow() - timedelta(1)}]})
+        with self.lock.exclusive('key', 'b', timeout=0.05):
+            self.assertEqual([], self.lock.rw_collection.find_one({'_id': 'key'})['readers'])
+
+    def test_shared_should_not_wait_for_expired_writer(self):
+        self.lock.rw_collection.insert_one({'_id': 'key', 'writer': 'a',
+                                            'writer_expire': datetime.utcnow() - timedelta(1), 'readers': []})
+        with self.lock.shared('key', 'b', timeout=0.05):
+            self.assertIsNone(self.lock.rw_collection.find_one({'_id': 'key'})['writer'])
+
+    def test_exclusive_should_release_when_exception_raised(self):
+        with self.assertRaises(ValueError):
+            with self.lock.exclusive('key', 'a'):
+                raise ValueError()
+        self.assertFalse(self.lock.is_locked('key'))
+
+    def test_is_locked_should_check_all_modes(self):
+        self.assertFalse(self.lock.is_locked('key'))
+        with self.lock.shared('key', 'a', expire=60):
+            self.assertTrue(self.lock.is_locked('key'))
+        with self.lock.exclusive('key', 'a', expire=60):
+            self.assertTrue(self.lock.is_locked('key'))
+        with self.lock('key', 'a', expire=60):
+            self.assertTrue(self.lock.is_locked('key'))
+        self.assertFalse(self.lock.is_locked('key'))
+
+
+if __name__ == '__main__':
+    unittest.main()
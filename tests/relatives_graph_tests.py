@@ -0,0 +1,71 @@
+import unittest
+
+from jsonschema import ValidationError
+from parameterized import parameterized
+
+from application.relatives_graph import RelativesGraph
+
+BACKENDS = [['python', 10 ** 9], ['numpy', 0]]
+
+
+class RelativesGraphTests(unittest.TestCase):
+    @staticmethod
+    def make_graph(numpy_threshold: int, citizens: dict) -> RelativesGraph:
+        graph = RelativesGraph(numpy_threshold)
+        for citizen_id, relatives in citizens.items():
+            graph.add_citizen(citizen_id, relatives)
+        return graph
+
+    def assert_exception(self, numpy_threshold: int, citizens: dict, expected_exception_message: str):
+        graph = self.make_graph(numpy_threshold, citizens)
+        with self.assertRaises(ValidationError) as context:
+            graph.validate()
+        self.assertEqual(expected_exception_message, context.exception.message)
+
+    @parameterized.expand(BACKENDS)
+    def test_correct_graph_should_be_valid(self, _, numpy_threshold: int):
+        graph = self.make_graph(numpy_threshold, {1: [2, 3], 2: [1], 3: [1], 10: []})
+        graph.validate()
+
+    @parameterized.expand(BACKENDS)
+    def test_empty_graph_should_be_valid(self, _, numpy_threshold: int):
+        self.make_graph(numpy_threshold, {}).validate()
+
+    @parameterized.expand(BACKENDS)
+    def test_graph_should_be_incorrect_when_citizen_is_relative_to_himself(self, _, numpy_threshold: int):
+        self.assert_exception(numpy_threshold, {1: [2, 1], 2: [1]}, 'Citizen can not be relative to himself')
+
+    @parameterized.expand(BACKENDS)
+    def test_graph_should_be_incorrect_when_relatives_not_unique(self, _, numpy_threshold: int):
+        self.assert_exception(numpy_threshold, {1: [2, 2], 2: [1]}, 'Relatives ids should be unique')
+
+    @parameterized.expand(BACKENDS)
+    def test_graph_should_report_same_error_when_several_errors(self, _, numpy_threshold: int):
+        self.assert_exception(numpy_threshold, {1: [2, 2], 2: [2, 1]}, 'Citizen can not be relative to himself')
+
+    @parameterized.expand(BACKENDS)
+    def test_graph_should_be_incorrect_when_relative_not_exists(self, _, numpy_threshold: int):
+        self.assert_exception(numpy_threshold, {1: [2], 2: [1, 5]}, 'Citizen relative does not exists')
+
+    @parameterized.expand(BACKENDS)
+    def test_graph_should_be_incorrect_when_relative_id_greater_than_all_ids(self, _, numpy_threshold: int):
+        self.assert_exception(numpy_threshold, {1: [100]}, 'Citizen relative does not exists')
+
+    @parameterized.expand(BACKENDS)
+    def test_graph_should_be_incorrect_when_relatives_not_duplex(self, _, numpy_threshold: int):
+        self.assert_exception(numpy_threshold, {1: [2, 3], 2: [1], 3: []}, 'Citizen relatives are not duplex')
+
+    @parameterized.expand(BACKENDS)
+    def test_graph_should_support_large_ids(self, _, numpy_threshold: int):
+        self.make_graph(numpy_threshold, {1: [2 ** 40], 2 ** 40: [1], 2 ** 50: []}).validate()
+        self.assert_exception(numpy_threshold, {1: [2 ** 40, 2 ** 50], 2 ** 40: [1], 2 ** 50: []},
+                              'Citizen relatives are not duplex')
+
+    @parameterized.expand(BACKENDS)
+    def test_graph_should_support_ids_not_fitting_into_int64(self, _, numpy_threshold: int):
+        self.make_graph(numpy_threshold, {1: [2 ** 70], 2 ** 70: [1]}).validate()
+        self.assert_exception(numpy_threshold, {1: [2 ** 70], 2 ** 70: []}, 'Citizen relatives are not duplex')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import json
+import unittest
+from datetime import date, datetime
+
+from application import response_body
+from application.response_body import JsonCodec, OrjsonCodec
+
+
+class JsonCodecTests(unittest.TestCase):
+    codec = JsonCodec()
+
+    def test_encode_should_format_dates(self):
+        body = self.codec.encode({'birth_date': datetime(2019, 12, 31), 'as_of': date(2020, 1, 1)})
+        self.assertEqual({'birth_date': '31.12.2019', 'as_of': '01.01.2020'}, json.loads(body))
+
+    def test_encode_should_keep_non_ascii_characters(self):
+        self.assertIn('Москва'.encode('utf-8'), self.codec.encode({'town': 'Москва'}))
+
+    def test_encode_should_raise_for_unsupported_type(self):
+        with self.assertRaises(TypeError):
+            self.codec.encode({'data': object()})
+
+    def test_decode_should_accept_bytes_and_str(self):
+        self.assertEqual({'town': 'Москва'}, self.codec.decode('{"town": "Москва"}'.encode('utf-8')))
+        self.assertEqual({'town': 'Москва'}, self.codec.decode('{"town": "Москва"}'))
+
+    def test_decode_should_raise_json_error_for_invalid_body(self):
+        with self.assertRaises(json.JSONDecodeError):
+            self.codec.decode(b'{"town": ')
+
+    def test_decode_should_reverse_encode(self):
+        data = {'data': [{'citizen_id': 1, 'relatives': [2, 3], 'name': 'Иван'}]}
+        self.assertEqual(data, self.codec.decode(self.codec.encode(data)))
+
+
+@unittest.skipIf(response_body.orjson is None, 'orjson is not installed')
+class OrjsonCodecTests(JsonCodecTests):
+    codec = OrjsonCodec()
+
+    def test_encode_should_match_json_codec(self):
+        data = {'data': [{'citizen_id': 1, 'birth_date': datetime(2019, 12, 31), 'town': 'Москва'}]}
+        self.assertEqual(json.loads(JsonCodec().encode(data)), json.loads(self.codec.encode(data)))
+
+
+class CacheFieldsTests(unittest.TestCase):
+    def test_make_cache_fields_should_contain_data_and_body(self):
+        body = b'{"data": {"1": []}}'
+        self.assertEqual({'data': {'1': []}, 'body': body, 'gzip_body': None},
+                         response_body.make_cache_fields(body, {'data': {'1': []}}))
+
+    def test_make_invalidating_update_should_remove_body(self):
+        self.assertEqual({'$set': {'data.1': []}, '$unset': {'body': '', 'gzip_body': ''}, '$inc': {'revision': 1}},
+                         response_body.make_invalidating_update({'$set': {'data.1': []}}))
+
+    def test_read_cached_data_should_skip_service_fields(self):
+        document = {'_id': 1, 'data': [], 'body': b'{"data": [1]}', 'gzip_body': None, 'expires': None, 'revision': 2}
+        self.assertEqual({'data': []}, response_body.read_cached_data(document))
+
+    def test_read_cached_data_should_decode_body_when_no_data(self):
+        self.assertEqual({'data': [1]}, response_body.read_cached_data({'body': b'{"data": [1]}', 'gzip_body': None}))
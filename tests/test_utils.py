@@ -1,15 +1,28 @@
+import asyncio
+import atexit
 import os
-from typing import Tuple
+from datetime import datetime
+from itertools import islice
+from typing import Callable, Iterable, Tuple, Union
+from unittest import mock
 from unittest.mock import MagicMock
+from urllib.parse import quote
 
 from bson import json_util
-from flask import Flask
-from mongolock import MongoLock
+from flask import Flask, Response
 from mongomock import MongoClient
 
+from application import response_body
+from application.aio import service as aio_service
+from application.aio.read_write_lock import AsyncReadWriteMongoLock
 from application.data_validator import DataValidator
+from application.handlers import age_histograms, shared
+from application.read_write_lock import ReadWriteMongoLock
 from application.service import make_app
 
+_loop = asyncio.new_event_loop()
+atexit.register(_loop.close)
+
 
 class MockMongoClient(MongoClient):
     """
@@ -31,6 +44,206 @@ class MockMongoClient(MongoClient):
         return self.session
 
 
+class AsyncMagicMock(MagicMock):
+    """Фейковый объект, вызов которого возвращает корутину, как у асинхронной функции."""
+
+    async def __call__(self, *args, **kwargs):
+        return super().__call__(*args, **kwargs)
+
+
+class AsyncMockCursor(object):
+    """
+    Фейковый асинхронный курсор motor поверх курсора mongomock.
+
+    Курсор mongomock создается при первом чтении, поэтому ошибки запроса, как и в motor, возникают при итерации.
+    """
+
+    def __init__(self, get_cursor: Callable[[], Iterable[dict]]):
+        self._get_cursor = get_cursor
+        self._modifiers = []
+        self._iterator = None
+
+    def sort(self, *args, **kwargs):
+        self._modifiers.append(('sort', args, kwargs))
+        return self
+
+    def batch_size(self, *args, **kwargs):
+        self._modifiers.append(('batch_size', args, kwargs))
+        return self
+
+    def limit(self, *args, **kwargs):
+        self._modifiers.append(('limit', args, kwargs))
+        return self
+
+    def _get_iterator(self):
+        if self._iterator is None:
+            cursor = self._get_cursor()
+            for name, args, kwargs in self._modifiers:
+                cursor = getattr(cursor, name)(*args, **kwargs)
+            self._iterator = iter(cursor)
+        return self._iterator
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> dict:
+        try:
+            return next(self._get_iterator())
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def to_list(self, length: int = None) -> list:
+        return list(islice(self._get_iterator(), length))
+
+    async def close(self):
+        self._iterator = iter(())
+
+
+class AsyncMockCollection(object):
+    """Фейковая асинхронная коллекция motor, методы которой выполняют запросы к коллекции mongomock."""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def find(self, *args, **kwargs) -> AsyncMockCursor:
+        return AsyncMockCursor(lambda: self._collection.find(*args, **kwargs))
+
+    def aggregate(self, *args, **kwargs) -> AsyncMockCursor:
+        return AsyncMockCursor(lambda: self._collection.aggregate(*args, **kwargs))
+
+    def __getattr__(self, name: str):
+        method = getattr(self._collection, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+
+        return call
+
+
+class AsyncMockSession(object):
+    """Фейковая асинхронная сессия motor. Как и в MockMongoClient, транзакции не выполняются."""
+
+    def __bool__(self):
+        return False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def start_transaction(self):
+        return self
+
+
+class AsyncMockMongoClient(object):
+    """Фейковый асинхронный клиент motor поверх клиента mongomock."""
+
+    def __init__(self, client: MongoClient):
+        self._client = client
+
+    def __getitem__(self, name: str) -> 'AsyncMockDatabase':
+        return AsyncMockDatabase(self._client[name], self)
+
+    async def start_session(self) -> AsyncMockSession:
+        return AsyncMockSession()
+
+
+class AsyncMockDatabase(object):
+    """Фейковая асинхронная база данных motor, работающая с той же базой данных mongomock."""
+
+    def __init__(self, db, client: AsyncMockMongoClient = None):
+        self._db = db
+        self.name = db.name
+        self.client = client or AsyncMockMongoClient(db.client)
+
+    def __getitem__(self, name: str) -> AsyncMockCollection:
+        return AsyncMockCollection(self._db[name])
+
+
+class AsgiTestClient(object):
+    """
+    Тестовый клиент ASGI приложения с тем же интерфейсом, что и тестовый клиент flask.
+
+    Запросы выполняются в общем цикле событий, ответы возвращаются объектами flask.Response.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def get(self, path: str, **kwargs) -> Response:
+        return self.open('GET', path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> Response:
+        return self.open('POST', path, **kwargs)
+
+    def patch(self, path: str, **kwargs) -> Response:
+        return self.open('PATCH', path, **kwargs)
+
+    def open(self, method: str, path: str, data: Union[str, bytes] = None, json: dict = None,
+             headers: Iterable[Tuple[str, str]] = ()) -> Response:
+        headers = list(headers.items() if isinstance(headers, dict) else headers)
+        if json is not None:
+            data = json_util.dumps(json)
+            headers.append(('Content-Type', 'application/json'))
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        path, _, query_string = path.partition('?')
+        scope = {'type': 'http', 'http_version': '1.1', 'method': method, 'scheme': 'http', 'path': path,
+                 'raw_path': path.encode(), 'root_path': '', 'query_string': quote(query_string, safe='=&').encode(),
+                 'headers': [(key.lower().encode(), value.encode()) for key, value in headers],
+                 'client': ('testclient', 50000), 'server': ('testserver', 80)}
+        return _loop.run_until_complete(self._request(scope, data or b''))
+
+    async def _request(self, scope: dict, body: bytes) -> Response:
+        messages = []
+        request_sent = False
+        response_complete = asyncio.Event()
+
+        async def receive() -> dict:
+            nonlocal request_sent
+            if request_sent:
+                await response_complete.wait()
+                return {'type': 'http.disconnect'}
+            request_sent = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        async def send(message: dict):
+            messages.append(message)
+            if message['type'] == 'http.response.body' and not message.get('more_body', False):
+                response_complete.set()
+
+        await self.app(scope, receive, send)
+        start = messages[0]
+        return Response(b''.join(message.get('body', b'') for message in messages[1:]), start['status'],
+                        [(key.decode(), value.decode()) for key, value in start['headers']])
+
+
+def run(coroutine):
+    """
+    Выполняет корутину в общем цикле событий тестов.
+
+    :param coroutine: корутина
+
+    :return: результат корутины
+    """
+    return _loop.run_until_complete(coroutine)
+
+
+def patch_cache_data(async_mode: bool = False):
+    """
+    Подменяет функцию сохранения ответа в кеш декоратора cache_response указанного режима сервиса.
+
+    :param bool async_mode: подменить функцию асинхронного декоратора
+
+    :return: контекстный менеджер подмены
+    """
+    if async_mode:
+        return mock.patch('application.aio.decorators.response_cacher._cache_data', new_callable=AsyncMagicMock,
+                          return_value=response_body.make_body_fields(b'{}'))
+    return mock.patch('application.decorators.response_cacher._cache_data')
+
+
 def create_mock_validator() -> DataValidator:
     """
     Создает фейковый экземпляр класса DataValidator
@@ -40,6 +253,7 @@ def create_mock_validator() -> DataValidator:
     """
     validator = DataValidator()
     validator.validate_import = MagicMock()
+    validator.validate_import_stream = MagicMock(side_effect=lambda citizens: citizens)
     validator.validate_citizen_patch = MagicMock()
     return validator
 
@@ -58,20 +272,76 @@ def read_data(filename: str) -> dict:
     return import_data
 
 
+def insert_import(db, import_data: dict):
+    """
+    Записывает поставку в фейковую базу данных в том же виде, в каком ее сохраняет сервис:
+    заголовок в коллекцию imports и каждого жителя отдельным документом в коллекцию citizens.
+
+    :param db: фейковая база данных
+    :param dict import_data: поставка с полем import_id
+    """
+    citizens = [{**citizen, 'import_id': import_data['import_id']} for citizen in import_data.get('citizens', [])]
+    citizens = [shared.with_birth_month(citizen) if isinstance(citizen.get('birth_date'), datetime) else citizen
+                for citizen in citizens]
+    if citizens:
+        db['citizens'].insert_many(citizens)
+    db['imports'].insert_one({**{key: value for key, value in import_data.items() if key != 'citizens'},
+                              'complete': True})
+
+
+def insert_age_histograms(db, import_data: dict):
+    """
+    Записывает гистограммы дат рождения поставки в фейковую базу данных так же, как их сохраняет сервис.
+
+    :param db: фейковая база данных
+    :param dict import_data: поставка с полем import_id и датами рождения жителей в datetime
+    """
+    histograms = age_histograms.create_histograms()
+    for citizen in import_data['citizens']:
+        age_histograms.add_citizen(histograms, citizen)
+    age_histograms.write_histograms(import_data['import_id'], histograms, db)
+
+
+def find_import(db, import_id: int) -> dict:
+    """
+    Собирает поставку из заголовка и документов жителей в фейковой базе данных.
+
+    :param db: фейковая база данных
+    :param int import_id: уникальный идентификатор поставки
+
+    :return: поставка вместе со списком жителей или None, если поставка не найдена
+    :rtype: dict
+    """
+    import_data = db['imports'].find_one({'import_id': import_id}, {'_id': 0, 'complete': 0})
+    if import_data is None:
+        return None
+    import_data['citizens'] = list(db['citizens'].find({'import_id': import_id},
+                                                       {'_id': 0, 'import_id': 0, 'birth_month': 0}))
+    return import_data
+
+
 def get_fake_db():
     """Создает экземпляр фейковой базы данных."""
     return MockMongoClient()['db']
 
 
-def set_up_service() -> Tuple[Flask, MongoClient, DataValidator]:
+def set_up_service(async_mode: bool = False) -> Tuple[Flask, MongoClient, DataValidator]:
     """
     Производит подготовку сервиса к тестированию.
 
-    :return: Запущенный сервис, фейковый монго клиент, фейковый валидатор
+    В асинхронном режиме сервис работает с той же фейковой базой данных через фейковый асинхронный клиент,
+    поэтому тесты подготавливают и проверяют данные одинаково в обоих режимах.
+    :param bool async_mode: подготовить асинхронное ASGI приложение вместо приложения flask
+
+    :return: Клиент запущенного сервиса, фейковый монго клиент, фейковый валидатор
     :rtype: Tuple[Flask, MongoClient, DataValidator]
     """
     db = get_fake_db()
     validator = create_mock_validator()
-    lock = MongoLock(client=db.client, db=db.name)
+    if async_mode:
+        async_db = AsyncMockDatabase(db)
+        lock = AsyncReadWriteMongoLock(client=async_db.client, db=db.name)
+        return AsgiTestClient(aio_service.make_app(async_db, validator, lock)), db, validator
+    lock = ReadWriteMongoLock(client=db.client, db=db.name)
     app = make_app(db, validator, lock).test_client()
     return app, db, validator